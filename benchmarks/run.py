@@ -0,0 +1,213 @@
+# Benchmarks of the parsing and extraction hot paths.
+# Measures the throughput (with timeit's autorange) and the peak of the python heap (with tracemalloc) of every case
+# and writes the results as json, so that the numbers of two commits can be compared.
+#
+# Run from the repository root:
+#   python -m benchmarks.run -o bench-new.json
+#   python -m benchmarks.run --baseline bench-old.json
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# The modules of hr/ import each other by their flat names, exactly like when the scripts are run from that folder.
+HR_DIR = Path(__file__).resolve().parent.parent / "hr"
+if str(HR_DIR) not in sys.path:
+    sys.path.insert(0, str(HR_DIR))
+
+from handelsregister import get_companies_in_searchresults  # noqa: E402
+from matching import cologne_phonetic, rank_rows, token_similarity  # noqa: E402
+from pyutil import create_company_folder_name, extract_company_data_from_pdf, extract_management_data, sanitize_string_for_folder_name  # noqa: E402
+
+from benchmarks.synthetic import generate_ad_text, generate_company_names, generate_result_html, write_ad_pdf  # noqa: E402
+
+# The input sizes of every case. "large" resembles long historical prints and full result pages with 100 rows.
+SIZES: Dict[str, Dict[str, int]] = {
+    "small": {"managers": 2, "purpose_lines": 8, "tail_lines": 0, "rows": 10, "history": 1, "names": 100},
+    "large": {"managers": 40, "purpose_lines": 200, "tail_lines": 2000, "rows": 100, "history": 5, "names": 1000}
+}
+
+@dataclass
+class Case:
+    name: str
+    size: str
+    func: Callable[[], Any]
+    input_bytes: int
+
+def build_cases(sizes: List[str], workdir: Path) -> List[Case]:
+    """
+    Generates the inputs of all cases.
+
+    Args:
+        sizes (List[str]): The names of the sizes (see SIZES).
+        workdir (Path): Folder for the generated PDFs.
+
+    Returns:
+        List[Case]: The cases in the order in which they are run.
+    """
+    cases: List[Case] = []
+    for size in sizes:
+        params = SIZES[size]
+        ad = generate_ad_text(params["managers"], params["purpose_lines"], params["tail_lines"])
+        pdf_path = write_ad_pdf(workdir / f"AD-{size}.pdf", ad.text)
+        html = generate_result_html(params["rows"], params["history"])
+        names = generate_company_names(params["names"])
+        rows = get_companies_in_searchresults(html)
+
+        cases += [
+            Case("extract_management_data", size, lambda text=ad.text: extract_management_data(text), len(ad.text.encode())),
+            Case("extract_company_data_from_text", size, lambda text=ad.text: extract_company_data_from_pdf("", _test_text=text), len(ad.text.encode())),
+            Case("extract_company_data_from_pdf", size, lambda path=str(pdf_path): extract_company_data_from_pdf(path), pdf_path.stat().st_size),
+            Case("extract_company_data_from_pdf_all_pages", size, lambda path=str(pdf_path): extract_company_data_from_pdf(path, early_exit=False), pdf_path.stat().st_size),
+            Case("get_companies_in_searchresults", size, lambda page=html: get_companies_in_searchresults(page), len(html.encode())),
+            Case("rank_rows", size, lambda rows=rows: _rank_rows_cold(rows), len(html.encode())),
+            Case("sanitize_string_for_folder_name", size, lambda pairs=names: [sanitize_string_for_folder_name(n) for n, _ in pairs], sum(len(n.encode()) for n, _ in names)),
+            Case("create_company_folder_name", size, lambda pairs=names: [create_company_folder_name(n, c, True) for n, c in pairs], sum(len((n + c).encode()) for n, c in names))
+        ]
+    return cases
+
+def _rank_rows_cold(rows: List[Dict[str, Any]]) -> List:
+    # Without the word caches of earlier runs, like the first search of a process.
+    cologne_phonetic.cache_clear()
+    token_similarity.cache_clear()
+    return rank_rows(rows, "Müller Bau GmbH", "Berlin")
+
+def measure(case: Case, repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    Measures a case.
+
+    Args:
+        case (Case): The case.
+        repeat (int): Number of timed rounds, the median and the minimum of the rounds are reported.
+        min_time (float): Minimum duration of a round in seconds, the number of calls per round is chosen accordingly.
+
+    Returns:
+        Dict[str, Any]: The results of the case.
+    """
+    case.func() # Warm-up, e.g. for the regex and import caches.
+    timer = timeit.Timer(case.func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    # Only the python heap is traced, allocations of MuPDF itself are not part of the peak.
+    tracemalloc.start()
+    try:
+        case.func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(rounds)
+    return {
+        "name": case.name,
+        "size": case.size,
+        "input_bytes": case.input_bytes,
+        "calls_per_round": number,
+        "rounds": repeat,
+        "median_s": median,
+        "min_s": min(rounds),
+        "ops_per_s": 1 / median if median else None,
+        "mb_per_s": case.input_bytes / median / 1e6 if median else None,
+        "peak_bytes": peak
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HR_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compares the results with the results of an earlier run.
+
+    Args:
+        results (List[Dict[str, Any]]): The current results.
+        baseline (Dict[str, Any]): The json document of the earlier run.
+        threshold (float): Relative slowdown or memory growth from which on a case counts as a regression, e.g. 0.1 for 10%.
+
+    Returns:
+        List[str]: One line per case that exists in both runs, regressions are marked.
+    """
+    old = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    lines = []
+    for result in results:
+        before = old.get((result["name"], result["size"]))
+        if before is None:
+            continue
+        speed = before["median_s"] / result["median_s"] if result["median_s"] else float("inf")
+        memory = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+        regression = speed < 1 - threshold or memory > 1 + threshold
+        lines.append(f"{'REGRESSION ' if regression else ''}{result['name']} [{result['size']}]: {speed:.2f}x speed, {memory:.2f}x peak memory")
+    return lines
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(prog="Handelsregister benchmarks", description="Misst Durchsatz und Speicherspitzen der Parser und der Extraktion.")
+    parser.add_argument("-o", "--output", help="Write the json results to this file instead of stdout")
+    parser.add_argument("--sizes", help="Comma separated input sizes", default="small,large")
+    parser.add_argument("-k", "--filter", help="Only run the cases whose name contains this string")
+    parser.add_argument("--repeat", help="Number of timed rounds per case", type=int, default=5)
+    parser.add_argument("--min-time", help="Minimum duration of a round in seconds", type=float, default=0.2)
+    parser.add_argument("--baseline", help="Json results of an earlier run to compare against")
+    parser.add_argument("--threshold", help="Relative change that counts as a regression", type=float, default=0.1)
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_cli_arguments()
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        sys.stderr.write(f"Unbekannte Größe(n): {', '.join(unknown)}\n")
+        return 2
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = [c for c in build_cases(sizes, Path(workdir)) if not args.filter or args.filter in c.name]
+        results = []
+        for case in cases:
+            result = measure(case, args.repeat, args.min_time)
+            sys.stderr.write(f"{case.name} [{case.size}]: {result['ops_per_s']:.1f} ops/s, peak {result['peak_bytes'] / 1024:.0f} KiB\n")
+            results.append(result)
+
+    document = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": {size: SIZES[size] for size in sizes}
+        },
+        "results": results
+    }
+    output = json.dumps(document, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.baseline:
+        lines = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.threshold)
+        sys.stderr.write("\n".join(lines) + "\n")
+        if any(line.startswith("REGRESSION") for line in lines):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
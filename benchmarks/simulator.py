@@ -0,0 +1,578 @@
+# Local stand-in for the JSF pages of the register portal.
+# The live portal is slow, only allows 60 retrievals per hour and must not be load-tested, so the lookup path (the Selenium
+# flow of pysil as well as the PortalClient) can not be measured against it. The simulator serves the pages these clients touch:
+#
+#   welcome.xhtml          start page with the naviForm and the link to the advanced search
+#   erweitertesuche.xhtml  the advanced search form with the form:* fields, its submit answers with the result table
+#   ergebnisse.xhtml       the ergebnissForm: ajax requests of the paginator and the document downloads
+#
+# Session cookies and ViewStates are checked like on the real server. The latency, the number of results, the position of the
+# matching row, the error rate and the size of the documents are configurable and all random values are seeded, so two runs
+# with the same configuration produce the same numbers (apart from the noise of the machine).
+#
+# Run from the repository root:
+#   python -m benchmarks.simulator --port 8080 --latency 0.3 --jitter 0.2 --results 250 --error-rate 0.02
+#   (cd hr && HR_PORTAL_URL=http://127.0.0.1:8080/rp_web/ python pysil.py -s "Testfirma GmbH" -ci Berlin)
+#   python -m benchmarks.simulator --lookups 50 --concurrency 4 # load test of the PortalClient against its own simulator
+
+import argparse
+import gzip
+import html
+import itertools
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# The modules of hr/ import each other by their flat names, exactly like when the scripts are run from that folder.
+HR_DIR = Path(__file__).resolve().parent.parent / "hr"
+if str(HR_DIR) not in sys.path:
+    sys.path.insert(0, str(HR_DIR))
+
+from handelsregister import (  # noqa: E402
+    REGISTER_COURT_FIELD, REGISTER_NUMBER_FIELD, REGISTER_TYPE_FIELD, RESULT_FORM_ID, RESULT_TABLE_ID, RESULTS_PER_PAGE_FIELD,
+    VIEW_STATE_FIELD, page_request_fields
+)
+
+from benchmarks import synthetic  # noqa: E402
+
+# The options of the court select. The values have the format of the codes of the real select.
+COURTS = {
+    "F1103R": "Berlin (Charlottenburg)",
+    "B8536": "Ulm",
+    "R3101": "Köln",
+    "D2601": "München",
+    "M1201": "Frankfurt am Main"
+}
+REGISTER_TYPES = ["HRA", "HRB", "GnR", "PR", "VR"]
+PAGE_SIZES = [10, 25, 50, 100]
+MAX_VIEWS = 10000 # ViewStates that are remembered, the oldest ones expire.
+
+# Matches the id of a document link, e.g. "ergebnissForm:selectedSuchErgebnisFormTable:3:j_idt161:0:fade".
+_DOCUMENT_LINK_PATTERN = re.compile(r"^%s:(\d+):j_idt161:\d+:fade$" % re.escape(RESULT_TABLE_ID))
+
+@dataclass
+class SimulatorConfig:
+    latency: float = 0.0 # Seconds before every answer.
+    jitter: float = 0.0 # Up to this many further seconds before every answer, uniformly distributed.
+    download_latency: float = 0.0 # Further seconds before a document.
+    results: int = 3 # Number of rows of every search.
+    match_position: Optional[int] = 0 # Row that carries the searched name and city (or register entry), None for no match.
+    error_rate: float = 0.0 # Share of the requests that get answered with "500 Internal Server Error".
+    document_size: int = 0 # Minimum size of the documents in bytes.
+    seed: int = 0
+
+class SimulatedRow(NamedTuple):
+    name: str
+    city: str
+    court: str
+    register: str # e.g. "HRB 44343"
+
+@dataclass
+class _Search:
+    rows: List[SimulatedRow]
+    page_size: int
+
+@dataclass
+class _Response:
+    kind: str # The page, used for the stats.
+    body: bytes
+    status: int = 200
+    content_type: str = "text/html; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+# Stand-ins for the scripts of jsf.js and PrimeFaces that the pages use: the command links submit their form with extra
+# parameters, the checkboxes toggle their hidden input and the paginator replaces the rows with the answer of an ajax request.
+# `jQuery.active` counts the running requests, like the real one that `waits.wait_for_ajax_idle` looks at.
+PAGE_SCRIPT = """
+var jQuery = {active: 0};
+var PrimeFaces = {cw: function() {}};
+var mojarra = {jsfcljs: function(form, params, target) {
+    var added = [];
+    for (var name in params) {
+        var input = document.createElement('input');
+        input.type = 'hidden'; input.name = name; input.value = params[name];
+        form.appendChild(input); added.push(input);
+    }
+    form.submit();
+    added.forEach(function(input) { form.removeChild(input); });
+}};
+function hrToggle(id) { var input = document.getElementById(id + '_input'); input.checked = !input.checked; }
+function hrNextPage(link, params) {
+    if (link.className.indexOf('ui-state-disabled') >= 0) { return false; }
+    var form = document.getElementById('%(form)s');
+    var table = '%(table)s';
+    var first = parseInt(link.getAttribute('data-first'), 10);
+    var rows = parseInt(link.getAttribute('data-rows'), 10);
+    var data = new URLSearchParams(new FormData(form));
+    for (var name in params) { data.set(name, params[name]); }
+    data.set(table + '_first', String(first));
+    jQuery.active++;
+    fetch(form.action, {method: 'POST', body: data, headers: {'Faces-Request': 'partial/ajax', 'X-Requested-With': 'XMLHttpRequest'}})
+        .then(function(response) { return response.text(); })
+        .then(function(text) {
+            var updates = new DOMParser().parseFromString(text, 'text/xml').getElementsByTagName('update');
+            for (var i = 0; i < updates.length; i++) {
+                var id = updates[i].getAttribute('id');
+                if (id === table) { document.getElementById(table + '_data').innerHTML = updates[i].textContent; }
+                else if (id.indexOf('%(view_state)s') >= 0) { form.elements['%(view_state)s'].value = updates[i].textContent; }
+            }
+            link.setAttribute('data-first', String(first + rows));
+            if (first + rows >= parseInt(link.getAttribute('data-count'), 10)) { link.className += ' ui-state-disabled'; }
+        })
+        .finally(function() { jQuery.active--; });
+    return false;
+}
+""" % {"form": RESULT_FORM_ID, "table": RESULT_TABLE_ID, "view_state": VIEW_STATE_FIELD}
+
+def _page(title: str, body: str) -> str:
+    return (
+        f'<!DOCTYPE html><html><head><title>{title}</title><script type="text/javascript">{PAGE_SCRIPT}</script></head>'
+        f'<body>{body}</body></html>'
+    )
+
+SELECTED = ' selected="selected"'
+CHECKED = ' checked="checked"'
+
+def _options(options: List[Tuple[str, str]], selected: str = "") -> str:
+    return "".join(
+        f'<option value="{html.escape(value)}"{SELECTED if value == selected else ""}>{html.escape(label)}</option>'
+        for value, label in options
+    )
+
+def welcome_page(view_state: str) -> str:
+    """
+    Args:
+        view_state (str): The ViewState of the page.
+
+    Returns:
+        str: The start page with the link to the advanced search.
+    """
+    link = "naviForm:erweiterteSucheLink"
+    return _page("Registerportal", (
+        '<form id="naviForm" name="naviForm" method="post" action="/rp_web/welcome.xhtml">'
+        '<input type="hidden" name="naviForm" value="naviForm" />'
+        f'<a id="{link}" href="#" onclick="mojarra.jsfcljs(document.getElementById(\'naviForm\'),{{\'{link}\':\'{link}\'}},\'\');return false">Erweiterte Suche</a>'
+        f'<input type="hidden" name="{VIEW_STATE_FIELD}" value="{view_state}" />'
+        '</form>'
+    ))
+
+def search_form_page(view_state: str) -> str:
+    """
+    Args:
+        view_state (str): The ViewState of the page.
+
+    Returns:
+        str: The advanced search form with the same ids and names as the real one.
+    """
+    # The option values follow `handelsregister.schlagwortOptionen`, the radio ids the order that pysil expects.
+    radios = "".join(
+        f'<input id="form:schlagwortOptionen:{i}" name="form:schlagwortOptionen" type="radio" value="{value}"{CHECKED if i == 0 else ""} />'
+        f'<label for="form:schlagwortOptionen:{i}">{label}</label>'
+        for i, (value, label) in enumerate([("1", "alle Schlagwörter"), ("3", "genauer Firmenname"), ("2", "mindestens ein Schlagwort")])
+    )
+    checkboxes = "".join(
+        f'<div id="{name}" class="ui-chkbox ui-widget" onclick="hrToggle(this.id)">'
+        f'<input id="{name}_input" name="{name}_input" type="checkbox"{CHECKED if checked else ""} style="display: none" />'
+        f'<div class="ui-chkbox-box">{label}</div></div>'
+        for name, label, checked in [("form:aenlichLautendeSchlagwoerterBoolChkbox", "ähnlich lautende Schlagwörter", True), ("form:auchGeloeschte", "auch gelöschte Firmen", False)]
+    )
+    return _page("Erweiterte Suche", (
+        '<form id="form" name="form" method="post" action="/rp_web/erweitertesuche.xhtml">'
+        '<input type="hidden" name="form" value="form" />'
+        '<input id="form:schlagwoerter" name="form:schlagwoerter" type="text" value="" />'
+        f'{radios}{checkboxes}'
+        '<input id="form:postleitzahl" name="form:postleitzahl" type="text" value="" />'
+        '<input id="form:ort" name="form:ort" type="text" value="" />'
+        '<input id="form:strasse" name="form:strasse" type="text" value="" />'
+        f'<select id="{REGISTER_TYPE_FIELD}" name="{REGISTER_TYPE_FIELD}">{_options([("", "alle")] + [(t, t) for t in REGISTER_TYPES])}</select>'
+        f'<input id="{REGISTER_NUMBER_FIELD}" name="{REGISTER_NUMBER_FIELD}" type="text" value="" />'
+        f'<select id="{REGISTER_COURT_FIELD}" name="{REGISTER_COURT_FIELD}">{_options([("", "alle")] + list(COURTS.items()))}</select>'
+        f'<select id="{RESULTS_PER_PAGE_FIELD}" name="{RESULTS_PER_PAGE_FIELD}">{_options([(str(size), str(size)) for size in PAGE_SIZES], str(PAGE_SIZES[0]))}</select>'
+        '<button id="form:btnSuche" name="form:btnSuche" type="submit">Suchen</button>'
+        f'<input type="hidden" name="{VIEW_STATE_FIELD}" value="{view_state}" />'
+        '</form>'
+    ))
+
+def rows_html(rows: List[SimulatedRow], first: int) -> str:
+    """
+    Args:
+        rows (List[SimulatedRow]): The rows of a page.
+        first (int): The data-ri index of the first row.
+
+    Returns:
+        str: The html of the rows, see `synthetic.result_row_html`.
+    """
+    return "".join(
+        synthetic.result_row_html(first + i, html.escape(row.name), html.escape(row.city), row.court, row.register)
+        for i, row in enumerate(rows)
+    )
+
+def results_page(search: _Search, view_state: str) -> str:
+    """
+    Args:
+        search (_Search): The rows of the search.
+        view_state (str): The ViewState of the page.
+
+    Returns:
+        str: The first page of the result table with its paginator.
+    """
+    count = len(search.rows)
+    size = search.page_size
+    disabled = " ui-state-disabled" if size >= count else ""
+    params = json.dumps(page_request_fields(0, size)).replace('"', "&quot;")
+    return _page("Suchergebnisse", (
+        f'<form id="{RESULT_FORM_ID}" name="{RESULT_FORM_ID}" method="post" action="/rp_web/ergebnisse.xhtml">'
+        f'<input type="hidden" name="{RESULT_FORM_ID}" value="{RESULT_FORM_ID}" />'
+        f'<div id="{RESULT_TABLE_ID}" class="ui-datatable"><table role="grid"><thead><tr><th>Ergebnisse</th></tr></thead>'
+        f'<tbody id="{RESULT_TABLE_ID}_data" class="ui-datatable-data ui-widget-content">{rows_html(search.rows[:size], 0)}</tbody></table>'
+        f'<div id="{RESULT_TABLE_ID}_paginator_bottom" class="ui-paginator"><a href="#" class="ui-paginator-next ui-state-default{disabled}" '
+        f'data-first="{size}" data-rows="{size}" data-count="{count}" onclick="return hrNextPage(this, {params})">&gt;</a></div></div>'
+        f'<script id="{RESULT_TABLE_ID}_s" type="text/javascript">PrimeFaces.cw("DataTable","widget_{RESULT_TABLE_ID.replace(":", "_")}",'
+        f'{{id:"{RESULT_TABLE_ID}",paginator:{{id:[\'{RESULT_TABLE_ID}_paginator_bottom\'],rows:{size},rowCount:{count},page:0}}}});</script>'
+        f'<input type="hidden" name="{VIEW_STATE_FIELD}" value="{view_state}" />'
+        '</form>'
+    ))
+
+def page_response(rows: str, view_state: str) -> str:
+    """
+    Args:
+        rows (str): The html of the rows of the page.
+        view_state (str): The new ViewState.
+
+    Returns:
+        str: The partial response to the ajax request of the paginator.
+    """
+    return (
+        "<?xml version='1.0' encoding='UTF-8'?>\n"
+        f'<partial-response id="j_id1"><changes><update id="{RESULT_TABLE_ID}"><![CDATA[{rows}]]></update>'
+        f'<update id="j_id1:{VIEW_STATE_FIELD}:0"><![CDATA[{view_state}]]></update></changes></partial-response>'
+    )
+
+@lru_cache(maxsize=256)
+def render_document(row: SimulatedRow, document_type: str, size: int, seed: int) -> bytes:
+    """
+    Generates the PDF of a document of a result row, its text follows the layout of an AD print.
+
+    Args:
+        row (SimulatedRow): The result row.
+        document_type (str): The document type, e.g. "AD".
+        size (int): Minimum size of the document in bytes.
+        seed (int): Seed of the random values.
+
+    Returns:
+        bytes: The PDF.
+    """
+    ad = synthetic.generate_ad_text(managers=2, seed=zlib.crc32(f"{seed}|{row}|{document_type}".encode("utf-8")))
+    text = ad.text.replace(ad.name, row.name)
+    content = synthetic.ad_pdf_bytes(text)
+    if len(content) < size:
+        content = synthetic.ad_pdf_bytes(text, padding=size - len(content))
+    return content
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real server.
+    # Headers and body are written separately, Nagle's algorithm would hold the body back until the client acknowledges
+    # the headers (up to 40 ms per request with delayed ACKs).
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.server.simulator.handle(self, "GET", {}) # type: ignore[attr-defined]
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        fields = {key: values[0] for key, values in parse_qs(body, keep_blank_values=True).items()}
+        self.server.simulator.handle(self, "POST", fields) # type: ignore[attr-defined]
+
+class PortalSimulator:
+    """
+    HTTP server that answers like the portal. Every search gets deterministic rows (seeded by the configuration and the
+    query), which stay available for the paginator and the downloads as long as their ViewState is known.
+    """
+
+    def __init__(self, config: Optional[SimulatorConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            config (Optional[SimulatorConfig]): The behaviour of the simulator.
+            host (str): The address to listen on.
+            port (int): The port, a free one is picked if 0.
+        """
+        self.config = config or SimulatorConfig()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.simulator = self # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._ids = itertools.count(1)
+        self._sessions: set = set()
+        self._views: "OrderedDict[str, Tuple[str, Optional[_Search]]]" = OrderedDict() # ViewState -> (session, search)
+        self._stats: Counter = Counter()
+
+    @property
+    def url(self) -> str:
+        """The base url of the rp_web application, e.g. for `PortalClient(base_url=...)` or HR_PORTAL_URL."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/rp_web/"
+
+    def start(self) -> "PortalSimulator":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="hr-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "PortalSimulator":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Number of answers per page ("welcome", "search_form", "results", "page", "document"), of the
+                injected errors ("error"), of the rejected requests ("rejected") and the sent bytes ("bytes").
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _new_view(self, session: str, search: Optional[_Search] = None) -> str:
+        with self._lock:
+            view_state = f"vs{next(self._ids)}"
+            self._views[view_state] = (session, search)
+            while len(self._views) > MAX_VIEWS:
+                self._views.popitem(last=False)
+            return view_state
+
+    def _view(self, session: Optional[str], view_state: Optional[str]) -> Optional[Tuple[str, Optional[_Search]]]:
+        # The ViewState has to be known and belong to the session of the request.
+        with self._lock:
+            view = self._views.get(view_state or "")
+        return view if view is not None and view[0] == session else None
+
+    def _search(self, fields: Dict[str, str]) -> _Search:
+        config = self.config
+        s = fields.get("form:schlagwoerter", "").strip()
+        ci = fields.get("form:ort", "").strip()
+        register_type = fields.get(REGISTER_TYPE_FIELD, "")
+        number = fields.get(REGISTER_NUMBER_FIELD, "").strip()
+        court_code = fields.get(REGISTER_COURT_FIELD, "")
+        try:
+            page_size = int(fields.get(RESULTS_PER_PAGE_FIELD) or PAGE_SIZES[0])
+        except ValueError:
+            page_size = PAGE_SIZES[0]
+        page_size = max([size for size in PAGE_SIZES if size <= page_size] or PAGE_SIZES[:1])
+
+        # The same query always gets the same rows.
+        rng = random.Random("|".join([str(config.seed), s, ci, register_type, number, court_code]))
+        rows = []
+        for i in range(config.results):
+            name = f"{rng.choice(synthetic.LAST_NAMES)} {rng.choice(synthetic.PURPOSE_WORDS)} {rng.choice(synthetic.LEGAL_FORMS)}"
+            city = rng.choice(synthetic.CITIES)
+            court = rng.choice(list(COURTS.values()))
+            register = f"{rng.choice(['HRA', 'HRB'])} {rng.randint(1000, 999999)}"
+            if i == config.match_position:
+                if number:
+                    register = f"{register_type or 'HRB'} {number}"
+                    court = COURTS.get(court_code, court)
+                name = s or name
+                city = ci or city
+            rows.append(SimulatedRow(name, city, court, register))
+        return _Search(rows, page_size)
+
+    def _route(self, method: str, page: str, session: Optional[str], fields: Dict[str, str]) -> _Response:
+        if method == "GET" and page == "welcome.xhtml":
+            # Opening the start page creates the session.
+            headers = {}
+            if session is None or session not in self._sessions:
+                session = f"s{next(self._ids)}"
+                with self._lock:
+                    self._sessions.add(session)
+                headers["Set-Cookie"] = f"JSESSIONID={session}; Path=/rp_web; HttpOnly"
+            return _Response("welcome", welcome_page(self._new_view(session)).encode("utf-8"), headers=headers)
+        if session is None or session not in self._sessions:
+            return _Response("rejected", b"no session", status=400, content_type="text/plain")
+        if method == "GET" and page == "erweitertesuche.xhtml":
+            return _Response("search_form", search_form_page(self._new_view(session)).encode("utf-8"))
+        if method != "POST":
+            return _Response("rejected", b"unknown page", status=404, content_type="text/plain")
+
+        view = self._view(session, fields.get(VIEW_STATE_FIELD))
+        if view is None:
+            return _Response("rejected", b"view expired", status=400, content_type="text/plain")
+        search = view[1]
+        if page == "welcome.xhtml" and "naviForm:erweiterteSucheLink" in fields:
+            return _Response("search_form", search_form_page(self._new_view(session)).encode("utf-8"))
+        if page == "erweitertesuche.xhtml":
+            search = self._search(fields)
+            return _Response("results", results_page(search, self._new_view(session, search)).encode("utf-8"))
+        if page == "ergebnisse.xhtml" and search is not None:
+            if fields.get("javax.faces.partial.ajax") == "true":
+                first = int(fields.get(RESULT_TABLE_ID + "_first") or 0)
+                rows = search.rows[first:first + search.page_size]
+                body = page_response(rows_html(rows, first), self._new_view(session, search))
+                return _Response("page", body.encode("utf-8"), content_type="text/xml; charset=utf-8")
+            document_type = fields.get("property", "").replace("Global.Dokumentart.", "")
+            indices = [int(m.group(1)) for m in map(_DOCUMENT_LINK_PATTERN.match, fields) if m]
+            if document_type and indices and indices[0] < len(search.rows):
+                row = search.rows[indices[0]]
+                return _Response(
+                    "document", render_document(row, document_type, self.config.document_size, self.config.seed),
+                    content_type="application/pdf",
+                    headers={"Content-Disposition": f'attachment; filename="{row.register.replace(" ", "")}_{document_type}.pdf"'}
+                )
+        return _Response("rejected", b"unexpected request", status=400, content_type="text/plain")
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, fields: Dict[str, str]) -> None:
+        """
+        Answers a request, after the configured latency. Called by the request handler threads.
+        """
+        config = self.config
+        with self._lock:
+            delay = config.latency + (self._rng.uniform(0, config.jitter) if config.jitter else 0.0)
+            failed = config.error_rate > 0 and self._rng.random() < config.error_rate
+
+        path = urlsplit(handler.path).path
+        cookie = re.search(r"JSESSIONID=([^;\s]+)", handler.headers.get("Cookie", ""))
+        if failed:
+            response = _Response("error", b"<html><body>Internal Server Error</body></html>", status=500)
+        elif not path.startswith("/rp_web/"):
+            response = _Response("rejected", b"unknown page", status=404, content_type="text/plain")
+        else:
+            response = self._route(method, path[len("/rp_web/"):], cookie.group(1) if cookie else None, fields)
+        if response.kind == "document":
+            delay += config.download_latency
+        if delay > 0:
+            time.sleep(delay)
+
+        body = response.body
+        headers = dict(response.headers)
+        if "gzip" in handler.headers.get("Accept-Encoding", "") and not response.content_type.startswith("application/pdf"):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        with self._lock:
+            self._stats[response.kind] += 1
+            self._stats["bytes"] += len(body)
+        handler.send_response(response.status)
+        handler.send_header("Content-Type", response.content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+class _NoQuota:
+    # The simulator does not need to be protected by the shared quota.
+    def acquire(self, max_wait: Optional[float] = None) -> None:
+        return None
+
+def run_http_lookups(url: str, queries: List[Tuple[str, str]], concurrency: int = 1) -> Dict[str, Any]:
+    """
+    Looks up the companies with the PortalClient (search, paging until a matching row is found, download of the AD document)
+    and measures every lookup.
+
+    Args:
+        url (str): The base url of the simulator.
+        queries (List[Tuple[str, str]]): The names and cities.
+        concurrency (int): Number of lookups at the same time, each with its own client (i.e. portal session).
+
+    Returns:
+        Dict[str, Any]: Number of lookups, found documents and errors, p50/p95/max in milliseconds and the lookups per second.
+    """
+    from httpclient import PortalClient, find_matching_row
+
+    def lookup(query: Tuple[str, str]) -> Tuple[float, Optional[bool]]:
+        s, ci = query
+        start = time.perf_counter()
+        try:
+            with PortalClient(base_url=url, quota=_NoQuota()) as client:
+                for page in client.search_pages(s, ci=ci):
+                    row_index = find_matching_row(page.rows, s, ci)
+                    if row_index is not None:
+                        client.download_document(page, page.first + row_index)
+                        return time.perf_counter() - start, True
+            return time.perf_counter() - start, False
+        except Exception:
+            return time.perf_counter() - start, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lookup, queries))
+    wall = time.perf_counter() - started
+
+    durations = sorted(duration * 1000 for duration, _ in outcomes)
+    return {
+        "lookups": len(outcomes),
+        "found": sum(1 for _, found in outcomes if found),
+        "errors": sum(1 for _, found in outcomes if found is None),
+        "p50_ms": round(statistics.median(durations), 3) if durations else None,
+        "p95_ms": round(durations[max(0, -(-len(durations) * 95 // 100) - 1)], 3) if durations else None,
+        "max_ms": round(durations[-1], 3) if durations else None,
+        "lookups_per_s": round(len(outcomes) / wall, 3) if wall > 0 else None
+    }
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(prog="Handelsregister simulator", description="Local stand-in for the pages of the register portal.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on, 0 picks a free one")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many further seconds before every answer")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="Further seconds before a document")
+    parser.add_argument("--results", type=int, default=3, help="Number of rows of every search")
+    parser.add_argument("--match-position", type=int, default=0, help="Row with the searched name and city, -1 for none")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of the requests that fail with a 500")
+    parser.add_argument("--document-size", type=int, default=0, help="Minimum size of the documents in bytes")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random values")
+    parser.add_argument("--lookups", type=int, default=0, help="Run this many PortalClient lookups against the simulator, print the numbers and exit")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of lookups at the same time for --lookups")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_cli_arguments()
+    config = SimulatorConfig(
+        latency=args.latency, jitter=args.jitter, download_latency=args.download_latency, results=args.results,
+        match_position=args.match_position if args.match_position >= 0 else None, error_rate=args.error_rate,
+        document_size=args.document_size, seed=args.seed
+    )
+    simulator = PortalSimulator(config, args.host, 0 if args.lookups else args.port)
+    with simulator:
+        if args.lookups:
+            queries = synthetic.generate_company_names(args.lookups, seed=args.seed)
+            result = run_http_lookups(simulator.url, queries, args.concurrency)
+            print(json.dumps({**result, "requests": simulator.stats()}, ensure_ascii=False))
+            return 0
+        print(json.dumps({"url": simulator.url}), flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
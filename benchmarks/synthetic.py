@@ -0,0 +1,251 @@
+# Generators for synthetic, but realistically structured inputs of the benchmarks:
+# the text of an AD document (Aktueller Abdruck), PDFs with that text and the html of a result page of the search.
+# All generators are deterministic for a given seed, so the results of different commits stay comparable.
+# The names only use characters of Latin-1, which is what the built-in Helvetica font of the generated PDFs covers.
+
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+FIRST_NAMES = ["Max", "Erika", "Peter", "Anna-Lena", "Jürgen", "Sieglinde", "Luitwin", "Maria", "Hans-Peter", "Özlem", "François", "Björn"]
+LAST_NAMES = ["Mustermann", "Musterfrau", "Müller", "Schmidt", "Schlachter-Ohnewald", "Böttinger", "von der Heide", "Weiß", "Öztürk", "de Vries"]
+CITIES = ["Berlin", "Ulm", "Neu-Ulm", "Köln", "Friedrichshafen", "München", "Groß-Gerau", "Dreieich", "Märkßheim", "Frankfurt am Main"]
+STREETS = ["Musterstraße", "Hauptstr.", "Am Marktplatz", "Wiley-Str.", "Königsallee", "Große Bleiche"]
+LEGAL_FORMS = ["GmbH", "AG", "GmbH & Co. KG", "UG (haftungsbeschränkt)", "e.K.", "SE"]
+COURTS = ["Berlin (Charlottenburg)", "Ulm", "Köln", "München", "Frankfurt am Main"]
+PURPOSE_WORDS = ["Entwicklung", "Vertrieb", "Beratung", "Software", "Dienstleistungen", "Handel", "Immobilien", "Verwaltung", "Beteiligung",
+                 "Herstellung", "Waren", "aller", "Art", "sowie", "und", "im", "Bereich", "der", "digitalen", "Medien", "Energie"]
+
+DOCUMENT_TYPES = ["AD", "CD", "HD", "DK", "UT", "VÖ", "SI"]
+
+@dataclass
+class SyntheticAd:
+    """The text of a generated AD document together with the values that the extraction should find."""
+    text: str
+    name: str
+    address: str
+    managers: List[str]
+
+def _date(rng: random.Random) -> str:
+    return f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1940, 2005)}"
+
+def _unique_people(rng: random.Random, count: int) -> List[Tuple[str, str]]:
+    people: List[Tuple[str, str]] = []
+    seen = set()
+    while len(people) < count:
+        last, first = rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES)
+        if len(seen) >= len(LAST_NAMES) * len(FIRST_NAMES):
+            # More people than combinations, numbered names keep them unique.
+            last = f"{last}{len(people)}"
+        if (last, first) in seen:
+            continue
+        seen.add((last, first))
+        people.append((last, first))
+    return people
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(PURPOSE_WORDS) for _ in range(words)) + "."
+
+def generate_ad_text(managers: int = 2, purpose_lines: int = 8, tail_lines: int = 0, seed: int = 0) -> SyntheticAd:
+    """
+    Generates the text of an AD document in the layout of the register portal.
+
+    Args:
+        managers (int): Number of managers inside of the management section.
+        purpose_lines (int): Number of lines of the object of the company (section 2c).
+        tail_lines (int): Number of additional lines after the last section, like the long history of an HD/CD print.
+        seed (int): Seed of the random values.
+
+    Returns:
+        SyntheticAd: The text and the expected extraction results.
+    """
+    rng = random.Random(seed)
+    city = rng.choice(CITIES)
+    name = f"{rng.choice(LAST_NAMES)} {rng.choice(PURPOSE_WORDS)} {rng.choice(LEGAL_FORMS)}"
+    address = f"{rng.choice(STREETS)} {rng.randint(1, 200)}, {rng.randint(10000, 99999)} {city}"
+    people = _unique_people(rng, managers + 1)
+
+    lines = [
+        f"Handelsregister B des Amtsgerichts {rng.choice(COURTS)} Abteilung B",
+        f"Nummer der Firma: HRB {rng.randint(1000, 999999)}",
+        f"Abruf vom {_date(rng)} 10:00",
+        "1. Anzahl der bisherigen Eintragungen:",
+        str(rng.randint(1, 40)),
+        "2. a) Firma:",
+        name,
+        "b) Sitz, Niederlassung, inländische Geschäftsanschrift, empfangsberechtigte Person, Zweigniederlassungen:",
+        city,
+        f"Geschäftsanschrift: {address}",
+        "c) Gegenstand des Unternehmens:"
+    ]
+    lines += [_sentence(rng, rng.randint(8, 14)) for _ in range(purpose_lines)]
+    lines += [
+        "3. Grund- oder Stammkapital:",
+        f"{rng.randint(25, 500)}.000,00 EUR",
+        "4. a) Allgemeine Vertretungsregelung:",
+        "Ist nur ein Geschäftsführer bestellt, so vertritt er die Gesellschaft allein.",
+        "b) Vorstand, Leitungsorgan, geschäftsführende Direktoren, persönlich haftende Gesellschafter, Vertretungsberechtigte und besondere Vertretungsbefugnis:"
+    ]
+    expected = []
+    for last, first in people[:managers]:
+        lines.append(f"Geschäftsführer: {last}, {first}, {rng.choice(CITIES)}, *{_date(rng)}")
+        expected.append(f"{last}, {first}")
+    last, first = people[managers]
+    lines += [
+        "5. Prokura:",
+        f"Einzelprokura: {last}, {first}, {rng.choice(CITIES)}, *{_date(rng)}",
+        "6. a) Rechtsform, Beginn, Satzung oder Gesellschaftsvertrag:",
+        "Gesellschaft mit beschränkter Haftung",
+        f"Gesellschaftsvertrag vom {_date(rng)}",
+        "b) Sonstige Rechtsverhältnisse:",
+        "-",
+        "7. a) Tag der letzten Eintragung:",
+        _date(rng)
+    ]
+    for number in range(tail_lines):
+        lines.append(f"Lfd. Nr. {number + 1} vom {_date(rng)}: {_sentence(rng, rng.randint(6, 12))}")
+
+    return SyntheticAd(text="\n".join(lines) + "\n", name=name, address=address, managers=expected)
+
+def write_ad_pdf(path: Path, text: str, lines_per_page: int = 50) -> Path:
+    """
+    Writes a text into a PDF, distributed over as many landscape pages as needed.
+
+    Args:
+        path (Path): The target file.
+        text (str): The text of the document.
+        lines_per_page (int): Number of text lines per page.
+
+    Returns:
+        Path: The written file.
+    """
+    Path(path).write_bytes(ad_pdf_bytes(text, lines_per_page))
+    return path
+
+def ad_pdf_bytes(text: str, lines_per_page: int = 50, padding: int = 0) -> bytes:
+    """
+    Same as `write_ad_pdf`, but returns the content of the PDF.
+
+    Args:
+        text (str): The text of the document.
+        lines_per_page (int): Number of text lines per page.
+        padding (int): Number of random bytes that get embedded as an attachment, to get larger documents with the same text.
+
+    Returns:
+        bytes: The PDF.
+    """
+    import fitz
+
+    lines = text.splitlines()
+    with fitz.open() as doc:
+        for start in range(0, max(len(lines), 1), lines_per_page):
+            page = doc.new_page(width=842, height=595)
+            page.insert_text((36, 36), "\n".join(lines[start:start + lines_per_page]), fontname="helv", fontsize=8)
+        if padding > 0:
+            # Random bytes, so that the compression of the PDF does not shrink them again.
+            doc.embfile_add("padding.bin", random.Random(padding).randbytes(padding))
+        return doc.tobytes()
+
+def result_row_html(index: int, name: str, city: str, court: str, register: str, history: Sequence[Tuple[str, str]] = (), status: str = "currently registered") -> str:
+    """
+    Generates a row of the result table in the markup of the portal, with the links of all document types.
+
+    Args:
+        index (int): The data-ri index of the row.
+        name (str): The name of the company.
+        city (str): The seat of the company.
+        court (str): The register court, e.g. "Berlin (Charlottenburg)".
+        register (str): The register type and number, e.g. "HRB 44343".
+        history (Sequence[Tuple[str, str]]): The former names and seats.
+        status (str): The text of the status column.
+
+    Returns:
+        str: The html of the row.
+    """
+    prefix = f"ergebnissForm:selectedSuchErgebnisFormTable:{index}"
+    links = "".join(
+        f'<a id="{prefix}:j_idt161:{i}:fade" href="#" class="dokumentList" aria-describedby="{prefix}:j_idt161:{i}:toolTipFade" '
+        f'onclick="mojarra.jsfcljs(document.getElementById(\'ergebnissForm\'),{{\'{prefix}:j_idt161:{i}:fade\':\'{prefix}:j_idt161:{i}:fade\','
+        f'\'property\':\'Global.Dokumentart.{doc}\'}},\'\');return false">'
+        f'<span id="{prefix}:j_idt161:{i}:popupLink" class="underlinedText">{doc}</span></a>'
+        for i, doc in enumerate(DOCUMENT_TYPES)
+    )
+    history_rows = "".join(
+        f'<tr class="ui-widget-content" role="row"><td role="gridcell" class="ui-panelgrid-cell RegPortErg_HistorieZn marginLeft20 padding0Px" colspan="5">'
+        f'<span class="marginLeft20 fontSize85">{h + 1}.) {former_name}</span></td>'
+        f'<td role="gridcell" class="ui-panelgrid-cell RegPortErg_SitzStatus "><span class="fontSize85">{h + 1}.) {former_city}</span></td>'
+        f'<td role="gridcell" class="ui-panelgrid-cell textAlignCenter"></td></tr>'
+        for h, (former_name, former_city) in enumerate(history)
+    )
+    return (
+        f'<tr data-ri="{index}" class="ui-widget-content ui-datatable-{"even" if index % 2 == 0 else "odd"}" role="row">'
+        f'<td role="gridcell" colspan="9" class="borderBottom3"><table id="{prefix}:j_idt147" class="ui-panelgrid ui-widget" role="grid"><tbody>'
+        f'<tr class="ui-widget-content ui-panelgrid-even borderBottom1" role="row"><td role="gridcell" class="ui-panelgrid-cell fontTableNameSize" colspan="5">'
+        f'{city}  <span class="fontWeightBold"> District court {court} {register}  </span></td></tr>'
+        f'<tr class="ui-widget-content ui-panelgrid-odd" role="row"><td role="gridcell" class="ui-panelgrid-cell paddingBottom20Px" colspan="5">'
+        f'<span class="marginLeft20">{name}</span></td>'
+        f'<td role="gridcell" class="ui-panelgrid-cell sitzSuchErgebnisse"><span class="verticalText ">{city}</span></td>'
+        f'<td role="gridcell" class="ui-panelgrid-cell" style="text-align: center;padding-bottom: 20px;"><span class="verticalText">{status}</span></td>'
+        f'<td role="gridcell" class="ui-panelgrid-cell textAlignLeft paddingBottom20Px" colspan="2"><div id="{prefix}:j_idt160" class="ui-outputpanel ui-widget linksPanel">'
+        f'<script type="text/javascript" src="/rp_web/javax.faces.resource/jsf.js.xhtml?ln=javax.faces"></script>{links}</div></td></tr>'
+        f'<tr class="ui-widget-content ui-panelgrid-even" role="row"><td role="gridcell" class="ui-panelgrid-cell" colspan="7">'
+        f'<table id="{prefix}:j_idt172" class="ui-panelgrid ui-widget marginLeft20" role="grid"><tbody>'
+        f'<tr class="ui-widget-content ui-panelgrid-even borderBottom1 RegPortErg_Klein" role="row"><td role="gridcell" class="ui-panelgrid-cell padding0Px">History</td></tr>'
+        f'</tbody></table><table id="{prefix}:j_idt176" class="ui-panelgrid ui-widget" role="grid"><tbody>{history_rows}</tbody></table></td></tr>'
+        f'</tbody></table></td></tr>'
+    )
+
+def _result_row(rng: random.Random, index: int, history: int) -> str:
+    # Same order of the random values as before, so that the generated pages stay the same.
+    court = rng.choice(COURTS)
+    city = rng.choice(CITIES)
+    name = f"{rng.choice(LAST_NAMES)} {rng.choice(PURPOSE_WORDS)} {rng.choice(LEGAL_FORMS)}"
+    former = [(f"{rng.choice(LAST_NAMES)} {rng.choice(LEGAL_FORMS)}", rng.choice(CITIES)) for _ in range(history)]
+    return result_row_html(index, name, city, court, f"HRB {rng.randint(1000, 999999)}", former)
+
+def generate_result_html(rows: int = 10, history: int = 1, seed: int = 0, page_padding: Optional[int] = 200) -> str:
+    """
+    Generates the html of a result page of the advanced search.
+
+    Args:
+        rows (int): Number of companies in the result table.
+        history (int): Number of history entries per company.
+        seed (int): Seed of the random values.
+        page_padding (Optional[int]): Number of unrelated elements around the table, like the navigation and scripts of the real page.
+
+    Returns:
+        str: The html of the page.
+    """
+    rng = random.Random(seed)
+    padding = "".join(
+        f'<div class="ui-menuitem"><a href="#" id="naviForm:link{i}" onclick="return false"><span>Menüpunkt {i}</span></a></div>'
+        for i in range(page_padding or 0)
+    )
+    body = "".join(_result_row(rng, index, history) for index in range(rows))
+    return (
+        '<!DOCTYPE html><html><head><title>Registerportal</title>'
+        '<script type="text/javascript">if (window.PrimeFaces) { PrimeFaces.settings.locale = "de"; }</script></head><body>'
+        f'<form id="naviForm">{padding}</form>'
+        '<form id="ergebnissForm" method="post" action="/rp_web/ergebnisse.xhtml">'
+        '<div class="ui-datatable"><table role="grid"><thead><tr><th>Ergebnisse</th></tr></thead>'
+        f'<tbody id="ergebnissForm:selectedSuchErgebnisFormTable_data" class="ui-datatable-data ui-widget-content">{body}</tbody></table></div>'
+        '<input type="hidden" name="javax.faces.ViewState" value="vs-results" /></form></body></html>'
+    )
+
+def generate_company_names(count: int = 100, seed: int = 0) -> List[Tuple[str, str]]:
+    """
+    Generates pairs of company names and cities with umlauts, commas, ampersands and long names for the folder name helpers.
+
+    Args:
+        count (int): Number of pairs.
+        seed (int): Seed of the random values.
+
+    Returns:
+        List[Tuple[str, str]]: The company names and cities.
+    """
+    rng = random.Random(seed)
+    return [
+        (f"{rng.choice(LAST_NAMES)} & {rng.choice(LAST_NAMES)}, {rng.choice(PURPOSE_WORDS)} - {rng.choice(PURPOSE_WORDS)} {rng.choice(LEGAL_FORMS)}", rng.choice(CITIES))
+        for _ in range(count)
+    ]
@@ -0,0 +1,278 @@
+# Batch mode for the pysil lookups.
+# Reads a CSV or JSONL file of queries, skips equivalent duplicates and looks up the remaining companies with reused browsers.
+# The lookups run through the pipeline of pipeline.py, so the extraction of a document overlaps with the next portal request.
+# Every result is written as a single json line to stdout as soon as its lookup is done, while progress, skipped duplicates
+# and failures are reported as json lines on stderr.
+#
+# Example: python batch.py companies.csv > results.jsonl
+# The columns/keys are named like the long options of pysil: schlagwoerter, schlagwortOptionen, sucheAehnliche,
+# sucheGeloeschte, city, street, postCode. An optional "id" column is passed through to the result.
+
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from lookupcache import is_empty_result, normalize_query, query_key
+
+# Accepted names of the query fields, the short names of the pysil CLI are allowed as well.
+FIELD_ALIASES = {
+    "schlagwoerter": "schlagwoerter", "s": "schlagwoerter",
+    "schlagwortoptionen": "schlagwortOptionen", "so": "schlagwortOptionen",
+    "sucheaehnliche": "sucheAehnliche", "sa": "sucheAehnliche",
+    "suchegeloeschte": "sucheGeloeschte", "sg": "sucheGeloeschte",
+    "city": "city", "ci": "city",
+    "street": "street", "st": "street",
+    "postcode": "postCode", "po": "postCode",
+    "id": "id"
+}
+
+TRUE_VALUES = {"1", "true", "yes", "ja", "y", "j", "x"}
+
+@dataclass
+class BatchQuery:
+    """A unique query of the batch together with all input lines that asked for it."""
+    query: Dict[str, Any]
+    lines: List[int]
+    ids: List[Any] = field(default_factory=list)
+
+    def lookup_args(self) -> Tuple:
+        # Positional arguments in the order that the pysil functions expect.
+        q = self.query
+        return (
+            q["schlagwoerter"],
+            q.get("schlagwortOptionen") or "all",
+            q.get("sucheAehnliche", False),
+            q.get("sucheGeloeschte", False),
+            q.get("city"),
+            q.get("street"),
+            q.get("postCode")
+        )
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    duplicates: int = 0
+    done: int = 0
+    found: int = 0
+    not_found: int = 0
+    failed: int = 0
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+def _clean_query(raw: Dict[str, Any]) -> Dict[str, Any]:
+    # Maps the field names to the pysil names and converts the values to the expected types.
+    if not isinstance(raw, dict):
+        raise ValueError("Die Zeile ist kein JSON-Objekt.")
+    query: Dict[str, Any] = {}
+    for key, value in raw.items():
+        name = FIELD_ALIASES.get(str(key).strip().lower())
+        if name is None:
+            continue
+        if name in ("sucheAehnliche", "sucheGeloeschte"):
+            query[name] = _to_bool(value)
+        elif name == "id":
+            query[name] = value
+        elif value is not None and str(value).strip():
+            query[name] = str(value).strip()
+    if not query.get("schlagwoerter"):
+        raise ValueError("Der Suchbegriff (schlagwoerter) fehlt.")
+    if query.get("schlagwortOptionen", "all") not in ("all", "min", "exact"):
+        raise ValueError(f"Unbekannte Suchoption '{query['schlagwortOptionen']}'.")
+    return query
+
+def read_raw_queries(stream: TextIO, fmt: str, report: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Reads the raw query objects from a CSV or JSONL stream.
+
+    Args:
+        stream (TextIO): The opened input.
+        fmt (str): Either "csv" or "jsonl".
+        report (Optional[Callable[[Dict[str, Any]], None]]): Receives an "invalid" event for every line that is not valid
+            json, the line is skipped then. The json error is raised if None.
+
+    Yields:
+        Tuple[int, Dict[str, Any]]: The line number and the raw fields of every query.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                if report is None:
+                    raise
+                report({"event": "invalid", "line": line_no, "error": f"Ungültiges JSON: {e}"})
+                continue
+            yield line_no, raw
+
+def collect_queries(raw_queries: Iterable[Tuple[int, Dict[str, Any]]], report: Callable[[Dict[str, Any]], None]) -> List[BatchQuery]:
+    """
+    Validates the queries and merges equivalent ones (same normalized query as used by the lookup cache).
+
+    Args:
+        raw_queries (Iterable[Tuple[int, Dict[str, Any]]]): The line numbers and raw fields of the queries.
+        report (Callable[[Dict[str, Any]], None]): Receives the events for skipped duplicates and invalid lines.
+
+    Returns:
+        List[BatchQuery]: The unique queries in the order of their first occurrence.
+    """
+    unique: Dict[str, BatchQuery] = {}
+    for line_no, raw in raw_queries:
+        try:
+            query = _clean_query(raw)
+        except (ValueError, AttributeError) as e:
+            report({"event": "invalid", "line": line_no, "error": str(e)})
+            continue
+        batch_query = BatchQuery(query=query, lines=[line_no])
+        key = query_key(normalize_query(*batch_query.lookup_args()))
+        if key in unique:
+            first = unique[key]
+            first.lines.append(line_no)
+            if "id" in query:
+                first.ids.append(query["id"])
+            report({"event": "duplicate", "line": line_no, "first_line": first.lines[0]})
+            continue
+        if "id" in query:
+            batch_query.ids.append(query["id"])
+        unique[key] = batch_query
+    return list(unique.values())
+
+def record_result(
+    summary: BatchSummary,
+    batch_query: BatchQuery,
+    emit: Callable[[Dict[str, Any]], None],
+    report: Callable[[Dict[str, Any]], None],
+    result: Optional[dict] = None,
+    error: Optional[BaseException] = None
+) -> None:
+    """
+    Emits the result object of a finished query and reports the progress.
+
+    Args:
+        summary (BatchSummary): The counters, get updated.
+        batch_query (BatchQuery): The finished query.
+        emit (Callable[[Dict[str, Any]], None]): Receives the result object.
+        report (Callable[[Dict[str, Any]], None]): Receives the progress and failure events.
+        result (Optional[dict]): The lookup result, None if nothing was found.
+        error (Optional[BaseException]): The reason why the lookup failed.
+    """
+    output: Dict[str, Any] = {"lines": batch_query.lines, "query": {k: v for k, v in batch_query.query.items() if k != "id"}}
+    if batch_query.ids:
+        output["ids"] = batch_query.ids
+    if error is not None:
+        summary.failed += 1
+        output["status"] = "error"
+        output["error"] = f"{type(error).__name__}: {error}"
+        report({"event": "failure", "lines": batch_query.lines, "error": output["error"]})
+    elif result is None:
+        summary.not_found += 1
+        output["status"] = "not_found"
+    else:
+        summary.found += 1
+        output["status"] = "found"
+        output["result"] = result
+    summary.done += 1
+    emit(output)
+    report({"event": "progress", "done": summary.done, "total": summary.total, "failed": summary.failed})
+
+def _json_line_writer(stream: TextIO) -> Callable[[Dict[str, Any]], None]:
+    def write(obj: Dict[str, Any]) -> None:
+        stream.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        stream.flush()
+    return write
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Selenium - Python | HandelsregisterCLI Batch",
+        description="Sucht viele Firmen aus einer CSV- oder JSONL-Datei nacheinander mit einem wiederverwendeten Browser.",
+        epilog="Achtung! Maximal 60 Anfragen pro Stunde stellen!"
+    )
+    parser.add_argument("input", help="CSV or JSONL file with one query per row/line, '-' reads from stdin")
+    parser.add_argument("--format", help="Format of the input, detected from the file suffix by default", choices=["csv", "jsonl"])
+    parser.add_argument("-o", "--output", help="Write the results to this file instead of stdout")
+    parser.add_argument("-f", "--force", help="Force a fresh pull and skip the cache", action="store_true")
+    parser.add_argument("--browsers", help="Number of browsers that search and download at the same time", type=int, default=1)
+    parser.add_argument("--extract-workers", help="Number of processes that extract the documents", type=int, default=2)
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_cli_arguments()
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    report = _json_line_writer(sys.stderr)
+
+    if args.input == "-":
+        queries = collect_queries(read_raw_queries(sys.stdin, fmt, report), report)
+    else:
+        with open(args.input, newline="", encoding="utf-8-sig") as f:
+            queries = collect_queries(read_raw_queries(f, fmt, report), report)
+    duplicates = sum(len(q.lines) - 1 for q in queries)
+
+    # Imported here, so that invalid input files are reported without loading selenium first.
+    from driverpool import DriverPool
+    from index import CompanyIndex
+    from lookupcache import LookupCache
+    from pipeline import Fetched, run_batch_pipeline
+    from pysil import lookup_in_index, search_and_store
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    cache = LookupCache()
+    index = CompanyIndex()
+    try:
+        # The browser sessions are reused for all rows of the batch.
+        with DriverPool(size=args.browsers) as pool:
+            def fetch(batch_query: BatchQuery) -> Fetched:
+                # A cache hit or a recent extraction in the index neither needs the portal nor an extraction.
+                query_args = batch_query.lookup_args()
+                if not args.force:
+                    entry = cache.get(normalize_query(*query_args))
+                    if entry is not None:
+                        return Fetched(result=entry.result)
+                    s, _, _, _, ci, st, po = query_args
+                    indexed = lookup_in_index(index, s, st, po, ci)
+                    if indexed is not None:
+                        return Fetched(result=indexed.result)
+                stored = search_and_store(*query_args, pool=pool, index=index)
+                if stored is None:
+                    return Fetched()
+                return Fetched(pdf_path=stored.path, register_id=stored.register_id)
+
+            def on_result(batch_query: BatchQuery, fetched: Fetched, result: dict) -> None:
+                if is_empty_result(result):
+                    return
+                cache.put(normalize_query(*batch_query.lookup_args()), result, str(fetched.pdf_path))
+                # The row the document was downloaded from identifies the company, even if its name is not unique.
+                index.add_extraction(result, str(fetched.pdf_path), register_id=fetched.register_id)
+
+            summary = run_batch_pipeline(
+                queries, fetch, _json_line_writer(out), report,
+                on_result=on_result,
+                duplicates=duplicates,
+                fetch_workers=args.browsers,
+                extract_workers=args.extract_workers
+            )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    report({"event": "summary", **summary.__dict__})
+    return 1 if summary.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# Bulk extraction of already downloaded documents.
+# Re-extracts whole archives (e.g. the download/<company-folder>/ tree that pysil fills) after the extraction rules changed.
+# The files are sent in chunks to a pool of worker processes, so the throughput scales with the cores of the machine,
+# and every file that can not be read is reported on its own without stopping the others.
+#
+# Example: python bulk.py download/ --workers 8 > extractions.jsonl
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pyutil import CompanyPdfData, extract_company_data_from_pages, iter_page_texts
+
+DEFAULT_CHUNK_SIZE = 16
+
+class ExtractionError(Exception):
+    """The extraction of a single file failed. Can be pickled, so it gets passed back from the worker processes."""
+
+    def __init__(self, path: str, message: str):
+        super().__init__(path, message)
+        self.path = path
+        self.message = message
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.message}"
+
+BulkResult = Tuple[str, Union[CompanyPdfData, ExtractionError]]
+
+def extract_file(path: str, early_exit: bool = True) -> BulkResult:
+    """
+    Extracts the company data of a single document and turns every failure into an `ExtractionError`.
+
+    Args:
+        path (str): The path of the PDF file.
+        early_exit (bool): Stop reading pages as soon as all fields have been found.
+
+    Returns:
+        BulkResult: The path together with its data or its error.
+    """
+    pages = iter_page_texts(path, strict=True)
+    try:
+        return path, extract_company_data_from_pages(pages, early_exit)
+    except Exception as e:
+        return path, ExtractionError(path, f"{type(e).__name__}: {e}")
+    finally:
+        pages.close()
+
+def _extract_chunk(paths: List[str], early_exit: bool) -> List[BulkResult]:
+    # Runs inside of a worker process, one task per chunk keeps the inter-process overhead low.
+    return [extract_file(path, early_exit) for path in paths]
+
+def _chunks(paths: List[str], chunk_size: int) -> Iterator[List[str]]:
+    for start in range(0, len(paths), chunk_size):
+        yield paths[start:start + chunk_size]
+
+def extract_many(
+    paths: Iterable[Union[str, Path]],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    early_exit: bool = True
+) -> Iterator[BulkResult]:
+    """
+    Extracts the company data of many documents in parallel and yields every result as soon as its chunk is done.
+
+    If a worker process dies (e.g. because of a crash inside of the PDF library), the files of all unfinished chunks are
+    retried one by one in a new pool, a file that still breaks its worker is reported as failed.
+
+    Args:
+        paths (Iterable[Union[str, Path]]): The PDF files.
+        workers (Optional[int]): Number of worker processes, defaults to the number of cores. 1 extracts inside of this process.
+        chunk_size (int): Number of files that a worker extracts per task.
+        early_exit (bool): Stop reading the pages of a document as soon as all fields have been found.
+
+    Yields:
+        BulkResult: The path of every file together with its `CompanyPdfData` or its `ExtractionError`, in completion order.
+    """
+    files = [str(path) for path in paths]
+    if chunk_size < 1:
+        raise ValueError("The chunk size needs to be at least 1.")
+    if workers == 1:
+        for path in files:
+            yield extract_file(path, early_exit)
+        return
+
+    pending: Deque[List[str]] = deque(_chunks(files, chunk_size))
+    while pending:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = {pool.submit(_extract_chunk, chunk, early_exit): chunk for chunk in pending}
+            pending = deque()
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    if len(chunk) == 1:
+                        yield chunk[0], ExtractionError(chunk[0], "Der Worker-Prozess ist bei dieser Datei abgestürzt.")
+                    else:
+                        pending.extend([path] for path in chunk)
+                    continue
+                yield from results
+        finally:
+            # Also cancels the queued chunks if the caller stops iterating early.
+            pool.shutdown(wait=True, cancel_futures=True)
+
+def collect_pdf_paths(inputs: Iterable[str]) -> List[Path]:
+    """
+    Collects the PDF files of the given files and directories (recursively), sorted per directory.
+
+    Args:
+        inputs (Iterable[str]): Paths of PDF files or of directories that contain them.
+
+    Returns:
+        List[Path]: The PDF files.
+    """
+    paths: List[Path] = []
+    for value in inputs:
+        path = Path(value)
+        if path.is_dir():
+            paths.extend(sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf"))
+        else:
+            paths.append(path)
+    return paths
+
+def result_to_json(path: str, result: Union[CompanyPdfData, ExtractionError]) -> dict:
+    if isinstance(result, ExtractionError):
+        return {"path": path, "error": result.message}
+    return {"path": path, **asdict(result)}
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Handelsregister bulk extraction",
+        description="Extrahiert die Firmendaten vieler bereits heruntergeladener Dokumente parallel."
+    )
+    parser.add_argument("inputs", nargs="+", help="PDF files or directories (searched recursively), e.g. download/")
+    parser.add_argument("-w", "--workers", help="Number of worker processes, defaults to the number of cores", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", help="Number of files per task of a worker", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--all-pages", help="Read every page instead of stopping once all fields were found", action="store_true")
+    parser.add_argument("-o", "--output", help="Write the results to this file instead of stdout")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_cli_arguments()
+    paths = collect_pdf_paths(args.inputs)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    done = failed = 0
+    try:
+        for path, result in extract_many(paths, workers=args.workers, chunk_size=args.chunk_size, early_exit=not args.all_pages):
+            done += 1
+            if isinstance(result, ExtractionError):
+                failed += 1
+            out.write(json.dumps(result_to_json(path, result), ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    sys.stderr.write(json.dumps({"event": "summary", "total": len(paths), "done": done, "failed": failed}) + "\n")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# Pinned resolution of the chromedriver binary.
+# `ChromeDriverManager().install()` asks the network for the matching driver version on every start, which can stall for
+# seconds or fail behind a restrictive egress. The driver gets resolved once instead (via webdriver-manager, or a system
+# chromedriver as fallback) and its path and version are recorded in a small manifest; later runs start it straight from
+# there without any network access. The manifest is renewed on request, or once when Chrome got updated and no longer
+# accepts the pinned driver (see `start_with_pinned_driver`):
+#
+#   python chromedriver.py refresh           # resolve again via webdriver-manager (falls back to the system driver)
+#   python chromedriver.py refresh --system  # pin the configured system driver, e.g. in containers without egress
+#   python chromedriver.py show
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+VERSION_PATTERN = re.compile(r"ChromeDriver\s+([\d.]+)")
+# Part of the message of the SessionNotCreatedException, e.g. "This version of ChromeDriver only supports Chrome version 114
+# Current browser version is 120.0.6099.109".
+VERSION_MISMATCH_PATTERN = re.compile(r"only supports chrome version|current browser version is", re.IGNORECASE)
+
+T = TypeVar("T")
+
+class ChromeDriverNotFoundError(Exception):
+    """Raised if neither webdriver-manager nor the system provide a chromedriver."""
+
+def default_manifest_path() -> Path:
+    """
+    Location of the manifest. Can be overwritten with the HR_CHROMEDRIVER_MANIFEST environment variable.
+
+    Returns:
+        Path: The path of the json file.
+    """
+    configured = os.environ.get("HR_CHROMEDRIVER_MANIFEST")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".cache" / "handelsregister" / "chromedriver.json"
+
+@dataclass
+class ResolvedDriver:
+    path: str
+    version: Optional[str] # As reported by `chromedriver --version`, None if it could not be read.
+    source: str # "webdriver-manager" or "system".
+    resolved_at: float
+
+def is_executable(path: Optional[str]) -> bool:
+    """
+    Args:
+        path (Optional[str]): Path of a file.
+
+    Returns:
+        bool: True if the file exists and may be executed.
+    """
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+def chromedriver_version(path: str) -> Optional[str]:
+    """
+    Args:
+        path (str): The chromedriver binary.
+
+    Returns:
+        Optional[str]: Its version, e.g. "120.0.6099.109", or None if it could not be read.
+    """
+    try:
+        completed = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_PATTERN.search(completed.stdout)
+    return match.group(1) if match else None
+
+def system_chromedriver(which: Callable[[str], Optional[str]] = shutil.which) -> Optional[str]:
+    """
+    The configured system driver: the HR_CHROMEDRIVER environment variable or else the chromedriver on the PATH.
+
+    Args:
+        which (Callable[[str], Optional[str]]): Lookup of a command on the PATH.
+
+    Returns:
+        Optional[str]: The path of the driver or None if there is none.
+    """
+    configured = os.environ.get("HR_CHROMEDRIVER")
+    if configured:
+        return configured if is_executable(configured) else None
+    return which("chromedriver")
+
+def _webdriver_manager_install() -> str:
+    # Imported here, webdriver-manager is only needed when the manifest gets (re)created.
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+def read_manifest(manifest_path: Optional[Path] = None) -> Optional[ResolvedDriver]:
+    """
+    Args:
+        manifest_path (Optional[Path]): The manifest. Defaults to `default_manifest_path()`.
+
+    Returns:
+        Optional[ResolvedDriver]: The recorded driver or None if there is no readable manifest.
+    """
+    try:
+        with open(manifest_path or default_manifest_path(), encoding="utf-8") as f:
+            return ResolvedDriver(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+def write_manifest(driver: ResolvedDriver, manifest_path: Optional[Path] = None) -> None:
+    """
+    Records the driver. The file is replaced atomically, so concurrent starts never read half of it.
+
+    Args:
+        driver (ResolvedDriver): The resolved driver.
+        manifest_path (Optional[Path]): The manifest. Defaults to `default_manifest_path()`.
+    """
+    path = Path(manifest_path or default_manifest_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(asdict(driver), f, indent=2)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+def refresh_chromedriver(
+    manifest_path: Optional[Path] = None,
+    prefer_system: bool = False,
+    install: Callable[[], str] = _webdriver_manager_install,
+    which: Callable[[str], Optional[str]] = shutil.which,
+    clock: Callable[[], float] = time.time
+) -> ResolvedDriver:
+    """
+    Resolves the driver again and records it in the manifest.
+
+    Args:
+        manifest_path (Optional[Path]): The manifest. Defaults to `default_manifest_path()`.
+        prefer_system (bool): Use the system driver without asking webdriver-manager (and with it the network) first.
+        install (Callable[[], str]): Downloads (or finds the cached) driver and returns its path.
+        which (Callable[[str], Optional[str]]): Lookup of a command on the PATH.
+        clock (Callable[[], float]): Source of the current unix time.
+
+    Returns:
+        ResolvedDriver: The recorded driver.
+
+    Raises:
+        ChromeDriverNotFoundError: If there is no driver at all.
+    """
+    path, source, failure = None, "system", None
+    if not prefer_system:
+        try:
+            path, source = install(), "webdriver-manager"
+        except Exception as e:
+            # Offline or the download failed, the system driver is the fallback.
+            failure = e
+    if not is_executable(path):
+        path, source = system_chromedriver(which), "system"
+    if not is_executable(path):
+        reason = "wurde übersprungen" if prefer_system else f"ist fehlgeschlagen ({failure})" if failure else "lieferte keine ausführbare Datei"
+        raise ChromeDriverNotFoundError(f"Kein chromedriver gefunden: webdriver-manager {reason}, HR_CHROMEDRIVER und der PATH enthalten keinen.")
+    driver = ResolvedDriver(path=str(path), version=chromedriver_version(str(path)), source=source, resolved_at=clock())
+    write_manifest(driver, manifest_path)
+    return driver
+
+def resolve_chromedriver(
+    manifest_path: Optional[Path] = None,
+    install: Callable[[], str] = _webdriver_manager_install,
+    which: Callable[[str], Optional[str]] = shutil.which,
+    clock: Callable[[], float] = time.time
+) -> ResolvedDriver:
+    """
+    The driver of the manifest, without any network access. The driver only gets resolved (see `refresh_chromedriver`) if
+    there is no manifest yet or its binary is gone (e.g. the cache of webdriver-manager was cleared).
+
+    Args:
+        manifest_path (Optional[Path]): The manifest. Defaults to `default_manifest_path()`.
+        install (Callable[[], str]): Downloads (or finds the cached) driver and returns its path.
+        which (Callable[[str], Optional[str]]): Lookup of a command on the PATH.
+        clock (Callable[[], float]): Source of the current unix time.
+
+    Returns:
+        ResolvedDriver: The driver to start.
+
+    Raises:
+        ChromeDriverNotFoundError: If there is no driver at all.
+    """
+    driver = read_manifest(manifest_path)
+    if driver is not None and is_executable(driver.path):
+        return driver
+    return refresh_chromedriver(manifest_path, install=install, which=which, clock=clock)
+
+def is_version_mismatch(error: BaseException) -> bool:
+    """
+    Args:
+        error (BaseException): The error of a failed browser start.
+
+    Returns:
+        bool: True if Chrome refused the session because it does not match the version of the driver.
+    """
+    # Imported here, selenium is only needed once a browser gets started.
+    from selenium.common.exceptions import SessionNotCreatedException
+    return isinstance(error, SessionNotCreatedException) and bool(VERSION_MISMATCH_PATTERN.search(str(error)))
+
+def start_with_pinned_driver(
+    start: Callable[[str], T],
+    driver: Optional[ResolvedDriver] = None,
+    manifest_path: Optional[Path] = None,
+    install: Callable[[], str] = _webdriver_manager_install,
+    which: Callable[[str], Optional[str]] = shutil.which,
+    clock: Callable[[], float] = time.time
+) -> T:
+    """
+    Starts a browser with the pinned driver. If Chrome has been updated in the meantime and refuses the driver, the driver
+    gets resolved again (see `refresh_chromedriver`), the manifest is updated and the start is retried once.
+
+    Args:
+        start (Callable[[str], T]): Starts the browser with the driver at the given path.
+        driver (Optional[ResolvedDriver]): The already resolved driver. Defaults to `resolve_chromedriver()`.
+        manifest_path (Optional[Path]): The manifest. Defaults to `default_manifest_path()`.
+        install (Callable[[], str]): Downloads (or finds the cached) driver and returns its path.
+        which (Callable[[str], Optional[str]]): Lookup of a command on the PATH.
+        clock (Callable[[], float]): Source of the current unix time.
+
+    Returns:
+        T: The result of `start`.
+
+    Raises:
+        ChromeDriverNotFoundError: If there is no driver at all.
+    """
+    if driver is None:
+        driver = resolve_chromedriver(manifest_path, install=install, which=which, clock=clock)
+    try:
+        return start(driver.path)
+    except Exception as e:
+        if not is_version_mismatch(e):
+            raise
+        print(f"Der chromedriver {driver.version or driver.path} passt nicht zu Chrome, er wird neu ermittelt: {e}", file=sys.stderr)
+    driver = refresh_chromedriver(manifest_path, install=install, which=which, clock=clock)
+    return start(driver.path)
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Handelsregister chromedriver",
+        description="Zeigt oder erneuert den festgehaltenen chromedriver, damit der Start ohne Netzwerkzugriff auskommt."
+    )
+    commands = parser.add_subparsers(dest="command")
+    refresh = commands.add_parser("refresh", help="Resolve the driver again and record it")
+    refresh.add_argument("--system", help="Pin the system driver (HR_CHROMEDRIVER or the PATH) without asking webdriver-manager", action="store_true")
+    commands.add_parser("show", help="Show the recorded driver (resolves it if there is none yet)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_cli_arguments()
+    try:
+        if args.command == "refresh":
+            driver = refresh_chromedriver(prefer_system=args.system)
+        else:
+            driver = resolve_chromedriver()
+    except ChromeDriverNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps({**asdict(driver), "manifest": str(default_manifest_path())}))
+    sys.exit(0)
@@ -0,0 +1,453 @@
+# Pool of warm, reusable Chrome WebDriver instances for the pysil lookups.
+# Launching a new headless Chrome (and resolving its driver) for every single query takes longer than the search itself,
+# so long-running callers can keep N initialized browsers alive and check them out per job instead.
+# The browsers use a lean profile: the portal's images, fonts and stylesheets are blocked via DevTools, pages count as
+# loaded once their DOM is ready and extensions, GPU and background networking are disabled. HR_CHROME_PROFILE=full
+# switches back to a regular profile, e.g. to look at the pages in a visible browser.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+from chromedriver import resolve_chromedriver, start_with_pinned_driver
+from timing import span
+
+# Selenium is only imported once a browser actually gets started.
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+# Requests of the lean profile that never reach the network. The lookups only read the DOM and the downloads, so the
+# portal's images, fonts and stylesheets are not needed. Documents are downloads and not affected.
+# The trailing wildcard also matches the JSF resource URLs of rp_web (e.g. "javax.faces.resource/theme.css.xhtml?ln=...").
+BLOCKED_URL_PATTERNS = [
+    "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.svg*", "*.ico*", "*.webp*",
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    "*.css*"
+]
+
+LEAN_CHROME_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--mute-audio",
+    "--disable-dev-shm-usage", # /dev/shm is tiny in most containers, Chrome crashes once it is full.
+    "--blink-settings=imagesEnabled=false"
+]
+
+def lean_profile_enabled() -> bool:
+    """
+    Returns:
+        bool: False if the HR_CHROME_PROFILE environment variable asks for the "full" profile.
+    """
+    return os.environ.get("HR_CHROME_PROFILE", "lean").lower() != "full"
+
+def build_chrome_options(dl_path: Path, lean: Optional[bool] = None) -> "webdriver.ChromeOptions":
+    """
+    Creates the ChromeOptions that are used for every headless browser of the lookup flow.
+
+    Args:
+        dl_path (Path): The directory where the browser should save downloaded documents to.
+        lean (Optional[bool]): Use the lean profile (eager page loads, no images, extensions or background networking).
+            Defaults to `lean_profile_enabled()`.
+
+    Returns:
+        webdriver.ChromeOptions: The configured options object.
+    """
+    from selenium import webdriver
+
+    if lean is None:
+        lean = lean_profile_enabled()
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument('--headless')  # Run the browser without opening a visible window.
+    chrome_options.add_argument('--disable-gpu') # Sometimes needed.
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--log-level=3') # Surpresses low level warnings.
+    prefs = {}
+    if lean:
+        for argument in LEAN_CHROME_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        # `get` returns once the DOM is ready, the lookups wait for the elements they need anyway.
+        chrome_options.page_load_strategy = "eager"
+        prefs["profile.managed_default_content_settings.images"] = 2
+    # Chrome options setup to ensure that we can download and that we know where the file will get downloaded to.
+    chrome_options.add_experimental_option('prefs', {
+        **prefs,
+        'download.default_directory': str(dl_path),
+        'download.prompt_for_download': False,
+        'download.directory_upgrade': True,
+        'safebrowsing.enabled': True,
+        "profile.default_content_settings.popups": 0,
+        "profile.content_settings.exceptions.automatic_downloads.*.setting": 1,
+        "profile.default_content_setting_values.automatic_downloads": 1,
+        "profile.default_content_settings.mimetype_overrides": {
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        }
+    })
+    return chrome_options
+
+def block_resources(driver: Any, patterns: List[str] = BLOCKED_URL_PATTERNS) -> None:
+    """
+    Lets the browser fail all requests whose URL matches one of the patterns, without sending them.
+    The blocking is part of the DevTools session, so it survives navigations and the state resets of the pool.
+
+    Args:
+        driver (Any): The running WebDriver instance.
+        patterns (List[str]): URL patterns with "*" as wildcard.
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+def create_chrome_driver(dl_path: Path, lean: Optional[bool] = None) -> "webdriver.Chrome":
+    """
+    Launches a new headless Chrome instance that downloads into the given directory.
+
+    Args:
+        dl_path (Path): The directory where the browser should save downloaded documents to.
+        lean (Optional[bool]): Use the lean profile. Defaults to `lean_profile_enabled()`.
+
+    Returns:
+        webdriver.Chrome: The started WebDriver instance.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+
+    # The driver recorded in the manifest, no network access unless it has to be resolved for the first time.
+    with span("chromedriver_resolve"):
+        resolved = resolve_chromedriver()
+    if lean is None:
+        lean = lean_profile_enabled()
+    options = build_chrome_options(dl_path, lean)
+    with span("chrome_start"):
+        # Re-resolves the driver once if Chrome has been updated and no longer accepts the pinned one.
+        driver = start_with_pinned_driver(lambda path: webdriver.Chrome(service=ChromeService(path), options=options), resolved)
+    if lean:
+        block_resources(driver)
+    return driver
+
+def _child_pids(proc: Path) -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # The command name in the second field may contain spaces and parentheses, the ppid follows the last ")".
+            ppid = int((entry / "stat").read_text().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue # The process ended in the meantime.
+        children.setdefault(ppid, []).append(int(entry.name))
+    return children
+
+def _process_memory(proc: Path, pid: int) -> int:
+    # The proportional set size splits the pages that the Chrome processes share among them, so the sum over the tree is
+    # what the browser really costs. Kernels without smaps_rollup fall back to the (overestimating) resident set size.
+    for name, key in (("smaps_rollup", "Pss:"), ("status", "VmRSS:")):
+        try:
+            for line in (proc / str(pid) / name).read_text().splitlines():
+                if line.startswith(key):
+                    return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            continue
+    return 0
+
+def _process_tree(root: int, children: Dict[int, List[int]]) -> Iterator[int]:
+    pending = [root]
+    while pending:
+        pid = pending.pop()
+        yield pid
+        pending.extend(children.get(pid, []))
+
+def process_tree_memory(pid: int, proc: Path = Path("/proc")) -> Optional[int]:
+    """
+    Memory use of a process and all of its descendants, read from procfs.
+
+    Args:
+        pid (int): The root of the process tree.
+        proc (Path): The procfs mount.
+
+    Returns:
+        Optional[int]: The bytes, None if there is no procfs (e.g. on macOS or Windows) or the process is gone.
+    """
+    if not (proc / str(pid)).is_dir():
+        return None
+    return sum(_process_memory(proc, p) for p in _process_tree(pid, _child_pids(proc)))
+
+def driver_memory(driver: Any) -> Optional[int]:
+    """
+    Memory use of a browser: its chromedriver and the Chrome processes (browser, renderers, utilities) started by it.
+
+    Args:
+        driver (Any): The running WebDriver instance.
+
+    Returns:
+        Optional[int]: The bytes, None if they can not be determined.
+    """
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    return process_tree_memory(pid)
+
+def set_download_dir(driver: Any, dl_path: Path) -> None:
+    """
+    Redirects the downloads of an already running browser to another directory.
+    The download directory from the ChromeOptions is fixed at startup, so a reused browser needs to get it changed via DevTools.
+
+    Args:
+        driver (Any): The running WebDriver instance.
+        dl_path (Path): The directory where the browser should save downloaded documents to from now on.
+    """
+    driver.execute_cdp_cmd("Browser.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": str(dl_path)
+    })
+
+def reset_driver_state(driver: Any) -> None:
+    """
+    Removes everything a previous job could have left behind inside of the browser (cookies, web storage and the open page).
+
+    Args:
+        driver (Any): The running WebDriver instance.
+    """
+    # delete_all_cookies only removes the cookies of the current page's domain, the CDP command those of every domain.
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    try:
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    except Exception:
+        pass # Pages like about:blank do not allow access to the web storage.
+    driver.get("about:blank")
+
+class DriverPool:
+    """
+    Thread-safe pool that keeps up to `size` initialized browsers alive between lookups.
+    Browsers get created lazily (or upfront via `warm()`), checked out for a single job and returned afterwards.
+    Every checkout points the downloads to the directory of the job and every checkin wipes the browser state.
+    Browsers that fail to reset are considered broken, get quit and are replaced by a fresh one on demand.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        factory: Optional[Callable[[Path], Any]] = None,
+        download_dir: Optional[Path] = None,
+        memory: Callable[[Any], Optional[int]] = driver_memory
+    ):
+        """
+        Args:
+            size (int): The maximum number of browsers that are kept alive at the same time.
+            factory (Optional[Callable[[Path], Any]]): Callable that starts a new browser for a download directory. Defaults to `create_chrome_driver`.
+            download_dir (Optional[Path]): The initial download directory for new browsers. Defaults to the "download" folder in the CWD.
+            memory (Callable[[Any], Optional[int]]): Memory use of a browser in bytes, for the stats.
+        """
+        if size < 1:
+            raise ValueError("The pool needs to hold at least one browser.")
+        self.size = size
+        self._factory = factory or create_chrome_driver
+        self._memory = memory
+        self._download_dir = download_dir or Path.joinpath(Path.cwd(), "download")
+        self._condition = threading.Condition()
+        self._idle: List[Any] = []
+        self._drivers: Dict[int, Any] = {} # id(driver) -> driver, every running browser
+        self._in_use: Dict[int, float] = {} # id(driver) -> checkout timestamp
+        self._closed = False
+        self._started = time.monotonic()
+        # Counters for the utilization stats.
+        self._alive = 0 # Browsers that are running or currently getting started.
+        self._discarded = 0
+        self._checkouts = 0
+        self._busy_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def warm(self, count: Optional[int] = None) -> None:
+        """
+        Starts browsers upfront, so that the first lookups do not have to pay for the cold start.
+
+        Args:
+            count (Optional[int]): The number of idle browsers that should exist afterwards. Defaults to the pool size.
+        """
+        target = self.size if count is None else min(count, self.size)
+        while True:
+            with self._condition:
+                if self._closed or len(self._idle) >= target or self._alive >= self.size:
+                    return
+                self._alive += 1 # Reserve the slot before leaving the lock.
+            try:
+                driver = self._factory(self._download_dir)
+            except Exception:
+                with self._condition:
+                    self._alive -= 1
+                raise
+            with self._condition:
+                self._drivers[id(driver)] = driver
+                self._idle.append(driver)
+                self._condition.notify()
+
+    def acquire(self, dl_path: Path, timeout: Optional[float] = None) -> Any:
+        """
+        Checks out a browser for a single job. Blocks until one is available if all of them are currently in use.
+
+        Args:
+            dl_path (Path): The directory where the browser should save the downloads of this job to.
+            timeout (Optional[float]): Maximum number of seconds to wait for a free browser. Waits forever if None.
+
+        Returns:
+            Any: The checked out WebDriver instance.
+
+        Raises:
+            TimeoutError: If no browser got available in time.
+            RuntimeError: If the pool was already closed.
+        """
+        waited_from = time.monotonic()
+        deadline = None if timeout is None else waited_from + timeout
+        while True:
+            driver = None
+            with self._condition:
+                while not self._idle and self._alive >= self.size and not self._closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No browser of the pool got available in time.")
+                    self._condition.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("The driver pool was already closed.")
+                if self._idle:
+                    driver = self._idle.pop()
+                else:
+                    self._alive += 1 # Reserve the slot, the browser gets started outside of the lock.
+
+            if driver is None:
+                try:
+                    driver = self._factory(dl_path)
+                except Exception:
+                    with self._condition:
+                        self._alive -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._drivers[id(driver)] = driver
+
+            try:
+                set_download_dir(driver, dl_path)
+            except Exception:
+                # The browser is not usable anymore, replace it and try again.
+                self._discard(driver)
+                continue
+
+            with self._condition:
+                now = time.monotonic()
+                self._in_use[id(driver)] = now
+                self._checkouts += 1
+                self._wait_seconds += now - waited_from
+            return driver
+
+    def release(self, driver: Any, discard: bool = False) -> None:
+        """
+        Returns a checked out browser to the pool after its state got reset.
+
+        Args:
+            driver (Any): The WebDriver instance that was returned by `acquire`.
+            discard (bool): Quit the browser instead of keeping it, e.g. when the job left it in an unknown state.
+        """
+        with self._condition:
+            checked_out_at = self._in_use.pop(id(driver), None)
+            if checked_out_at is not None:
+                self._busy_seconds += time.monotonic() - checked_out_at
+
+        if not discard and not self._closed:
+            try:
+                reset_driver_state(driver)
+            except Exception:
+                discard = True
+
+        if discard or self._closed:
+            self._discard(driver)
+            return
+
+        with self._condition:
+            self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def checkout(self, dl_path: Path, timeout: Optional[float] = None):
+        """
+        Context manager around `acquire` and `release`.
+
+        Args:
+            dl_path (Path): The directory where the browser should save the downloads of this job to.
+            timeout (Optional[float]): Maximum number of seconds to wait for a free browser.
+
+        Yields:
+            Any: The checked out WebDriver instance.
+        """
+        driver = self.acquire(dl_path, timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collects the current size and utilization numbers of the pool.
+
+        Returns:
+            Dict[str, Any]: Dictionary with the pool size, alive/idle/in-use browsers and the accumulated usage counters.
+                `utilization` is the share of the available browser time (size * uptime) that was spent inside of jobs.
+                `memory_bytes` lists the memory use of every running browser (None where it is unknown).
+        """
+        with self._condition:
+            drivers = list(self._drivers.values())
+        # Reading procfs takes a moment, so it happens outside of the lock.
+        memory = [self._memory(driver) for driver in drivers]
+        known = [m for m in memory if m is not None]
+        with self._condition:
+            now = time.monotonic()
+            busy = self._busy_seconds + sum(now - started for started in self._in_use.values())
+            uptime = max(now - self._started, 1e-9)
+            return {
+                "size": self.size,
+                "alive": self._alive,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "launched": self._alive + self._discarded,
+                "discarded": self._discarded,
+                "checkouts": self._checkouts,
+                "busy_seconds": round(busy, 3),
+                "avg_wait_seconds": round(self._wait_seconds / self._checkouts, 3) if self._checkouts else 0.0,
+                "utilization": round(busy / (self.size * uptime), 4),
+                "memory_bytes": memory,
+                "memory_total_bytes": sum(known),
+                "memory_avg_bytes": round(sum(known) / len(known)) if known else None
+            }
+
+    def close(self) -> None:
+        """
+        Quits all idle browsers. Browsers that are still checked out get quit as soon as they are released.
+        """
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for driver in idle:
+            self._discard(driver)
+
+    def __enter__(self) -> "DriverPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _discard(self, driver: Any) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._condition:
+            self._drivers.pop(id(driver), None)
+            self._alive -= 1
+            self._discarded += 1
+            self._condition.notify()
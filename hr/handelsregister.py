@@ -5,12 +5,19 @@ You can query, download, automate and much more, without using a web browser.
 """
 
 import argparse
+from html.parser import HTMLParser
 from typing_extensions import deprecated
-import mechanize
 import re
 import pathlib
 import sys
-from bs4 import BeautifulSoup
+import xml.etree.ElementTree as ET
+from typing import NamedTuple, Optional
+from urllib.parse import urlencode
+
+try:
+    from .quota import portal_quota
+except ImportError: # Executed as a script from inside of hr/.
+    from quota import portal_quota
 
 # Dictionaries to map arguments to values
 schlagwortOptionen = {
@@ -19,9 +26,38 @@ schlagwortOptionen = {
     "exact": 3
 }
 
+# The result table is a PrimeFaces DataTable, its further pages get loaded via JSF ajax requests.
+RESULTS_PER_PAGE = 100 # Largest value of ergebnisseProSeite.
+RESULTS_PER_PAGE_FIELD = "form:ergebnisseProSeite_input"
+RESULT_FORM_ID = "ergebnissForm"
+RESULT_TABLE_ID = "ergebnissForm:selectedSuchErgebnisFormTable"
+VIEW_STATE_FIELD = "javax.faces.ViewState"
+AJAX_HEADERS = {"Faces-Request": "partial/ajax", "X-Requested-With": "XMLHttpRequest"}
+
+# Fields of the advanced search for an exact lookup via the register (Angaben nur zur Hauptniederlassung).
+REGISTER_TYPES = ("HRA", "HRB", "GnR", "PR", "VR")
+REGISTER_TYPE_FIELD = "form:registerArt_input"
+REGISTER_NUMBER_FIELD = "form:registerNummer"
+REGISTER_COURT_FIELD = "form:registergericht_input"
+
+# "HRB 44343", "HRB 44343 B", "HRB 44343, Charlottenburg", "Amtsgericht Charlottenburg HRB 44343" or just "44343".
+# The suffix of the number is upper case only and never the start of the court, e.g. "HRB 44343 AG Charlottenburg".
+REGISTER_NUMBER_PATTERN = re.compile(
+    r"^\s*(?:(?P<court_before>.*?)[\s,]+)??(?:(?P<type>%s)\s*)?(?P<number>\d+(?:\s*(?!(?:amtsgericht|district\s+court|ag)\b)(?-i:[A-Z]{1,2})\b)?)(?:(?:\s*,\s*|\s+)(?P<court_after>.+?))?\s*$" % "|".join(REGISTER_TYPES),
+    re.IGNORECASE
+)
+COURT_PREFIX_PATTERN = re.compile(r"^(?:amtsgericht|district court|ag)\s+", re.IGNORECASE)
+
+# Paginator options of the DataTable widget script, e.g. paginator:{id:[...],rows:100,rowCount:234,page:0}
+PAGINATOR_PATTERN = re.compile(
+    r"""["']%s["'][^<]*?paginator\s*:\s*\{[^}]*?\brows\s*:\s*(\d+)[^}]*?\browCount\s*:\s*(\d+)""" % re.escape(RESULT_TABLE_ID)
+)
+
 @deprecated("\nDon't use this outdated script!\nUse pysil.py (pysel.py) instead!\nThis file was only left as a reference!")
 class HandelsRegister:
     def __init__(self, args):
+        # mechanize is only needed by this (deprecated) client, not by the parsing helpers of this module.
+        import mechanize
         self.args = args
         self.browser = mechanize.Browser()
 
@@ -53,9 +89,18 @@ class HandelsRegister:
         self.cachedir = pathlib.Path("cache")
         self.cachedir.mkdir(parents=True, exist_ok=True)
 
+        # The last result page and whether it belongs to the current session (needed to load its further pages).
+        self.last_results_html = ""
+        self.last_results_live = False
+        self.startpage_open = False
+
     def open_startpage(self):
+        # Every search session counts against the shared quota of 60 retrievals per hour. Blocks until a slot is free.
+        portal_quota().acquire()
+        import mechanize
         # Changed the initial navigation to the page via mechanize because the syntax seems to have changed since this repository was created.
         self.browser.open(mechanize.Request("https://www.handelsregister.de/rp_web/erweitertesuche.xhtml", method="POST"), timeout=10)
+        self.startpage_open = True
 
     def companyname2cachename(self, companyname):
         # Sanitize the company name by replacing invalid characters with underscores
@@ -63,12 +108,18 @@ class HandelsRegister:
         return self.cachedir / sanitized_name
 
     def search_company(self):
+        import mechanize
         cachename = self.companyname2cachename(self.args.schlagwoerter)
+        live = False
         if self.args.force == False and cachename.exists():
             with open(cachename, "r") as f:
                 html = f.read()
                 print("return cached content for %s" % self.args.schlagwoerter)
         else:
+            # The portal (and with it a slot of the quota) is only needed on a cache miss.
+            if not self.startpage_open:
+                self.open_startpage()
+
             # Use an atomic counter: https://gist.github.com/benhoyt/8c8a8d62debe8e5aa5340373f9c509c7
             # line below is not needed anymore.
             #response_search = self.browser.follow_link(text="Advanced search")
@@ -82,6 +133,11 @@ class HandelsRegister:
             so_id = schlagwortOptionen.get(self.args.schlagwortOptionen)
 
             self.browser["form:schlagwortOptionen"] = [str(so_id)]
+            try:
+                # As many rows per page as possible, so that less pages need to be requested.
+                self.browser[RESULTS_PER_PAGE_FIELD] = [str(RESULTS_PER_PAGE)]
+            except (mechanize.ControlNotFoundError, mechanize.ItemNotFoundError):
+                pass
 
             response_result = self.browser.submit()
 
@@ -90,19 +146,68 @@ class HandelsRegister:
 
             if response_result is not None:
                 html = response_result.read().decode("utf-8")
+                live = True
                 with open(cachename, "w") as f:
                     f.write(html)
             else:
                 print("Error: Form submission failed, no response received.")
                 html = ""
 
+        self.last_results_live = live
+        self.last_results_html = html
         return get_companies_in_searchresults(html)
 
+    def iter_companies(self):
+        """
+        Generator over the companies of all result pages. The next page is only requested once the rows of the
+        previous one have been consumed, each page counts against the portal quota.
+
+        Yields:
+            dict: The parsed result rows, see `get_companies_in_searchresults`.
+        """
+        import mechanize
+        yield from self.search_company()
+
+        paging = result_paging(self.last_results_html)
+        if paging is None:
+            return
+        rows, row_count = paging
+        if row_count <= rows:
+            return
+        if not self.last_results_live:
+            print("cached content only contains the first page, use --force to fetch the others")
+            return
+
+        self.browser.select_form(name=RESULT_FORM_ID)
+        form = self.browser.form
+        fields = {control.name: control.value for control in form.controls if control.type == "hidden" and control.name}
+        for first in range(rows, row_count, rows):
+            portal_quota().acquire()
+            request = mechanize.Request(
+                form.action,
+                data=urlencode({**fields, **page_request_fields(first, rows)}),
+                headers=AJAX_HEADERS,
+                method="POST"
+            )
+            rows_html, view_state = parse_page_response(self.browser.open_novisit(request, timeout=10).read().decode("utf-8"))
+            if rows_html is None:
+                print("Error: Result page %d could not be loaded." % (first // rows + 1))
+                return
+            if view_state:
+                fields[VIEW_STATE_FIELD] = view_state
+            companies = get_companies_in_searchresults(result_rows_page(rows_html))
+            if not companies:
+                return
+            yield from companies
+
 def parse_result(result):
     cells = []
     for cellnum, cell in enumerate(result.find_all('td')):
         #print('[%d]: %s [%s]' % (cellnum, cell.text, cell))
         cells.append(cell.text.strip())
+    return parse_result_cells(cells)
+
+def parse_result_cells(cells):
     #assert cells[7] == 'History'
     d = {}
     d['court'] = cells[1]
@@ -125,25 +230,318 @@ def pr_company_info(c):
     # for name, loc in c.get('history'):
     #     print(name, loc)
 
+# Elements without content, they never stay open (same list as the html.parser tree builder of BeautifulSoup).
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param', 'source',
+    'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+])
+# The text inside of these elements is not part of the text of a cell.
+NON_TEXT_ELEMENTS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+# Start of the first result table, used to skip the navigation and scripts in front of it without tokenizing them.
+GRID_START_PATTERN = re.compile(r"""<table\b[^>]*?\srole\s*=\s*["']?grid["'\s/>]""", re.IGNORECASE)
+# Markup in front of the table that changes how the table itself gets parsed, the page gets parsed as a whole then.
+UNSAFE_PREFIX_PATTERN = re.compile(r"<(?:table|template|rt|rp)[\s/>]", re.IGNORECASE)
+
+class _GridComplete(Exception):
+    pass
+
+class _PrefixNeeded(Exception):
+    pass
+
+class ResultGridParser(HTMLParser):
+    """
+    Streaming parser for the result table of the search.
+
+    Only the first table with role="grid" is looked at: every row with a data-ri attribute becomes a result, its cells are
+    all of the td elements inside of it (including the ones of the nested history tables) with their text stripped,
+    exactly like the former BeautifulSoup based parsing. No tree gets built and the parsing stops at the end of the table.
+    """
+
+    def __init__(self, partial=False):
+        """
+        Args:
+            partial (bool): The html starts at the result table and the elements in front of it are not known.
+        """
+        super().__init__(convert_charrefs=True)
+        self.partial = partial
+        self.found_grid = False
+        self.results = []
+        self._stack = [] # Open elements: (name, cell, row, is_grid)
+        self._open = {} # Number of open elements per name.
+        self._in_grid = False
+        self._open_rows = [] # (result index, cells) of the open result rows.
+        self._open_cells = []
+        self._skip_text = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        cell = row = None
+        is_grid = False
+        if not self._in_grid:
+            if tag == 'table' and not self.found_grid and dict(attrs).get('role') == 'grid':
+                self.found_grid = self._in_grid = is_grid = True
+        elif tag == 'td':
+            cell = []
+            self._open_cells.append(cell)
+            for _, cells in self._open_rows:
+                cells.append(cell)
+        elif tag == 'tr' and dict(attrs).get('data-ri') is not None:
+            row = (len(self.results), [])
+            self.results.append(None)
+            self._open_rows.append(row)
+        if tag in NON_TEXT_ELEMENTS:
+            self._skip_text += 1
+        self._stack.append((tag, cell, row, is_grid))
+        self._open[tag] = self._open.get(tag, 0) + 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if not self._open.get(tag):
+            # Closes an element from in front of the table (and with it the table) or nothing at all, only the full page tells.
+            if self.partial:
+                raise _PrefixNeeded()
+            return
+        # Like BeautifulSoup, an end tag closes the most recent open element of its name and all elements inside of it.
+        while self._stack:
+            name, cell, row, is_grid = self._stack.pop()
+            self._open[name] -= 1
+            if cell is not None:
+                self._open_cells = [c for c in self._open_cells if c is not cell]
+            elif row is not None:
+                self._finish_row(row)
+            if name in NON_TEXT_ELEMENTS:
+                self._skip_text -= 1
+            if is_grid:
+                self._finish()
+                raise _GridComplete()
+            if name == tag:
+                return
+
+    def handle_data(self, data):
+        if self._open_cells and not self._skip_text:
+            for cell in self._open_cells:
+                cell.append(data)
+
+    def unknown_decl(self, data):
+        # The content of a CDATA section counts as text.
+        if data.upper().startswith('CDATA['):
+            self.handle_data(data[len('CDATA['):])
+
+    def _finish_row(self, row):
+        index, cells = row
+        self._open_rows = [r for r in self._open_rows if r is not row]
+        self.results[index] = parse_result_cells([''.join(cell).strip() for cell in cells])
+
+    def _finish(self):
+        # Rows that are still open at the end of the table (or of a truncated page) are closed like the tree builder would.
+        for row in reversed(self._open_rows[:]):
+            self._finish_row(row)
+        self._in_grid = False
+
+    def close(self):
+        super().close()
+        if self._in_grid:
+            self._finish()
+
+def grid_start(html):
+    """
+    Finds the offset of the result table, if the html in front of it can be skipped without changing the result.
+
+    Args:
+        html (str): The html of the result page.
+
+    Returns:
+        int: The offset of the table or 0 if the whole page needs to be parsed.
+    """
+    match = GRID_START_PATTERN.search(html)
+    if not match:
+        return 0
+    start = match.start()
+    prefix = html[:start].lower()
+    # The candidate must not be part of a comment, a script, a CDATA section or an attribute value.
+    unclosed = (('<!--', '-->'), ('<script', '</script'), ('<style', '</style'), ('<![', ']]>'), ('<', '>'))
+    if any(prefix.rfind(opening) > prefix.rfind(closing) for opening, closing in unclosed):
+        return 0
+    if UNSAFE_PREFIX_PATTERN.search(prefix):
+        return 0
+    return start
+
+def _parse_grid(html, start):
+    parser = ResultGridParser(partial=start > 0)
+    try:
+        parser.feed(html[start:] if start else html)
+        parser.close()
+    except _GridComplete:
+        pass
+    return parser
+
 def get_companies_in_searchresults(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    grid = soup.find('table', role='grid')
-    #print('grid: %s', grid)
-  
-    results = []
-    from bs4.element import Tag
-    if grid is not None and isinstance(grid, Tag):
-        for result in grid.find_all('tr'):
-            if isinstance(result, Tag):
-                a = result.get('data-ri')
-                if a is not None:
-                    index = int(str(a))
-                    #print('r[%d] %s' % (index, result))
-                    d = parse_result(result)
-                    results.append(d)
-    else:
+    start = grid_start(html)
+    try:
+        parser = _parse_grid(html, start)
+        if start and not parser.found_grid:
+            raise _PrefixNeeded()
+    except _PrefixNeeded:
+        parser = _parse_grid(html, 0)
+
+    if not parser.found_grid:
         print("No results table found in the HTML or grid is not a valid table element.")
-    return results
+    return parser.results
+
+def result_paging(html):
+    """
+    Reads the paginator options of the result table.
+
+    Args:
+        html (str): The html of the first result page.
+
+    Returns:
+        Optional[Tuple[int, int]]: The rows per page and the total number of rows, None if the table has no paginator.
+    """
+    match = PAGINATOR_PATTERN.search(html)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def page_request_fields(first, rows=RESULTS_PER_PAGE):
+    """
+    The request parameters that the paginator of the result table sends to load a page.
+    They get sent together with the hidden fields (incl. the ViewState) of the result form and the AJAX_HEADERS.
+
+    Args:
+        first (int): The index of the first row of the page.
+        rows (int): The number of rows per page.
+
+    Returns:
+        dict: The parameters of the ajax request.
+    """
+    return {
+        "javax.faces.partial.ajax": "true",
+        "javax.faces.source": RESULT_TABLE_ID,
+        "javax.faces.partial.execute": RESULT_TABLE_ID,
+        "javax.faces.partial.render": RESULT_TABLE_ID,
+        "javax.faces.behavior.event": "page",
+        "javax.faces.partial.event": "page",
+        RESULT_TABLE_ID + "_pagination": "true",
+        RESULT_TABLE_ID + "_first": str(first),
+        RESULT_TABLE_ID + "_rows": str(rows),
+        RESULT_TABLE_ID + "_skipChildren": "true",
+        RESULT_TABLE_ID + "_encodeFeature": "true",
+        RESULT_FORM_ID: RESULT_FORM_ID
+    }
+
+def parse_page_response(xml):
+    """
+    Reads the partial response to the ajax request of a result page.
+
+    Args:
+        xml (str): The body of the response.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The html of the table rows (None if the response contains no rows, e.g. an error
+            or a redirect after an expired session) and the new ViewState (None if it did not change).
+    """
+    try:
+        root = ET.fromstring(xml.strip())
+    except ET.ParseError:
+        return None, None
+    rows_html = view_state = None
+    for update in root.iter("update"):
+        update_id = update.get("id", "")
+        if update_id == RESULT_TABLE_ID:
+            rows_html = update.text or ""
+        elif update_id.split(":")[-2:-1] == [VIEW_STATE_FIELD] or update_id == VIEW_STATE_FIELD:
+            view_state = (update.text or "").strip()
+    return rows_html, view_state
+
+def result_rows_page(rows_html):
+    # The rows of a further page come without their table.
+    return '<table role="grid"><tbody>%s</tbody></table>' % rows_html
+
+class RegisterNumber(NamedTuple):
+    """A register entry like "HRB 44343" at the court of Charlottenburg."""
+    register_type: Optional[str]
+    number: str
+    court: Optional[str] = None
+
+    def __str__(self):
+        text = "%s %s" % (self.register_type, self.number) if self.register_type else self.number
+        return "%s, %s" % (text, self.court) if self.court else text
+
+def parse_register_number(value, register_type=None, court=None):
+    """
+    Parses a register number, which can contain the register type and the court as well.
+
+    Args:
+        value (str): The register number, e.g. "HRB 44343", "HRB 44343, Charlottenburg", "HRB 44343 Charlottenburg" or "44343".
+        register_type (Optional[str]): The register type, used if the value does not contain one.
+        court (Optional[str]): The register court (name or code like "F1103R"), used if the value does not contain one.
+
+    Returns:
+        Optional[RegisterNumber]: The register number or None if the value is empty or no register number.
+    """
+    match = REGISTER_NUMBER_PATTERN.match(value or "")
+    if not match:
+        return None
+    parsed_type = match.group("type") or register_type
+    if parsed_type:
+        # Normalizes the spelling, e.g. "hrb" -> "HRB" and "gnr" -> "GnR".
+        parsed_type = next((known for known in REGISTER_TYPES if known.lower() == parsed_type.lower()), parsed_type)
+    parsed_court = match.group("court_after") or match.group("court_before") or court
+    return RegisterNumber(parsed_type, re.sub(r"\s+", " ", match.group("number").upper()), parsed_court.strip() if parsed_court else None)
+
+def _normalize_court(court):
+    return COURT_PREFIX_PATTERN.sub("", court.strip()).lower()
+
+def find_court_option(options, court):
+    """
+    Finds the value of the register court inside of the options of the court select of the search form.
+
+    Args:
+        options (Iterable[Tuple[str, str]]): The (value, label) pairs of the select.
+        court (str): The court code (e.g. "F1103R") or name (e.g. "Charlottenburg" or "Amtsgericht Charlottenburg").
+
+    Returns:
+        Optional[str]: The value of the court or None if no option (or more than one) matches.
+    """
+    options = [(value, label) for value, label in options if value]
+    wanted = _normalize_court(court)
+    for value, label in options:
+        if value.lower() == court.strip().lower() or _normalize_court(label) == wanted:
+            return value
+    # A part of the name is only accepted if it is unambiguous, e.g. "Charlottenburg" for "Berlin (Charlottenburg)".
+    pattern = re.compile(r"\b%s\b" % re.escape(wanted), re.IGNORECASE)
+    candidates = [value for value, label in options if pattern.search(label)]
+    return candidates[0] if len(candidates) == 1 else None
+
+def register_matches(text, register):
+    """
+    Checks if a result row (e.g. its court cell "District court Berlin (Charlottenburg) HRB 44343") belongs to the register entry.
+
+    Args:
+        text (str): The text of the row.
+        register (RegisterNumber): The wanted register entry.
+
+    Returns:
+        bool: True if the register type and number (and the court name, if there is one) are part of the text.
+    """
+    number = r"[ \t]*".join(re.escape(part) for part in register.number.split(" "))
+    # "HRB 44343 B" is another entry than "HRB 44343". The suffix is upper case and on the same line, the text of a whole
+    # row continues with the company name (e.g. "DB Netz AG") on the next one.
+    end = r"(?!\d|[ \t]*(?-i:[A-Z]{1,2})\b)"
+    pattern = r"\b%s\s*%s%s" % (re.escape(register.register_type), number, end) if register.register_type else r"(?<!\d)%s%s" % (number, end)
+    if not re.search(pattern, text, re.IGNORECASE):
+        return False
+    # A court code can not be checked against the text of the row.
+    if register.court and not re.fullmatch(r"[A-Z]\d{4}[A-Z]?", register.court.strip()):
+        return _normalize_court(register.court) in text.lower()
+    return True
 
 def parse_args():
     # Parse arguments
@@ -187,7 +585,6 @@ def parse_args():
 if __name__ == "__main__":
     args = parse_args()
     h = HandelsRegister(args)
-    h.open_startpage()
     companies = h.search_company()
     if companies is not None:
         for c in companies:
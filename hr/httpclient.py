@@ -0,0 +1,460 @@
+# Browserless HTTP client for the JSF pages of the portal.
+# Does the same as the Selenium flow of pysil (advanced search + download of the AD document), but with plain HTTP requests:
+# the client keeps the session cookies and the JSF ViewState of the last page, submits the forms the way the browser would
+# and reuses its keep-alive connections (gzip compressed) for all requests of a lookup.
+
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from requests.adapters import HTTPAdapter
+
+from handelsregister import (
+    AJAX_HEADERS, REGISTER_COURT_FIELD, REGISTER_NUMBER_FIELD, REGISTER_TYPE_FIELD, RESULT_FORM_ID, RESULTS_PER_PAGE,
+    RESULTS_PER_PAGE_FIELD, VIEW_STATE_FIELD, RegisterNumber, find_court_option, get_companies_in_searchresults,
+    page_request_fields, parse_page_response, register_matches, result_paging, result_rows_page, schlagwortOptionen
+)
+from index import CompanyIndex
+from matching import NameMatcher
+from quota import portal_quota
+
+# HR_PORTAL_URL points the client to another instance of rp_web, e.g. the local simulator of the benchmarks.
+PORTAL_BASE_URL = os.environ.get("HR_PORTAL_URL", "https://www.handelsregister.de/rp_web/")
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.5 Safari/605.1.15",
+    "Accept-Language": "de-DE,de;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Connection": "keep-alive"
+}
+
+# Matches the 'key':'value' pairs of the parameter objects inside of the onclick handlers of JSF command links.
+_SUBMIT_PARAM_PATTERN = re.compile(r"""['"]([^'"]+)['"]\s*:\s*['"]([^'"]*)['"]""")
+
+class PortalError(Exception):
+    """Raised if the portal answered with something the client did not expect."""
+
+@dataclass
+class JsfForm:
+    """The fields of a form as the browser would submit them, including the JSF ViewState."""
+    form_id: str
+    action: str
+    fields: Dict[str, str] = field(default_factory=dict)
+
+@dataclass
+class SearchResult:
+    """The parsed result page of a search. The html is needed to trigger the document downloads afterwards."""
+    html: str
+    url: str
+    rows: List[Dict[str, Any]]
+    first: int = 0 # data-ri index of the first row, the rows of the further pages continue the numbering.
+    form: Optional[JsfForm] = None # The result form, further pages only contain their rows and share the form of the first one.
+
+@dataclass
+class Document:
+    content: bytes
+    filename: str
+    content_type: str
+
+def parse_form(html: str, form_id: str, base_url: str) -> JsfForm:
+    """
+    Collects the fields of a form (hidden inputs, text inputs, checked checkboxes/radios and selects) from a page.
+
+    Args:
+        html (str): The html of the page.
+        form_id (str): The id of the form.
+        base_url (str): The url of the page, used to resolve the form action.
+
+    Returns:
+        JsfForm: The form with its current field values.
+
+    Raises:
+        PortalError: If the page does not contain the form.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    form = soup.find("form", id=form_id)
+    if not isinstance(form, Tag):
+        raise PortalError(f"Die Seite enthält kein Formular '{form_id}'.")
+
+    fields: Dict[str, str] = {}
+    for element in form.find_all(["input", "select", "textarea"]):
+        name = element.get("name")
+        if not name:
+            continue
+        if element.name == "select":
+            selected = element.find("option", selected=True) or element.find("option")
+            fields[name] = str(selected.get("value", selected.text)) if isinstance(selected, Tag) else ""
+        elif element.name == "textarea":
+            fields[name] = element.text
+        else:
+            input_type = str(element.get("type", "text")).lower()
+            if input_type in ("checkbox", "radio"):
+                if element.has_attr("checked"):
+                    fields[name] = str(element.get("value", "on"))
+            elif input_type not in ("submit", "button", "image", "reset"):
+                fields[name] = str(element.get("value", ""))
+
+    return JsfForm(form_id=form_id, action=urljoin(base_url, str(form.get("action", ""))), fields=fields)
+
+def parse_select_options(html: str, name: str) -> List[Tuple[str, str]]:
+    """
+    Collects the options of a select of a page.
+
+    Args:
+        html (str): The html of the page.
+        name (str): The name of the select.
+
+    Returns:
+        List[Tuple[str, str]]: The (value, label) pairs of the options, empty if there is no such select.
+    """
+    select = BeautifulSoup(html, "html.parser").find("select", attrs={"name": name})
+    if not isinstance(select, Tag):
+        return []
+    return [(str(option.get("value", option.text)), option.text.strip()) for option in select.find_all("option")]
+
+def parse_submit_params(onclick: str) -> Dict[str, str]:
+    """
+    Extracts the request parameters that a JSF command link adds to its form when it gets clicked.
+
+    Args:
+        onclick (str): The onclick handler of the link.
+
+    Returns:
+        Dict[str, str]: The parameters of the link.
+    """
+    return dict(_SUBMIT_PARAM_PATTERN.findall(onclick))
+
+def find_document_link(html: str, row_index: int, document_type: str = "AD") -> Tag:
+    """
+    Finds the link of a document type (AD, CD, HD, ...) inside of a row of the result table.
+
+    Args:
+        html (str): The html of the result page.
+        row_index (int): The data-ri index of the row.
+        document_type (str): The document type.
+
+    Returns:
+        Tag: The link element.
+
+    Raises:
+        PortalError: If the row or the link do not exist.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    row = soup.find("tr", attrs={"data-ri": str(row_index)})
+    if not isinstance(row, Tag):
+        raise PortalError(f"Die Ergebnistabelle enthält keine Zeile {row_index}.")
+    for link in row.find_all("a", class_="dokumentList"):
+        onclick = str(link.get("onclick", ""))
+        if f"Global.Dokumentart.{document_type}" in onclick or link.text.strip() == document_type:
+            return link
+    raise PortalError(f"Zeile {row_index} enthält kein Dokument vom Typ {document_type}.")
+
+def find_matching_row(rows: List[Dict[str, Any]], s: str, ci: Optional[str] = None) -> Optional[int]:
+    """
+    Finds the result row whose name matches the search term best and whose seat is the city (same rule as pysil).
+
+    Args:
+        rows (List[Dict[str, Any]]): The parsed rows of the result table.
+        s (str): the search term (i.e. name of the company)
+        ci (Optional[str]): the name of the city
+
+    Returns:
+        Optional[int]: The index of the matching row or None.
+    """
+    return NameMatcher(s, ci).best((row.get("name", ""), row.get("state", "")) for row in rows)
+
+def find_register_row(rows: List[Dict[str, Any]], register: RegisterNumber) -> Optional[int]:
+    """
+    Finds the first result row of an exact register lookup that belongs to the register entry.
+
+    Args:
+        rows (List[Dict[str, Any]]): The parsed rows of the result table.
+        register (RegisterNumber): The wanted register entry.
+
+    Returns:
+        Optional[int]: The index of the matching row or None.
+    """
+    for index, row in enumerate(rows):
+        if register_matches(row.get("court", ""), register):
+            return index
+    return None
+
+def _filename_from_response(response: requests.Response, fallback: str) -> str:
+    disposition = response.headers.get("Content-Disposition", "")
+    match = re.search(r"""filename\*?=(?:UTF-8'')?["']?([^"';]+)""", disposition)
+    return match.group(1) if match else fallback
+
+class PortalClient:
+    """
+    HTTP-only client for the search and the document download of the portal.
+    One client represents one portal session; it is not meant to be shared between threads.
+    """
+
+    def __init__(self, base_url: str = PORTAL_BASE_URL, pool_size: int = 4, timeout: float = 20, quota: Any = None, index: Optional[CompanyIndex] = None):
+        """
+        Args:
+            base_url (str): The url of the rp_web application. Can point to a local stand-in server for tests.
+            pool_size (int): Maximum number of keep-alive connections.
+            timeout (float): Timeout of every request in seconds.
+            quota (Any): Scheduler with an `acquire()` method. Defaults to the shared portal quota.
+            index (Optional[CompanyIndex]): Local company index that receives the rows of every loaded result page.
+        """
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.quota = quota if quota is not None else portal_quota()
+        self.index = index
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.last_url: Optional[str] = None
+        self.last_html: Optional[str] = None
+
+    def _request(self, method: str, url: str, data: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        headers = {**({"Referer": self.last_url} if self.last_url else {}), **(headers or {})}
+        response = self.session.request(method, url, data=data, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def _add_to_index(self, rows: List[Dict[str, Any]]) -> None:
+        if self.index is not None:
+            self.index.add_rows(rows)
+
+    def _page(self, method: str, url: str, data: Optional[Dict[str, str]] = None) -> str:
+        response = self._request(method, url, data)
+        self.last_url = response.url
+        self.last_html = response.text
+        return response.text
+
+    def adopt_browser_session(self, cookies: List[Dict[str, Any]], user_agent: Optional[str] = None, url: Optional[str] = None) -> None:
+        """
+        Takes over the session of a browser (e.g. of the Selenium flow of pysil), so that the page it currently shows can be
+        continued with plain requests, e.g. to fetch a document into memory instead of letting the browser download it.
+
+        Args:
+            cookies (List[Dict[str, Any]]): The cookies of the browser, as returned by `driver.get_cookies()`.
+            user_agent (Optional[str]): The user agent of the browser. The portal sees the same client as before if given.
+            url (Optional[str]): The url of the page the browser shows, sent as Referer.
+        """
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+        self.last_url = url
+
+    def open_search_form(self) -> JsfForm:
+        """
+        Opens the start page (which creates the session) and changes to the advanced search, like a click on its link would.
+
+        Returns:
+            JsfForm: The search form with the current ViewState.
+        """
+        html = self._page("GET", urljoin(self.base_url, "welcome.xhtml"))
+        try:
+            navi = parse_form(html, "naviForm", self.last_url or self.base_url)
+            navi.fields["naviForm:erweiterteSucheLink"] = "naviForm:erweiterteSucheLink"
+            html = self._page("POST", navi.action, navi.fields)
+        except PortalError:
+            # Start page without the navigation form, the advanced search can still be opened directly.
+            html = self._page("GET", urljoin(self.base_url, "erweitertesuche.xhtml"))
+        return parse_form(html, "form", self.last_url or self.base_url)
+
+    def search(self, s: str, so: str = "all", sa: bool = False, sg: bool = False, ci: Optional[str] = None, st: Optional[str] = None, po: Optional[str] = None, register: Optional[RegisterNumber] = None) -> SearchResult:
+        """
+        Submits the advanced search form.
+
+        Args:
+            s (str): the search term (i.e. name of the company)
+            so (str): search options - "all", "exact" or "min"
+            sa (bool): if phonetically similar sounding results should get returned, too.
+            sg (bool): if already deleted entries should get returned, too.
+            ci (Optional[str]): the name of the city
+            st (Optional[str]): the name of the street (and possibly the house number)
+            po (Optional[str]): the post code of the city
+            register (Optional[RegisterNumber]): the register entry for an exact lookup. The search term is not sent in that
+                case, as the name in the register might not contain all of its words.
+
+        Returns:
+            SearchResult: The result page and its parsed rows.
+        """
+        # Every search counts against the shared quota of 60 retrievals per hour.
+        self.quota.acquire()
+        form = self.open_search_form()
+
+        fields = dict(form.fields)
+        fields["form:schlagwoerter"] = s if register is None else ""
+        fields["form:schlagwortOptionen"] = str(schlagwortOptionen.get(so, 1))
+        for checkbox, enabled in (("form:aenlichLautendeSchlagwoerterBoolChkbox_input", sa), ("form:auchGeloeschte_input", sg)):
+            if enabled:
+                fields[checkbox] = "on"
+            else:
+                fields.pop(checkbox, None)
+        fields["form:postleitzahl"] = po or ""
+        fields["form:ort"] = ci or ""
+        fields["form:strasse"] = st or ""
+        fields[RESULTS_PER_PAGE_FIELD] = str(RESULTS_PER_PAGE) # Less pages for large result sets.
+        if register is not None:
+            fields[REGISTER_TYPE_FIELD] = register.register_type or ""
+            fields[REGISTER_NUMBER_FIELD] = register.number
+            # The court has to be one of the options of the select, the name gets resolved to its code.
+            court = find_court_option(parse_select_options(self.last_html or "", REGISTER_COURT_FIELD), register.court) if register.court else None
+            fields[REGISTER_COURT_FIELD] = court or ""
+        fields["form:btnSuche"] = ""
+
+        html = self._page("POST", form.action, fields)
+        result = SearchResult(html=html, url=self.last_url or form.action, rows=get_companies_in_searchresults(html))
+        self._add_to_index(result.rows)
+        return result
+
+    def search_pages(self, s: str, so: str = "all", sa: bool = False, sg: bool = False, ci: Optional[str] = None, st: Optional[str] = None, po: Optional[str] = None, register: Optional[RegisterNumber] = None) -> Iterator[SearchResult]:
+        """
+        Submits the advanced search form and yields its result pages. The next page is only requested (and counted against
+        the quota) once the consumer asks for it, so the rows of a page should be downloaded from before moving on.
+
+        Args:
+            s (str): the search term (i.e. name of the company)
+            so (str): search options - "all", "exact" or "min"
+            sa (bool): if phonetically similar sounding results should get returned, too.
+            sg (bool): if already deleted entries should get returned, too.
+            ci (Optional[str]): the name of the city
+            st (Optional[str]): the name of the street (and possibly the house number)
+            po (Optional[str]): the post code of the city
+            register (Optional[RegisterNumber]): the register entry for an exact lookup.
+
+        Yields:
+            SearchResult: The result pages, each with its parsed rows.
+        """
+        result = self.search(s, so, sa, sg, ci, st, po, register)
+        yield result
+
+        paging = result_paging(result.html)
+        if paging is None:
+            return
+        rows, row_count = paging
+        if result.form is None:
+            result.form = parse_form(result.html, RESULT_FORM_ID, result.url)
+        for first in range(rows, row_count, rows):
+            page = self.load_page(result, first, rows)
+            if not page.rows:
+                return
+            yield page
+
+    def search_rows(self, s: str, so: str = "all", sa: bool = False, sg: bool = False, ci: Optional[str] = None, st: Optional[str] = None, po: Optional[str] = None, register: Optional[RegisterNumber] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Same as `search_pages`, but yields the rows of all pages one by one.
+
+        Yields:
+            Dict[str, Any]: The parsed result rows, see `get_companies_in_searchresults`.
+        """
+        for page in self.search_pages(s, so, sa, sg, ci, st, po, register):
+            yield from page.rows
+
+    def load_page(self, result: SearchResult, first: int, rows: int = RESULTS_PER_PAGE) -> SearchResult:
+        """
+        Loads a further page of a result table, like a click on the paginator would.
+
+        Args:
+            result (SearchResult): The first result page.
+            first (int): The index of the first row of the page.
+            rows (int): The number of rows per page.
+
+        Returns:
+            SearchResult: The page, it shares the result form (and with it the current ViewState) with `result`.
+
+        Raises:
+            PortalError: If the portal did not answer with the rows of the page.
+        """
+        form = result.form or parse_form(result.html, RESULT_FORM_ID, result.url)
+        result.form = form
+        fields = dict(form.fields)
+        fields.update(page_request_fields(first, rows))
+
+        # Every further page is another retrieval.
+        self.quota.acquire()
+        response = self._request("POST", form.action, fields, headers=AJAX_HEADERS)
+        rows_html, view_state = parse_page_response(response.text)
+        if rows_html is None:
+            raise PortalError(f"Das Portal hat die Ergebnisse ab Zeile {first + 1} nicht geliefert.")
+        if view_state:
+            form.fields[VIEW_STATE_FIELD] = view_state
+        html = result_rows_page(rows_html)
+        page = SearchResult(html=html, url=result.url, rows=get_companies_in_searchresults(html), first=first, form=form)
+        self._add_to_index(page.rows)
+        return page
+
+    def download_document(self, result: SearchResult, row_index: int, document_type: str = "AD") -> Document:
+        """
+        Triggers the download of a document of a result row, like a click on its link would.
+
+        Args:
+            result (SearchResult): The result page that contains the row.
+            row_index (int): The data-ri index of the row (`result.first` plus the index inside of `result.rows`).
+            document_type (str): The document type, "AD" (Aktueller Abdruck) by default.
+
+        Returns:
+            Document: The downloaded document.
+
+        Raises:
+            PortalError: If the portal did not answer with a document.
+        """
+        link = find_document_link(result.html, row_index, document_type)
+        form = result.form or parse_form(result.html, RESULT_FORM_ID, result.url)
+        fields = dict(form.fields)
+        fields.update(parse_submit_params(str(link.get("onclick", ""))))
+        link_id = link.get("id")
+        if link_id:
+            fields.setdefault(str(link_id), str(link_id))
+
+        # The document retrieval counts against the quota as well.
+        self.quota.acquire()
+        response = self._request("POST", form.action, fields)
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type.startswith("text/html") or not response.content:
+            raise PortalError(f"Das Portal hat statt eines Dokuments vom Typ {document_type} eine Seite geliefert.")
+        return Document(
+            content=response.content,
+            filename=_filename_from_response(response, f"{document_type}.pdf"),
+            content_type=content_type
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "PortalClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def save_document(document: Document, dl_path: Path) -> Path:
+    """
+    Writes a downloaded document into a folder. The file is written under a temporary name and renamed afterwards, so
+    concurrent jobs that save the same document never see a half written file.
+
+    Args:
+        document (Document): The downloaded document.
+        dl_path (Path): The target folder.
+
+    Returns:
+        Path: The path of the written file.
+    """
+    dl_path.mkdir(parents=True, exist_ok=True)
+    target = dl_path / Path(document.filename).name
+    fd, tmp_name = tempfile.mkstemp(dir=dl_path, prefix=".tmp-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(document.content)
+        os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return target
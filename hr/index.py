@@ -0,0 +1,390 @@
+# Local full-text index of all companies that have been seen in a result table or extracted from a document.
+# Every result row contains court, register number, name, seat, status and the name history of a company. Instead of throwing
+# them away after a lookup, they are kept in a SQLite FTS5 index that answers name, city, register number and historical name
+# queries offline. Only misses and stale entries need to go to the rate-limited portal.
+#
+# Query it with: python index.py search "gasag" --city Berlin
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from handelsregister import COURT_PREFIX_PATTERN, REGISTER_TYPES, RegisterNumber, parse_register_number
+
+# The court cell of a result row, e.g. "Berlin  District court Berlin (Charlottenburg) HRB 44343".
+COURT_CELL_PATTERN = re.compile(
+    r"^(?P<state>.*?)\s*(?P<court>(?:District court|Amtsgericht)\s.*?)?\s*(?P<type>%s)\s+(?P<number>\d+(?:\s*[A-Z]{1,2})?)\s*$" % "|".join(REGISTER_TYPES)
+)
+# Numbering in front of the entries of the name history, e.g. "1.) Gasag Berliner Gaswerke Aktiengesellschaft".
+HISTORY_PREFIX_PATTERN = re.compile(r"^\s*\d+\.\)\s*")
+TOKEN_PATTERN = re.compile(r"\w+")
+# Extracted data that is older than this is not used to answer a lookup anymore (same as the lookup cache).
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 3600.0
+
+def default_index_db_path() -> Path:
+    """
+    Location of the company index. Can be overwritten with the HR_INDEX_DB environment variable.
+
+    Returns:
+        Path: The path of the SQLite database file.
+    """
+    configured = os.environ.get("HR_INDEX_DB")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".cache" / "handelsregister" / "index.sqlite3"
+
+@dataclass
+class IndexedCompany:
+    register_id: str
+    name: str
+    court: str
+    register_type: Optional[str]
+    register_number: Optional[str]
+    state: str
+    seat: str
+    status: str
+    history: List[Tuple[str, str]] = field(default_factory=list) # (former name, former seat)
+    managers: Optional[List[str]] = None # Only known once a document of the company has been extracted.
+    address: Optional[str] = None
+    pdf_path: Optional[str] = None
+    seen_at: float = 0.0 # Last time the company was part of a result table.
+    extracted_at: Optional[float] = None
+
+def split_court_cell(text: str) -> Tuple[str, str, Optional[RegisterNumber]]:
+    """
+    Splits the court cell of a result row into the federal state, the court and the register entry.
+
+    Args:
+        text (str): The cell, e.g. "Berlin  District court Berlin (Charlottenburg) HRB 44343".
+
+    Returns:
+        Tuple[str, str, Optional[RegisterNumber]]: The state, the court (without "District court"/"Amtsgericht")
+            and the register entry, which is None if the cell does not end with a register number.
+    """
+    text = " ".join(text.split())
+    match = COURT_CELL_PATTERN.match(text)
+    if not match:
+        return "", text, None
+    court = COURT_PREFIX_PATTERN.sub("", match.group("court") or "").strip()
+    register = RegisterNumber(match.group("type"), " ".join(match.group("number").split()), court or None)
+    return match.group("state").strip(), court, register
+
+def register_id_of_row(row: Dict[str, Any]) -> str:
+    """
+    Creates the key of a result row, which stays the same no matter in which search the company has been seen.
+
+    Args:
+        row (Dict[str, Any]): A parsed result row, see `get_companies_in_searchresults`.
+
+    Returns:
+        str: The court and register entry, e.g. "berlin (charlottenburg)|HRB 44343".
+    """
+    _, court, register = split_court_cell(row.get("court", ""))
+    if register is None:
+        # Rows without a register number are identified by their court cell and name.
+        return "?|%s|%s" % (" ".join(row.get("court", "").split()).casefold(), " ".join(row.get("name", "").split()).casefold())
+    return "%s|%s %s" % (court.casefold(), register.register_type, register.number)
+
+def _match_query(text: str, columns: str) -> Optional[str]:
+    # Every word has to occur (as a prefix) in one of the columns. Quoting keeps FTS5 operators in the input from being used.
+    tokens = TOKEN_PATTERN.findall(text)
+    if not tokens:
+        return None
+    return "{%s} : (%s)" % (columns, " AND ".join('"%s"*' % token for token in tokens))
+
+class CompanyIndex:
+    """
+    SQLite FTS5 index over the result rows and extractions that have been seen so far.
+    A company is stored once per register entry; seeing it again updates its row and its `seen_at`.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, clock: Callable[[], float] = time.time, max_age: float = DEFAULT_MAX_AGE_SECONDS):
+        """
+        Args:
+            db_path (Optional[Path]): The database file. Defaults to `default_index_db_path()`.
+            clock (Callable[[], float]): Source of the current unix time.
+            max_age (float): Number of seconds an extraction can answer a lookup, see `find_extracted`.
+        """
+        self.db_path = Path(db_path) if db_path else default_index_db_path()
+        self._clock = clock
+        self.max_age = max_age
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS companies (
+                    register_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    court TEXT NOT NULL,
+                    register_type TEXT,
+                    register_number TEXT,
+                    state TEXT NOT NULL,
+                    seat TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    history TEXT NOT NULL,
+                    managers TEXT,
+                    address TEXT,
+                    pdf_path TEXT,
+                    seen_at REAL NOT NULL,
+                    extracted_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS companies_register ON companies (register_number, register_type)")
+            # The rowid of the full-text entries is the rowid of the company.
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS companies_fts USING fts5(
+                    name, history, seat, court, tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Commits (or rolls back) the transaction and closes the connection again.
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _reindex(self, conn: sqlite3.Connection, register_id: str) -> None:
+        rowid, name, history, seat, court = conn.execute(
+            "SELECT rowid, name, history, seat, court FROM companies WHERE register_id = ?", (register_id,)
+        ).fetchone()
+        history_text = " ".join("%s %s" % (former_name, former_seat) for former_name, former_seat in json.loads(history))
+        conn.execute("DELETE FROM companies_fts WHERE rowid = ?", (rowid,))
+        conn.execute("INSERT INTO companies_fts (rowid, name, history, seat, court) VALUES (?, ?, ?, ?, ?)", (rowid, name, history_text, seat, court))
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Adds (or refreshes) the parsed rows of a result table.
+
+        Args:
+            rows (Iterable[Dict[str, Any]]): The rows, see `get_companies_in_searchresults`.
+
+        Returns:
+            int: The number of stored rows.
+        """
+        now = self._clock()
+        count = 0
+        with self._connect() as conn:
+            for row in rows:
+                state, court, register = split_court_cell(row.get("court", ""))
+                register_id = register_id_of_row(row)
+                history = [(HISTORY_PREFIX_PATTERN.sub("", name), HISTORY_PREFIX_PATTERN.sub("", seat)) for name, seat in row.get("history", [])]
+                # An upsert keeps the rowid (and with it the extraction data) of a company that has been seen before.
+                conn.execute("""
+                    INSERT INTO companies (register_id, name, court, register_type, register_number, state, seat, status, history, seen_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (register_id) DO UPDATE SET
+                        name = excluded.name, court = excluded.court, state = excluded.state, seat = excluded.seat,
+                        status = excluded.status, history = excluded.history, seen_at = excluded.seen_at
+                """, (
+                    register_id, row.get("name", ""), court, register.register_type if register else None,
+                    register.number if register else None, state, row.get("state", ""), row.get("status", ""),
+                    json.dumps(history, ensure_ascii=False), now
+                ))
+                self._reindex(conn, register_id)
+                count += 1
+        return count
+
+    def add_extraction(self, data: Dict[str, Any], pdf_path: Optional[str] = None, register: Optional[RegisterNumber] = None, register_id: Optional[str] = None) -> Optional[str]:
+        """
+        Attaches the data that was extracted from a document to its company.
+        The company is found via the register id of the row the document was fetched from, the register entry or, without
+        both, via its (current) name if that is unambiguous.
+
+        Args:
+            data (Dict[str, Any]): The extracted {managers, name, address} of the company.
+            pdf_path (Optional[str]): The document the data was extracted from.
+            register (Optional[RegisterNumber]): The register entry of the company, if known.
+            register_id (Optional[str]): The key of the result row the document was fetched from, see `register_id_of_row`.
+
+        Returns:
+            Optional[str]: The register id of the company or None if it is not part of the index.
+        """
+        with self._connect() as conn:
+            if register_id is not None and conn.execute("SELECT 1 FROM companies WHERE register_id = ?", (register_id,)).fetchone():
+                candidates = [register_id]
+            elif register is not None:
+                candidates = [row[0] for row in conn.execute(
+                    "SELECT register_id FROM companies WHERE register_number = ? AND (? IS NULL OR register_type = ?)",
+                    (register.number, register.register_type, register.register_type)
+                )]
+                if register.court and len(candidates) > 1:
+                    court = COURT_PREFIX_PATTERN.sub("", register.court.strip()).casefold()
+                    candidates = [candidate for candidate in candidates if court in candidate.split("|")[0]]
+            else:
+                name = " ".join((data.get("name") or "").split()).casefold()
+                match = _match_query(name, "name")
+                candidates = [row[0] for row in conn.execute(
+                    "SELECT c.register_id, c.name FROM companies_fts JOIN companies c ON c.rowid = companies_fts.rowid WHERE companies_fts MATCH ?",
+                    (match,)
+                ) if " ".join(row[1].split()).casefold() == name] if match else []
+            if len(candidates) != 1:
+                return None
+            conn.execute(
+                "UPDATE companies SET managers = ?, address = ?, pdf_path = ?, extracted_at = ? WHERE register_id = ?",
+                (json.dumps(data.get("managers") or [], ensure_ascii=False), data.get("address"), pdf_path, self._clock(), candidates[0])
+            )
+        return candidates[0]
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        city: Optional[str] = None,
+        register: Optional[RegisterNumber] = None,
+        max_age: Optional[float] = None,
+        limit: int = 20
+    ) -> List[IndexedCompany]:
+        """
+        Searches the index, all given criteria have to match.
+
+        Args:
+            text (Optional[str]): Words of the current or a former name, each one matches as a prefix ("gasag berl").
+            city (Optional[str]): Words of the (current or former) seat.
+            register (Optional[RegisterNumber]): The register entry, the court is only compared if it is given by name.
+            max_age (Optional[float]): Only return companies that have been seen in a result table within this many seconds.
+            limit (int): Maximum number of returned companies.
+
+        Returns:
+            List[IndexedCompany]: The best matches first.
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        match_parts = [part for part in (_match_query(text or "", "name history"), _match_query(city or "", "seat history")) if part]
+        if match_parts:
+            conditions.append("companies_fts MATCH ?")
+            params.append(" AND ".join(match_parts))
+        if register is not None:
+            conditions.append("c.register_number = ?")
+            params.append(register.number)
+            if register.register_type:
+                conditions.append("c.register_type = ?")
+                params.append(register.register_type)
+            if register.court and not re.fullmatch(r"[A-Z]\d{4}[A-Z]?", register.court.strip()):
+                conditions.append("c.court LIKE ?")
+                params.append("%%%s%%" % COURT_PREFIX_PATTERN.sub("", register.court.strip()))
+        if max_age is not None:
+            conditions.append("c.seen_at >= ?")
+            params.append(self._clock() - max_age)
+
+        if match_parts:
+            sql = "SELECT c.* FROM companies_fts JOIN companies c ON c.rowid = companies_fts.rowid WHERE %s ORDER BY bm25(companies_fts, 10.0, 2.0, 1.0, 1.0) LIMIT ?"
+        else:
+            sql = "SELECT c.* FROM companies c WHERE %s ORDER BY c.seen_at DESC LIMIT ?"
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(sql % (" AND ".join(conditions) or "1"), (*params, limit)).fetchall()
+        return [self._to_company(row) for row in rows]
+
+    def find_extracted(self, name: Optional[str] = None, city: Optional[str] = None, register: Optional[RegisterNumber] = None) -> Optional[IndexedCompany]:
+        """
+        Finds the company of a lookup whose document has been extracted within `max_age` seconds, so that the lookup can be
+        answered without the portal. Only an unambiguous match counts: the register entry or, without one, the current name.
+
+        Args:
+            name (Optional[str]): The searched company name, has to equal the current name (ignoring case and whitespace).
+            city (Optional[str]): Words of the seat.
+            register (Optional[RegisterNumber]): The register entry.
+
+        Returns:
+            Optional[IndexedCompany]: The company or None if the portal has to be asked.
+        """
+        if register is not None:
+            candidates = self.search(city=city, register=register, limit=2)
+        elif name and name.strip():
+            wanted = " ".join(name.split()).casefold()
+            candidates = [
+                company for company in self.search(name, city, limit=20)
+                if " ".join(company.name.split()).casefold() == wanted
+            ]
+        else:
+            return None
+        if len(candidates) != 1:
+            return None
+        company = candidates[0]
+        if company.extracted_at is None or company.managers is None or self._clock() - company.extracted_at > self.max_age:
+            return None
+        return company
+
+    def get(self, register_id: str) -> Optional[IndexedCompany]:
+        """
+        Args:
+            register_id (str): The key of the company, see `register_id_of_row`.
+
+        Returns:
+            Optional[IndexedCompany]: The company or None if it is not part of the index.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM companies WHERE register_id = ?", (register_id,)).fetchone()
+        return self._to_company(row) if row else None
+
+    @staticmethod
+    def _to_company(row: sqlite3.Row) -> IndexedCompany:
+        return IndexedCompany(
+            register_id=row["register_id"],
+            name=row["name"],
+            court=row["court"],
+            register_type=row["register_type"],
+            register_number=row["register_number"],
+            state=row["state"],
+            seat=row["seat"],
+            status=row["status"],
+            history=[tuple(entry) for entry in json.loads(row["history"])],
+            managers=json.loads(row["managers"]) if row["managers"] is not None else None,
+            address=row["address"],
+            pdf_path=row["pdf_path"],
+            seen_at=row["seen_at"],
+            extracted_at=row["extracted_at"]
+        )
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Handelsregister company index",
+        description="Durchsucht den lokalen Index aller bisher gesehenen Firmen, ohne das Portal abzufragen."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("search", help="Search the index")
+    search.add_argument("text", nargs="?", help="Words of the current or a former name")
+    search.add_argument("-ci", "--city", help="Words of the seat")
+    search.add_argument("-n", "--registerNummer", help="Register entry, e.g. 'HRB 44343, Charlottenburg'")
+    search.add_argument("--max-age", help="Only companies seen within this many days", type=float)
+    search.add_argument("-l", "--limit", help="Maximum number of results", type=int, default=20)
+    commands.add_parser("stats", help="Show the number of indexed companies")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_cli_arguments()
+    index = CompanyIndex()
+    if args.command == "stats":
+        print(json.dumps({"companies": len(index), "db_path": str(index.db_path)}))
+    else:
+        companies = index.search(
+            args.text,
+            args.city,
+            parse_register_number(args.registerNummer) if args.registerNummer else None,
+            args.max_age * 24 * 3600 if args.max_age is not None else None,
+            args.limit
+        )
+        for company in companies:
+            print(json.dumps(asdict(company), ensure_ascii=False))
+        sys.exit(0 if companies else 1)
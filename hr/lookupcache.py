@@ -0,0 +1,200 @@
+# Persistent cache for the results of the pysil lookups.
+# Every cache hit saves a browser session and a slot of the 60 retrievals per hour, so repeated lookups of the same company
+# are answered from a local SQLite database instead of the portal. Use -f/--force to skip the cache for a single lookup.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600.0
+DEFAULT_MAX_ENTRIES = 10000
+
+def default_cache_db_path() -> Path:
+    """
+    Location of the lookup cache. Can be overwritten with the HR_CACHE_DB environment variable.
+
+    Returns:
+        Path: The path of the SQLite database file.
+    """
+    configured = os.environ.get("HR_CACHE_DB")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".cache" / "handelsregister" / "lookups.sqlite3"
+
+def _normalize_text(value: Optional[str]) -> str:
+    # Case and whitespace differences do not change the result of the portal search.
+    return " ".join((value or "").split()).casefold()
+
+def normalize_query(s: str, so: str, sa: bool, sg: bool, ci: Optional[str], st: Optional[str], po: Optional[str], rn: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Creates the normalized form of a lookup query, so that equivalent queries share one cache entry.
+
+    Args:
+        s (str): the search term (i.e. name of the company)
+        so (str): search options - "all", "exact" or "min"
+        sa (bool): if phonetically similar sounding results should get returned, too.
+        sg (bool): if already deleted entries should get returned, too.
+        ci (Optional[str]): the name of the city
+        st (Optional[str]): the name of the street (and possibly the house number)
+        po (Optional[str]): the post code of the city
+        rn (Optional[str]): the register entry of an exact lookup, e.g. "HRB 44343, Charlottenburg"
+
+    Returns:
+        Dict[str, Any]: The normalized query.
+    """
+    query = {
+        "s": _normalize_text(s),
+        "so": so or "all",
+        "sa": bool(sa),
+        "sg": bool(sg),
+        "ci": _normalize_text(ci),
+        "st": _normalize_text(st),
+        "po": (po or "").replace(" ", "")
+    }
+    # Only part of the key if given, so that the keys of the name searches stay the same.
+    if rn:
+        query["rn"] = _normalize_text(rn)
+    return query
+
+def query_key(query: Dict[str, Any]) -> str:
+    """
+    Creates the cache key of a normalized query.
+
+    Args:
+        query (Dict[str, Any]): The query that was created by `normalize_query`.
+
+    Returns:
+        str: The hex digest that identifies the query.
+    """
+    return hashlib.sha256(json.dumps(query, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def is_empty_result(result: Dict[str, Any]) -> bool:
+    """
+    Checks if an extraction found neither the name nor the managers of the company, e.g. because the document could not be
+    read. Such a result must not be cached, the next lookup would return it for a week instead of trying again.
+
+    Args:
+        result (Dict[str, Any]): The extracted {managers, name, address} of the company.
+
+    Returns:
+        bool: True if the result contains no name and no managers.
+    """
+    return not (result.get("name") or "").strip() and not result.get("managers")
+
+@dataclass
+class CacheEntry:
+    result: Dict[str, Any] # The extracted {managers, name, address} of the company.
+    pdf_path: Optional[str] # The document the result was extracted from.
+    stored_at: float
+
+class LookupCache:
+    """
+    SQLite backed cache from normalized lookup queries to their extracted results.
+    Entries expire after `ttl` seconds and the least recently used ones get evicted once more than `max_entries` are stored.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            db_path (Optional[Path]): The database file. Defaults to `default_cache_db_path()`.
+            ttl (float): Number of seconds an entry stays valid.
+            max_entries (int): Maximum number of stored entries.
+            clock (Callable[[], float]): Source of the current unix time.
+        """
+        self.db_path = Path(db_path) if db_path else default_cache_db_path()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lookups (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    pdf_path TEXT,
+                    stored_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS lookups_last_access ON lookups (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        # Commits (or rolls back) the transaction and closes the connection again.
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, query: Dict[str, Any]) -> Optional[CacheEntry]:
+        """
+        Looks up the result of a query. Expired entries are removed instead of returned.
+
+        Args:
+            query (Dict[str, Any]): The query that was created by `normalize_query`.
+
+        Returns:
+            Optional[CacheEntry]: The cached entry or None on a cache miss.
+        """
+        key = query_key(query)
+        now = self._clock()
+        with self._connect() as conn:
+            row = conn.execute("SELECT result, pdf_path, stored_at FROM lookups WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl:
+                conn.execute("DELETE FROM lookups WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE lookups SET last_access = ? WHERE key = ?", (now, key))
+        return CacheEntry(result=json.loads(row[0]), pdf_path=row[1], stored_at=row[2])
+
+    def put(self, query: Dict[str, Any], result: Dict[str, Any], pdf_path: Optional[str] = None) -> None:
+        """
+        Stores the result of a query and evicts the least recently used entries if the cache is full.
+
+        Args:
+            query (Dict[str, Any]): The query that was created by `normalize_query`.
+            result (Dict[str, Any]): The extracted {managers, name, address} of the company.
+            pdf_path (Optional[str]): The document the result was extracted from.
+        """
+        now = self._clock()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lookups (key, query, result, pdf_path, stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (query_key(query), json.dumps(query, ensure_ascii=False), json.dumps(result, ensure_ascii=False), pdf_path, now, now)
+            )
+            conn.execute("DELETE FROM lookups WHERE stored_at < ?", (now - self.ttl,))
+            conn.execute("""
+                DELETE FROM lookups WHERE key IN (
+                    SELECT key FROM lookups ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def invalidate(self, query: Dict[str, Any]) -> None:
+        """
+        Removes the entry of a query.
+
+        Args:
+            query (Dict[str, Any]): The query that was created by `normalize_query`.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM lookups WHERE key = ?", (query_key(query),))
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
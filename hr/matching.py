@@ -0,0 +1,232 @@
+# Fuzzy matching of company names against the rows of a result table.
+# The portal returns every company whose name contains (or, with the similar search, sounds like) the search term, so the
+# first row that merely contains the term is often the wrong one: umlauts are written out ("Mueller"), legal forms are
+# spelled differently ("Gesellschaft mit beschränkter Haftung" vs. "GmbH") and larger companies come with many
+# subsidiaries of similar names. Instead, all candidate rows get scored and only the best one gets downloaded.
+
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Minimum score of a row to be downloaded at all.
+MIN_SCORE = 0.8
+# Score of two different spellings with the same Kölner Phonetik code ("Meier" and "Mayer").
+PHONETIC_SCORE = 0.9
+# Score of a row whose name starts with the search term ("Testfir" and "Testfirma").
+PREFIX_SCORE = 0.9
+# Weight of the words of the row that are not part of the search term ("Testfirma Nord" for "Testfirma").
+EXTRA_WORDS_WEIGHT = 0.2
+# Factor for a row with another legal form than the one of the search term ("Testfirma AG" for "Testfirma GmbH").
+LEGAL_FORM_MISMATCH = 0.85
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Spellings of the legal forms and their canonical short form, the longer forms first.
+LEGAL_FORMS: Tuple[Tuple[str, str], ...] = (
+    (r"gmbh\s*(?:&|und)\s*co\.?\s*kg", "gmbh & co kg"),
+    (r"ug\s*\(?haftungsbeschraenkt\)?|unternehmergesellschaft\s*\(?haftungsbeschraenkt\)?", "ug"),
+    (r"gesellschaft mit beschraenkter haftung|g\.\s*m\.\s*b\.\s*h\.?|gmbh|mbh", "gmbh"),
+    (r"kommanditgesellschaft auf aktien|kgaa", "kgaa"),
+    (r"aktiengesellschaft|ag", "ag"),
+    (r"kommanditgesellschaft|kg", "kg"),
+    (r"offene handelsgesellschaft|ohg", "ohg"),
+    (r"eingetragene[rn]? (?:kaufmann|kauffrau)|e\.\s*(?:kfm|kfr|k)\.?", "ek"),
+    (r"eingetragene[rn]? verein|e\.\s*v\.?", "ev"),
+    (r"eingetragene genossenschaft|eg", "eg"),
+    (r"partnerschaftsgesellschaft(?: mbb)?|partg(?: mbb)?", "partg"),
+    (r"societas europaea|se", "se"),
+)
+LEGAL_FORM_PATTERN = re.compile(
+    "|".join(r"(?P<f%d>(?<!\w)(?:%s)(?!\w))" % (i, pattern) for i, (pattern, _) in enumerate(LEGAL_FORMS))
+)
+
+# Codes of the Kölner Phonetik that do not depend on the neighbouring letters.
+_PHONETIC_CODES: Dict[str, str] = {
+    **dict.fromkeys("aeijouy", "0"), "b": "1", **dict.fromkeys("fvw", "3"), **dict.fromkeys("gkq", "4"),
+    "l": "5", **dict.fromkeys("mn", "6"), "r": "7", **dict.fromkeys("sz", "8")
+}
+
+def fold(text: str) -> str:
+    """
+    Case- and umlaut-insensitive form of a text, "Müller" and "MUELLER" both become "mueller".
+
+    Args:
+        text (str): Any text.
+
+    Returns:
+        str: The folded text with collapsed whitespace.
+    """
+    return " ".join(text.casefold().translate(UMLAUTS).split())
+
+@lru_cache(maxsize=4096)
+def cologne_phonetic(word: str) -> str:
+    """
+    Kölner Phonetik of a word, the phonetic code the similar search of the portal is based on.
+    Letters that sound alike get the same digit, e.g. "Wikipedia" -> "3412" and "Müller-Lüdenscheidt" -> "65752682".
+
+    Args:
+        word (str): The word, characters other than letters are ignored.
+
+    Returns:
+        str: The code, empty if the word contains no letters.
+    """
+    letters = [c for c in word.casefold().translate(UMLAUTS) if "a" <= c <= "z"]
+    codes = []
+    for i, c in enumerate(letters):
+        before = letters[i - 1] if i else ""
+        after = letters[i + 1] if i + 1 < len(letters) else ""
+        if c == "h":
+            continue
+        if c == "p":
+            code = "3" if after == "h" else "1"
+        elif c in "dt":
+            code = "8" if after in ("c", "s", "z") else "2"
+        elif c == "c":
+            if i == 0:
+                code = "4" if after in ("a", "h", "k", "l", "o", "q", "r", "u", "x") else "8"
+            else:
+                code = "4" if after in ("a", "h", "k", "o", "q", "u", "x") and before not in ("s", "z") else "8"
+        elif c == "x":
+            code = "8" if before in ("c", "k", "q") else "48"
+        else:
+            code = _PHONETIC_CODES[c]
+        codes.append(code)
+
+    # Repeated digits are collapsed, vowels are only kept at the start.
+    collapsed: List[str] = []
+    for digit in "".join(codes):
+        if not collapsed or collapsed[-1] != digit:
+            collapsed.append(digit)
+    return "".join(d for i, d in enumerate(collapsed) if d != "0" or i == 0)
+
+def split_legal_form(name: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Splits a company name into the (folded) words of its name and its legal form.
+
+    Args:
+        name (str): The company name, e.g. "Müller Bau Gesellschaft mit beschränkter Haftung".
+
+    Returns:
+        Tuple[List[str], Optional[str]]: The words (["mueller", "bau"]) and the canonical legal form ("gmbh"), which is None
+            if the name does not contain one.
+    """
+    folded = fold(name)
+    legal_form = None
+    for match in LEGAL_FORM_PATTERN.finditer(folded):
+        # The legal form is usually at the end, so the last one wins.
+        legal_form = LEGAL_FORMS[int(match.lastgroup[1:])][1]
+    words = TOKEN_PATTERN.findall(LEGAL_FORM_PATTERN.sub(" ", folded))
+    return words, legal_form
+
+@lru_cache(maxsize=16384)
+def token_similarity(a: str, b: str) -> float:
+    """
+    Similarity of two folded words.
+
+    Args:
+        a (str): The word of the search term.
+        b (str): The word of the candidate.
+
+    Returns:
+        float: 1.0 for the same word, PHONETIC_SCORE for the same sound, PREFIX_SCORE if `b` starts with `a` and otherwise
+            the ratio of the matching characters (0.0 - 1.0).
+    """
+    if a == b:
+        return 1.0
+    if a.isdigit() or b.isdigit():
+        # Numbers in names ("Objekt 12" and "Objekt 13") are either the same or different.
+        return 0.0
+    score = SequenceMatcher(None, a, b).ratio()
+    if len(a) >= 3 and b.startswith(a):
+        score = max(score, PREFIX_SCORE)
+    code = cologne_phonetic(a)
+    if code and code == cologne_phonetic(b):
+        score = max(score, PHONETIC_SCORE)
+    return score
+
+def _coverage(words: Sequence[str], others: Sequence[str]) -> float:
+    # Mean of the best similarity of every word to any of the other words.
+    if not words:
+        return 1.0
+    if not others:
+        return 0.0
+    return sum(max(token_similarity(word, other) for other in others) for word in words) / len(words)
+
+class NameMatcher:
+    """
+    Scores candidates against one search term (and city). The search term is only prepared once, so all rows of a result
+    table can be scored in one go.
+    """
+
+    def __init__(self, s: str, ci: Optional[str] = None):
+        """
+        Args:
+            s (str): the search term (i.e. name of the company)
+            ci (Optional[str]): the name of the city, rows with another seat score 0.
+        """
+        self.words, self.legal_form = split_legal_form(s)
+        self.city_words = TOKEN_PATTERN.findall(fold(ci)) if ci else []
+
+    def score(self, name: str, seat: str = "") -> float:
+        """
+        Args:
+            name (str): The company name of the candidate.
+            seat (str): The seat of the candidate.
+
+        Returns:
+            float: 0.0 (no match) to 1.0 (same name, same legal form and in the city).
+        """
+        if self.city_words and _coverage(self.city_words, TOKEN_PATTERN.findall(fold(seat))) < MIN_SCORE:
+            return 0.0
+        words, legal_form = split_legal_form(name)
+        if not self.words:
+            # The search term is only a legal form (or empty), the legal form decides alone.
+            return 1.0 if self.legal_form is None or legal_form == self.legal_form else 0.0
+        score = (1 - EXTRA_WORDS_WEIGHT) * _coverage(self.words, words) + EXTRA_WORDS_WEIGHT * _coverage(words, self.words)
+        if self.legal_form and legal_form and legal_form != self.legal_form:
+            score *= LEGAL_FORM_MISMATCH
+        return score
+
+    def score_all(self, candidates: Iterable[Tuple[str, str]]) -> List[float]:
+        """
+        Args:
+            candidates (Iterable[Tuple[str, str]]): The (name, seat) of every candidate.
+
+        Returns:
+            List[float]: The scores in the order of the candidates.
+        """
+        return [self.score(name, seat) for name, seat in candidates]
+
+    def best(self, candidates: Iterable[Tuple[str, str]], min_score: float = MIN_SCORE) -> Optional[int]:
+        """
+        Args:
+            candidates (Iterable[Tuple[str, str]]): The (name, seat) of every candidate.
+            min_score (float): Candidates with a lower score are never returned.
+
+        Returns:
+            Optional[int]: The index of the best candidate (the first one of equally good ones) or None.
+        """
+        best_index, best_score = None, min_score
+        for i, score in enumerate(self.score_all(candidates)):
+            if score > best_score or (best_index is None and score == best_score):
+                best_index, best_score = i, score
+        return best_index
+
+def rank_rows(rows: Sequence[Dict[str, str]], s: str, ci: Optional[str] = None, min_score: float = MIN_SCORE) -> List[Tuple[int, float]]:
+    """
+    Ranks the parsed rows of a result table, see `get_companies_in_searchresults`.
+
+    Args:
+        rows (Sequence[Dict[str, str]]): The rows with their "name" and "state" (seat).
+        s (str): the search term (i.e. name of the company)
+        ci (Optional[str]): the name of the city
+        min_score (float): Rows with a lower score are left out.
+
+    Returns:
+        List[Tuple[int, float]]: The (index, score) of the matching rows, the best one first.
+    """
+    scores = NameMatcher(s, ci).score_all((row.get("name", ""), row.get("state", "")) for row in rows)
+    ranked = [(i, score) for i, score in enumerate(scores) if score >= min_score]
+    return sorted(ranked, key=lambda entry: -entry[1])
@@ -0,0 +1,157 @@
+# Asyncio pipeline for batches of lookups.
+# A single lookup is strictly sequential (search, download, extract, print), so the CPU bound extraction of one document
+# and the waiting for the portal never overlap. The pipeline splits the batch into stages that are connected by bounded
+# queues: while the extraction of a document runs in a worker process, the next search is already in flight.
+#
+#   queries -> [fetch] -> [extract] -> [emit]
+#
+# fetch:   search and download of the document (blocking Selenium calls, run in a thread per browser). Both happen in the
+#          same browser session, so they are one stage; a cache hit skips the portal and the extraction.
+# extract: PyMuPDF extraction in a process pool. The blocking cache/index writes of `on_result` run in a separate thread,
+#          so the event loop keeps serving the other stages meanwhile.
+# emit:    cache/index updates and the output, in the order in which the lookups finish.
+#
+# The queues hold at most `queue_size` items each, so a slow stage stops the ones in front of it instead of letting
+# downloaded documents pile up: the memory stays flat on long batches.
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from batch import BatchQuery, BatchSummary, record_result
+from pyutil import extract_company_data_from_pdf
+
+DEFAULT_QUEUE_SIZE = 4
+
+class Fetched(NamedTuple):
+    pdf_path: Optional[Path] = None # The downloaded document, None if nothing was found.
+    result: Optional[dict] = None # An already known result (e.g. from the cache), nothing needs to be extracted then.
+    register_id: Optional[str] = None # The company of the row the document was downloaded from, see `index.register_id_of_row`.
+
+def extract_lookup_result(pdf_path: str) -> dict:
+    """
+    Extracts the {managers, name, address} of a document, like `pysil.build_lookup_result`.
+    Runs in the worker processes of the extract stage, so it has to stay a picklable module level function.
+
+    Args:
+        pdf_path (str): The path of the document.
+
+    Returns:
+        dict: Dictionary containing the managers, the name and the address of the company.
+    """
+    data = extract_company_data_from_pdf(pdf_path)
+    return {"managers": data.ceos, "name": data.name, "address": data.address}
+
+@dataclass
+class _Job:
+    batch_query: BatchQuery
+    fetched: Fetched = Fetched()
+    result: Optional[dict] = None
+    error: Optional[BaseException] = None
+
+async def run_pipeline(
+    queries: List[BatchQuery],
+    fetch: Callable[[BatchQuery], Fetched],
+    emit: Callable[[Dict[str, Any]], None],
+    report: Callable[[Dict[str, Any]], None],
+    extract: Callable[[str], dict] = extract_lookup_result,
+    on_result: Optional[Callable[[BatchQuery, Fetched, dict], None]] = None,
+    duplicates: int = 0,
+    fetch_workers: int = 1,
+    extract_workers: int = 2,
+    extract_executor: Optional[Executor] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE
+) -> BatchSummary:
+    """
+    Looks up all queries with overlapping stages and emits each result as soon as it is available.
+    A failing lookup is reported and does not stop the batch.
+
+    Args:
+        queries (List[BatchQuery]): The unique queries (see `batch.collect_queries`).
+        fetch (Callable[[BatchQuery], Fetched]): Blocking search and download of a query, runs in one of `fetch_workers` threads.
+        emit (Callable[[Dict[str, Any]], None]): Receives one result object per query, see `batch.record_result`.
+        report (Callable[[Dict[str, Any]], None]): Receives the progress and failure events.
+        extract (Callable[[str], dict]): Extraction of a downloaded document, runs in the extract executor.
+        on_result (Optional[Callable[[BatchQuery, Fetched, dict], None]]): Called with the fetched document and every newly
+            extracted result (e.g. to fill the lookup cache) before it is emitted. Runs in a single worker thread, so it may block but the calls
+            never overlap.
+        duplicates (int): Number of skipped duplicates, only used for the summary.
+        fetch_workers (int): Number of lookups that talk to the portal at the same time (i.e. the number of browsers).
+        extract_workers (int): Number of documents that get extracted at the same time.
+        extract_executor (Optional[Executor]): Executor for `extract`. A process pool with `extract_workers` processes is used
+            (and shut down afterwards) if None.
+        queue_size (int): Maximum number of jobs that wait in front of every stage.
+
+    Returns:
+        BatchSummary: The counters of the finished batch.
+    """
+    loop = asyncio.get_running_loop()
+    summary = BatchSummary(total=len(queries), duplicates=duplicates)
+    fetch_queue: asyncio.Queue = asyncio.Queue(queue_size)
+    extract_queue: asyncio.Queue = asyncio.Queue(queue_size)
+    emit_queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+    fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="hr-fetch")
+    store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hr-store")
+    own_extract_executor = extract_executor is None
+    if extract_executor is None:
+        extract_executor = ProcessPoolExecutor(max_workers=extract_workers)
+
+    async def produce() -> None:
+        for batch_query in queries:
+            await fetch_queue.put(_Job(batch_query))
+        for _ in range(fetch_workers):
+            await fetch_queue.put(None)
+
+    async def fetch_stage() -> None:
+        while (job := await fetch_queue.get()) is not None:
+            try:
+                job.fetched = await loop.run_in_executor(fetch_executor, fetch, job.batch_query)
+                job.result = job.fetched.result
+            except Exception as e:
+                job.error = e
+            await extract_queue.put(job)
+
+    async def extract_stage() -> None:
+        while (job := await extract_queue.get()) is not None:
+            if job.error is None and job.result is None and job.fetched.pdf_path is not None:
+                try:
+                    job.result = await loop.run_in_executor(extract_executor, extract, str(job.fetched.pdf_path))
+                    if on_result is not None:
+                        await loop.run_in_executor(store_executor, on_result, job.batch_query, job.fetched, job.result)
+                except Exception as e:
+                    job.error = e
+            await emit_queue.put(job)
+
+    async def emit_stage() -> None:
+        while (job := await emit_queue.get()) is not None:
+            record_result(summary, job.batch_query, emit, report, result=job.result, error=job.error)
+
+    async def fetchers() -> None:
+        await asyncio.gather(*(fetch_stage() for _ in range(fetch_workers)))
+        for _ in range(extract_workers):
+            await extract_queue.put(None)
+
+    async def extractors() -> None:
+        await asyncio.gather(*(extract_stage() for _ in range(extract_workers)))
+        await emit_queue.put(None)
+
+    try:
+        await asyncio.gather(produce(), fetchers(), extractors(), emit_stage())
+    finally:
+        fetch_executor.shutdown(wait=True, cancel_futures=True)
+        store_executor.shutdown(wait=True)
+        if own_extract_executor:
+            extract_executor.shutdown(wait=True, cancel_futures=True)
+    return summary
+
+def run_batch_pipeline(queries: List[BatchQuery], fetch: Callable[[BatchQuery], Fetched], emit: Callable[[Dict[str, Any]], None], report: Callable[[Dict[str, Any]], None], **kwargs: Any) -> BatchSummary:
+    """
+    Blocking wrapper around `run_pipeline` for callers without an event loop, takes the same arguments.
+
+    Returns:
+        BatchSummary: The counters of the finished batch.
+    """
+    return asyncio.run(run_pipeline(queries, fetch, emit, report, **kwargs))
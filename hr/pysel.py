@@ -4,10 +4,14 @@ from pyutil import extract_company_data_from_pdf
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
+from chromedriver import start_with_pinned_driver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
+from quota import portal_quota
+from handelsregister import REGISTER_TYPES, parse_register_number, register_matches
+from pysil import fill_register_fields
+from waits import is_partial_download, snapshot_dir, wait_for_ajax_idle, wait_for_download
 import time
 from pathlib import Path,PurePath
 import argparse
@@ -82,7 +86,20 @@ def parse_cli_arguments():
     parser.add_argument(
         "-n",
         "--registerNummer",
-        help="Add registry number to improve search results",
+        help="Registry number (e.g. 'HRB 44343' or 'HRB 44343, Charlottenburg'), looks up exactly this entry instead of searching by name",
+        required=False
+    )
+    parser.add_argument(
+        "-ra",
+        "--registerArt",
+        help="Register type of the registry number, if it is not part of it.",
+        choices=REGISTER_TYPES,
+        required=False
+    )
+    parser.add_argument(
+        "-rg",
+        "--registerGericht",
+        help="Register court (name like 'Charlottenburg' or code like 'F1103R') of the registry number, if it is not part of it.",
         required=False
     )
     parser.add_argument(
@@ -114,7 +131,7 @@ def parse_cli_arguments():
 
     return args
 
-def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
+def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po, register=None):
     """Function to fetch and download a specific data request/response from the handelsregister bundesAPI.
     Currently only decorative for checking on the way that the input gets passed along.
 
@@ -126,7 +143,10 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
         ci (str): the name of the city
         st (str): the name of the street (and possibly the house number)
         po (str): the post code of the city
+        register (Optional[RegisterNumber]): look up exactly this register entry instead of searching by name.
     """
+    downloaded_file = None
+
     # Save each entry into its own download folder.
     dl_path = Path.joinpath(Path.cwd(),"download", s)
     print("DOWNLOADPATH = ", dl_path)
@@ -155,15 +175,21 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
     })
 
     try:
-        # Webdriver-manager loads the appropriate driver or uses a cached one.
-        service = ChromeService(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        print("WebDriver erfolgreich mit webdriver-manager initialisiert.")
+        # The pinned driver of the manifest, see chromedriver.py. It is resolved again once if Chrome no longer accepts it.
+        driver = start_with_pinned_driver(lambda path: webdriver.Chrome(service=ChromeService(path), options=chrome_options))
+        print("WebDriver erfolgreich initialisiert.")
     except Exception as e:
-        print(f"Fehler beim Initialisieren des WebDrivers mit webdriver-manager: {e}")
+        print(f"Fehler beim Initialisieren des WebDrivers: {e}")
         exit()
 
     try:
+        # Every search counts against the shared quota of 60 retrievals per hour. Blocks until a slot is free.
+        quota = portal_quota()
+        start_at = quota.estimate()
+        if start_at > time.time():
+            print(f"Kontingent ausgeschöpft, die Suche startet um {time.strftime('%H:%M:%S', time.localtime(start_at))}...")
+        quota.acquire()
+
         # Trying to get the elements via their IDs.
         driver.get("https://www.handelsregister.de/rp_web/welcome.xhtml")
         target_class_selector = "a.ui-commandlink.ui-widget.dokumentList"
@@ -203,7 +229,10 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
         wait = WebDriverWait(driver, 10)
         try:
             text_box = wait.until(EC.element_to_be_clickable((By.ID, search_terms)))
-            text_box.send_keys(s)
+            if register is None:
+                text_box.send_keys(s)
+            else:
+                print(f"Exakte Suche nach {register}, der Suchbegriff wird nicht verwendet.")
         except TimeoutException:
             print("Es wurde nicht rechtzeitig eine Textbox für die Eingabe von Suchbegriffen gefunden.")
             text_box = ""
@@ -215,7 +244,7 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 EC.element_to_be_clickable((By.CSS_SELECTOR, f"label[for='{search_options}']"))
             )
             radioBtnLabel.click()
-            time.sleep(2)
+            wait_for_ajax_idle(driver) # Wait till the AJAX update of the widget change is done.
         except TimeoutException:
             print("Es wurde nicht rechtzeitig ein klickbarer Radiobutton für die Eingabe von Suchoptionen gefunden.")
             radioBtnLabel = ""
@@ -232,7 +261,7 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 similar_checkbox_container = wait.until(EC.element_to_be_clickable((By.ID, "form:aenlichLautendeSchlagwoerterBoolChkbox")))
                 if (sa == True):
                     similar_checkbox_container.click() # select deselected if we want to search for similar!
-            time.sleep(2)
+            wait_for_ajax_idle(driver) # Wait till the AJAX update of the widget change is done.
         except TimeoutException:
             print("Es wurde nicht rechtzeitig eine klickbare Checkbox für die Auswahl zur Suche von ähnlich klingenden Einträgen gefunden.")
             similar_checkbox_container = ""
@@ -249,7 +278,7 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 deleted_checkbox_container = wait.until(EC.element_to_be_clickable((By.ID, "form:auchGeloeschte")))
                 if (sg == True):
                     deleted_checkbox_container.click() # select deselected if we want to search for deleted entries!
-            time.sleep(2)
+            wait_for_ajax_idle(driver) # Wait till the AJAX update of the widget change is done.
         except TimeoutException:
             print("Es wurde nicht rechtzeitig eine klickbare Checkbox für die Auswahl zur Suche von bereits gelöschten Einträgen gefunden.")
             deleted_checkbox_container = ""
@@ -284,6 +313,10 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
         except TimeoutException:
             print("Es wurde nicht rechtzeitig eine Textbox für die Straßennameneingabe gefunden.")
             strt = ""
+
+    # Fill in the register type, number and court for an exact lookup.
+        if register is not None:
+            fill_register_fields(driver, register)
         
 
         wait = WebDriverWait(driver, 10)
@@ -328,6 +361,11 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                     name_matches = s.lower() in row_company_name.lower()
                     # City is optional, but has to get handled differently.
                     city_matches = (ci.lower() in row_company_location.lower()) if ci else True
+                    if register is not None:
+                        # The row of an exact lookup only has to belong to the register entry. Only its court cell (the
+                        # second one) is checked, the company name in the text of the whole row could look like a suffix.
+                        court_cell = row.find_elements(By.TAG_NAME, "td")[1].text
+                        name_matches = city_matches = register_matches(court_cell, register)
 
                     if name_matches and city_matches:
                         print(f"✔️ Passende Zeile gefunden!")
@@ -338,9 +376,16 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                         ad_link = row.find_element(By.CSS_SELECTOR, ad_link_selector)
                         
                         print("Klicke 'AD'-Link zum Download...")
+                        # The document retrieval counts against the quota as well.
+                        portal_quota().acquire()
+                        existing_files = snapshot_dir(dl_path)
                         wait.until(EC.element_to_be_clickable(ad_link)).click()
-                        
-                        time.sleep(3) # Short pause to allow the download to finish.
+
+                        # Wait till the browser finalized the document instead of hoping that a fixed pause is long enough.
+                        try:
+                            downloaded_file = wait_for_download(dl_path, existing_files)
+                        except TimeoutError as e:
+                            print(f"\n❌ {e}")
                         break 
 
                 except Exception as e:
@@ -364,15 +409,17 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
         if Path("temp_page.html").exists():
             Path("temp_page.html").unlink()
             
-        downloaded_files = list(Path(dl_path).iterdir())
-        if not downloaded_files:
-            print(f"Fehler: Download fehlgeschlagen. Keine Datei im Verzeichnis '{dl_path}' gefunden.")
-            return # End the function here if nothing was found.
+        # Fall back to a document of an earlier run, if nothing new got downloaded. Unfinished downloads are never used.
+        if downloaded_file is None:
+            downloaded_files = [p for p in Path(dl_path).iterdir() if not is_partial_download(p)]
+            if not downloaded_files:
+                print(f"Fehler: Download fehlgeschlagen. Keine Datei im Verzeichnis '{dl_path}' gefunden.")
+                return # End the function here if nothing was found.
+            downloaded_file = downloaded_files[0]
 
         # Continue here if data was found.
         print("\nDaten wurden heruntergeladen. Extrahieren der Geschäftsführer und Prokuristen wird gestartet...")
-        pdfFileName = downloaded_files[0]
-        pdfFilePath = PurePath.joinpath(dl_path, pdfFileName)
+        pdfFilePath = PurePath.joinpath(dl_path, downloaded_file)
         print("\nEs wird versucht die Daten von " + str(pdfFilePath) + " zu laden...")
         companyData = extract_company_data_from_pdf(str(pdfFilePath))
         managers = companyData.ceos
@@ -411,5 +458,6 @@ if __name__ == "__main__":
         args.sucheGeloeschte,
         args.city,
         args.street,
-        args.postCode
+        args.postCode,
+        parse_register_number(args.registerNummer, args.registerArt, args.registerGericht)
     )
\ No newline at end of file
@@ -1,21 +1,69 @@
 # Selenium/Python powered stand-alone module to provide convenient programmatic access the bundesAPI WebSearch.
+import hashlib
 import json
+import os
+import sqlite3
 import sys
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+from lookupcache import LookupCache, is_empty_result, normalize_query, query_key
+from index import CompanyIndex, register_id_of_row
+from matching import NameMatcher
 from pyutil import create_company_folder_name, extract_company_data_from_pdf
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-import time
-from pathlib import Path,PurePath
+from driverpool import DriverPool, create_chrome_driver
+from quota import portal_quota
+from handelsregister import (
+    REGISTER_COURT_FIELD, REGISTER_NUMBER_FIELD, REGISTER_TYPE_FIELD, REGISTER_TYPES, RESULTS_PER_PAGE, RESULTS_PER_PAGE_FIELD,
+    RegisterNumber, find_court_option, get_companies_in_searchresults, parse_register_number, register_matches
+)
+from waits import snapshot_dir, wait_for_ajax_idle, wait_for_download
+from store import DocumentStore, StoredDocument
+from timing import append_trace, default_trace_path, recording, span
+from pathlib import Path
 import argparse
 
 # ! PySel - Silent version. Adapted so that only the result gets printed to console in a predictable json format.
 # Contains the updated versions of the extraction methods that have been introduced via pyutil.py from imsMailVerify.
 # Needs to get called with the keyword argument syntax. This pairs each value to a specific key, which eleminates the need for correct order of params.
+# Selenium (and through pyutil/driverpool PyMuPDF, nameparser and webdriver-manager) is imported inside of the functions that
+# drive the browser, so `--help` and lookups that are answered from the cache start without loading them.
+
+# HR_PORTAL_URL points the lookups to another instance of rp_web, e.g. the local simulator of the benchmarks.
+PORTAL_START_URL = os.environ.get("HR_PORTAL_URL", "https://www.handelsregister.de/rp_web/").rstrip("/") + "/welcome.xhtml"
+RESULTS_TBODY_ID = "ergebnissForm:selectedSuchErgebnisFormTable_data"
+RESULT_ROWS_SELECTOR = "#ergebnissForm\\:selectedSuchErgebnisFormTable_data > tr[data-ri]"
+RESULT_PAGINATOR_NEXT_SELECTOR = "#ergebnissForm\\:selectedSuchErgebnisFormTable .ui-paginator-next"
+
+# Selects the largest page size of the (hidden) select behind the "Ergebnisse pro Seite" menu that does not exceed the wanted one.
+SELECT_PAGE_SIZE_SCRIPT = """
+var select = document.getElementById(arguments[0]);
+if (!select) { return null; }
+var best = null;
+for (var i = 0; i < select.options.length; i++) {
+    var size = parseInt(select.options[i].value, 10);
+    if (!isNaN(size) && size <= arguments[1] && (best === null || size > best)) { best = size; }
+}
+if (best !== null) { select.value = String(best); }
+return best;
+"""
+
+# Reads the (value, label) pairs of a select and sets the value of a select, used for the hidden selects behind the PrimeFaces menus.
+READ_OPTIONS_SCRIPT = """
+var select = document.getElementById(arguments[0]);
+if (!select) { return []; }
+var options = [];
+for (var i = 0; i < select.options.length; i++) { options.push([select.options[i].value, select.options[i].text]); }
+return options;
+"""
+SELECT_VALUE_SCRIPT = """
+var select = document.getElementById(arguments[0]);
+if (!select) { return false; }
+for (var i = 0; i < select.options.length; i++) {
+    if (select.options[i].value === arguments[1]) { select.value = arguments[1]; return true; }
+}
+return false;
+"""
 
 def parse_cli_arguments():
     """
@@ -45,6 +93,28 @@ def parse_cli_arguments():
         help="Force a fresh pull and skip the cache",
         action="store_true"
     )
+    parser.add_argument(
+        "-t",
+        "--timings",
+        help="Add the duration of every phase to the output and append it to the trace file",
+        action="store_true"
+    )
+    parser.add_argument(
+        "-m",
+        "--in-memory",
+        help="Fetch the AD document into memory and extract it from there instead of waiting for the download of the browser",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--no-persist",
+        help="With --in-memory: do not keep the document in the document store",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--trace-file",
+        help="JSONL file the timings get appended to (default: HR_TRACE_FILE or ~/.cache/handelsregister/timings.jsonl)",
+        required=False
+    )
     parser.add_argument(
         "-s",
         "--schlagwoerter",
@@ -80,7 +150,20 @@ def parse_cli_arguments():
     parser.add_argument(
         "-n",
         "--registerNummer",
-        help="Add registry number to improve search results",
+        help="Registry number (e.g. 'HRB 44343' or 'HRB 44343, Charlottenburg'), looks up exactly this entry instead of searching by name",
+        required=False
+    )
+    parser.add_argument(
+        "-ra",
+        "--registerArt",
+        help="Register type of the registry number, if it is not part of it.",
+        choices=REGISTER_TYPES,
+        required=False
+    )
+    parser.add_argument(
+        "-rg",
+        "--registerGericht",
+        help="Register court (name like 'Charlottenburg' or code like 'F1103R') of the registry number, if it is not part of it.",
         required=False
     )
     parser.add_argument(
@@ -112,12 +195,37 @@ def parse_cli_arguments():
 
     return args
 
-def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
+def fill_register_fields(driver, register: RegisterNumber) -> None:
     """
-    Function to fetch and download a specific data request/response from the handelsregister bundesAPI.
-    Currently only decorative for checking on the way that the input gets passed along.
+    Function to fill in the register type, number and court of the advanced search form.
+
+    Args:
+        driver (WebDriver): the browser that shows the search form.
+        register (RegisterNumber): the wanted register entry.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    if register.register_type:
+        driver.execute_script(SELECT_VALUE_SCRIPT, REGISTER_TYPE_FIELD, register.register_type)
+    try:
+        number = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, REGISTER_NUMBER_FIELD)))
+        number.send_keys(register.number)
+    except TimeoutException:
+        pass
+    if register.court:
+        # The court has to be one of the options of the select, the name gets resolved to its code.
+        court = find_court_option(driver.execute_script(READ_OPTIONS_SCRIPT, REGISTER_COURT_FIELD), register.court)
+        if court:
+            driver.execute_script(SELECT_VALUE_SCRIPT, REGISTER_COURT_FIELD, court)
+
+def fill_and_submit_search_form(driver, s, so, sa, sg, ci, st, po, register: Optional[RegisterNumber] = None) -> bool:
+    """
+    Function to open the advanced search of the portal, fill in the search form and submit it.
 
     Args:
+        driver (WebDriver): the browser that is used for this lookup.
         s (str): the search term (i.e. name of the company)
         so (str): search options - "all", "exact" or "min"
         sa (bool): if phonetically similar sounding results should get returned, too.
@@ -125,95 +233,78 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
         ci (str): the name of the city
         st (str): the name of the street (and possibly the house number)
         po (str): the post code of the city
-    """
-    
-    # Save each entry into its own download folder.
-    dl_path = Path.joinpath(Path.cwd(),"download", create_company_folder_name(s, ci, True))
-    if not Path.is_dir(dl_path): # Creating the folder; but only if it does not exist yet.
-        Path.mkdir(dl_path)
-
-    # Chrome Options.
-    chrome_options = webdriver.ChromeOptions()
-    chrome_options.add_argument('--headless')  # Run the browser without opening a visible window.
-    chrome_options.add_argument('--disable-gpu') # Sometimes needed.
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('--log-level=3') # Surpresses low level warnings.
-    # Chrome options setup to ensure that we can download and that we know where the file will get downloaded to.
-    chrome_options.add_experimental_option('prefs', {
-        'download.default_directory': str(dl_path),  
-        'download.prompt_for_download': False,
-        'download.directory_upgrade': True,
-        'safebrowsing.enabled': True,
-        "profile.default_content_settings.popups": 0,
-        "profile.content_settings.exceptions.automatic_downloads.*.setting": 1,
-        "profile.default_content_setting_values.automatic_downloads": 1,
-        "profile.default_content_settings.mimetype_overrides": {
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        }
-    })
+        register (Optional[RegisterNumber]): the register entry for an exact lookup. The search term is not sent in that case,
+            as the name in the register might not contain all of its words.
 
-    try:
-        # Webdriver-manager loads the appropriate driver or uses a cached one.
-        service = ChromeService(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-    except Exception as e:
-        exit()
+    Returns:
+        bool: True if the result table was loaded in time, False otherwise.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    # Every search counts against the shared quota of 60 retrievals per hour. Blocks until a slot is free.
+    with span("quota_wait"):
+        portal_quota().acquire()
 
-    try:
-        # Trying to get the elements via their IDs.
-        driver.get("https://www.handelsregister.de/rp_web/welcome.xhtml")
-        target_class_selector = "a.ui-commandlink.ui-widget.dokumentList"
-        advanced_search = "naviForm:erweiterteSucheLink"
-        search_terms = "form:schlagwoerter"
-        
-        search_options_all = "form:schlagwortOptionen:0"
-        search_options_exact = "form:schlagwortOptionen:1"
-        search_options_min = "form:schlagwortOptionen:2"
-        
-        search_options = search_options_all  # Default value to avoid unbound error
-        if so == "all":
-            search_options = search_options_all
-        elif so == "exact":
-            search_options = search_options_exact
-        elif so == "min":
-            search_options = search_options_min
-        
-        post_code = "form:postleitzahl"
-        city = "form:ort"
-        street = "form:strasse"
-        submitBtn = "form:btnSuche"
-        
+    # Trying to get the elements via their IDs.
+    with span("page_load"):
+        driver.get(PORTAL_START_URL)
+    advanced_search = "naviForm:erweiterteSucheLink"
+    search_terms = "form:schlagwoerter"
+    
+    search_options_all = "form:schlagwortOptionen:0"
+    search_options_exact = "form:schlagwortOptionen:1"
+    search_options_min = "form:schlagwortOptionen:2"
+    
+    search_options = search_options_all  # Default value to avoid unbound error
+    if so == "all":
+        search_options = search_options_all
+    elif so == "exact":
+        search_options = search_options_exact
+    elif so == "min":
+        search_options = search_options_min
+    
+    post_code = "form:postleitzahl"
+    city = "form:ort"
+    street = "form:strasse"
+    submitBtn = "form:btnSuche"
+    
     ######## Interaction with the elements inside of the webpage search form. #########
     # Change to the advanced search form.    
+    with span("form.advanced_search"):
         wait = WebDriverWait(driver, 10)
         try:
             search_link = wait.until(EC.element_to_be_clickable((By.ID, advanced_search)))
             search_link.click()
         except TimeoutException:
             search_link = ""
-            
-        # Changed to the page containing the search form.
+        
+    # Changed to the page containing the search form.
     # Click on textbox and enter search term.
+    with span("form.keywords"):
         wait = WebDriverWait(driver, 10)
         try:
             text_box = wait.until(EC.element_to_be_clickable((By.ID, search_terms)))
-            text_box.send_keys(s)
+            if register is None:
+                text_box.send_keys(s)
         except TimeoutException:
             text_box = ""
-        
+    
     # Find radio button label that corresponds to the selected option and click it.
+    with span("form.option"):
         wait = WebDriverWait(driver, 10)
         try:
             radioBtnLabel = wait.until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, f"label[for='{search_options}']"))
             )
             radioBtnLabel.click()
-            time.sleep(2)
+            wait_for_ajax_idle(driver) # Wait till the AJAX update of the widget change is done.
         except TimeoutException:
             radioBtnLabel = ""
 
     # Find the checkbox for similar sounding search results getting fetched as well.
+    with span("form.similar"):
         wait = WebDriverWait(driver, 10)
         try:
             similar_checkbox_input = driver.find_element(By.ID, "form:aenlichLautendeSchlagwoerterBoolChkbox_input")
@@ -225,11 +316,12 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 similar_checkbox_container = wait.until(EC.element_to_be_clickable((By.ID, "form:aenlichLautendeSchlagwoerterBoolChkbox")))
                 if (sa == True):
                     similar_checkbox_container.click() # select deselected if we want to search for similar!
-            time.sleep(2)
+            wait_for_ajax_idle(driver) # Wait till the AJAX update of the widget change is done.
         except TimeoutException:
             similar_checkbox_container = ""
 
     # Find the checkbox for already deleted entries getting fetched as well.
+    with span("form.deleted"):
         wait = WebDriverWait(driver, 10)
         try:
             deleted_checkbox_input = driver.find_element(By.ID, "form:auchGeloeschte_input")
@@ -241,12 +333,13 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 deleted_checkbox_container = wait.until(EC.element_to_be_clickable((By.ID, "form:auchGeloeschte")))
                 if (sg == True):
                     deleted_checkbox_container.click() # select deselected if we want to search for deleted entries!
-            time.sleep(2)
+            wait_for_ajax_idle(driver) # Wait till the AJAX update of the widget change is done.
         except TimeoutException:
             deleted_checkbox_container = ""
 
 
     # Find text input for the post code and enter it.
+    with span("form.post_code"):
         wait = WebDriverWait(driver, 10)
         try:
             plz = wait.until(EC.element_to_be_clickable((By.ID, post_code)))
@@ -254,8 +347,9 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 plz.send_keys(po)
         except TimeoutException:
             plz = ""
-            
+        
     # Find text input for the city name and enter it.
+    with span("form.city"):
         wait = WebDriverWait(driver, 10)
         try:
             ort = wait.until(EC.element_to_be_clickable((By.ID, city)))
@@ -263,8 +357,9 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 ort.send_keys(ci)
         except TimeoutException:
             ort = ""
-            
+        
     # Find text input for the street name and enter it.
+    with span("form.street"):
         wait = WebDriverWait(driver, 10)
         try:
             strt = wait.until(EC.element_to_be_clickable((By.ID, street)))
@@ -272,7 +367,15 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
                 strt.send_keys(st)
         except TimeoutException:
             strt = ""
-        
+    
+    if register is not None:
+        with span("form.register"):
+            fill_register_fields(driver, register)
+
+    # As many rows per page as possible, so that less pages need to be requested.
+    driver.execute_script(SELECT_PAGE_SIZE_SCRIPT, RESULTS_PER_PAGE_FIELD, RESULTS_PER_PAGE)
+
+    with span("submit"):
         wait = WebDriverWait(driver, 10)
         try:
             # Waiting for the button to get loaded into the DOM.
@@ -283,79 +386,577 @@ def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po):
             wait = WebDriverWait(driver, 10) 
         except TimeoutException:
             subBtn = ""
-        
+    
+    with span("results_wait"):
         wait = WebDriverWait(driver, 20) # Waiting max 20 seconds.
-        
         try:
             # Waiting till the result table was loaded as expected.
-            results_tbody_id = "ergebnissForm:selectedSuchErgebnisFormTable_data"
-            wait.until(EC.presence_of_element_located((By.ID, results_tbody_id)))
-
-            # Selection of the rows that contain the desired results.
-            result_rows = driver.find_elements(By.CSS_SELECTOR, "#ergebnissForm\\:selectedSuchErgebnisFormTable_data > tr[data-ri]")
-
-            found_match = False
-            for row in result_rows:
-                try:
-                    # Extracting the company name and its location via more advanced search parameters.
-                    row_company_name = row.find_element(By.CSS_SELECTOR, "span.marginLeft20").text.strip()
-                    row_company_location = row.find_element(By.CSS_SELECTOR, "td.sitzSuchErgebnisse span.verticalText").text.strip()
-
-                    # Comparing the previously available data with the fetched data from the downloaded documents. 
-                    name_matches = s.lower() in row_company_name.lower()
-                    # City is optional, but has to get handled differently.
-                    city_matches = (ci.lower() in row_company_location.lower()) if ci else True
-
-                    if name_matches and city_matches:
-                        found_match = True
-                        
-                        # Locating the 'AD' link within. (AD ==> Aktueller Abdruck)
-                        ad_link_selector = "a.dokumentList[onclick*='Global.Dokumentart.AD']"
-                        ad_link = row.find_element(By.CSS_SELECTOR, ad_link_selector)
-                        
-                        wait.until(EC.element_to_be_clickable(ad_link)).click()
-                        
-                        time.sleep(3) # Short pause to allow the download to finish.
-                        break 
-                except Exception as e:
-                    break
+            wait.until(EC.presence_of_element_located((By.ID, RESULTS_TBODY_ID)))
+            return True
+        except TimeoutException:
+            return False
 
-        except Exception as e:
+def show_next_result_page(driver, last_row) -> bool:
+    """
+    Function to move the result table to its next page via the paginator.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        last_row (WebElement): a row of the current page, used to notice when the page has been replaced.
+
+    Returns:
+        bool: True if the next page is shown, False if there is none.
+
+    Raises:
+        TimeoutError: If the next page could not be loaded in time.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    next_buttons = driver.find_elements(By.CSS_SELECTOR, RESULT_PAGINATOR_NEXT_SELECTOR)
+    if not next_buttons or "ui-state-disabled" in (next_buttons[0].get_attribute("class") or ""):
+        return False
+
+    # Every further page is another retrieval.
+    with span("quota_wait"):
+        portal_quota().acquire()
+    with span("next_page"):
+        driver.execute_script("arguments[0].click();", next_buttons[0])
+        try:
+            # The rows of the old page get replaced by the AJAX update.
+            WebDriverWait(driver, 20).until(EC.staleness_of(last_row))
+        except TimeoutException:
+            # Otherwise the remaining pages would silently count as "no match".
+            raise TimeoutError("Die nächste Ergebnisseite wurde nicht rechtzeitig geladen.")
+        wait_for_ajax_idle(driver)
+    return True
+
+def iter_result_pages(driver):
+    """
+    Generator over the result pages. The next page is only requested once the consumer asks for it, so a caller that stops
+    at the first match only pays for the pages it actually looked at.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+
+    Yields:
+        List[WebElement]: The rows of the current page.
+    """
+    from selenium.webdriver.common.by import By
+    while True:
+        rows = driver.find_elements(By.CSS_SELECTOR, RESULT_ROWS_SELECTOR)
+        yield rows
+        if not rows or not show_next_result_page(driver, rows[-1]):
             return
 
+def iter_result_rows(driver):
+    """
+    Generator over the rows of all result pages. The next page is only requested once all rows of the current one have been
+    consumed.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+
+    Yields:
+        WebElement: The result rows.
+    """
+    for rows in iter_result_pages(driver):
+        yield from rows
+
+class DownloadedDocument(NamedTuple):
+    path: Optional[Path] # None if the document was captured in memory.
+    register_id: str # The company of the row the document was downloaded from, see `index.register_id_of_row`.
+    content: Optional[bytes] = None # The document, if it was captured in memory.
+
+class CapturedDocument(NamedTuple):
+    content: bytes
+    path: Optional[Path] # Where the document is (or will be, see `persisted`) in the document store, None if it is not kept.
+    persisted: Optional[Future] = None # The pending write into the document store.
+    register_id: Optional[str] = None # The company of the row the document was captured from.
+
+def read_result_rows(driver, rows, index: Optional[CompanyIndex] = None) -> List[Dict[str, Any]]:
+    """
+    Reads the court, company name and seat of all rows of the current result page.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        rows (List[WebElement]): the rows of the current page.
+        index (Optional[CompanyIndex]): receives the parsed rows of the page.
+
+    Returns:
+        List[Dict[str, Any]]: The rows in the format of `get_companies_in_searchresults`, in the order of `rows`.
+    """
+    from selenium.webdriver.common.by import By
+    # One parse of the page source instead of several webdriver round trips per row.
+    with span("parse_results"):
+        parsed = get_companies_in_searchresults(driver.page_source)
+    if len(parsed) == len(rows):
+        if index is not None:
+            with span("index"):
+                index.add_rows(parsed)
+        return parsed
+    return [
+        {
+            "court": "",
+            "name": row.find_element(By.CSS_SELECTOR, "span.marginLeft20").text.strip(),
+            "state": row.find_element(By.CSS_SELECTOR, "td.sitzSuchErgebnisse span.verticalText").text.strip()
+        }
+        for row in rows
+    ]
+
+def download_matching_ad(driver, s, ci, dl_path: Path, index: Optional[CompanyIndex] = None, in_memory: bool = False) -> Optional[DownloadedDocument]:
+    """
+    Function to find the result row that matches the company name (and city) best and to download its AD document.
+    All rows of a page are scored at once (see `matching.NameMatcher`), further pages only get loaded if no row of the
+    current one is good enough.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        s (str): the search term (i.e. name of the company)
+        ci (str): the name of the city
+        dl_path (Path): the folder that the browser downloads into.
+        index (Optional[CompanyIndex]): receives the rows of the result pages that get looked at.
+        in_memory (bool): capture the document in memory instead of letting the browser download it (see `capture_ad_of_row`).
+
+    Returns:
+        Optional[DownloadedDocument]: The downloaded document or None if no row matches.
+
+    Raises:
+        TimeoutError: If a page or the document could not be loaded in time. Failures of the browser are raised as well.
+    """
+    matcher = NameMatcher(s, ci)
+    for rows in iter_result_pages(driver):
+        parsed = read_result_rows(driver, rows, index)
+        # Only the best row gets downloaded, a wrong document would cost another slot of the quota on the retry.
+        best = matcher.best((row["name"], row["state"]) for row in parsed)
+        if best is not None:
+            return download_document_of_row(driver, rows[best], dl_path, register_id_of_row(parsed[best]), in_memory)
+    return None
+
+def download_document_of_row(driver, row, dl_path: Path, register_id: str, in_memory: bool = False) -> DownloadedDocument:
+    """
+    Function to get the AD document of a result row, either as download of the browser or captured in memory.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        row (WebElement): the result row.
+        dl_path (Path): the folder that the browser downloads into.
+        register_id (str): the company of the row, see `index.register_id_of_row`.
+        in_memory (bool): capture the document in memory instead of letting the browser download it.
+
+    Returns:
+        DownloadedDocument: The document.
+
+    Raises:
+        TimeoutError: If the download did not finish in time (see `download_ad_of_row`).
+    """
+    if in_memory:
+        return DownloadedDocument(None, register_id, capture_ad_of_row(driver, row))
+    return DownloadedDocument(download_ad_of_row(driver, row, dl_path), register_id)
+
+class _ReservedSlot:
+    """Quota of the PortalClient in `capture_ad_of_row`, the slot of the download has already been reserved there."""
+
+    def acquire(self) -> None:
+        pass
+
+def capture_ad_of_row(driver, row) -> bytes:
+    """
+    Function to fetch the AD document of a result row into memory instead of letting the browser download it.
+    The form post of the AD link is sent by the `httpclient.PortalClient` with the session of the browser, so the document
+    never touches the disk and there is no download folder to poll.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        row (WebElement): the result row.
+
+    Returns:
+        bytes: The document.
+
+    Raises:
+        httpclient.PortalError: If the portal did not answer with a document.
+        requests.RequestException: If the request failed.
+    """
+    # The HTTP client (requests, bs4) is only needed in this mode.
+    from httpclient import PortalClient, SearchResult
+
+    # The document retrieval counts against the quota as well.
+    with span("quota_wait"):
+        portal_quota().acquire()
+    with span("download"):
+        with PortalClient(quota=_ReservedSlot()) as client:
+            client.adopt_browser_session(driver.get_cookies(), driver.execute_script("return navigator.userAgent;"), driver.current_url)
+            # The live DOM, it carries the ViewState of the last ajax update of the paginator.
+            page = SearchResult(html=driver.page_source, url=driver.current_url, rows=[])
+            return client.download_document(page, int(row.get_attribute("data-ri"))).content
+
+def download_ad_of_row(driver, row, dl_path: Path) -> Path:
+    """
+    Function to click the AD link of a result row and to wait for the document.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        row (WebElement): the result row.
+        dl_path (Path): the folder that the browser downloads into.
+
+    Returns:
+        Path: The path of the downloaded document.
+
+    Raises:
+        TimeoutError: If the download did not finish in time.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    wait = WebDriverWait(driver, 20)
+    # Locating the 'AD' link within. (AD ==> Aktueller Abdruck)
+    ad_link_selector = "a.dokumentList[onclick*='Global.Dokumentart.AD']"
+    ad_link = row.find_element(By.CSS_SELECTOR, ad_link_selector)
+
+    # The document retrieval counts against the quota as well.
+    with span("quota_wait"):
+        portal_quota().acquire()
+    with span("download"):
+        existing_files = snapshot_dir(dl_path)
+        wait.until(EC.element_to_be_clickable(ad_link)).click()
+
+        # Wait till the browser finalized the document instead of hoping that a fixed pause is long enough.
+        return wait_for_download(dl_path, existing_files)
+
+def download_register_ad(driver, register: RegisterNumber, dl_path: Path, index: Optional[CompanyIndex] = None, in_memory: bool = False) -> Optional[DownloadedDocument]:
+    """
+    Function to download the AD document of the result row of an exact register lookup.
+    The court cell of the row only gets checked against the register number instead of comparing name and city.
+
+    Args:
+        driver (WebDriver): the browser that shows the result table.
+        register (RegisterNumber): the wanted register entry.
+        dl_path (Path): the folder that the browser downloads into.
+        index (Optional[CompanyIndex]): receives the rows of the result pages that get looked at.
+        in_memory (bool): capture the document in memory instead of letting the browser download it (see `capture_ad_of_row`).
+
+    Returns:
+        Optional[DownloadedDocument]: The downloaded document or None if no row belongs to the register entry.
+
+    Raises:
+        TimeoutError: If a page or the document could not be loaded in time. Failures of the browser are raised as well.
+    """
+    for rows in iter_result_pages(driver):
+        parsed = read_result_rows(driver, rows, index)
+        for i, row in enumerate(rows):
+            # Like `httpclient.find_register_row`, the text of the whole row only if the court cell could not be parsed.
+            if register_matches(parsed[i]["court"] or row.text, register):
+                return download_document_of_row(driver, row, dl_path, register_id_of_row(parsed[i]), in_memory)
+    return None
+
+def fetch_document(s, so, sa, sg, ci, st, po, dl_path: Path, pool: Optional[DriverPool] = None, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, in_memory: bool = False) -> Optional[DownloadedDocument]:
+    """
+    Function to search for a company in a browser and to fetch its AD document.
+
+    Args:
+        s, so, sa, sg, ci, st, po, pool, register, index: See `search_and_download`.
+        dl_path (Path): the folder that the browser downloads into.
+        in_memory (bool): capture the document in memory instead of letting the browser download it (see `capture_ad_of_row`).
+
+    Returns:
+        Optional[DownloadedDocument]: The document or None if no row of the results matches.
+
+    Raises:
+        TimeoutError: If the results or the document could not be loaded in time. Failures of the browser, the portal or
+            the quota are raised as well, so that callers (e.g. the batch pipeline) can report them as errors.
+    """
+    # Either check out an already running browser from the pool or start a new one just for this lookup.
+    if pool is not None:
+        with span("driver_checkout"):
+            driver = pool.acquire(dl_path)
+    else:
+        with span("driver_start"):
+            driver = create_chrome_driver(dl_path)
+
+    failed = True
+    try:
+        if not fill_and_submit_search_form(driver, s, so, sa, sg, ci, st, po, register):
+            raise TimeoutError("Die Ergebnistabelle wurde nicht rechtzeitig geladen.")
+        if register is not None:
+            downloaded = download_register_ad(driver, register, dl_path, index, in_memory=in_memory)
+        else:
+            downloaded = download_matching_ad(driver, s, ci, dl_path, index, in_memory=in_memory)
+        failed = False
+        return downloaded
     finally:
         # ! If the line below is not commented-out, the browser will only close itself after the user pressed enter.
         #input("Drücke Enter, um den Browser zu schließen...") # For Debugging.
-        
-        if 'driver' in locals():
-            driver.quit()
-        if Path("temp_page.html").exists():
-            Path("temp_page.html").unlink()
-            
+
+        with span("driver_release"):
+            if pool is not None:
+                # Keeps the browser alive for the next lookup, unless the failure left it in an unknown state.
+                pool.release(driver, discard=failed)
+            else:
+                driver.quit()
+
+def search_and_store(s, so, sa, sg, ci, st, po, pool: Optional[DriverPool] = None, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, store: Optional[DocumentStore] = None) -> Optional[StoredDocument]:
+    """
+    Function to search for a company in the handelsregister bundesAPI and to download its AD document into the document store.
+
+    Args:
+        s (str): the search term (i.e. name of the company)
+        so (str): search options - "all", "exact" or "min"
+        sa (bool): if phonetically similar sounding results should get returned, too.
+        sg (bool): if already deleted entries should get returned, too.
+        ci (str): the name of the city
+        st (str): the name of the street (and possibly the house number)
+        po (str): the post code of the city
+        pool (Optional[DriverPool]): pool of warm browsers to check out from. A new browser gets started (and quit afterwards) if None.
+        register (Optional[RegisterNumber]): look up exactly this register entry instead of searching by name.
+        index (Optional[CompanyIndex]): local company index that receives every result row that gets looked at.
+        store (Optional[DocumentStore]): where the document gets stored. Defaults to the shared document store.
+
+    Returns:
+        Optional[StoredDocument]: The document in the store, with the register id of the row it was downloaded from, or None
+            if there is no document for this company.
+    """
+    store = store if store is not None else DocumentStore()
+    key = query_key(normalize_query(s, so, sa, sg, ci, st, po, str(register) if register else None))
+
+    # Every job downloads into its own private folder, so concurrent lookups of the same company never see each other's files.
+    # The folder is removed again (with unfinished downloads) once the document has been moved into the store.
+    with store.job_dir(create_company_folder_name(s, ci or "", True) + "-") as dl_path:
+        downloaded = fetch_document(s, so, sa, sg, ci, st, po, dl_path, pool, register, index)
+        if downloaded is not None:
+            # Atomic, the job folder is on the same file system as the blobs.
+            with span("store"):
+                return store.put(downloaded.path, downloaded.register_id, "AD", key, move=True)
+    return None
+
+def search_and_download(s, so, sa, sg, ci, st, po, pool: Optional[DriverPool] = None, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, store: Optional[DocumentStore] = None) -> Optional[Path]:
+    """
+    Like `search_and_store`, but only returns the path of the document.
+
+    Returns:
+        Optional[Path]: The path of the document (in the store) or None if there is no document for this company.
+    """
+    stored = search_and_store(s, so, sa, sg, ci, st, po, pool, register, index, store)
+    return stored.path if stored is not None else None
+
+def search_and_capture(s, so, sa, sg, ci, st, po, pool: Optional[DriverPool] = None, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, store: Optional[DocumentStore] = None, persist: bool = True) -> Optional[CapturedDocument]:
+    """
+    Like `search_and_store`, but the AD document is captured in memory (see `capture_ad_of_row`) and can be extracted
+    right away. Keeping it in the document store is optional and happens in the background.
+
+    Args:
+        s, so, sa, sg, ci, st, po, pool, register, index, store: See `search_and_store`.
+        persist (bool): write the document into the store (asynchronously).
+
+    Returns:
+        Optional[CapturedDocument]: The document or None if there is no document for this company.
+    """
+    store = store if store is not None else DocumentStore()
+    key = query_key(normalize_query(s, so, sa, sg, ci, st, po, str(register) if register else None))
+
+    # Nothing gets downloaded by the browser in this mode, the folder is only needed to check out a browser.
+    captured = fetch_document(s, so, sa, sg, ci, st, po, store.tmp_root, pool, register, index, in_memory=True)
+    if captured is not None and captured.content:
+        if not persist:
+            return CapturedDocument(captured.content, None, register_id=captured.register_id)
+        persisted = store.put_bytes_async(captured.content, captured.register_id, "AD", key)
+        return CapturedDocument(captured.content, store.blob_path(hashlib.sha256(captured.content).hexdigest()), persisted, captured.register_id)
+    return None
+
+def build_lookup_result(pdf_path: Union[Path, bytes]) -> dict:
+    """
+    Function to extract the company data from a downloaded document into the dictionary that gets returned to the TS caller.
+
+    Args:
+        pdf_path (Union[Path, bytes]): the path of the downloaded document or the document itself, if it was captured in memory.
+
+    Returns:
+        dict: Dictionary containing the managers, the name and the address of the company.
+    """
+    companyData = extract_company_data_from_pdf(pdf_path if isinstance(pdf_path, bytes) else str(pdf_path))
+    managers = companyData.ceos
+    companyName = companyData.name
+    companyAddress = companyData.address
+
+    # Combine data into a Dictionary.
+    return {
+        "managers": managers,
+        "name": companyName,
+        "address": companyAddress
+    }
+
+def wait_for_persisted(persisted: Future) -> Optional[Path]:
+    """
+    Function to wait for the background write of a captured document (see `search_and_capture`).
+
+    Args:
+        persisted (Future): the pending write into the document store.
+
+    Returns:
+        Optional[Path]: The path of the stored document or None if it could not be written.
+    """
+    try:
+        with span("store"):
+            return persisted.result().path
+    except (OSError, sqlite3.Error) as e:
+        print(f"Das Dokument konnte nicht gespeichert werden: {e}", file=sys.stderr)
+        return None
+
+class LookupOutcome(NamedTuple):
+    result: dict # See `build_lookup_result`.
+    pdf_path: Optional[str] # The document the result was extracted from, None if it was not kept.
+    register_id: Optional[str] = None # The company of the row the document was fetched from, None if it is not known (e.g. on a cache hit).
+
+def lookup_in_index(index: CompanyIndex, s, st, po, ci, register: Optional[RegisterNumber] = None) -> Optional[LookupOutcome]:
+    """
+    Function to answer a lookup from a recent extraction in the company index instead of the portal.
+
+    Args:
+        index (CompanyIndex): the local company index.
+        s, st, po, ci, register: See `lookup_company_document`. A lookup by street or post code always goes to the portal,
+            the index does not know them.
+
+    Returns:
+        Optional[LookupOutcome]: The extracted data and its document or None if the portal has to be asked.
+    """
+    if st or po:
+        return None
+    with span("index"):
+        company = index.find_extracted(s, ci, register)
+    if company is None:
+        return None
+    return LookupOutcome({"managers": company.managers, "name": company.name, "address": company.address}, company.pdf_path, company.register_id)
+
+def lookup_company_document(s, so, sa, sg, ci, st, po, pool: Optional[DriverPool] = None, cache: Optional[LookupCache] = None, force: bool = False, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, in_memory: bool = False, persist: bool = True, store: Optional[DocumentStore] = None) -> Optional[LookupOutcome]:
+    """
+    Function to search, download and extract the data of a company in one go.
+    A cache hit or a recent extraction in the index answers the lookup without starting a browser or using a slot of the
+    portal quota.
+
+    Args:
+        s, so, sa, sg, ci, st, po, pool: See `search_and_store`.
+        cache (Optional[LookupCache]): cache for the lookup results. The portal gets asked every time if None.
+        force (bool): skip reading from the cache and force a fresh pull. The fresh result still gets cached.
+        register (Optional[RegisterNumber]): look up exactly this register entry instead of searching by name.
+        index (Optional[CompanyIndex]): local company index that receives the result rows and the extracted data. It is
+            asked (see `lookup_in_index`) before the portal unless force is set.
+        in_memory (bool): capture the document in memory and extract it from there (see `search_and_capture`).
+        persist (bool): with in_memory, keep the document in the document store (written in the background).
+        store (Optional[DocumentStore]): where the document gets stored. Defaults to the shared document store.
+
+    Returns:
+        Optional[LookupOutcome]: The extracted data and its document or None if no document was found.
+    """
+    query = normalize_query(s, so, sa, sg, ci, st, po, str(register) if register else None)
+    if cache is not None and not force:
+        with span("cache"):
+            entry = cache.get(query)
+        if entry is not None:
+            return LookupOutcome(entry.result, entry.pdf_path)
+
+    if index is not None and not force:
+        outcome = lookup_in_index(index, s, st, po, ci, register)
+        if outcome is not None:
+            return outcome
+
+    if in_memory:
+        captured = search_and_capture(s, so, sa, sg, ci, st, po, pool, register, index, store, persist=persist)
         # End the function here when there is nothing more to process.
-        downloaded_files = list(Path(dl_path).iterdir())
-        if not downloaded_files:
-            return
+        if captured is None:
+            return None
+        document, pdf_path, register_id = captured.content, captured.path, captured.register_id
+    else:
+        stored = search_and_store(s, so, sa, sg, ci, st, po, pool, register, index, store)
+        # End the function here when there is nothing more to process.
+        if stored is None:
+            return None
+        document, pdf_path, register_id = stored.path, stored.path, stored.register_id
+    with span("extract"):
+        result = build_lookup_result(document)
+    if in_memory and captured.persisted is not None:
+        # The document was written in the background during the extraction, only a finished write may be remembered.
+        pdf_path = wait_for_persisted(captured.persisted)
+    # Without persist the in-memory document is gone afterwards, there is no path to remember.
+    stored_path = str(pdf_path) if pdf_path is not None else None
+    # An empty extraction is returned, but neither cached nor indexed, so that the next lookup tries again.
+    if is_empty_result(result):
+        return LookupOutcome(result, stored_path, register_id)
+    if index is not None:
+        with span("index"):
+            # The row the document was fetched from identifies the company, no matter how it was searched.
+            index.add_extraction(result, stored_path, register, register_id)
 
-        # Only when files have been downloaded, we can continue here.
-        pdfFileName = downloaded_files[0]
-        pdfFilePath = PurePath.joinpath(dl_path, pdfFileName)
-        companyData = extract_company_data_from_pdf(str(pdfFilePath))
-        managers = companyData.ceos
-        companyName = companyData.name
-        companyAddress = companyData.address
-
-        # Combine data into a Dictionary.
-        ts_return_value = {
-            "managers": managers,
-            "name": companyName,
-            "address": companyAddress
-        }
-        
-        # Parse to JSON string and write directly to console.
-        json_output = json.dumps(ts_return_value)
-        print(json_output)
-        sys.stdout.flush()
+    if cache is not None:
+        with span("cache"):
+            cache.put(query, result, stored_path)
+    return LookupOutcome(result, stored_path, register_id)
+
+def lookup_company(s, so, sa, sg, ci, st, po, pool: Optional[DriverPool] = None, cache: Optional[LookupCache] = None, force: bool = False, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, in_memory: bool = False, persist: bool = True) -> Optional[dict]:
+    """
+    Like `lookup_company_document`, but only returns the extracted data.
+
+    Returns:
+        Optional[dict]: The extracted data (see `build_lookup_result`) or None if no document was found.
+    """
+    outcome = lookup_company_document(s, so, sa, sg, ci, st, po, pool, cache, force, register, index, in_memory, persist)
+    return outcome.result if outcome is not None else None
+
+def fetch_and_download_from_bundes_api(s, so, sa, sg, ci, st, po, pool: Optional[DriverPool] = None, cache: Optional[LookupCache] = None, force: bool = False, register: Optional[RegisterNumber] = None, index: Optional[CompanyIndex] = None, timings: bool = False, trace_file: Optional[Path] = None, in_memory: bool = False, persist: bool = True):
+    """
+    Function to fetch and download a specific data request/response from the handelsregister bundesAPI.
+    The extracted data gets printed to the console as a single json line.
+
+    Args:
+        s (str): the search term (i.e. name of the company)
+        so (str): search options - "all", "exact" or "min"
+        sa (bool): if phonetically similar sounding results should get returned, too.
+        sg (bool): if already deleted entries should get returned, too.
+        ci (str): the name of the city
+        st (str): the name of the street (and possibly the house number)
+        po (str): the post code of the city
+        pool (Optional[DriverPool]): pool of warm browsers to check out from. A new browser gets started (and quit afterwards) if None.
+        cache (Optional[LookupCache]): cache for the lookup results.
+        force (bool): skip reading from the cache and force a fresh pull.
+        register (Optional[RegisterNumber]): look up exactly this register entry instead of searching by name.
+        index (Optional[CompanyIndex]): local company index that receives the result rows and the extracted data.
+        timings (bool): time every phase of the lookup, add the milliseconds per phase as "timings" to the output and
+            append them to the trace file.
+        trace_file (Optional[Path]): the JSONL trace file. Defaults to `timing.default_trace_path()`.
+        in_memory (bool): capture the document in memory and extract it from there instead of waiting for the download.
+        persist (bool): with in_memory, keep the document in the document store (written in the background).
+    """
+    ts_return_value = None
+    failure = None
+    with (recording() if timings else nullcontext()) as recorded:
+        try:
+            ts_return_value = lookup_company(s, so, sa, sg, ci, st, po, pool, cache, force, register, index, in_memory, persist)
+        except Exception as e:
+            failure = e
+
+    if recorded is not None:
+        outcome = "error" if failure is not None else ("not_found" if ts_return_value is None else "found")
+        try:
+            append_trace(
+                trace_file or default_trace_path(), recorded,
+                query={"s": s, "ci": ci, "register": str(register) if register else None}, outcome=outcome
+            )
+        except OSError as e:
+            print(f"Die Zeitmessung konnte nicht gespeichert werden: {e}", file=sys.stderr)
+
+    if failure is not None:
+        print(failure, file=sys.stderr)
+        sys.exit(1)
+
+    if ts_return_value is None:
+        return
+
+    if recorded is not None:
+        ts_return_value = {**ts_return_value, "timings": recorded.totals()}
+
+    # Parse to JSON string and write directly to console.
+    json_output = json.dumps(ts_return_value)
+    print(json_output)
+    sys.stdout.flush()
 
 if __name__ == "__main__":
     args = parse_cli_arguments()
@@ -366,5 +967,13 @@ if __name__ == "__main__":
         args.sucheGeloeschte,
         args.city,
         args.street,
-        args.postCode
+        args.postCode,
+        cache=LookupCache(),
+        force=args.force,
+        register=parse_register_number(args.registerNummer, args.registerArt, args.registerGericht),
+        index=CompanyIndex(),
+        timings=args.timings,
+        trace_file=Path(args.trace_file) if args.trace_file else None,
+        in_memory=args.in_memory,
+        persist=not args.no_persist
     )
\ No newline at end of file
@@ -1,48 +1,228 @@
 # Adjusted methods with added _test_text to allow for easier tests via data injection!
 
-from dataclasses import dataclass
+from bisect import bisect_left
+from dataclasses import dataclass, field
 import re
-from typing import List, Optional
-import fitz
-from nameparser import HumanName
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Union
 import unicodedata
 
+# PyMuPDF and nameparser take most of the import time of this module, they get imported by the functions that need them,
+# so that callers which only use the text helpers (or answer from a cache) do not pay for them.
+if TYPE_CHECKING:
+    from nameparser import HumanName
+
 @dataclass
 class CompanyPdfData:
     ceos: List[str]
     name: str
     address: str
+    pages_read: int = field(default=0, compare=False) # Number of pages that had to be read to find the data.
+
+# ---------------------------------- #
+# -- Precompiled extraction rules -- #
+# ---------------------------------- #
+
+# A single scan over the text finds every anchor that the field extractors need: the lines that start a numbered section
+# ("1.", "2.", ...), the closing brackets of the lettered subsections ("a)", "b)", ...) and the "Geschäftsanschrift:" labels.
+# Every alternative starts with a literal character and there are no capturing groups, which lets the regex engine skip ahead
+# to the next candidate character. The kind of an anchor is told apart by its first character.
+_ANCHOR_PATTERN = re.compile(r"\n[^\S\n]*\d+\.|\)|Geschäftsanschrift:")
+
+_MARKER_LETTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
 
-def extract_company_data_from_pdf(pdf_path: str, _test_text: Optional[str] = None) -> CompanyPdfData:
+# The field rules are only ever tried at the offsets of their anchors, never searched through the whole text.
+_NAME_PATTERN = re.compile(r"a\)\s*(?:Firma|Name):?\s*([^\n]+)")
+_ADDRESS_PATTERN = re.compile(r"Geschäftsanschrift:\s*([^\n]+)")
+_ADDRESS_FALLBACK_PATTERN = re.compile(r"b\)\s*Sitz,[^\n]+\n[^\n]+\n\s*([^\n]+)")
+_MANAGEMENT_HEADER_PATTERN = re.compile(
+    r"b\)\s*(?:Vorstand, Leitungsorgan|Geschäftsführer|persönlich haften|Vertretungsberechtigte)[^\n]*\n",
+    re.IGNORECASE
+)
+
+# Patterns for cleaning the extracted manager lines.
+_JUNK_PATTERN_CITY_FIRST = re.compile(r',\s*[^,]+,\s*\*\d{2}\.\d{2}\.\d{4}.*$', re.IGNORECASE)
+_JUNK_PATTERN_DATE_FIRST = re.compile(r',\s*\*\d{2}\.\d{2}\.\d{4}.*$', re.IGNORECASE)
+_MANAGER_PREFIX_PATTERN = re.compile(r"^\s*(?:Geschäftsführer|Liquidator|Vorstand|Partner|persönlich hafte.* Gesellschafter):\s*", re.IGNORECASE)
+
+class SectionIndex:
     """
-    Main function to extract company data from the text of a Handelsregister PDF.
+    The offsets of the numbered sections ("1.", "2.", ...), the lettered subsections ("a)", "b)", ...) and the address labels
+    of a document text, shared by all field extractors.
 
-    This function orchestrates the extraction of the company name, address, and
-    management personnel (CEOs, partners, etc.) by calling specialized functions.
+    The text gets walked only once and only as far as the extractors have asked for: every offset that has been passed is
+    recorded, so later questions are answered from the index, and the long tail of a document (e.g. the articles of association)
+    is never scanned if the fields were found before it.
+    """
+
+    def __init__(self, full_text: str):
+        """
+        Args:
+            full_text (str): The extracted text string from the document.
+        """
+        self.sections: List[int] = [] # Start offsets of the lines that begin a numbered section.
+        self.markers: Dict[str, List[int]] = {} # Offsets of the lettered subsections, by their lowercase letter.
+        self.address_labels: List[int] = [] # Offsets of the "Geschäftsanschrift:" labels.
+        self.complete = False
+        self._text = full_text
+        self._anchors = _ANCHOR_PATTERN.finditer(full_text)
+
+    def _advance(self) -> bool:
+        # Records the next anchor of the text. Returns False once the end of the text has been reached.
+        for match in self._anchors:
+            start = match.start()
+            first = self._text[start]
+            if first == ")":
+                # Only a bracket that directly follows a letter closes a subsection marker.
+                if start > 0 and self._text[start - 1] in _MARKER_LETTERS:
+                    self.markers.setdefault(self._text[start - 1].lower(), []).append(start - 1)
+            elif first == "\n":
+                # The offset of the section line itself, after its preceding line break.
+                self.sections.append(start + 1)
+            else:
+                self.address_labels.append(start)
+            return True
+        self.complete = True
+        return False
+
+    def _iter_offsets(self, offsets: List[int]) -> Iterator[int]:
+        position = 0
+        while position < len(offsets) or self._advance():
+            if position < len(offsets):
+                yield offsets[position]
+                position += 1
+
+    def subsections(self, letter: str) -> Iterator[int]:
+        """
+        Iterates over the offsets of the subsections with the given letter (in either case) in the order of the text.
+
+        Args:
+            letter (str): The letter of the subsections, e.g. "b".
+
+        Yields:
+            int: The offset of the letter of each subsection marker.
+        """
+        return self._iter_offsets(self.markers.setdefault(letter.lower(), []))
+
+    def labels(self) -> Iterator[int]:
+        """
+        Iterates over the offsets of the "Geschäftsanschrift:" labels in the order of the text.
+
+        Yields:
+            int: The offset of each label.
+        """
+        return self._iter_offsets(self.address_labels)
+
+    def next_section(self, offset: int) -> Optional[int]:
+        """
+        Finds the first numbered section that starts at or after the offset.
+
+        Args:
+            offset (int): The offset in the text.
+
+        Returns:
+            Optional[int]: The start offset of the section line or None if there is no further section.
+        """
+        while (not self.sections or self.sections[-1] < offset) and self._advance():
+            pass
+        position = bisect_left(self.sections, offset)
+        return self.sections[position] if position < len(self.sections) else None
+
+def _first_match(pattern: re.Pattern, full_text: str, offsets: Iterable[int]) -> Optional[re.Match]:
+    # Tries the rule at the anchors in the order of the text, like a search would.
+    for offset in offsets:
+        match = pattern.match(full_text, offset)
+        if match:
+            return match
+    return None
+
+def iter_page_texts(pdf_path: Union[str, bytes], strict: bool = False) -> Iterator[str]:
+    """
+    Opens the pages of a PDF one after another and yields their text. Pages after the last consumed one are never loaded.
+    Errors while opening or reading the document are printed and end the iteration, unless strict is set.
 
     Args:
-        pdf_path (str): The path to the PDF file that was downloaded from the Handelsregister BundesAPI.
-        _test_text (Optional[str]): Optional string test text parameter that is only used for testing the methods in this file more efficiently.
+        pdf_path (Union[str, bytes]): The path to the PDF file or its content, e.g. a document that was captured in memory.
+        strict (bool): Raise the errors instead of printing them.
+
+    Yields:
+        str: The text of each page.
+    """
+    import fitz
+
+    try:
+        with (fitz.open(stream=pdf_path, filetype="pdf") if isinstance(pdf_path, bytes) else fitz.open(pdf_path)) as doc:
+            for page in doc:
+                if isinstance(page, fitz.Page):
+                    yield page.get_text() # type: ignore
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Fehler beim Öffnen oder Lesen der PDF-Datei: {e}")
+
+def _scan_window(field_name: str, window: str) -> tuple:
+    # Looks for a field that is still missing inside of the text of the last pages.
+    # Returns (value, keep_window): value is None as long as the field can not be final yet, keep_window tells if the
+    # window has to keep its first page because a started but unfinished match or section lies inside of it.
+    index = SectionIndex(window)
+    if field_name in ("name", "address"):
+        # Only the labelled address is final, the fallback rule may not be used before the whole document has been read.
+        if field_name == "name":
+            match = _first_match(_NAME_PATTERN, window, index.subsections("a"))
+        else:
+            match = _first_match(_ADDRESS_PATTERN, window, index.labels())
+        if match is None:
+            return None, False
+        # A match is only final if more text follows it, otherwise its whitespace and value could continue on the next page.
+        if window[match.end():].strip():
+            return match.group(1).strip(), False
+        return None, True
+    section = _management_section(window, index)
+    if section is not None:
+        return _management_names(section), False
+    return None, _management_header_end(window, index) is not None
+
+def extract_company_data_from_pages(pages: Iterable[str], early_exit: bool = True) -> CompanyPdfData:
+    """
+    Extracts the company data from the texts of the pages of a document, which are consumed one after another.
+
+    With early_exit no further page is consumed once the name, the labelled address and the management section have been found,
+    the result is the same as for the text of the whole document. Every missing field is only searched inside of the last pages
+    (or from the start of an unfinished management section on), so the work per page does not grow with the length of the document.
+    If the pages run out before all fields were found, the joined text of all pages is extracted at once.
+
+    Args:
+        pages (Iterable[str]): The texts of the pages, e.g. from `iter_page_texts`.
+        early_exit (bool): Stop consuming pages as soon as all fields have been found.
 
     Returns:
-        CompanyPdfData: A CompanyPdfData object containing the extracted information.
+        CompanyPdfData: A CompanyPdfData object containing the extracted information and the number of pages that were read.
     """
-    full_text = ""
-    if _test_text:
-        full_text = _test_text
-    else:
-        try:
-            with fitz.open(pdf_path) as doc:
-                for page in doc:
-                    if isinstance(page, fitz.Page):
-                        full_text += page.get_text() # type: ignore
-        except Exception as e:
-            print(f"Fehler beim Öffnen oder Lesen der PDF-Datei: {e}")
-            
-    
-    tmp_name = extract_company_name(full_text)
-    tmp_address = extract_company_address(full_text)
-    tmp_ceos = extract_management_data(full_text)
+    parts: List[str] = []
+    found: Dict[str, Any] = {}
+    window_start = {"name": 0, "address": 0, "ceos": 0} # First page of the window in which each missing field is searched.
+
+    for page_text in pages:
+        parts.append(page_text)
+        if not early_exit:
+            continue
+        last = len(parts) - 1
+        for field_name, start in window_start.items():
+            if field_name in found:
+                continue
+            value, keep_window = _scan_window(field_name, "".join(parts[start:]))
+            if value is not None:
+                found[field_name] = value
+            elif not keep_window and parts[last].strip():
+                # A field that continues on the next page can only have started on one of the last two pages.
+                window_start[field_name] = max(start, last - 1)
+        if len(found) == len(window_start):
+            return CompanyPdfData(found["ceos"], found["name"], found["address"], pages_read=len(parts))
+
+    full_text = "".join(parts)
+    index = SectionIndex(full_text)
+    tmp_name = extract_company_name(full_text, index)
+    tmp_address = extract_company_address(full_text, index)
+    tmp_ceos = extract_management_data(full_text, index)
     ceos = []
     name = ""
     address = ""
@@ -52,65 +232,71 @@ def extract_company_data_from_pdf(pdf_path: str, _test_text: Optional[str] = Non
         name = tmp_name
     if tmp_address:
         address = tmp_address
-    return CompanyPdfData(ceos, name, address)
+    return CompanyPdfData(ceos, name, address, pages_read=len(parts))
 
-def extract_management_data(full_text: str) -> List[str]:
+def extract_company_data_from_pdf(pdf_path: Union[str, bytes], _test_text: Optional[str] = None, early_exit: bool = True) -> CompanyPdfData:
     """
-    Function to extract the names of the ceos of a company from the provided text input parameter.
-    The text should have been extracted from the document that was downloaded after calling the Handelsregister BundesAPI.
-    Can process different format patterns of company data.
-    
+    Main function to extract company data from the text of a Handelsregister PDF.
+
+    This function orchestrates the extraction of the company name, address, and
+    management personnel (CEOs, partners, etc.) by calling specialized functions.
+    The pages are streamed and, with early_exit, the remaining pages are not read anymore once all of the data has been found,
+    which saves most of the work for long historical prints (HD/CD).
+
     Args:
-        full_text (str): The extracted text string from the document.
-    
+        pdf_path (Union[str, bytes]): The path to the PDF file that was downloaded from the Handelsregister BundesAPI or its content.
+        _test_text (Optional[str]): Optional string test text parameter that is only used for testing the methods in this file more efficiently.
+        early_exit (bool): Stop reading pages as soon as all fields have been found.
+
     Returns:
-        List[str]: A list containing all of the ceos that could get extracted from the document text.
+        CompanyPdfData: A CompanyPdfData object containing the extracted information.
     """
-    
-    # 1. Isolating the part of the document that contains the ceo(s) of the company.
-    # The pattern now uses a capturing group to get ONLY the lines with manager data,
-    # excluding the section header itself.
-    section_pattern = re.compile(
-        # Group 1: Match the header line (non-capturing)
-        r"(?:b\)\s*(?:Vorstand, Leitungsorgan|Geschäftsführer|persönlich haften|Vertretungsberechtigte)[\s\S]*?\n)"
-        # Group 2: Capture the actual manager data lines that follow the header
-        r"([\s\S]+?)"
-        # Stop before the next numbered section
-        r"(?=\n\s*\d+\.\s*)",
-        re.DOTALL | re.IGNORECASE
-    )
-    management_section_match = section_pattern.search(full_text)
-    
-    # If no match or the capturing group for the data is empty, return.
-    if not management_section_match or not management_section_match.group(1):
-        return []
-    
-    # source_text now contains ONLY the relevant lines with manager names.
-    source_text = management_section_match.group(1)
+    if _test_text:
+        return extract_company_data_from_pages([_test_text], early_exit)
+
+    pages = iter_page_texts(pdf_path)
+    try:
+        return extract_company_data_from_pages(pages, early_exit)
+    finally:
+        # Closes the document right away, even if its remaining pages were skipped.
+        pages.close()
+
+def _management_header_end(full_text: str, index: SectionIndex) -> Optional[int]:
+    # The first lettered subsection with a management header starts the section, the header line itself is excluded.
+    for offset in index.subsections("b"):
+        header = _MANAGEMENT_HEADER_PATTERN.match(full_text, offset)
+        if header:
+            return header.end()
+    return None
 
+def _management_section(full_text: str, index: SectionIndex) -> Optional[str]:
+    start = _management_header_end(full_text, index)
+    if start is None:
+        return None
+    # The section ends before the next numbered section. Its first line always belongs to it, even if that line is empty,
+    # which is why the search for the end starts two characters later.
+    end = index.next_section(start + 2)
+    return full_text[start:end] if end is not None else None
+
+def _management_names(source_text: str) -> List[str]:
+    # Cleans the manager names out of the lines of the management section.
     all_managers = []
-    
-    # Patterns for cleaning the extracted lines
-    junk_pattern_city_first = re.compile(r',\s*[^,]+,\s*\*\d{2}\.\d{2}\.\d{4}.*$', re.IGNORECASE)
-    junk_pattern_date_first = re.compile(r',\s*\*\d{2}\.\d{2}\.\d{4}.*$', re.IGNORECASE)
-    prefix_pattern = re.compile(r"^\s*(?:Geschäftsführer|Liquidator|Vorstand|Partner|persönlich hafte.* Gesellschafter):\s*", re.IGNORECASE)
 
-    # 2. Iterate through the now clean list of lines.
     for line in source_text.splitlines():
-        name_part = prefix_pattern.sub('', line.strip())
-        
+        name_part = _MANAGER_PREFIX_PATTERN.sub('', line.strip())
+
         if not name_part or ',' not in name_part:
             continue
-            
+
         final_name = ""
-        
+
         # Case A: The line contains a birth date (*DD.MM.YYYY).
         if '*' in name_part:
-            temp_line = junk_pattern_city_first.sub('', name_part)
+            temp_line = _JUNK_PATTERN_CITY_FIRST.sub('', name_part)
             if temp_line == name_part:
-                temp_line = junk_pattern_date_first.sub('', name_part)
+                temp_line = _JUNK_PATTERN_DATE_FIRST.sub('', name_part)
             final_name = temp_line.strip()
-        
+
         # Case B: The line does not contain a birth date.
         else:
             parts = name_part.split(',')
@@ -121,49 +307,79 @@ def extract_management_data(full_text: str) -> List[str]:
 
         if final_name and final_name not in all_managers:
             all_managers.append(final_name)
-            
+
     return all_managers
-    
-def extract_company_name(full_text: str) -> Optional[str]:
+
+def extract_management_data(full_text: str, index: Optional[SectionIndex] = None) -> List[str]:
+    """
+    Function to extract the names of the ceos of a company from the provided text input parameter.
+    The text should have been extracted from the document that was downloaded after calling the Handelsregister BundesAPI.
+    Can process different format patterns of company data.
+
+    Args:
+        full_text (str): The extracted text string from the document.
+        index (Optional[SectionIndex]): The section index of the text. Gets created if None.
+
+    Returns:
+        List[str]: A list containing all of the ceos that could get extracted from the document text.
+    """
+    if index is None:
+        index = SectionIndex(full_text)
+
+    # 1. Isolating the part of the document that contains the ceo(s) of the company.
+    # source_text contains ONLY the lines with manager data, the section header itself is excluded.
+    source_text = _management_section(full_text, index)
+    if not source_text:
+        return []
+
+    # 2. Clean the names out of the lines.
+    return _management_names(source_text)
+
+def extract_company_name(full_text: str, index: Optional[SectionIndex] = None) -> Optional[str]:
     """
     Extracts the company name from the text.
 
     Args (str):
         full_text: The text content of the Handelsregister excerpt.
+        index (Optional[SectionIndex]): The section index of the text. Gets created if None.
 
     Returns:
         Optional[str]: The company name as a string, or an empty string if not found.
     """
-    # This improved regex looks for either "Firma:" or "Name:" and is not
+    if index is None:
+        index = SectionIndex(full_text)
+
+    # Looks for either "Firma:" or "Name:" after any "a)" subsection and is not
     # dependent on newlines or specific numbering, making it more robust.
-    pattern = re.compile(r"a\)\s*(?:Firma|Name):?\s*([^\n]+)")
-    match = pattern.search(full_text)
+    match = _first_match(_NAME_PATTERN, full_text, index.subsections("a"))
     return match.group(1).strip() if match else ""
 
-def extract_company_address(full_text: str) -> Optional[str]:
+def extract_company_address(full_text: str, index: Optional[SectionIndex] = None) -> Optional[str]:
     """
     Extracts the company's business address from the text.
 
     Args:
         full_text (str): The text content of the Handelsregister excerpt.
+        index (Optional[SectionIndex]): The section index of the text. Gets created if None.
 
     Returns:
         Optional[str]: The company address as a string, or an empty string if not found.
     """
-    # The primary pattern looks for the explicit "Geschäftsanschrift:" label.
+    if index is None:
+        index = SectionIndex(full_text)
+
+    # The primary rule reads the explicit "Geschäftsanschrift:" label.
     # This is the most common format.
-    primary_pattern = re.compile(r"Geschäftsanschrift:\s*([^\n]+)")
-    match = primary_pattern.search(full_text)
+    match = _first_match(_ADDRESS_PATTERN, full_text, index.labels())
     if match:
         return match.group(1).strip()
 
-    # A fallback pattern for cases where the address
+    # A fallback rule for cases where the address
     # appears on the line directly following the city, under the "Sitz" section.
-    fallback_pattern = re.compile(r"b\)\s*Sitz,[^\n]+\n[^\n]+\n\s*([^\n]+)")
-    match = fallback_pattern.search(full_text)
+    match = _first_match(_ADDRESS_FALLBACK_PATTERN, full_text, index.subsections("b"))
     return match.group(1).strip() if match else ""
 
-def parse_string_name(full_name: str) -> HumanName:
+def parse_string_name(full_name: str) -> "HumanName":
     """
     Parses a string containing the full name of a person to a HumanName object where the individual parts can get accessed individually.
 
@@ -173,6 +389,8 @@ def parse_string_name(full_name: str) -> HumanName:
     Returns:
         HumanName: The HumanName object that was parsed from the input string.
     """
+    from nameparser import HumanName
+
     name = HumanName(full_name)
     return name
 
@@ -180,35 +398,35 @@ def create_company_folder_name(name: str, city: str, shorten: bool) -> str:
     """
     Creates the name of the download folder, where the documents of the corresponding company gets saved to.
     If the name should get shortened, then the company name may get up to 15 characters long, and the city name may get up to 10 characters long.
-    
+
     Args:
         name (str): The string name of the company.
         city (str): The string city of the company.
         shorten (bool): Boolean flag to indicate if the name should get sanitized and shortened.
-    
+
     Returns:
         str: The generated company folder name.
     """
-    
+
     n_len = 15
     c_len = 10
-    
+
     if shorten:
         return crop_string_to_max_length(sanitize_string_for_folder_name(name), n_len) + "-" + crop_string_to_max_length(sanitize_string_for_folder_name(city), c_len)
-    
+
     return name + "-" + city
 
 def remove_diacritical_marks(s: str) -> str:
     """
     Removes all diacritical marks from a given string.
-    
+
     Args:
         s (str): The string to get sanitized.
-    
+
     Returns:
         str: The string without any diacritical marks.
     """
-    
+
     # Normalize the string into NFD, which removes all of those special characters and replaces them with the base letter equivalent.
     nfkd_form = unicodedata.normalize('NFD', s)
     # Additionally filters out all remaining combining diacritics before returning the string.
@@ -217,14 +435,14 @@ def remove_diacritical_marks(s: str) -> str:
 def sanitize_string_for_folder_name(s: str) -> str:
     """
     Sanitizes a given string to get a simplified version of it, without special characters or empty spaces.
-    
+
     Args:
         s (str): The string that needs to get sanitized.
-    
+
     Returns:
         str: The sanitized string that can be used for creating a company folder name.
     """
-    
+
     # Sanitation map containing german special characters and their base letter replacements.
     sanitation_map = {
         'ä': 'ae',
@@ -232,7 +450,7 @@ def sanitize_string_for_folder_name(s: str) -> str:
         'ü': 'ue',
         'ß': 'ss'
     }
-    
+
     # Trim extra spaces from the start and end of the string, replace all "´" and replace all commas.
     sanitized = s.strip().replace(",", "")
     sanitized = sanitized.replace("´", "")
@@ -263,7 +481,7 @@ def crop_string_to_max_length(s: str, max: int) -> str:
     Returns:
         str: The (possibly) cropped string.
     """
-    
+
     if len(s) <= max:
         return s
 
@@ -0,0 +1,211 @@
+# Shared scheduler for the portal quota of 60 retrievals per hour.
+# All entry points (pysil, pysel, HandelsRegister, the service) reserve a slot here before they touch the portal.
+# The slots are stored inside of a local SQLite database, so concurrent processes on the same host share one quota.
+#
+# Show the current state with: python quota.py
+
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# The Nutzungsordnung of the portal forbids more than 60 retrievals per hour.
+PORTAL_REQUESTS_PER_HOUR = 60
+QUOTA_WINDOW_SECONDS = 3600.0
+
+def default_quota_db_path() -> Path:
+    """
+    Location of the shared quota database. Can be overwritten with the HR_QUOTA_DB environment variable.
+
+    Returns:
+        Path: The path of the SQLite database file.
+    """
+    configured = os.environ.get("HR_QUOTA_DB")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".cache" / "handelsregister" / "quota.sqlite3"
+
+class QuotaExceededError(Exception):
+    """Raised if the next free slot lies further in the future than the caller is willing to wait."""
+
+    def __init__(self, start_at: float):
+        self.start_at = start_at
+        super().__init__(f"Das Kontingent von {PORTAL_REQUESTS_PER_HOUR} Abrufen pro Stunde ist ausgeschöpft. Nächster freier Abruf um {time.strftime('%H:%M:%S', time.localtime(start_at))}.")
+
+@dataclass
+class Reservation:
+    """A reserved slot of the quota. The caller may touch the portal from `start_at` (unix timestamp) on."""
+    start_at: float
+    wait: float # Seconds between the reservation and `start_at`.
+    queued: int # Number of slots that were already reserved in the future when this one got booked.
+
+class QuotaScheduler:
+    """
+    Schedules portal retrievals so that no rolling time window ever contains more than `limit` of them.
+
+    Every reservation books the earliest slot that keeps the limit, so callers are packed densely into the quota:
+    as long as slots are free they start immediately, afterwards they queue up in FIFO order and get the time
+    at which they may start. A token bucket with a full burst would allow twice the limit inside of a rolling hour,
+    which is why the granted slots themselves are logged instead of a token counter.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        limit: int = PORTAL_REQUESTS_PER_HOUR,
+        window: float = QUOTA_WINDOW_SECONDS,
+        name: str = "handelsregister",
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Args:
+            db_path (Optional[Path]): The shared database file. Defaults to `default_quota_db_path()`.
+            limit (int): Maximum number of retrievals inside of one window.
+            window (float): Length of the rolling window in seconds.
+            name (str): Name of the quota, allows multiple independent quotas inside of one database.
+            clock (Callable[[], float]): Source of the current unix time.
+            sleep (Callable[[float], None]): Function that is used to wait for a reserved slot.
+        """
+        if limit < 1:
+            raise ValueError("The quota needs to allow at least one retrieval.")
+        self.db_path = Path(db_path) if db_path else default_quota_db_path()
+        self.limit = limit
+        self.window = window
+        self.name = name
+        self._clock = clock
+        self._sleep = sleep
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS quota_slots (name TEXT NOT NULL, start_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS quota_slots_name_start ON quota_slots (name, start_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode, the transactions are started explicitly so that they can take the write lock upfront.
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _next_slot(self, conn: sqlite3.Connection, now: float) -> tuple:
+        # Returns (start_at, queued) of the earliest slot that keeps the limit.
+        conn.execute("DELETE FROM quota_slots WHERE name = ? AND start_at <= ?", (self.name, now - self.window))
+        slots = [row[0] for row in conn.execute(
+            "SELECT start_at FROM quota_slots WHERE name = ? ORDER BY start_at", (self.name,)
+        )]
+        start_at = now
+        if slots:
+            # Keep the FIFO order of the queue.
+            start_at = max(start_at, slots[-1])
+        if len(slots) >= self.limit:
+            # The window ending at the new slot may only contain limit-1 of the existing slots.
+            start_at = max(start_at, slots[-self.limit] + self.window)
+        queued = sum(1 for slot in slots if slot > now)
+        return start_at, queued
+
+    def reserve(self, max_wait: Optional[float] = None) -> Reservation:
+        """
+        Books the next free slot without waiting for it.
+
+        Args:
+            max_wait (Optional[float]): Maximum number of seconds the caller is willing to wait. Books any slot if None.
+
+        Returns:
+            Reservation: The booked slot.
+
+        Raises:
+            QuotaExceededError: If the next free slot is further away than `max_wait`. Nothing gets booked in that case.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE") # Takes the write lock, concurrent processes wait here.
+            now = self._clock()
+            start_at, queued = self._next_slot(conn, now)
+            if max_wait is not None and start_at - now > max_wait:
+                conn.execute("ROLLBACK")
+                raise QuotaExceededError(start_at)
+            conn.execute("INSERT INTO quota_slots (name, start_at) VALUES (?, ?)", (self.name, start_at))
+            conn.execute("COMMIT")
+            return Reservation(start_at=start_at, wait=start_at - now, queued=queued)
+        finally:
+            conn.close()
+
+    def acquire(self, max_wait: Optional[float] = None) -> Reservation:
+        """
+        Books the next free slot and blocks until it has been reached.
+
+        Args:
+            max_wait (Optional[float]): Maximum number of seconds the caller is willing to wait. Waits as long as needed if None.
+
+        Returns:
+            Reservation: The slot that has been reached.
+
+        Raises:
+            QuotaExceededError: If the next free slot is further away than `max_wait`.
+        """
+        reservation = self.reserve(max_wait)
+        remaining = reservation.start_at - self._clock()
+        if remaining > 0:
+            self._sleep(remaining)
+        return reservation
+
+    def estimate(self) -> float:
+        """
+        Calculates when a job that gets queued right now could start, without booking anything.
+
+        Returns:
+            float: The unix timestamp of the next free slot.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            start_at, _ = self._next_slot(conn, self._clock())
+            conn.execute("ROLLBACK")
+            return start_at
+        finally:
+            conn.close()
+
+    def status(self) -> Dict[str, float]:
+        """
+        Collects the current usage of the quota.
+
+        Returns:
+            Dict[str, float]: The limit, the slots used inside of the current window, the already queued slots
+                and the unix timestamp of the next free slot.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = self._clock()
+            start_at, queued = self._next_slot(conn, now)
+            used = conn.execute(
+                "SELECT COUNT(*) FROM quota_slots WHERE name = ? AND start_at <= ?", (self.name, now)
+            ).fetchone()[0]
+            conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+        return {
+            "limit": self.limit,
+            "window": self.window,
+            "used": used,
+            "queued": queued,
+            "next_slot": start_at,
+            "next_slot_in": round(max(0.0, start_at - now), 3)
+        }
+
+_portal_quota: Optional[QuotaScheduler] = None
+
+def portal_quota() -> QuotaScheduler:
+    """
+    Returns the process wide scheduler for the portal quota, which is backed by the shared database of this host.
+
+    Returns:
+        QuotaScheduler: The shared scheduler.
+    """
+    global _portal_quota
+    if _portal_quota is None:
+        _portal_quota = QuotaScheduler()
+    return _portal_quota
+
+if __name__ == "__main__":
+    print(json.dumps(portal_quota().status()))
@@ -0,0 +1,271 @@
+# Long-running HTTP service around the pysil lookup flow.
+# Instead of spawning a new python process (imports + browser launch) per lookup, callers send their queries to this service,
+# which keeps warm browsers and already extracted documents in-process between the requests.
+#
+# Start it with: python service.py --port 8000 --pool-size 2
+
+import argparse
+import os
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Literal, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from driverpool import DriverPool
+from handelsregister import RegisterNumber, get_companies_in_searchresults, parse_register_number
+from index import CompanyIndex
+from lookupcache import LookupCache
+from pysil import fill_and_submit_search_form, lookup_company_document, search_and_download
+from pyutil import CompanyPdfData, extract_company_data_from_pdf
+from quota import portal_quota
+from store import DocumentStore
+
+# ------------ #
+# -- Models -- #
+# ------------ #
+
+class SearchQuery(BaseModel):
+    """Search parameters, named like the arguments of the pysil CLI."""
+    schlagwoerter: str
+    schlagwortOptionen: Literal["all", "min", "exact"] = "all"
+    sucheAehnliche: bool = False
+    sucheGeloeschte: bool = False
+    city: Optional[str] = None
+    street: Optional[str] = None
+    postCode: Optional[str] = None
+    registerNummer: Optional[str] = None # e.g. "HRB 44343, Charlottenburg", looks up exactly this entry.
+
+class SearchResultRow(BaseModel):
+    """A single row of the result table, see `get_companies_in_searchresults`."""
+    court: str
+    name: str
+    state: str
+    status: str
+    documents: str
+    history: List[Tuple[str, str]]
+
+class DownloadResult(BaseModel):
+    pdf_path: str
+    sha256: Optional[str] = None
+
+class ExtractRequest(BaseModel):
+    """A document of the document store, by its content hash or by the path that /download returned."""
+    sha256: Optional[str] = None
+    pdf_path: Optional[str] = None
+
+class IndexedCompanyModel(BaseModel):
+    """Mirrors the `IndexedCompany` dataclass from index."""
+    register_id: str
+    name: str
+    court: str
+    register_type: Optional[str]
+    register_number: Optional[str]
+    state: str
+    seat: str
+    status: str
+    history: List[Tuple[str, str]]
+    managers: Optional[List[str]] = None
+    address: Optional[str] = None
+    pdf_path: Optional[str] = None
+    seen_at: float
+    extracted_at: Optional[float] = None
+
+class CompanyPdfDataModel(BaseModel):
+    """Mirrors the `CompanyPdfData` dataclass from pyutil."""
+    ceos: List[str]
+    name: str
+    address: str
+    pages_read: int = 0
+
+    @classmethod
+    def from_dataclass(cls, data: CompanyPdfData) -> "CompanyPdfDataModel":
+        return cls(ceos=data.ceos, name=data.name, address=data.address, pages_read=data.pages_read)
+
+class LookupResult(BaseModel):
+    """The same json object that pysil prints to the console for the TS caller."""
+    managers: List[str]
+    name: str
+    address: str
+    pdf_path: Optional[str] = None
+
+# ------------- #
+# -- Helpers -- #
+# ------------- #
+
+@lru_cache(maxsize=1024)
+def _extract_cached(pdf_path: str, mtime_ns: int, size: int) -> CompanyPdfData:
+    # The modification time and size are part of the key, so that a replaced document gets extracted again.
+    return extract_company_data_from_pdf(pdf_path)
+
+def extract_document(pdf_path: Path) -> CompanyPdfData:
+    """
+    Extracts the company data of a document, but only once per version of the file.
+
+    Args:
+        pdf_path (Path): The path of the downloaded document.
+
+    Returns:
+        CompanyPdfData: The extracted company data.
+    """
+    stat = pdf_path.stat()
+    return _extract_cached(str(pdf_path), stat.st_mtime_ns, stat.st_size)
+
+def _query_args(query: SearchQuery) -> tuple:
+    # Positional arguments in the order that the pysil functions expect.
+    return (
+        query.schlagwoerter,
+        query.schlagwortOptionen,
+        query.sucheAehnliche,
+        query.sucheGeloeschte,
+        query.city,
+        query.street,
+        query.postCode
+    )
+
+def _register(query: SearchQuery) -> Optional[RegisterNumber]:
+    if not query.registerNummer:
+        return None
+    register = parse_register_number(query.registerNummer)
+    if register is None:
+        raise HTTPException(status_code=422, detail=f"'{query.registerNummer}' ist keine Registernummer.")
+    return register
+
+# ------------- #
+# -- The app -- #
+# ------------- #
+
+def create_app(pool: Optional[DriverPool] = None, pool_size: int = 2, warm: bool = True, cache: Optional[LookupCache] = None, index: Optional[CompanyIndex] = None, store: Optional[DocumentStore] = None) -> FastAPI:
+    """
+    Creates the FastAPI application.
+
+    Args:
+        pool (Optional[DriverPool]): An already existing browser pool. A new one with `pool_size` browsers gets created if None.
+        pool_size (int): The number of browsers that are kept alive.
+        warm (bool): Start all browsers on startup instead of on the first requests.
+        cache (Optional[LookupCache]): The cache for the lookup results. The default (shared) lookup cache gets used if None.
+        index (Optional[CompanyIndex]): The local company index. The default (shared) index gets used if None.
+        store (Optional[DocumentStore]): The document store. The default (shared) store gets used if None.
+
+    Returns:
+        FastAPI: The application that can be served by uvicorn.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.pool = pool if pool is not None else DriverPool(size=pool_size)
+        app.state.cache = cache if cache is not None else LookupCache()
+        app.state.index = index if index is not None else CompanyIndex()
+        app.state.store = store if store is not None else DocumentStore()
+        if warm:
+            await run_in_threadpool(app.state.pool.warm)
+        yield
+        app.state.pool.close()
+
+    app = FastAPI(title="Handelsregister lookup service", lifespan=lifespan)
+
+    # The endpoints are synchronous on purpose: FastAPI runs them in its threadpool and the browser pool limits the concurrency.
+
+    @app.get("/health")
+    def health(request: Request) -> dict:
+        return {"status": "ok", "pool": request.app.state.pool.stats()}
+
+    @app.get("/quota")
+    def quota() -> dict:
+        # Shows how much of the shared portal quota is used and when the next lookup could start.
+        return portal_quota().status()
+
+    @app.post("/search", response_model=List[SearchResultRow])
+    def search(query: SearchQuery, request: Request):
+        download_root = Path.joinpath(Path.cwd(), "download")
+        with request.app.state.pool.checkout(download_root) as driver:
+            if not fill_and_submit_search_form(driver, *_query_args(query), _register(query)):
+                return []
+            html = driver.page_source
+        rows = get_companies_in_searchresults(html)
+        request.app.state.index.add_rows(rows)
+        return rows
+
+    @app.post("/download", response_model=DownloadResult)
+    def download(query: SearchQuery, request: Request):
+        store = request.app.state.store
+        pdf_path = search_and_download(*_query_args(query), pool=request.app.state.pool, register=_register(query), index=request.app.state.index, store=store)
+        if pdf_path is None:
+            raise HTTPException(status_code=404, detail="Es konnte kein Dokument für diese Firma gefunden werden.")
+        document = store.find(pdf_path)
+        return DownloadResult(pdf_path=str(pdf_path), sha256=document.sha256 if document else None)
+
+    @app.post("/extract", response_model=CompanyPdfDataModel)
+    def extract(body: ExtractRequest, request: Request):
+        # Only documents of the store can be extracted, a path of the request must not reach any other file of the server.
+        store = request.app.state.store
+        if body.sha256:
+            document = store.by_sha256(body.sha256)
+        elif body.pdf_path:
+            document = store.find(Path(body.pdf_path))
+        else:
+            raise HTTPException(status_code=422, detail="Es muss sha256 oder pdf_path angegeben werden.")
+        if document is None:
+            raise HTTPException(status_code=404, detail="Das Dokument ist nicht im Dokumentenspeicher.")
+        return CompanyPdfDataModel.from_dataclass(extract_document(document.path))
+
+    @app.post("/lookup", response_model=LookupResult)
+    def lookup(query: SearchQuery, request: Request, force: bool = False, in_memory: bool = False):
+        # The same flow as pysil.py (cache, index, search, download, extraction). A cache hit or a recent extraction in the
+        # index neither needs a browser nor a slot of the portal quota, force=true skips reading from both.
+        outcome = lookup_company_document(
+            *_query_args(query),
+            pool=request.app.state.pool,
+            cache=request.app.state.cache,
+            force=force,
+            register=_register(query),
+            index=request.app.state.index,
+            in_memory=in_memory,
+            store=request.app.state.store
+        )
+        if outcome is None:
+            raise HTTPException(status_code=404, detail="Es konnte kein Dokument für diese Firma gefunden werden.")
+        return LookupResult(**outcome.result, pdf_path=outcome.pdf_path)
+
+    @app.get("/index", response_model=List[IndexedCompanyModel])
+    def index_search(
+        request: Request,
+        q: Optional[str] = None,
+        city: Optional[str] = None,
+        register: Optional[str] = None,
+        max_age: Optional[float] = None,
+        limit: int = 20
+    ):
+        # Answered from the local index only, neither a browser nor the portal quota is needed. max_age is in seconds.
+        companies = request.app.state.index.search(q, city, parse_register_number(register) if register else None, max_age, limit)
+        return [IndexedCompanyModel(**asdict(company)) for company in companies]
+
+    return app
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Handelsregister lookup service",
+        description="Startet einen HTTP-Service für Suche, Download und Extraktion mit vorgewärmten Browsern.",
+        epilog="Achtung! Maximal 60 Anfragen pro Stunde stellen!"
+    )
+    parser.add_argument("--host", help="Interface to listen on", default=os.environ.get("HR_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", help="Port to listen on", type=int, default=int(os.environ.get("HR_SERVICE_PORT", "8000")))
+    parser.add_argument("--pool-size", help="Number of browsers that are kept alive", type=int, default=int(os.environ.get("HR_POOL_SIZE", "2")))
+    parser.add_argument("--no-warm", help="Start the browsers on demand instead of on startup", action="store_true")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_cli_arguments()
+    uvicorn.run(create_app(pool_size=args.pool_size, warm=not args.no_warm), host=args.host, port=args.port)
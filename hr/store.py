@@ -0,0 +1,340 @@
+# Content-addressed store for the downloaded documents.
+# The shortened download folders of pysil (15 characters of the name, 10 of the city) are shared by different companies, so
+# picking "the" PDF of a folder can return a stale or foreign document. Instead, every document is stored once under the
+# SHA-256 of its content and a small SQLite index maps (register id, document type, fetch time) to the blobs, so the latest
+# document of a company is found with one indexed query instead of a directory listing.
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+def default_store_path() -> Path:
+    """
+    Location of the document store. Can be overwritten with the HR_STORE_DIR environment variable.
+
+    Returns:
+        Path: The root folder of the store.
+    """
+    configured = os.environ.get("HR_STORE_DIR")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".cache" / "handelsregister" / "store"
+
+def file_digest(path: Path) -> str:
+    """
+    Args:
+        path (Path): Any file.
+
+    Returns:
+        str: The SHA-256 hex digest of its content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+
+def _background_writer() -> ThreadPoolExecutor:
+    # A single thread shared by all stores of the process. Its pending writes are still finished when the interpreter exits.
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hr-store")
+        return _writer
+
+@dataclass
+class StoredDocument:
+    register_id: str # The company, see `index.register_id_of_row`.
+    doc_type: str # "AD", "CD", ...
+    sha256: str
+    size: int
+    filename: str # The name the portal gave the document.
+    fetched_at: float
+    path: Path # The blob, shared by all fetches of the same content.
+
+class DocumentStore:
+    """
+    Stores documents as immutable blobs named after their content hash. Identical documents (e.g. the same AD fetched twice)
+    are only stored once, every fetch is recorded in the index.
+    """
+
+    def __init__(self, root: Optional[Path] = None, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            root (Optional[Path]): The root folder. Defaults to `default_store_path()`.
+            clock (Callable[[], float]): Source of the current unix time.
+        """
+        self.root = Path(root) if root else default_store_path()
+        self.blob_root = self.root / "blobs"
+        self.tmp_root = self.root / "tmp"
+        self.db_path = self.root / "documents.sqlite3"
+        self._clock = clock
+        self.blob_root.mkdir(parents=True, exist_ok=True)
+        self.tmp_root.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    register_id TEXT NOT NULL,
+                    doc_type TEXT NOT NULL,
+                    query_key TEXT,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    suffix TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_register ON documents (register_id, doc_type, fetched_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_query ON documents (query_key, doc_type, fetched_at)")
+
+    @contextmanager
+    def _connect(self):
+        # Commits (or rolls back) the transaction and closes the connection again.
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def job_dir(self, prefix: str = "job-") -> Iterator[Path]:
+        """
+        Private temporary folder for the downloads of a single job. It is on the same file system as the blobs, so a finished
+        download can be moved into the store atomically with `put(..., move=True)`. Everything that is left in the folder
+        gets deleted afterwards.
+
+        Args:
+            prefix (str): Start of the folder name, helps to tell the jobs apart while they run.
+
+        Yields:
+            Path: The folder.
+        """
+        self.tmp_root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix=prefix, dir=self.tmp_root) as path:
+            yield Path(path)
+
+    def blob_path(self, sha256: str, suffix: str = ".pdf") -> Path:
+        """
+        Args:
+            sha256 (str): The content hash.
+            suffix (str): The file extension of the blob.
+
+        Returns:
+            Path: Where the blob is (or would be) stored, fanned out by the first two hex digits.
+        """
+        return self.blob_root / sha256[:2] / (sha256 + suffix)
+
+    def _write_blob(self, source: Path, target: Path, move: bool) -> None:
+        if target.exists():
+            # Same content is already stored, the new file is not needed anymore.
+            if move:
+                source.unlink()
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            try:
+                # Atomic if both are on the same file system.
+                os.replace(source, target)
+                return
+            except OSError:
+                pass
+        # Copy next to the target first, so that a reader never sees a half written blob.
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp, open(source, "rb") as src:
+                shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+            os.replace(tmp_name, target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        if move:
+            source.unlink()
+
+    def _write_blob_bytes(self, content: bytes, target: Path) -> None:
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(content)
+            os.replace(tmp_name, target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _record(self, register_id: str, doc_type: str, query_key: Optional[str], sha256: str, size: int, filename: str, suffix: str) -> StoredDocument:
+        fetched_at = self._clock()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO documents (register_id, doc_type, query_key, sha256, size, filename, suffix, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (register_id, doc_type, query_key, sha256, size, filename, suffix, fetched_at)
+            )
+        return StoredDocument(register_id, doc_type, sha256, size, filename, fetched_at, self.blob_path(sha256, suffix))
+
+    def put(self, source: Path, register_id: str, doc_type: str = "AD", query_key: Optional[str] = None, move: bool = False) -> StoredDocument:
+        """
+        Adds a downloaded document.
+
+        Args:
+            source (Path): The downloaded file.
+            register_id (str): The company the document belongs to.
+            doc_type (str): The document type, e.g. "AD".
+            query_key (Optional[str]): The key of the lookup query (see `lookupcache.query_key`) that found the document.
+            move (bool): Move the file into the store instead of copying it.
+
+        Returns:
+            StoredDocument: The stored document.
+        """
+        source = Path(source)
+        sha256 = file_digest(source)
+        suffix = source.suffix.lower() or ".pdf"
+        size = source.stat().st_size
+        target = self.blob_path(sha256, suffix)
+        self._write_blob(source, target, move)
+        return self._record(register_id, doc_type, query_key, sha256, size, source.name, suffix)
+
+    def put_bytes(self, content: bytes, register_id: str, doc_type: str = "AD", query_key: Optional[str] = None, filename: str = "AD.pdf") -> StoredDocument:
+        """
+        Adds a document that was captured in memory, without a downloaded file.
+
+        Args:
+            content (bytes): The document.
+            register_id (str): The company the document belongs to.
+            doc_type (str): The document type, e.g. "AD".
+            query_key (Optional[str]): The key of the lookup query (see `lookupcache.query_key`) that found the document.
+            filename (str): The name the portal gave the document.
+
+        Returns:
+            StoredDocument: The stored document.
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        suffix = Path(filename).suffix.lower() or ".pdf"
+        self._write_blob_bytes(content, self.blob_path(sha256, suffix))
+        return self._record(register_id, doc_type, query_key, sha256, len(content), Path(filename).name, suffix)
+
+    def put_bytes_async(self, content: bytes, register_id: str, doc_type: str = "AD", query_key: Optional[str] = None, filename: str = "AD.pdf") -> "Future[StoredDocument]":
+        """
+        Like `put_bytes`, but the write happens in a background thread, so the caller can go on with the content right away.
+        The blob will be at `blob_path(sha256 of the content, suffix of the filename)` once the future is done.
+
+        Returns:
+            Future[StoredDocument]: The pending write.
+        """
+        return _background_writer().submit(self.put_bytes, content, register_id, doc_type, query_key, filename)
+
+    def _document(self, row: sqlite3.Row) -> StoredDocument:
+        return StoredDocument(
+            register_id=row["register_id"],
+            doc_type=row["doc_type"],
+            sha256=row["sha256"],
+            size=row["size"],
+            filename=row["filename"],
+            fetched_at=row["fetched_at"],
+            path=self.blob_path(row["sha256"], row["suffix"])
+        )
+
+    def _latest(self, column: str, value: str, doc_type: str, max_age: Optional[float]) -> Optional[StoredDocument]:
+        min_fetched_at = self._clock() - max_age if max_age is not None else float("-inf")
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"SELECT * FROM documents WHERE {column} = ? AND doc_type = ? AND fetched_at >= ? ORDER BY fetched_at DESC",
+                (value, doc_type, min_fetched_at)
+            )
+            for row in rows:
+                document = self._document(row)
+                # Blobs that were deleted by hand are skipped.
+                if document.path.is_file():
+                    return document
+        return None
+
+    def latest(self, register_id: str, doc_type: str = "AD", max_age: Optional[float] = None) -> Optional[StoredDocument]:
+        """
+        Args:
+            register_id (str): The company.
+            doc_type (str): The document type.
+            max_age (Optional[float]): Ignore documents that were fetched more than this many seconds ago.
+
+        Returns:
+            Optional[StoredDocument]: The most recently fetched document or None.
+        """
+        return self._latest("register_id", register_id, doc_type, max_age)
+
+    def latest_for_query(self, query_key: str, doc_type: str = "AD", max_age: Optional[float] = None) -> Optional[StoredDocument]:
+        """
+        Same as `latest`, but for the documents that were found by a lookup query.
+
+        Args:
+            query_key (str): The key of the lookup query, see `lookupcache.query_key`.
+            doc_type (str): The document type.
+            max_age (Optional[float]): Ignore documents that were fetched more than this many seconds ago.
+
+        Returns:
+            Optional[StoredDocument]: The most recently fetched document or None.
+        """
+        return self._latest("query_key", query_key, doc_type, max_age)
+
+    def by_sha256(self, sha256: str) -> Optional[StoredDocument]:
+        """
+        Args:
+            sha256 (str): The content hash of a document.
+
+        Returns:
+            Optional[StoredDocument]: The latest fetch of the document or None if the store does not know it (anymore).
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM documents WHERE sha256 = ? ORDER BY fetched_at DESC LIMIT 1", (sha256.lower(),)).fetchone()
+        if row is None:
+            return None
+        document = self._document(row)
+        return document if document.path.is_file() else None
+
+    def find(self, path: Path) -> Optional[StoredDocument]:
+        """
+        Looks up the document of a blob path, e.g. one that was handed out to a caller before.
+        Paths outside of the blobs of this store (also via ".." or symlinks) are never accepted.
+
+        Args:
+            path (Path): The path of the blob.
+
+        Returns:
+            Optional[StoredDocument]: The stored document or None if the path is not a blob of this store.
+        """
+        resolved = Path(path).resolve()
+        if not resolved.is_relative_to(self.blob_root.resolve()):
+            return None
+        document = self.by_sha256(resolved.stem)
+        return document if document is not None and document.path.resolve() == resolved else None
+
+    def history(self, register_id: str, doc_type: str = "AD") -> List[StoredDocument]:
+        """
+        Args:
+            register_id (str): The company.
+            doc_type (str): The document type.
+
+        Returns:
+            List[StoredDocument]: All fetches of the document, the latest first.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT * FROM documents WHERE register_id = ? AND doc_type = ? ORDER BY fetched_at DESC", (register_id, doc_type)
+            ).fetchall()
+        return [self._document(row) for row in rows]
@@ -0,0 +1,221 @@
+# Span timing of the phases of a lookup.
+# A slow lookup can lose its time in many places: resolving the chromedriver, starting Chrome, loading the portal, the form
+# waits, the result table, waiting for a slot of the quota, the download or the extraction. The phases are wrapped in
+# `span("name")` blocks, which cost a single context variable lookup unless a recording has been started with `recording()`.
+# The recorded timings are added to the json output of pysil and appended to a JSONL trace file, which can be aggregated with:
+#
+#   python timing.py ~/.cache/handelsregister/timings.jsonl
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+def default_trace_path() -> Path:
+    """
+    Location of the trace file. Can be overwritten with the HR_TRACE_FILE environment variable.
+
+    Returns:
+        Path: The path of the JSONL file.
+    """
+    configured = os.environ.get("HR_TRACE_FILE")
+    if configured:
+        return Path(configured)
+    return Path.home() / ".cache" / "handelsregister" / "timings.jsonl"
+
+@dataclass
+class Span:
+    name: str
+    start: float # Seconds since the start of the recording.
+    duration: float
+    depth: int # Number of enclosing spans.
+
+@dataclass
+class Timings:
+    """The spans of a single recording."""
+    clock: Callable[[], float] = time.perf_counter
+    spans: List[Span] = field(default_factory=list)
+    started: float = 0.0
+    depth: int = 0
+
+    def totals(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: The summed up milliseconds per span name (e.g. all waits for the quota), in the order of their first start.
+        """
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration * 1000
+        return {name: round(ms, 3) for name, ms in totals.items()}
+
+    def elapsed(self) -> float:
+        """
+        Returns:
+            float: Seconds since the start of the recording.
+        """
+        return self.clock() - self.started
+
+    def to_trace(self) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            List[Dict[str, Any]]: The single spans with their start and duration in milliseconds, in the order of their start (enclosing spans first).
+        """
+        return [
+            {"name": s.name, "start_ms": round(s.start * 1000, 3), "duration_ms": round(s.duration * 1000, 3), "depth": s.depth}
+            for s in sorted(self.spans, key=lambda s: (s.start, s.depth))
+        ]
+
+_current: ContextVar[Optional[Timings]] = ContextVar("hr_timings", default=None)
+
+@contextmanager
+def recording(clock: Callable[[], float] = time.perf_counter) -> Iterator[Timings]:
+    """
+    Records all spans of the current context (thread or asyncio task) until the block ends.
+
+    Args:
+        clock (Callable[[], float]): Monotonic source of seconds.
+
+    Yields:
+        Timings: The recording, filled while the block runs.
+    """
+    timings = Timings(clock=clock, started=clock())
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Times the block as a span of the current recording. Does nothing if there is no recording.
+
+    Args:
+        name (str): The phase, e.g. "quota_wait". Spans with the same name are summed up in `Timings.totals`.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = timings.clock()
+    timings.depth += 1
+    try:
+        yield
+    finally:
+        timings.depth -= 1
+        end = timings.clock()
+        timings.spans.append(Span(name, start - timings.started, end - start, timings.depth))
+
+def append_trace(path: Path, timings: Timings, **fields: Any) -> None:
+    """
+    Appends the recording as a single json line to the trace file.
+    The line is written with one `write` call in append mode, so concurrent processes do not interleave their lines.
+
+    Args:
+        path (Path): The trace file, gets created if needed.
+        timings (Timings): The finished recording.
+        **fields (Any): Further fields of the line, e.g. the query and the outcome.
+    """
+    line = json.dumps({
+        "ts": time.time(),
+        **fields,
+        "total_ms": round(timings.elapsed() * 1000, 3),
+        "timings": timings.totals(),
+        "spans": timings.to_trace()
+    }, ensure_ascii=False) + "\n"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    # Nearest rank percentile of already sorted values.
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def exclusive_totals(spans: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Sums up the milliseconds per span name without the time of the nested spans, so that no time is counted twice.
+
+    Args:
+        spans (Iterable[Dict[str, Any]]): The spans of a trace line, see `Timings.to_trace`.
+
+    Returns:
+        Dict[str, float]: The exclusive milliseconds per span name.
+    """
+    totals: Dict[str, float] = {}
+    parents: List[str] = [] # The name of the last span per depth.
+    for s in spans:
+        depth = s["depth"]
+        del parents[depth:]
+        totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration_ms"]
+        if depth > 0 and len(parents) == depth:
+            totals[parents[-1]] -= s["duration_ms"]
+        parents.append(s["name"])
+    return {name: max(ms, 0.0) for name, ms in totals.items()}
+
+def summarize(lines: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Aggregates the trace lines per phase.
+
+    Args:
+        lines (Iterable[Dict[str, Any]]): The parsed lines of a trace file.
+
+    Returns:
+        List[Dict[str, Any]]: Count, p50, p95, max and the share of the summed up time of every phase (plus "total"),
+            the phase with the highest p95 first. The percentiles include the nested phases, the share does not (see
+            `exclusive_totals`), so the shares of the phases never add up to more than 1.
+    """
+    values: Dict[str, List[float]] = {}
+    exclusive: Dict[str, float] = {}
+    for line in lines:
+        values.setdefault("total", []).append(line.get("total_ms", 0.0))
+        for name, ms in line.get("timings", {}).items():
+            values.setdefault(name, []).append(ms)
+        # Lines without the single spans only have the summed up times, which are used as they are.
+        own = exclusive_totals(line["spans"]) if "spans" in line else line.get("timings", {})
+        for name, ms in own.items():
+            exclusive[name] = exclusive.get(name, 0.0) + ms
+    overall = sum(values.get("total", [])) or 1.0
+    exclusive["total"] = overall
+    summary = []
+    for name, ms in values.items():
+        ms.sort()
+        summary.append({
+            "phase": name,
+            "count": len(ms),
+            "p50_ms": _percentile(ms, 50),
+            "p95_ms": _percentile(ms, 95),
+            "max_ms": ms[-1],
+            "share": round(exclusive.get(name, 0.0) / overall, 4)
+        })
+    return sorted(summary, key=lambda entry: -entry["p95_ms"])
+
+def parse_cli_arguments():
+    """
+    Function to parse the arguments that were passed on to this python script when it was executed.
+
+    Returns:
+        Namespace containing all key=value pairs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Handelsregister timings",
+        description="Wertet die Zeitmessungen der Suchen aus (p50/p95 pro Phase)."
+    )
+    parser.add_argument("trace", nargs="?", help="The JSONL trace file", default=str(default_trace_path()))
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_cli_arguments()
+    with open(args.trace, encoding="utf-8") as f:
+        for entry in summarize(json.loads(line) for line in f if line.strip()):
+            print(json.dumps(entry, ensure_ascii=False))
+    sys.exit(0)
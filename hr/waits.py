@@ -0,0 +1,114 @@
+# Condition based waits for the Selenium flows, replacing the fixed time.sleep() calls after widget changes and downloads.
+
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional, Set
+
+# File suffixes that browsers use for downloads that are still in progress.
+PARTIAL_DOWNLOAD_SUFFIXES = (".crdownload", ".part", ".partial", ".tmp", ".download")
+
+# Evaluates to true once the page finished loading and neither PrimeFaces nor jQuery have pending AJAX requests.
+AJAX_IDLE_SCRIPT = """
+if (document.readyState !== 'complete') { return false; }
+if (window.PrimeFaces && PrimeFaces.ajax && PrimeFaces.ajax.Queue && !PrimeFaces.ajax.Queue.isEmpty()) { return false; }
+if (window.jQuery && window.jQuery.active > 0) { return false; }
+return true;
+"""
+
+def wait_for_ajax_idle(driver: Any, timeout: float = 10, poll: float = 0.1) -> bool:
+    """
+    Waits until the DOM is loaded and all AJAX requests triggered by a widget change (radio buttons, checkboxes, ...) are done.
+
+    Args:
+        driver (Any): The running WebDriver instance.
+        timeout (float): Maximum number of seconds to wait.
+        poll (float): Number of seconds between two checks.
+
+    Returns:
+        bool: True if the page got idle in time, False otherwise.
+    """
+    # Imported here, the download helpers of this module are used without a browser as well.
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    def is_idle(d) -> bool:
+        try:
+            return bool(d.execute_script(AJAX_IDLE_SCRIPT))
+        except WebDriverException:
+            return False # The page is currently getting replaced.
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(is_idle)
+        return True
+    except TimeoutException:
+        return False
+
+def is_partial_download(path: Path) -> bool:
+    """
+    Checks if a file in the download directory still gets written by the browser.
+
+    Args:
+        path (Path): The path of the file.
+
+    Returns:
+        bool: True if the file is an unfinished download.
+    """
+    return path.suffix.lower() in PARTIAL_DOWNLOAD_SUFFIXES
+
+def snapshot_dir(dl_path: Path) -> Set[str]:
+    """
+    Collects the names of all files that already exist inside of the download directory.
+    Needs to get called before the download gets triggered, so that old files are not mistaken for the new download.
+
+    Args:
+        dl_path (Path): The download directory.
+
+    Returns:
+        Set[str]: The names of the existing files.
+    """
+    if not dl_path.is_dir():
+        return set()
+    return {p.name for p in dl_path.iterdir()}
+
+def wait_for_download(dl_path: Path, existing: Iterable[str] = (), timeout: float = 60, stable_for: float = 0.5, poll: float = 0.1) -> Path:
+    """
+    Watches the download directory until a new file was finalized by the browser.
+    A download counts as finished once no partial file is left and the size of the new file did not change for `stable_for` seconds.
+
+    Args:
+        dl_path (Path): The download directory.
+        existing (Iterable[str]): Names of files that already existed before the download was triggered (see `snapshot_dir`).
+        timeout (float): Maximum number of seconds to wait for the download.
+        stable_for (float): Number of seconds the file size has to stay the same.
+        poll (float): Number of seconds between two checks.
+
+    Returns:
+        Path: The path of the downloaded file.
+
+    Raises:
+        TimeoutError: If no finished download showed up in time.
+    """
+    known = set(existing)
+    deadline = time.monotonic() + timeout
+    last_size: Optional[int] = None
+    stable_since = 0.0
+    candidate: Optional[Path] = None
+
+    while time.monotonic() < deadline:
+        new_files = [p for p in dl_path.iterdir() if p.name not in known] if dl_path.is_dir() else []
+        finished = [p for p in new_files if not is_partial_download(p)]
+
+        if finished and len(finished) == len(new_files):
+            # Take the most recent file, in case more than one download got finished in the meantime.
+            current = max(finished, key=lambda p: p.stat().st_mtime)
+            size = current.stat().st_size
+            now = time.monotonic()
+            if current != candidate or size != last_size:
+                candidate, last_size, stable_since = current, size, now
+            elif size > 0 and now - stable_since >= stable_for:
+                return current
+        else:
+            candidate, last_size = None, None
+        time.sleep(poll)
+
+    raise TimeoutError(f"Der Download in '{dl_path}' wurde nicht innerhalb von {timeout} Sekunden abgeschlossen.")
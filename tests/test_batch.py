@@ -0,0 +1,98 @@
+import io
+import json
+import pytest
+from hr import batch
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+@pytest.fixture
+def csv_input():
+    return io.StringIO(
+        "id,schlagwoerter,city,sucheAehnliche\n"
+        "1,Testfirma GmbH,Musterstadt,\n"
+        "2,testfirma  gmbh,musterstadt,\n"
+        "3,Andere AG,Berlin,ja\n"
+        "4,,Berlin,\n"
+    )
+
+@pytest.fixture
+def jsonl_input():
+    return io.StringIO(
+        '{"s": "Testfirma GmbH", "ci": "Musterstadt"}\n'
+        '\n'
+        '{"schlagwoerter": "Kaputt AG", "schlagwortOptionen": "exact"}\n'
+        '{"schlagwoerter": "Andere AG", "so": "fuzzy"}\n'
+    )
+
+@pytest.fixture
+def events():
+    return []
+
+# ----------------------------- #
+# -- Tests for reading input -- #
+# ----------------------------- #
+
+def test_csv_duplicates_are_merged(csv_input, events):
+    """Gleichwertige Anfragen werden nur einmal gesucht, die übersprungenen Zeilen werden gemeldet."""
+    queries = batch.collect_queries(batch.read_raw_queries(csv_input, "csv"), events.append)
+
+    assert [q.lines for q in queries] == [[2, 3], [4]]
+    assert queries[0].ids == ["1", "2"]
+    assert queries[1].lookup_args() == ("Andere AG", "all", True, False, "Berlin", None, None)
+    assert {"event": "duplicate", "line": 3, "first_line": 2} in events
+    assert [e["line"] for e in events if e["event"] == "invalid"] == [5]
+
+def test_jsonl_short_names_and_validation(jsonl_input, events):
+    queries = batch.collect_queries(batch.read_raw_queries(jsonl_input, "jsonl"), events.append)
+
+    assert [q.lookup_args() for q in queries] == [
+        ("Testfirma GmbH", "all", False, False, "Musterstadt", None, None),
+        ("Kaputt AG", "exact", False, False, None, None, None),
+    ]
+    assert [e["line"] for e in events if e["event"] == "invalid"] == [4]
+
+def test_broken_jsonl_lines_are_skipped(events):
+    """Eine ungültige Zeile wird gemeldet, die Zeilen davor und danach werden trotzdem gesucht."""
+    stream = io.StringIO(
+        '{"s": "Testfirma GmbH"}\n'
+        '{"s": "Kaputt AG",\n'
+        '[1]\n'
+        '"x"\n'
+        '{"s": "Andere AG"}\n'
+    )
+    queries = batch.collect_queries(batch.read_raw_queries(stream, "jsonl", events.append), events.append)
+
+    assert [q.query["schlagwoerter"] for q in queries] == ["Testfirma GmbH", "Andere AG"]
+    assert [(e["event"], e["line"]) for e in events] == [("invalid", 2), ("invalid", 3), ("invalid", 4)]
+    assert events[0]["error"].startswith("Ungültiges JSON")
+    assert events[1]["error"] == "Die Zeile ist kein JSON-Objekt."
+
+# ---------------------------------- #
+# -- Tests for the result objects -- #
+# ---------------------------------- #
+
+def test_found_and_failed_results(jsonl_input, events):
+    """Ergebnisse und Fehler werden mit den Zeilen und IDs ihrer Anfrage ausgegeben, Fehler zusätzlich gemeldet."""
+    queries = batch.collect_queries(batch.read_raw_queries(jsonl_input, "jsonl"), lambda e: None)
+    summary = batch.BatchSummary(total=len(queries))
+    emitted = []
+
+    batch.record_result(summary, queries[0], emitted.append, events.append, result={"managers": [], "name": "Testfirma GmbH", "address": ""})
+    batch.record_result(summary, queries[1], emitted.append, events.append, error=RuntimeError("Browser abgestürzt"))
+
+    assert [e["status"] for e in emitted] == ["found", "error"]
+    assert emitted[0]["result"]["name"] == "Testfirma GmbH"
+    assert emitted[1]["error"] == "RuntimeError: Browser abgestürzt"
+    assert summary.done == 2 and summary.found == 1 and summary.failed == 1
+    assert [e["event"] for e in events] == ["progress", "failure", "progress"]
+
+def test_not_found(events):
+    batch_query = batch.BatchQuery(query={"schlagwoerter": "Gibtsnicht", "id": 7}, lines=[1], ids=[7])
+    summary = batch.BatchSummary(total=1)
+    emitted = []
+    batch.record_result(summary, batch_query, emitted.append, events.append)
+    assert emitted == [{"lines": [1], "query": {"schlagwoerter": "Gibtsnicht"}, "ids": [7], "status": "not_found"}]
+    assert summary.not_found == 1
+    json.dumps(emitted)
@@ -0,0 +1,60 @@
+import pytest
+from benchmarks import run, synthetic
+from hr import get_companies_in_searchresults, pyutil
+
+# ------------------------------------ #
+# -- Tests for the synthetic inputs -- #
+# ------------------------------------ #
+
+def test_generated_ad_text_is_extracted():
+    """Der generierte AD-Text liefert genau die erwarteten Werte."""
+    ad = synthetic.generate_ad_text(managers=5, purpose_lines=20, tail_lines=50, seed=3)
+    result = pyutil.extract_company_data_from_pdf("", _test_text=ad.text)
+    assert result.name == ad.name
+    assert result.address == ad.address
+    assert result.ceos == ad.managers
+
+def test_generated_pdf_is_extracted(tmp_path):
+    """Die generierte PDF-Datei wird über mehrere Seiten verteilt und liefert dieselben Werte."""
+    ad = synthetic.generate_ad_text(managers=3, tail_lines=200, seed=4)
+    pdf_path = synthetic.write_ad_pdf(tmp_path / "AD.pdf", ad.text)
+    result = pyutil.extract_company_data_from_pdf(str(pdf_path), early_exit=False)
+    assert (result.name, result.address, result.ceos) == (ad.name, ad.address, ad.managers)
+    assert result.pages_read > 4
+
+def test_generated_result_html_is_parsed():
+    """Die generierte Ergebnisseite enthält die gewünschte Anzahl an Zeilen und Historieneinträgen."""
+    rows = get_companies_in_searchresults(synthetic.generate_result_html(rows=12, history=3, seed=5))
+    assert len(rows) == 12
+    assert all(len(row["history"]) == 3 for row in rows)
+    assert all(row["documents"] == "".join(synthetic.DOCUMENT_TYPES) for row in rows)
+
+# ------------------------------ #
+# -- Tests for the comparison -- #
+# ------------------------------ #
+
+def test_compare_marks_regressions():
+    """Langsamere Fälle und Fälle mit höherem Speicherbedarf werden als Regression markiert."""
+    baseline = {"results": [
+        {"name": "a", "size": "small", "median_s": 1.0, "peak_bytes": 100},
+        {"name": "b", "size": "small", "median_s": 1.0, "peak_bytes": 100},
+        {"name": "c", "size": "small", "median_s": 1.0, "peak_bytes": 100}
+    ]}
+    results = [
+        {"name": "a", "size": "small", "median_s": 0.5, "peak_bytes": 100},
+        {"name": "b", "size": "small", "median_s": 2.0, "peak_bytes": 100},
+        {"name": "c", "size": "small", "median_s": 1.0, "peak_bytes": 200},
+        {"name": "d", "size": "small", "median_s": 1.0, "peak_bytes": 100}
+    ]
+    lines = run.compare(results, baseline, threshold=0.1)
+    assert len(lines) == 3
+    assert not lines[0].startswith("REGRESSION")
+    assert lines[1].startswith("REGRESSION") and lines[2].startswith("REGRESSION")
+
+def test_measure_reports_case():
+    """Ein einzelner Fall wird gemessen und mit allen Kennzahlen zurückgegeben."""
+    case = run.Case("noop", "small", lambda: sum(range(10)), 10)
+    result = run.measure(case, repeat=2, min_time=0.001)
+    assert result["name"] == "noop" and result["rounds"] == 2
+    assert result["ops_per_s"] > 0
+    assert result["peak_bytes"] >= 0
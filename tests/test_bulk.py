@@ -0,0 +1,80 @@
+import json
+import fitz
+import pytest
+from hr import bulk, pyutil
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+AD_TEXT = """1. a) Firma:
+{name}
+2. Geschäftsanschrift:
+Musterstraße {number}, 12345 Musterstadt
+3. b) Geschäftsführer:
+Geschäftsführer: Mustermann, Max, Musterhausen, *01.03.1988
+4. Prokura:
+-
+"""
+
+@pytest.fixture
+def archive(tmp_path):
+    """Ein kleines download/-Archiv mit drei Dokumenten und einer kaputten Datei."""
+    paths = []
+    for number in range(3):
+        folder = tmp_path / "download" / f"testfirma-{number}-musterstadt"
+        folder.mkdir(parents=True)
+        path = folder / "AD.pdf"
+        with fitz.open() as doc:
+            doc.new_page().insert_text((50, 50), AD_TEXT.format(name=f"Testfirma {number} GmbH", number=number), fontname="helv")
+            doc.save(str(path))
+        paths.append(path)
+    broken = tmp_path / "download" / "kaputt" / "AD.pdf"
+    broken.parent.mkdir()
+    broken.write_text("kein pdf")
+    return tmp_path / "download", paths, broken
+
+# ---------------------------- #
+# -- Tests for extract_many -- #
+# ---------------------------- #
+
+@pytest.mark.parametrize("workers,chunk_size", [(1, 16), (2, 1), (2, 3)])
+def test_extract_many(archive, workers, chunk_size):
+    """Alle Dateien werden extrahiert, eine kaputte Datei wird einzeln als Fehler gemeldet."""
+    _, paths, broken = archive
+    results = dict(bulk.extract_many(paths + [broken], workers=workers, chunk_size=chunk_size))
+
+    assert set(results) == {str(p) for p in paths + [broken]}
+    for number, path in enumerate(paths):
+        data = results[str(path)]
+        assert isinstance(data, bulk.CompanyPdfData)
+        assert data.name == f"Testfirma {number} GmbH"
+        assert data.address == f"Musterstraße {number}, 12345 Musterstadt"
+        assert data.ceos == ["Mustermann, Max"]
+    assert isinstance(results[str(broken)], bulk.ExtractionError)
+
+def test_extract_file_missing(tmp_path):
+    """Eine fehlende Datei wird nicht ausgegeben, sondern als Fehler zurückgegeben."""
+    path, result = bulk.extract_file(str(tmp_path / "fehlt.pdf"))
+    assert isinstance(result, bulk.ExtractionError)
+    assert result.path == path
+
+def test_collect_pdf_paths(archive):
+    """Verzeichnisse werden rekursiv nach PDF-Dateien durchsucht."""
+    root, paths, broken = archive
+    assert set(bulk.collect_pdf_paths([str(root)])) == set(paths + [broken])
+
+def test_cli_writes_jsonl(archive, tmp_path, monkeypatch, capsys):
+    """Die CLI schreibt eine JSON-Zeile pro Datei und meldet eine Zusammenfassung auf stderr."""
+    root, paths, broken = archive
+    output = tmp_path / "out.jsonl"
+    monkeypatch.setattr("sys.argv", ["bulk.py", str(root), "-w", "2", "--chunk-size", "2", "-o", str(output)])
+
+    assert bulk.main() == 1
+
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 4
+    assert sum(1 for line in lines if "error" in line) == 1
+    assert all(line["pages_read"] == 1 for line in lines if "error" not in line)
+    summary = json.loads(capsys.readouterr().err.strip().splitlines()[-1])
+    assert summary == {"event": "summary", "total": 4, "done": 4, "failed": 1}
@@ -0,0 +1,171 @@
+import json
+import pytest
+from selenium.common.exceptions import SessionNotCreatedException
+
+from hr.chromedriver import (
+    ChromeDriverNotFoundError, read_manifest, refresh_chromedriver, resolve_chromedriver, start_with_pinned_driver
+)
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+def fake_chromedriver(path, version="120.0.6099.109"):
+    """Ein ausführbares Skript, das sich wie `chromedriver --version` verhält."""
+    path.write_text('#!/bin/sh\necho "ChromeDriver %s (abc123-refs/branch-heads/6099@{#1})"\n' % version)
+    path.chmod(0o755)
+    return str(path)
+
+@pytest.fixture(autouse=True)
+def no_system_driver(monkeypatch):
+    monkeypatch.delenv("HR_CHROMEDRIVER", raising=False)
+
+@pytest.fixture
+def manifest(tmp_path):
+    return tmp_path / "chromedriver.json"
+
+class FakeInstall:
+    """Ersetzt `ChromeDriverManager().install()` und zählt die Aufrufe."""
+
+    def __init__(self, path=None, error=None):
+        self.path = path
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.path
+
+def no_which(command):
+    return None
+
+# ---------------------------------- #
+# -- Tests for the driver pinning -- #
+# ---------------------------------- #
+
+def test_first_resolve_records_the_driver(tmp_path, manifest):
+    install = FakeInstall(fake_chromedriver(tmp_path / "chromedriver"))
+    driver = resolve_chromedriver(manifest, install=install, which=no_which, clock=lambda: 1000.0)
+
+    assert (driver.path, driver.version, driver.source, driver.resolved_at) == (install.path, "120.0.6099.109", "webdriver-manager", 1000.0)
+    assert json.loads(manifest.read_text())["path"] == install.path
+    assert read_manifest(manifest) == driver
+
+def test_later_resolves_do_not_ask_webdriver_manager(tmp_path, manifest):
+    """Sobald das Manifest existiert, wird webdriver-manager (und damit das Netzwerk) nicht mehr gefragt."""
+    install = FakeInstall(fake_chromedriver(tmp_path / "chromedriver"))
+    first = resolve_chromedriver(manifest, install=install, which=no_which)
+    again = resolve_chromedriver(manifest, install=install, which=no_which)
+    assert again == first
+    assert install.calls == 1
+
+def test_missing_binary_is_resolved_again(tmp_path, manifest):
+    """Ist der festgehaltene Treiber verschwunden (z.B. geleerter Cache), wird neu aufgelöst."""
+    old = tmp_path / "old"
+    old.mkdir()
+    resolve_chromedriver(manifest, install=FakeInstall(fake_chromedriver(old / "chromedriver")), which=no_which)
+    (old / "chromedriver").unlink()
+
+    install = FakeInstall(fake_chromedriver(tmp_path / "chromedriver", version="121.0.6167.85"))
+    driver = resolve_chromedriver(manifest, install=install, which=no_which)
+    assert install.calls == 1
+    assert driver.version == "121.0.6167.85"
+    assert read_manifest(manifest) == driver
+
+def test_broken_manifest_is_resolved_again(tmp_path, manifest):
+    manifest.write_text("{kaputt")
+    install = FakeInstall(fake_chromedriver(tmp_path / "chromedriver"))
+    assert resolve_chromedriver(manifest, install=install, which=no_which).path == install.path
+
+def test_refresh_replaces_the_manifest(tmp_path, manifest):
+    resolve_chromedriver(manifest, install=FakeInstall(fake_chromedriver(tmp_path / "a")), which=no_which)
+    install = FakeInstall(fake_chromedriver(tmp_path / "b", version="122.0.1"))
+    driver = refresh_chromedriver(manifest, install=install, which=no_which)
+    assert install.calls == 1
+    assert read_manifest(manifest) == driver and driver.version == "122.0.1"
+
+# -------------------------------------- #
+# -- Tests for the start with the pin -- #
+# -------------------------------------- #
+
+MISMATCH = SessionNotCreatedException(
+    "session not created: This version of ChromeDriver only supports Chrome version 120\n"
+    "Current browser version is 122.0.6261.57"
+)
+
+class FakeStart:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.paths = []
+
+    def __call__(self, path):
+        self.paths.append(path)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "driver"
+
+def test_version_mismatch_resolves_the_driver_again(tmp_path, manifest):
+    """Passt Chrome nicht mehr zum festgehaltenen Treiber, wird einmal neu aufgelöst und das Manifest aktualisiert."""
+    old = resolve_chromedriver(manifest, install=FakeInstall(fake_chromedriver(tmp_path / "a")), which=no_which)
+    install = FakeInstall(fake_chromedriver(tmp_path / "b", version="122.0.6261.57"))
+    start = FakeStart([MISMATCH])
+
+    assert start_with_pinned_driver(start, manifest_path=manifest, install=install, which=no_which) == "driver"
+    assert start.paths == [old.path, install.path]
+    assert install.calls == 1
+    assert read_manifest(manifest).version == "122.0.6261.57"
+
+def test_version_mismatch_is_retried_only_once(tmp_path, manifest):
+    install = FakeInstall(fake_chromedriver(tmp_path / "chromedriver"))
+    start = FakeStart([MISMATCH, MISMATCH])
+    with pytest.raises(SessionNotCreatedException):
+        start_with_pinned_driver(start, manifest_path=manifest, install=install, which=no_which)
+    assert len(start.paths) == 2
+
+@pytest.mark.parametrize("error", [
+    SessionNotCreatedException("session not created: Chrome failed to start: exited normally."),
+    OSError("kaputt"),
+])
+def test_other_start_errors_are_not_retried(tmp_path, manifest, error):
+    install = FakeInstall(fake_chromedriver(tmp_path / "chromedriver"))
+    start = FakeStart([error])
+    with pytest.raises(type(error)):
+        start_with_pinned_driver(start, manifest_path=manifest, install=install, which=no_which)
+    assert len(start.paths) == 1
+    assert install.calls == 1
+
+# ---------------------------- #
+# -- Tests for the fallback -- #
+# ---------------------------- #
+
+def test_offline_falls_back_to_the_configured_driver(tmp_path, manifest, monkeypatch):
+    """Ohne Netzwerk wird der über HR_CHROMEDRIVER konfigurierte Treiber festgehalten."""
+    monkeypatch.setenv("HR_CHROMEDRIVER", fake_chromedriver(tmp_path / "chromedriver"))
+    driver = resolve_chromedriver(manifest, install=FakeInstall(error=ConnectionError("offline")), which=no_which)
+    assert (driver.path, driver.source) == (str(tmp_path / "chromedriver"), "system")
+
+def test_offline_falls_back_to_the_path(tmp_path, manifest):
+    path = fake_chromedriver(tmp_path / "chromedriver")
+    driver = resolve_chromedriver(manifest, install=FakeInstall(error=ConnectionError("offline")), which=lambda command: path)
+    assert (driver.path, driver.source) == (path, "system")
+
+def test_prefer_system_skips_webdriver_manager(tmp_path, manifest):
+    path = fake_chromedriver(tmp_path / "chromedriver")
+    install = FakeInstall(fake_chromedriver(tmp_path / "other"))
+    driver = refresh_chromedriver(manifest, prefer_system=True, install=install, which=lambda command: path)
+    assert install.calls == 0
+    assert (driver.path, driver.source) == (path, "system")
+
+def test_no_driver_at_all(tmp_path, manifest, monkeypatch):
+    monkeypatch.setenv("HR_CHROMEDRIVER", str(tmp_path / "gibtsnicht"))
+    with pytest.raises(ChromeDriverNotFoundError, match="offline"):
+        resolve_chromedriver(manifest, install=FakeInstall(error=ConnectionError("offline")), which=no_which)
+    assert not manifest.exists()
+
+def test_unreadable_version(tmp_path, manifest):
+    path = tmp_path / "chromedriver"
+    path.write_text("#!/bin/sh\necho unbekannt\n")
+    path.chmod(0o755)
+    assert resolve_chromedriver(manifest, install=FakeInstall(str(path)), which=no_which).version is None
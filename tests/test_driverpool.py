@@ -0,0 +1,197 @@
+import threading
+import pytest
+from hr.driverpool import DriverPool, block_resources, build_chrome_options, process_tree_memory
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeDriver:
+    """Ersetzt einen echten Chrome WebDriver und merkt sich alle Aufrufe."""
+
+    def __init__(self, dl_path):
+        self.download_dirs = [str(dl_path)]
+        self.cdp_commands = []
+        self.visited = []
+        self.quit_called = False
+        self.broken = False
+
+    def execute_cdp_cmd(self, cmd, params):
+        if self.broken:
+            raise RuntimeError("browser crashed")
+        self.cdp_commands.append((cmd, params))
+        if cmd == "Browser.setDownloadBehavior":
+            self.download_dirs.append(params["downloadPath"])
+
+    def execute_script(self, script):
+        pass
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def quit(self):
+        self.quit_called = True
+
+@pytest.fixture
+def created():
+    """Liste aller Browser, die von der Factory gestartet wurden."""
+    return []
+
+@pytest.fixture
+def pool(created, tmp_path):
+    def factory(dl_path):
+        driver = FakeDriver(dl_path)
+        created.append(driver)
+        return driver
+    pool = DriverPool(size=2, factory=factory, download_dir=tmp_path)
+    yield pool
+    pool.close()
+
+# ------------------------- #
+# -- Tests for the pool  -- #
+# ------------------------- #
+
+def test_driver_is_reused_between_jobs(pool, created, tmp_path):
+    """Ein zurückgegebener Browser wird für den nächsten Job wiederverwendet statt neu gestartet."""
+    with pool.checkout(tmp_path / "a") as first:
+        pass
+    with pool.checkout(tmp_path / "b") as second:
+        pass
+    assert first is second
+    assert len(created) == 1
+    assert first.download_dirs[-1] == str(tmp_path / "b")
+
+def test_state_is_reset_on_checkin(pool, tmp_path):
+    """Die Cookies aller Domains werden gelöscht und die Seite geschlossen, sobald ein Browser zurückgegeben wird."""
+    driver = pool.acquire(tmp_path)
+    pool.release(driver)
+    assert driver.cdp_commands[-1] == ("Network.clearBrowserCookies", {})
+    assert driver.visited[-1] == "about:blank"
+
+def test_pool_blocks_when_exhausted(pool, tmp_path):
+    """Sind alle Browser vergeben, wartet acquire bis zum Timeout."""
+    pool.acquire(tmp_path)
+    pool.acquire(tmp_path)
+    with pytest.raises(TimeoutError):
+        pool.acquire(tmp_path, timeout=0.05)
+
+def test_waiting_job_gets_released_driver(pool, tmp_path):
+    """Ein wartender Job bekommt den Browser, der zwischenzeitlich zurückgegeben wurde."""
+    first = pool.acquire(tmp_path)
+    pool.acquire(tmp_path)
+    result = {}
+    waiter = threading.Thread(target=lambda: result.update(driver=pool.acquire(tmp_path, timeout=2)))
+    waiter.start()
+    pool.release(first)
+    waiter.join()
+    assert result["driver"] is first
+
+def test_broken_driver_is_replaced(pool, created, tmp_path):
+    """Ein Browser, der sich nicht zurücksetzen lässt, wird beendet und durch einen neuen ersetzt."""
+    driver = pool.acquire(tmp_path)
+    driver.broken = True
+    pool.release(driver)
+    assert driver.quit_called
+    replacement = pool.acquire(tmp_path)
+    assert replacement is not driver
+    assert pool.stats()["discarded"] == 1
+
+def test_warm_and_stats(pool, created, tmp_path):
+    """warm() startet die Browser vorab und stats() liefert Größe und Auslastung."""
+    pool.warm()
+    assert len(created) == 2
+    pool.acquire(tmp_path)
+    stats = pool.stats()
+    assert stats["size"] == 2
+    assert stats["alive"] == 2
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 1
+    assert stats["checkouts"] == 1
+    assert 0.0 <= stats["utilization"] <= 1.0
+
+def test_close_quits_all_drivers(pool, created, tmp_path):
+    """close() beendet alle Browser, auch die erst danach zurückgegebenen."""
+    pool.warm()
+    driver = pool.acquire(tmp_path)
+    pool.close()
+    pool.release(driver)
+    assert all(d.quit_called for d in created)
+    with pytest.raises(RuntimeError):
+        pool.acquire(tmp_path)
+
+def test_stats_report_the_memory_per_browser(created, tmp_path):
+    """stats() meldet den Speicherverbrauch jedes laufenden Browsers."""
+    memory = {}
+
+    def factory(dl_path):
+        driver = FakeDriver(dl_path)
+        memory[id(driver)] = (len(created) + 1) * 100 * 1024 * 1024
+        created.append(driver)
+        return driver
+
+    with DriverPool(size=2, factory=factory, download_dir=tmp_path, memory=lambda d: memory[id(d)]) as pool:
+        pool.warm()
+        stats = pool.stats()
+        assert sorted(stats["memory_bytes"]) == [100 * 1024 * 1024, 200 * 1024 * 1024]
+        assert stats["memory_total_bytes"] == 300 * 1024 * 1024
+        assert stats["memory_avg_bytes"] == 150 * 1024 * 1024
+
+        driver = pool.acquire(tmp_path)
+        pool.release(driver, discard=True)
+        remaining = next(d for d in created if d is not driver)
+        assert pool.stats()["memory_bytes"] == [memory[id(remaining)]]
+
+def test_unknown_memory(pool, tmp_path):
+    """Ohne procfs bzw. ohne Prozess ist der Speicherverbrauch unbekannt statt 0."""
+    pool.warm(1)
+    stats = pool.stats()
+    assert stats["memory_bytes"] == [None]
+    assert stats["memory_total_bytes"] == 0 and stats["memory_avg_bytes"] is None
+
+# -------------------------------- #
+# -- Tests for the lean profile -- #
+# -------------------------------- #
+
+def test_lean_profile_options(tmp_path):
+    """Das schlanke Profil lädt eager und ohne Erweiterungen, Bilder und Hintergrund-Netzwerk."""
+    options = build_chrome_options(tmp_path, lean=True)
+    assert options.page_load_strategy == "eager"
+    assert "--disable-extensions" in options.arguments
+    assert "--disable-background-networking" in options.arguments
+    assert options.experimental_options["prefs"]["profile.managed_default_content_settings.images"] == 2
+    assert options.experimental_options["prefs"]["download.default_directory"] == str(tmp_path)
+
+def test_full_profile_via_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("HR_CHROME_PROFILE", "full")
+    options = build_chrome_options(tmp_path)
+    assert options.page_load_strategy == "normal"
+    assert "--disable-extensions" not in options.arguments
+    assert "profile.managed_default_content_settings.images" not in options.experimental_options["prefs"]
+
+def test_resources_are_blocked_via_devtools(tmp_path):
+    driver = FakeDriver(tmp_path)
+    block_resources(driver)
+    commands = dict(driver.cdp_commands)
+    assert "Network.enable" in commands
+    assert {"*.png*", "*.woff*", "*.css*"} <= set(commands["Network.setBlockedURLs"]["urls"])
+
+def write_process(proc, pid, ppid, pss_kb=None, rss_kb=None, name="chrome"):
+    entry = proc / str(pid)
+    entry.mkdir()
+    (entry / "stat").write_text("%d (%s) S %d 1 1 0 -1\n" % (pid, name, ppid))
+    if pss_kb is not None:
+        (entry / "smaps_rollup").write_text("Rss:  %d kB\nPss:  %d kB\n" % (pss_kb * 2, pss_kb))
+    if rss_kb is not None:
+        (entry / "status").write_text("Name:\t%s\nVmRSS:\t%d kB\n" % (name, rss_kb))
+
+def test_memory_of_the_process_tree(tmp_path):
+    """Der Speicher von chromedriver und allen Chrome-Prozessen darunter wird summiert, fremde Prozesse nicht."""
+    write_process(tmp_path, 100, 1, pss_kb=10, name="chromedriver")
+    write_process(tmp_path, 101, 100, pss_kb=200)
+    write_process(tmp_path, 102, 101, pss_kb=50, name="chrome (renderer)")
+    write_process(tmp_path, 103, 101, rss_kb=30) # No smaps_rollup, falls back to the RSS.
+    write_process(tmp_path, 200, 1, pss_kb=999, name="other")
+    (tmp_path / "self").mkdir()
+    assert process_tree_memory(100, proc=tmp_path) == (10 + 200 + 50 + 30) * 1024
+    assert process_tree_memory(101, proc=tmp_path) == (200 + 50 + 30) * 1024
+    assert process_tree_memory(999, proc=tmp_path) is None
@@ -1,5 +1,12 @@
 from hr import get_companies_in_searchresults,HandelsRegister
+from hr.handelsregister import (
+    RegisterNumber, find_court_option, grid_start, page_request_fields, parse_page_response, parse_register_number, parse_result,
+    register_matches, result_paging
+)
+from benchmarks.synthetic import generate_result_html
+from bs4 import BeautifulSoup
 import argparse
+import pytest
 
 def test_parse_search_result():
     # simplified html from a real search
@@ -20,4 +27,169 @@ def test_get_results():
     h = HandelsRegister(args)
     h.open_startpage()
     companies = h.search_company()
-    assert len(companies) > 0
\ No newline at end of file
+    assert len(companies) > 0
+
+
+def test_cached_search_does_not_use_the_quota(tmp_path, monkeypatch, mocker):
+    """Eine Suche aus dem Cache öffnet das Portal nicht und verbraucht kein Kontingent."""
+    monkeypatch.chdir(tmp_path)
+    quota = mocker.patch("hr.handelsregister.portal_quota")
+    args = argparse.Namespace(debug=False, force=False, schlagwoerter='gasag', schlagwortOptionen='all')
+    h = HandelsRegister(args)
+    h.companyname2cachename('gasag').write_text(generate_result_html(rows=2, history=1, seed=7))
+
+    assert len(h.search_company()) == 2
+    quota.assert_not_called()
+    assert not h.startpage_open
+
+def parse_with_beautifulsoup(html):
+    # The former implementation, serves as the reference for the streaming parser.
+    grid = BeautifulSoup(html, 'html.parser').find('table', role='grid')
+    return [parse_result(row) for row in grid.find_all('tr') if row.get('data-ri') is not None] if grid else []
+
+@pytest.mark.parametrize("rows,history,seed", [(0, 0, 1), (1, 0, 2), (25, 2, 3), (100, 5, 4)])
+def test_streaming_parser_matches_beautifulsoup(rows, history, seed):
+    """Der Streaming-Parser liefert für generierte Ergebnisseiten dieselben Zeilen wie BeautifulSoup."""
+    html = generate_result_html(rows=rows, history=history, seed=seed)
+    assert grid_start(html) > 0
+    assert get_companies_in_searchresults(html) == parse_with_beautifulsoup(html)
+
+@pytest.mark.parametrize("prefix", [
+    '<!-- <table role="grid"> -->',
+    '<script>var t = \'<table role="grid"><tr data-ri="9"><td>x</td></tr></table>\';</script>',
+    '<div title=\'<table role="grid">\'>',
+    '<table role="grid"><tr data-ri="0"><td>1</td><td>A</td><td>B</td><td>C</td><td>D</td><td>AD</td></tr></table>',
+    '<div><span>',
+])
+def test_streaming_parser_handles_markup_in_front_of_the_grid(prefix):
+    """Kommentare, Skripte und Attribute vor der Tabelle verfälschen das Ergebnis nicht."""
+    html = '<html><body>%s%s</span></div></body></html>' % (prefix, generate_result_html(rows=2, history=1, seed=6, page_padding=0))
+    assert get_companies_in_searchresults(html) == parse_with_beautifulsoup(html)
+
+def test_streaming_parser_cell_text():
+    """Entities werden aufgelöst, Skripte in den Zellen ignoriert und verschachtelte Tabellen mitgezählt."""
+    cells = ['', 'Köln &amp; Bonn', '<b>Müller&nbsp;GmbH</b>', '<script>var a = "<td>";</script>Köln', 'aktuell', '<br>AD<br/>CD', '', 'History', '1.) Alt', '1.) Bonn', '']
+    html = '<table role="grid"><tr data-ri="0">%s</tr></table>' % ''.join('<td>%s</td>' % cell for cell in cells)
+    assert get_companies_in_searchresults(html) == parse_with_beautifulsoup(html) == [{
+        'court': 'Köln & Bonn',
+        'name': 'Müller\xa0GmbH',
+        'state': 'Köln',
+        'status': 'aktuell',
+        'documents': 'ADCD',
+        'history': [('1.) Alt', '1.) Bonn')]
+    }]
+
+def portal_row(name='<span class="marginLeft20">GASAG AG</span>', documents='<a><span>AD</span></a>', history=''):
+    # The nesting of a result row of the portal: one cell with a table per row, the history tables inside of another cell.
+    return (
+        '<tr data-ri="0"><td colspan="9"><table role="grid"><tbody>'
+        '<tr><td>Berlin <span> District court Berlin (Charlottenburg) HRB 44343 </span></td></tr>'
+        '<tr><td>%s</td><td><span>Berlin</span></td><td><span>currently registered</span></td><td>%s</td></tr>'
+        '%s</tbody></table></td></tr>'
+    ) % (name, documents, history)
+
+def test_streaming_parser_without_history():
+    """Zeilen ohne Historien-Tabelle haben eine leere Historie."""
+    html = '<table role="grid"><tbody>%s</tbody></table>' % portal_row()
+    assert get_companies_in_searchresults(html) == parse_with_beautifulsoup(html) == [{
+        'court': 'Berlin  District court Berlin (Charlottenburg) HRB 44343',
+        'name': 'GASAG AG',
+        'state': 'Berlin',
+        'status': 'currently registered',
+        'documents': 'AD',
+        'history': []
+    }]
+
+def test_streaming_parser_nested_spans():
+    """Der Text verschachtelter Elemente wird in der Reihenfolge des Dokuments zusammengesetzt."""
+    history = (
+        '<tr><td colspan="7"><table role="grid"><tbody><tr><td>History</td></tr></tbody></table>'
+        '<table role="grid"><tbody><tr><td><span><span>1.)</span> <span>Gasag <span>Berliner</span> Gaswerke</span></span></td>'
+        '<td><span>1.) <span>Berlin</span></span></td><td></td></tr></tbody></table></td></tr>'
+    )
+    html = '<table role="grid"><tbody>%s</tbody></table>' % portal_row('<span class="marginLeft20"><span>GASAG</span> <b><span>AG</span></b></span>', history=history)
+    [company] = get_companies_in_searchresults(html)
+    assert company == parse_with_beautifulsoup(html)[0]
+    assert company['name'] == 'GASAG AG'
+    assert company['history'] == [('1.) Gasag Berliner Gaswerke', '1.) Berlin')]
+
+def test_streaming_parser_empty_document_cell():
+    """Eine Zeile ohne Dokumente liefert einen leeren Eintrag und verschiebt die folgenden Zellen nicht."""
+    html = '<table role="grid"><tbody>%s%s</tbody></table>' % (portal_row(documents=''), portal_row(documents='<div class="linksPanel"></div>').replace('data-ri="0"', 'data-ri="1"'))
+    companies = get_companies_in_searchresults(html)
+    assert companies == parse_with_beautifulsoup(html)
+    assert [(c['documents'], c['status'], c['history']) for c in companies] == [('', 'currently registered', [])] * 2
+
+def test_streaming_parser_without_grid(capsys):
+    """Ohne Ergebnistabelle wird eine leere Liste geliefert."""
+    assert get_companies_in_searchresults('<html><body><table><tr data-ri="0"><td>x</td></tr></table></body></html>') == []
+    assert "No results table found" in capsys.readouterr().out
+
+def test_result_paging():
+    """Die Paginator-Optionen werden aus dem Widget-Skript der Ergebnistabelle gelesen."""
+    html = """<script>PrimeFaces.cw("DataTable","widget_ergebnissForm_selectedSuchErgebnisFormTable",{id:"ergebnissForm:selectedSuchErgebnisFormTable",selectionMode:"single",paginator:{id:['ergebnissForm:selectedSuchErgebnisFormTable_paginator_top'],rows:100,rowCount:234,page:0,currentPageTemplate:'({currentPage} of {totalPages})'}});</script>"""
+    assert result_paging(html) == (100, 234)
+    assert result_paging('<table role="grid"></table>') is None
+
+def test_parse_page_response():
+    """Zeilen und neuer ViewState werden aus der Partial-Response gelesen, Fehlerantworten liefern keine Zeilen."""
+    xml = """<?xml version='1.0' encoding='UTF-8'?><partial-response id="j_id1"><changes><update id="ergebnissForm:selectedSuchErgebnisFormTable"><![CDATA[<tr data-ri="100"><td>x</td></tr>]]></update><update id="j_id1:javax.faces.ViewState:0"><![CDATA[-123:456]]></update></changes></partial-response>"""
+    assert parse_page_response(xml) == ('<tr data-ri="100"><td>x</td></tr>', '-123:456')
+    assert parse_page_response("<partial-response><redirect url=\"/rp_web/sessiontimeout.xhtml\"/></partial-response>") == (None, None)
+    assert parse_page_response("<html>kaputt") == (None, None)
+    fields = page_request_fields(200, 100)
+    assert fields["ergebnissForm:selectedSuchErgebnisFormTable_first"] == "200"
+    assert fields["ergebnissForm:selectedSuchErgebnisFormTable_rows"] == "100"
+
+@pytest.mark.parametrize("value,expected", [
+    ("HRB 44343", RegisterNumber("HRB", "44343")),
+    ("hrb 44343 B", RegisterNumber("HRB", "44343 B")),
+    # Lower case letters are not a suffix of the number.
+    ("hrb 44343 b", RegisterNumber("HRB", "44343", "b")),
+    ("HRB 44343 AG Charlottenburg", RegisterNumber("HRB", "44343", "AG Charlottenburg")),
+    ("HRB 44343 Amtsgericht Charlottenburg", RegisterNumber("HRB", "44343", "Amtsgericht Charlottenburg")),
+    ("HRB 44343 B AG Charlottenburg", RegisterNumber("HRB", "44343 B", "AG Charlottenburg")),
+    ("HRB 44343, Charlottenburg", RegisterNumber("HRB", "44343", "Charlottenburg")),
+    ("HRB 44343 Charlottenburg", RegisterNumber("HRB", "44343", "Charlottenburg")),
+    ("HRB 44343 B Berlin (Charlottenburg)", RegisterNumber("HRB", "44343 B", "Berlin (Charlottenburg)")),
+    ("Amtsgericht Charlottenburg HRB 44343", RegisterNumber("HRB", "44343", "Amtsgericht Charlottenburg")),
+    ("gnr 12", RegisterNumber("GnR", "12")),
+    ("44343", RegisterNumber(None, "44343")),
+    ("Testfirma GmbH", None),
+    (None, None),
+])
+def test_parse_register_number(value, expected):
+    assert parse_register_number(value) == expected
+
+def test_parse_register_number_with_separate_type_and_court():
+    """Registerart und Gericht aus eigenen Argumenten ergänzen die Nummer."""
+    assert parse_register_number("44343", "HRB", "F1103R") == RegisterNumber("HRB", "44343", "F1103R")
+    assert parse_register_number("VR 7, Bonn", "HRB", "Köln") == RegisterNumber("VR", "7", "Bonn")
+
+def test_find_court_option():
+    """Gerichte werden über Code, vollständigen Namen oder einen eindeutigen Namensteil gefunden."""
+    options = [("", "alle"), ("F1103R", "Berlin (Charlottenburg)"), ("D3201", "Ansbach"), ("R3306", "Bonn"), ("R2101", "Bonn-Bad Godesberg"), ("R1101", "Aachen")]
+    assert find_court_option(options, "f1103r") == "F1103R"
+    assert find_court_option(options, "Amtsgericht Ansbach") == "D3201"
+    assert find_court_option(options, "Charlottenburg") == "F1103R"
+    assert find_court_option(options, "Bonn") == "R3306"
+    assert find_court_option(options, "Godesberg") == "R2101"
+    assert find_court_option(options, "Köln") is None
+
+def test_register_matches():
+    """Nur die Zeile mit genau dieser Nummer (und diesem Gericht) gehört zum Registereintrag."""
+    court = "Berlin District court Berlin (Charlottenburg) HRB 44343"
+    assert register_matches(court, RegisterNumber("HRB", "44343", "Charlottenburg"))
+    assert register_matches(court, RegisterNumber("HRB", "44343", "F1103R"))
+    assert not register_matches(court, RegisterNumber("HRB", "4434"))
+    assert not register_matches(court, RegisterNumber("HRA", "44343"))
+    assert not register_matches(court, RegisterNumber("HRB", "44343", "Hamburg"))
+    assert not register_matches(court + " B", RegisterNumber("HRB", "44343"))
+
+def test_register_matches_the_text_of_a_whole_row():
+    """Ein Firmenname mit kurzem ersten Wort in der nächsten Zeile ist kein Suffix der Registernummer."""
+    row = "Berlin\nDistrict court Berlin (Charlottenburg) HRB 44343 B\nDB Netz AG\nBerlin\ncurrently registered"
+    assert register_matches(row, RegisterNumber("HRB", "44343 B"))
+    assert not register_matches(row, RegisterNumber("HRB", "44343"))
+    assert register_matches("HRB 44343\nDB Netz AG", RegisterNumber("HRB", "44343"))
+    assert register_matches("HRB 44343 de Vries GmbH", RegisterNumber("HRB", "44343"))
@@ -0,0 +1,260 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pytest
+from hr import httpclient
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+WELCOME = """<html><body>
+<form id="naviForm" name="naviForm" method="post" action="/rp_web/welcome.xhtml">
+<input type="hidden" name="naviForm" value="naviForm" />
+<a id="naviForm:erweiterteSucheLink" href="#">Erweiterte Suche</a>
+<input type="hidden" name="javax.faces.ViewState" value="vs-welcome" />
+</form></body></html>"""
+
+SEARCH_FORM = """<html><body>
+<form id="form" name="form" method="post" action="/rp_web/erweitertesuche.xhtml">
+<input type="hidden" name="form" value="form" />
+<input id="form:schlagwoerter" name="form:schlagwoerter" type="text" value="" />
+<input id="form:schlagwortOptionen:0" name="form:schlagwortOptionen" type="radio" value="1" checked="checked" />
+<input id="form:schlagwortOptionen:1" name="form:schlagwortOptionen" type="radio" value="3" />
+<input id="form:aenlichLautendeSchlagwoerterBoolChkbox_input" name="form:aenlichLautendeSchlagwoerterBoolChkbox_input" type="checkbox" checked="checked" />
+<input id="form:auchGeloeschte_input" name="form:auchGeloeschte_input" type="checkbox" />
+<input id="form:postleitzahl" name="form:postleitzahl" type="text" />
+<input id="form:ort" name="form:ort" type="text" />
+<input id="form:strasse" name="form:strasse" type="text" />
+<select id="form:registerArt_input" name="form:registerArt_input"><option value="" selected="selected">alle</option><option value="HRA">HRA</option><option value="HRB">HRB</option></select>
+<input id="form:registerNummer" name="form:registerNummer" type="text" />
+<select id="form:registergericht_input" name="form:registergericht_input"><option value="" selected="selected">alle</option><option value="D3201">Ansbach</option><option value="F1103R">Berlin (Charlottenburg)</option></select>
+<button id="form:btnSuche" name="form:btnSuche" type="submit">Suchen</button>
+<input type="hidden" name="javax.faces.ViewState" value="vs-search" />
+</form></body></html>"""
+
+RESULTS = """<html><body>
+<form id="ergebnissForm" name="ergebnissForm" method="post" action="/rp_web/ergebnisse.xhtml">
+<input type="hidden" name="ergebnissForm" value="ergebnissForm" />
+<table role="grid"><tbody id="ergebnissForm:selectedSuchErgebnisFormTable_data">
+<tr data-ri="0"><td><table><tbody>
+<tr><td colspan="5">Berlin <span>District court Berlin (Charlottenburg) HRB 1</span></td></tr>
+<tr><td colspan="5"><span class="marginLeft20">Falsche Firma AG</span></td><td class="sitzSuchErgebnisse"><span class="verticalText">Berlin</span></td><td><span>currently registered</span></td><td colspan="2">
+<a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:fade" href="#" class="dokumentList" onclick="mojarra.jsfcljs(document.getElementById('ergebnissForm'),{'ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:fade':'ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:fade','property':'Global.Dokumentart.AD'},'');return false"><span>AD</span></a>
+</td></tr></tbody></table></td></tr>
+<tr data-ri="1"><td><table><tbody>
+<tr><td colspan="5">Berlin <span>District court Berlin (Charlottenburg) HRB 44343</span></td></tr>
+<tr><td colspan="5"><span class="marginLeft20">Testfirma GmbH</span></td><td class="sitzSuchErgebnisse"><span class="verticalText">Musterstadt</span></td><td><span>currently registered</span></td><td colspan="2">
+<a id="ergebnissForm:selectedSuchErgebnisFormTable:1:j_idt161:0:fade" href="#" class="dokumentList" onclick="mojarra.jsfcljs(document.getElementById('ergebnissForm'),{'ergebnissForm:selectedSuchErgebnisFormTable:1:j_idt161:0:fade':'ergebnissForm:selectedSuchErgebnisFormTable:1:j_idt161:0:fade','property':'Global.Dokumentart.AD'},'');return false"><span>AD</span></a>
+</td></tr></tbody></table></td></tr>
+</tbody></table>
+<script id="ergebnissForm:selectedSuchErgebnisFormTable_s">$(function(){PrimeFaces.cw("DataTable","widget_ergebnissForm_selectedSuchErgebnisFormTable",{id:"ergebnissForm:selectedSuchErgebnisFormTable",paginator:{id:['ergebnissForm:selectedSuchErgebnisFormTable_paginator_bottom'],rows:2,rowCount:3,page:0}});});</script>
+<input type="hidden" name="javax.faces.ViewState" value="vs-results" />
+</form></body></html>"""
+
+# Answer to the ajax request of the paginator for the second (last) page.
+PAGE_2 = """<?xml version='1.0' encoding='UTF-8'?>
+<partial-response id="j_id1"><changes><update id="ergebnissForm:selectedSuchErgebnisFormTable"><![CDATA[<tr data-ri="2"><td><table><tbody>
+<tr><td colspan="5">Hamburg <span>District court Hamburg HRB 7</span></td></tr>
+<tr><td colspan="5"><span class="marginLeft20">Testfirma Nord GmbH</span></td><td class="sitzSuchErgebnisse"><span class="verticalText">Hamburg</span></td><td><span>currently registered</span></td><td colspan="2">
+<a id="ergebnissForm:selectedSuchErgebnisFormTable:2:j_idt161:0:fade" href="#" class="dokumentList" onclick="mojarra.jsfcljs(document.getElementById('ergebnissForm'),{'ergebnissForm:selectedSuchErgebnisFormTable:2:j_idt161:0:fade':'ergebnissForm:selectedSuchErgebnisFormTable:2:j_idt161:0:fade','property':'Global.Dokumentart.AD'},'');return false"><span>AD</span></a>
+</td></tr></tbody></table></td></tr>]]></update><update id="j_id1:javax.faces.ViewState:0"><![CDATA[vs-results-2]]></update></changes></partial-response>"""
+
+PDF = b"%PDF-1.4 Testfirma GmbH"
+
+class PortalStub(BaseHTTPRequestHandler):
+    """Minimaler Nachbau der JSF-Seiten des Portals, prüft Session-Cookie und ViewState wie der echte Server."""
+    protocol_version = "HTTP/1.1" # Keep-alive.
+    requests = []
+    connections = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        extra = dict(headers or {})
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            extra["Content-Encoding"] = "gzip"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in extra.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, message):
+        body = message.encode("utf-8")
+        self.send_response(400)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        PortalStub.connections.add(self.client_address[1])
+        PortalStub.requests.append(("GET", self.path, {}))
+        if self.path == "/rp_web/welcome.xhtml":
+            self._send(WELCOME, headers={"Set-Cookie": "JSESSIONID=abc; Path=/rp_web"})
+        else:
+            self._fail("unknown page")
+
+    def do_POST(self):
+        PortalStub.connections.add(self.client_address[1])
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        fields = {k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()}
+        PortalStub.requests.append(("POST", self.path, fields))
+        if "JSESSIONID=abc" not in self.headers.get("Cookie", ""):
+            return self._fail("no session")
+        view_state = fields.get("javax.faces.ViewState")
+        if self.path == "/rp_web/welcome.xhtml" and view_state == "vs-welcome" and "naviForm:erweiterteSucheLink" in fields:
+            self._send(SEARCH_FORM)
+        elif self.path == "/rp_web/erweitertesuche.xhtml" and view_state == "vs-search":
+            self._send(RESULTS)
+        elif self.path == "/rp_web/ergebnisse.xhtml" and view_state == "vs-results" and fields.get("javax.faces.partial.ajax") == "true":
+            if self.headers.get("Faces-Request") != "partial/ajax" or fields.get("ergebnissForm:selectedSuchErgebnisFormTable_first") != "2":
+                return self._fail("unexpected page request")
+            self._send(PAGE_2, "text/xml; charset=utf-8")
+        elif self.path == "/rp_web/ergebnisse.xhtml" and view_state in ("vs-results", "vs-results-2") and fields.get("property") == "Global.Dokumentart.AD":
+            self._send(PDF, "application/pdf", {"Content-Disposition": 'attachment; filename="HRB44343_AD.pdf"'})
+        else:
+            self._fail("unexpected request")
+
+class CountingQuota:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+@pytest.fixture
+def portal():
+    PortalStub.requests = []
+    PortalStub.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PortalStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/rp_web/"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def quota():
+    return CountingQuota()
+
+# ------------------------------ #
+# -- Tests for the HTTP client -- #
+# ------------------------------ #
+
+def test_search_submits_form_with_viewstate(portal, quota):
+    """Die Suche folgt dem JSF-Ablauf und liefert die geparsten Zeilen."""
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        result = client.search("Testfirma", so="exact", sa=False, sg=True, ci="Musterstadt")
+
+    assert [row["name"] for row in result.rows] == ["Falsche Firma AG", "Testfirma GmbH"]
+    method, path, fields = PortalStub.requests[-1]
+    assert path == "/rp_web/erweitertesuche.xhtml"
+    assert fields["form:schlagwoerter"] == "Testfirma"
+    assert fields["form:schlagwortOptionen"] == "3"
+    assert fields["form:ort"] == "Musterstadt"
+    assert fields["form:auchGeloeschte_input"] == "on"
+    assert "form:aenlichLautendeSchlagwoerterBoolChkbox_input" not in fields
+    assert quota.acquired == 1
+
+def test_download_document(portal, quota, tmp_path):
+    """Der AD-Link der passenden Zeile wird ohne Browser ausgelöst und die PDF gespeichert."""
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        result = client.search("Testfirma", ci="Musterstadt")
+        row_index = httpclient.find_matching_row(result.rows, "Testfirma", "Musterstadt")
+        document = client.download_document(result, row_index)
+
+    assert row_index == 1
+    assert document.content == PDF
+    assert document.filename == "HRB44343_AD.pdf"
+    assert quota.acquired == 2
+    fields = PortalStub.requests[-1][2]
+    assert "ergebnissForm:selectedSuchErgebnisFormTable:1:j_idt161:0:fade" in fields
+    assert httpclient.save_document(document, tmp_path).read_bytes() == PDF
+
+def test_connections_are_kept_alive(portal, quota):
+    """Alle Anfragen einer Suche laufen über dieselbe Verbindung."""
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        client.search("Testfirma")
+        client.search("Testfirma")
+    assert len(PortalStub.requests) == 6
+    assert len(PortalStub.connections) == 1
+
+def test_unknown_document_type(portal, quota):
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        result = client.search("Testfirma")
+        with pytest.raises(httpclient.PortalError):
+            client.download_document(result, 0, "HD")
+
+def test_parse_submit_params():
+    onclick = "PrimeFaces.addSubmitParam('ergebnissForm',{'ergebnissForm:link':'ergebnissForm:link','property':'Global.Dokumentart.AD'}).submit('ergebnissForm');"
+    assert httpclient.parse_submit_params(onclick) == {
+        "ergebnissForm:link": "ergebnissForm:link",
+        "property": "Global.Dokumentart.AD"
+    }
+
+def test_search_pages_are_loaded_lazily(portal, quota):
+    """Die weiteren Seiten werden erst angefragt, wenn sie gebraucht werden."""
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        pages = client.search_pages("Testfirma")
+        first = next(pages)
+        assert quota.acquired == 1
+        assert PortalStub.requests[-1][2]["form:ergebnisseProSeite_input"] == "100"
+
+        second = next(pages)
+        assert quota.acquired == 2
+        assert [row["name"] for row in second.rows] == ["Testfirma Nord GmbH"]
+        assert second.first == 2
+        fields = PortalStub.requests[-1][2]
+        assert fields["ergebnissForm:selectedSuchErgebnisFormTable_rows"] == "2"
+        assert fields["javax.faces.ViewState"] == "vs-results"
+
+        # rowCount 3 with 2 rows per page: there is no third page.
+        assert next(pages, None) is None
+        assert quota.acquired == 2
+
+        document = client.download_document(second, second.first + 0)
+    assert document.content == PDF
+    assert PortalStub.requests[-1][2]["javax.faces.ViewState"] == "vs-results-2"
+    assert [row["name"] for row in first.rows] == ["Falsche Firma AG", "Testfirma GmbH"]
+
+def test_search_rows_stop_with_the_consumer(portal, quota):
+    """Wer nur den ersten Treffer braucht, bezahlt nur eine Seite."""
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        rows = client.search_rows("Testfirma")
+        assert next(rows)["name"] == "Falsche Firma AG"
+        assert quota.acquired == 1
+        assert [row["name"] for row in rows] == ["Testfirma GmbH", "Testfirma Nord GmbH"]
+        assert quota.acquired == 2
+
+def test_register_search(portal, quota):
+    """Die exakte Suche füllt Registerart, -nummer und -gericht statt des Suchbegriffs."""
+    register = httpclient.RegisterNumber("HRB", "44343", "Charlottenburg")
+    with httpclient.PortalClient(base_url=portal, quota=quota) as client:
+        result = client.search("Testfirma", register=register)
+
+    fields = PortalStub.requests[-1][2]
+    assert fields["form:schlagwoerter"] == ""
+    assert fields["form:registerArt_input"] == "HRB"
+    assert fields["form:registerNummer"] == "44343"
+    assert fields["form:registergericht_input"] == "F1103R"
+    assert httpclient.find_register_row(result.rows, register) == 1
+    assert httpclient.find_register_row(result.rows, httpclient.RegisterNumber("HRB", "7")) is None
+
+def test_loaded_pages_are_indexed(portal, quota, tmp_path):
+    """Alle geladenen Ergebniszeilen landen im lokalen Index."""
+    index = httpclient.CompanyIndex(db_path=tmp_path / "index.sqlite3")
+    with httpclient.PortalClient(base_url=portal, quota=quota, index=index) as client:
+        pages = client.search_pages("Testfirma")
+        next(pages)
+        assert len(index) == 2
+        next(pages)
+    assert len(index) == 3
+    assert [company.name for company in index.search("nord")] == ["Testfirma Nord GmbH"]
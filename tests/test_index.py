@@ -0,0 +1,154 @@
+import pytest
+from hr.handelsregister import RegisterNumber
+from hr.index import CompanyIndex, register_id_of_row, split_court_cell
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def index(tmp_path, clock):
+    return CompanyIndex(db_path=tmp_path / "index.sqlite3", clock=clock)
+
+def row(name, court="Berlin  District court Berlin (Charlottenburg) HRB 44343", seat="Berlin", history=()):
+    return {
+        "court": court,
+        "name": name,
+        "state": seat,
+        "status": "currently registered",
+        "documents": "ADCDHDDKUTVÖ",
+        "history": list(history)
+    }
+
+GASAG = row("GASAG AG", history=[("1.) Gasag Berliner Gaswerke Aktiengesellschaft", "1.) Berlin")])
+MUELLER = row("Müller Bau GmbH", "Bayern  District court München HRB 12345", "München")
+MUELLER_BREMEN = row("Müller Bau GmbH", "Bremen  District court Bremen HRB 12345", "Bremen")
+
+# ---------------------------------- #
+# -- Tests for the court cell split -- #
+# ---------------------------------- #
+
+def test_split_court_cell():
+    assert split_court_cell("Berlin  District court Berlin (Charlottenburg) HRB 44343") == (
+        "Berlin", "Berlin (Charlottenburg)", RegisterNumber("HRB", "44343", "Berlin (Charlottenburg)")
+    )
+    assert split_court_cell("Bayern Amtsgericht München VR 204 B")[2] == RegisterNumber("VR", "204 B", "München")
+    assert split_court_cell("Hamburg") == ("", "Hamburg", None)
+
+def test_register_id_ignores_the_name():
+    """Dieselbe Registernummer ergibt denselben Schlüssel, auch wenn sich der Name geändert hat."""
+    assert register_id_of_row(GASAG) == register_id_of_row(row("GASAG Berlin AG")) == "berlin (charlottenburg)|HRB 44343"
+    assert register_id_of_row(MUELLER) != register_id_of_row(MUELLER_BREMEN)
+
+# ---------------------------- #
+# -- Tests for the indexing -- #
+# ---------------------------- #
+
+def test_rows_are_stored_once_per_register_entry(index, clock):
+    assert index.add_rows([GASAG, MUELLER]) == 2
+    clock.now += 10
+    index.add_rows([row("GASAG Berlin AG")])
+
+    assert len(index) == 2
+    company = index.get("berlin (charlottenburg)|HRB 44343")
+    assert company.name == "GASAG Berlin AG"
+    assert company.seen_at == clock.now
+    # The old name is no longer found, the new one is.
+    assert [c.name for c in index.search("Berliner Gaswerke")] == []
+    assert [c.name for c in index.search("gasag berl")] == ["GASAG Berlin AG"]
+
+def test_search_finds_former_names(index):
+    index.add_rows([GASAG, MUELLER])
+    companies = index.search("berliner gaswerke")
+    assert [c.name for c in companies] == ["GASAG AG"]
+    assert companies[0].history == [("Gasag Berliner Gaswerke Aktiengesellschaft", "Berlin")]
+
+def test_search_ignores_case_and_diacritics(index):
+    index.add_rows([MUELLER])
+    assert [c.register_number for c in index.search("MULLER bau")] == ["12345"]
+
+def test_search_by_city_and_register(index):
+    index.add_rows([GASAG, MUELLER, MUELLER_BREMEN])
+    assert [c.seat for c in index.search("Müller", city="bremen")] == ["Bremen"]
+    assert {c.seat for c in index.search(register=RegisterNumber("HRB", "12345"))} == {"München", "Bremen"}
+    assert [c.seat for c in index.search(register=RegisterNumber("HRB", "12345", "Amtsgericht München"))] == ["München"]
+    assert index.search(register=RegisterNumber("HRA", "12345")) == []
+
+def test_search_skips_stale_companies(index, clock):
+    index.add_rows([GASAG])
+    clock.now += 3600
+    index.add_rows([MUELLER])
+    assert [c.name for c in index.search(max_age=60)] == ["Müller Bau GmbH"]
+    assert len(index.search(max_age=7200)) == 2
+
+def test_search_input_is_not_an_fts_query(index):
+    """Operatoren und Sonderzeichen in der Eingabe werden als normale Wörter behandelt."""
+    index.add_rows([GASAG])
+    assert index.search('"GASAG" OR NOT (x*') == []
+    assert index.search("-") == index.search() != []
+
+# ------------------------------ #
+# -- Tests for the extractions -- #
+# ------------------------------ #
+
+def test_extraction_is_attached_by_register(index, clock):
+    index.add_rows([MUELLER, MUELLER_BREMEN])
+    data = {"managers": ["Müller, Hans"], "name": "Müller Bau GmbH", "address": "Hauptstraße 1, 28195 Bremen"}
+
+    register_id = index.add_extraction(data, "/tmp/AD.pdf", RegisterNumber("HRB", "12345", "Bremen"))
+
+    company = index.get(register_id)
+    assert company.seat == "Bremen"
+    assert company.managers == ["Müller, Hans"]
+    assert company.pdf_path == "/tmp/AD.pdf"
+    assert company.extracted_at == clock.now
+    # Seeing the row again keeps the extracted data.
+    index.add_rows([MUELLER_BREMEN])
+    assert index.get(register_id).address == "Hauptstraße 1, 28195 Bremen"
+
+def test_recent_extraction_answers_a_lookup(index, clock):
+    """Nur eine eindeutige und nicht zu alte Extraktion beantwortet eine Suche ohne das Portal."""
+    index.add_rows([GASAG, MUELLER, MUELLER_BREMEN])
+    assert index.find_extracted("GASAG AG") is None
+    index.add_extraction({"managers": ["Mustermann, Max"], "name": "GASAG AG", "address": "Berlin"}, "/tmp/AD.pdf")
+    index.add_extraction({"managers": ["Müller, Hans"], "name": "Müller Bau GmbH", "address": "Bremen"}, None, RegisterNumber("HRB", "12345", "Bremen"))
+
+    assert index.find_extracted("gasag  ag", "Berlin").managers == ["Mustermann, Max"]
+    assert index.find_extracted(register=RegisterNumber("HRB", "44343", "Charlottenburg")).pdf_path == "/tmp/AD.pdf"
+    # Only a prefix of the name, a second company with the same name or the wrong seat.
+    assert index.find_extracted("GASAG") is None
+    assert index.find_extracted("Müller Bau GmbH") is None
+    assert index.find_extracted("Müller Bau GmbH", "Bremen").address == "Bremen"
+    assert index.find_extracted("GASAG AG", "München") is None
+
+    clock.now += index.max_age + 1
+    assert index.find_extracted("GASAG AG") is None
+
+def test_extraction_is_attached_by_the_downloaded_row(index):
+    """Mit der Zeile, aus der das Dokument stammt, wird die Extraktion auch bei gleichnamigen Firmen zugeordnet."""
+    index.add_rows([MUELLER, MUELLER_BREMEN])
+    register_id = register_id_of_row(MUELLER_BREMEN)
+    data = {"managers": ["Müller, Hans"], "name": "Müller Bau GmbH & Co.", "address": "Bremen"}
+
+    assert index.add_extraction(data, "/tmp/AD.pdf", register_id=register_id) == register_id
+    assert index.find_extracted("Müller Bau GmbH", "Bremen").managers == ["Müller, Hans"]
+    # An unknown row falls back to the name.
+    assert index.add_extraction(data, register_id="?|unbekannt|x") is None
+
+def test_extraction_is_attached_by_unambiguous_name(index):
+    index.add_rows([GASAG, MUELLER, MUELLER_BREMEN])
+    assert index.add_extraction({"managers": [], "name": "GASAG  AG", "address": ""}) == "berlin (charlottenburg)|HRB 44343"
+    # Two companies with this name, the extraction cannot be assigned.
+    assert index.add_extraction({"managers": [], "name": "Müller Bau GmbH", "address": ""}) is None
+    assert index.add_extraction({"managers": [], "name": "Unbekannt GmbH", "address": ""}) is None
@@ -0,0 +1,89 @@
+import pytest
+from hr.lookupcache import LookupCache, normalize_query, query_key
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return LookupCache(db_path=tmp_path / "lookups.sqlite3", ttl=100.0, max_entries=3, clock=clock)
+
+@pytest.fixture
+def result():
+    return {"managers": ["Mustermann, Max"], "name": "Testfirma GmbH", "address": "Musterstraße 1, 12345 Musterstadt"}
+
+def query(name, city=None):
+    return normalize_query(name, "all", False, False, city, None, None)
+
+# ------------------------------ #
+# -- Tests for the normalizing -- #
+# ------------------------------ #
+
+def test_equivalent_queries_share_a_key():
+    """Groß-/Kleinschreibung und überflüssige Leerzeichen ändern das Suchergebnis nicht."""
+    assert query_key(normalize_query("Testfirma  GmbH", "all", False, False, " Berlin", None, "10 115")) == \
+        query_key(normalize_query("testfirma gmbh", "all", False, False, "berlin", "", "10115"))
+
+def test_flags_are_part_of_the_key():
+    assert query_key(normalize_query("Testfirma", "all", False, False, None, None, None)) != \
+        query_key(normalize_query("Testfirma", "all", True, False, None, None, None))
+    assert query_key(normalize_query("Testfirma", "all", False, False, None, None, None)) != \
+        query_key(normalize_query("Testfirma", "exact", False, False, None, None, None))
+
+def test_register_number_is_part_of_the_key():
+    """Die Registernummer unterscheidet exakte Abfragen, ohne die Schlüssel der Namenssuchen zu ändern."""
+    name_search = normalize_query("Testfirma", "all", False, False, None, None, None)
+    assert "rn" not in name_search
+    assert query_key(normalize_query("Testfirma", "all", False, False, None, None, None, "HRB 44343")) != query_key(name_search)
+
+# ------------------------- #
+# -- Tests for the cache -- #
+# ------------------------- #
+
+def test_put_and_get(cache, result):
+    cache.put(query("Testfirma"), result, "/tmp/AD.pdf")
+    entry = cache.get(query("TESTFIRMA"))
+    assert entry.result == result
+    assert entry.pdf_path == "/tmp/AD.pdf"
+
+def test_miss(cache):
+    assert cache.get(query("Unbekannt")) is None
+
+def test_entries_expire(cache, clock, result):
+    cache.put(query("Testfirma"), result)
+    clock.now += 101
+    assert cache.get(query("Testfirma")) is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted(cache, clock, result):
+    """Bei vollem Cache fliegt der Eintrag, auf den am längsten nicht zugegriffen wurde."""
+    for name in ("A", "B", "C"):
+        cache.put(query(name), result)
+        clock.now += 1
+    cache.get(query("A"))
+    clock.now += 1
+    cache.put(query("D"), result)
+    assert len(cache) == 3
+    assert cache.get(query("B")) is None
+    assert cache.get(query("A")) is not None
+
+def test_cache_is_persistent(tmp_path, result):
+    LookupCache(db_path=tmp_path / "lookups.sqlite3").put(query("Testfirma"), result)
+    assert LookupCache(db_path=tmp_path / "lookups.sqlite3").get(query("Testfirma")).result == result
+
+def test_invalidate(cache, result):
+    cache.put(query("Testfirma"), result)
+    cache.invalidate(query("Testfirma"))
+    assert cache.get(query("Testfirma")) is None
@@ -0,0 +1,93 @@
+import pytest
+from hr.matching import NameMatcher, cologne_phonetic, fold, rank_rows, split_legal_form, token_similarity
+
+# ------------------------------------ #
+# -- Tests for the Kölner Phonetik -- #
+# ------------------------------------ #
+
+@pytest.mark.parametrize("word, code", [
+    ("Wikipedia", "3412"),
+    ("Müller-Lüdenscheidt", "65752682"),
+    ("Breschnew", "17863"),
+    ("Meier", "67"),
+    ("Mayer", "67"),
+    ("Christoph", "47823"),
+    ("Xaver", "4837"),
+    ("Acht", "042"),
+    ("", ""),
+    ("123", "")
+])
+def test_cologne_phonetic(word, code):
+    assert cologne_phonetic(word) == code
+
+# ------------------------------------- #
+# -- Tests for the name normalization -- #
+# ------------------------------------- #
+
+def test_fold_writes_out_umlauts():
+    assert fold("  MÜLLER   Weiß ") == fold("Mueller weiss") == "mueller weiss"
+
+@pytest.mark.parametrize("name, words, legal_form", [
+    ("Müller Bau GmbH", ["mueller", "bau"], "gmbh"),
+    ("Müller Bau Gesellschaft mit beschränkter Haftung", ["mueller", "bau"], "gmbh"),
+    ("Müller Bau G.m.b.H.", ["mueller", "bau"], "gmbh"),
+    ("Müller Bau GmbH & Co. KG", ["mueller", "bau"], "gmbh & co kg"),
+    ("Müller UG (haftungsbeschränkt)", ["mueller"], "ug"),
+    ("Gasag Berliner Gaswerke Aktiengesellschaft", ["gasag", "berliner", "gaswerke"], "ag"),
+    ("Sportverein Ulm e.V.", ["sportverein", "ulm"], "ev"),
+    ("Agrarhandel Müller e.K.", ["agrarhandel", "mueller"], "ek"),
+    ("Testfirma", ["testfirma"], None)
+])
+def test_split_legal_form(name, words, legal_form):
+    assert split_legal_form(name) == (words, legal_form)
+
+# ------------------------------- #
+# -- Tests for the similarity -- #
+# ------------------------------- #
+
+def test_token_similarity():
+    assert token_similarity("mueller", "mueller") == 1.0
+    # Same sound, different spelling.
+    assert token_similarity("meier", "mayer") >= 0.9
+    assert token_similarity("testfir", "testfirma") >= 0.9
+    assert token_similarity("12", "13") == 0.0
+    assert token_similarity("gasag", "bau") < 0.5
+
+def test_spelling_variants_match():
+    """Umlaute, ausgeschriebene Rechtsformen und die Reihenfolge der Wörter spielen keine Rolle."""
+    matcher = NameMatcher("Mueller Bau GmbH")
+    assert matcher.score("Müller Bau GmbH") == 1.0
+    assert matcher.score("Müller Bau Gesellschaft mit beschränkter Haftung") == 1.0
+    assert matcher.score("Bau Müller GmbH") == 1.0
+
+def test_exact_name_beats_similar_names():
+    matcher = NameMatcher("Müller Bau GmbH")
+    scores = matcher.score_all([("Müller Bau AG", ""), ("Müller Bau GmbH", ""), ("Müller Bau Nord GmbH", ""), ("Möller Bau GmbH", "")])
+    assert scores[1] == max(scores)
+    assert scores[0] < scores[1] and scores[2] < scores[1] and scores[3] < scores[1]
+
+def test_city_has_to_match():
+    matcher = NameMatcher("Testfirma", "Frankfurt am Main")
+    assert matcher.score("Testfirma GmbH", "Frankfurt am Main") == 1.0
+    assert matcher.score("Testfirma GmbH", "Berlin") == 0.0
+
+# --------------------------- #
+# -- Tests for the ranking -- #
+# --------------------------- #
+
+ROWS = [
+    {"name": "Falsche Firma AG", "state": "Musterstadt"},
+    {"name": "Testfirma Nord GmbH", "state": "Musterstadt"},
+    {"name": "Testfirma GmbH", "state": "Musterstadt"},
+    {"name": "Testfirma GmbH", "state": "Berlin"}
+]
+
+def test_best_is_not_the_first_containing_row():
+    """Der frühere Substring-Vergleich hätte 'Testfirma Nord GmbH' genommen."""
+    assert NameMatcher("Testfirma", "Musterstadt").best((row["name"], row["state"]) for row in ROWS) == 2
+    assert NameMatcher("Gibtsnicht GmbH").best((row["name"], row["state"]) for row in ROWS) is None
+
+def test_rank_rows():
+    ranked = rank_rows(ROWS, "testfirma gmbh", "musterstadt")
+    assert [index for index, _ in ranked] == [2, 1]
+    assert ranked[0][1] == 1.0
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from hr.batch import BatchQuery
+from hr.pipeline import Fetched, run_batch_pipeline, run_pipeline
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+def queries(*names):
+    return [BatchQuery(query={"schlagwoerter": name}, lines=[i + 1]) for i, name in enumerate(names)]
+
+@pytest.fixture
+def extract_executor():
+    # Threads instead of processes, so that the fake extraction functions do not have to be picklable.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+@pytest.fixture
+def events():
+    return []
+
+def fake_extract(pdf_path):
+    return {"managers": [], "name": Path(pdf_path).stem, "address": ""}
+
+# ---------------------------- #
+# -- Tests for the pipeline -- #
+# ---------------------------- #
+
+def test_results_and_failures(extract_executor, events):
+    """Gefundene, nicht gefundene und fehlgeschlagene Suchen landen alle in der Ausgabe."""
+    stored = []
+
+    def fetch(batch_query):
+        name = batch_query.query["schlagwoerter"]
+        if name == "Kaputt AG":
+            raise RuntimeError("Browser abgestürzt")
+        if name == "Gibtsnicht":
+            return Fetched()
+        if name == "Gecacht":
+            return Fetched(result={"managers": [], "name": "aus dem Cache", "address": ""})
+        return Fetched(pdf_path=Path(f"/tmp/{name}.pdf"), register_id=f"ulm|HRB {len(name)}")
+
+    def extract(pdf_path):
+        if pdf_path.endswith("Defekt.pdf"):
+            raise ValueError("Kein PDF")
+        return fake_extract(pdf_path)
+
+    emitted = []
+    summary = run_batch_pipeline(
+        queries("Testfirma", "Kaputt AG", "Gibtsnicht", "Gecacht", "Defekt"), fetch, emitted.append, events.append,
+        extract=extract, extract_executor=extract_executor, on_result=lambda q, fetched, result: stored.append((q.lines, fetched.pdf_path, fetched.register_id))
+    )
+
+    by_line = {e["lines"][0]: e for e in emitted}
+    assert by_line[1]["result"]["name"] == "Testfirma"
+    assert by_line[2]["status"] == "error" and "Browser abgestürzt" in by_line[2]["error"]
+    assert by_line[3]["status"] == "not_found"
+    assert by_line[4]["result"]["name"] == "aus dem Cache"
+    assert by_line[5]["status"] == "error" and "Kein PDF" in by_line[5]["error"]
+    # Only newly extracted results are stored.
+    assert stored == [([1], Path("/tmp/Testfirma.pdf"), "ulm|HRB 9")]
+    assert (summary.done, summary.found, summary.not_found, summary.failed) == (5, 2, 1, 2)
+    assert len([e for e in events if e["event"] == "progress"]) == 5
+
+def test_results_are_stored_off_the_event_loop(extract_executor, events):
+    """Die blockierenden Cache- und Index-Schreibzugriffe laufen nicht im Thread der Event-Loop."""
+    loop_thread = threading.get_ident()
+    store_threads = []
+
+    emitted = []
+    run_batch_pipeline(
+        queries("A", "B"), lambda q: Fetched(pdf_path=Path("/tmp/%s.pdf" % q.query["schlagwoerter"])), emitted.append, events.append,
+        extract=fake_extract, extract_executor=extract_executor, on_result=lambda q, fetched, result: store_threads.append(threading.get_ident())
+    )
+    assert len(store_threads) == 2 and loop_thread not in store_threads
+    assert len(emitted) == 2
+
+def test_extraction_overlaps_with_the_next_fetch(extract_executor, events):
+    """Während ein Dokument extrahiert wird, läuft bereits die nächste Portal-Anfrage."""
+    extracting = threading.Event()
+    overlapped = []
+
+    def fetch(batch_query):
+        if batch_query.lines[0] > 1:
+            # The extraction of the first document has to start without waiting for this fetch.
+            overlapped.append(extracting.wait(timeout=5))
+        return Fetched(pdf_path=Path("/tmp/%s.pdf" % batch_query.query["schlagwoerter"]))
+
+    def extract(pdf_path):
+        extracting.set()
+        time.sleep(0.05)
+        return fake_extract(pdf_path)
+
+    emitted = []
+    run_batch_pipeline(queries("A", "B"), fetch, emitted.append, events.append, extract=extract, extract_executor=extract_executor)
+    assert overlapped == [True]
+    assert sorted(e["result"]["name"] for e in emitted) == ["A", "B"]
+
+def test_queues_are_bounded(extract_executor, events):
+    """Ein langsamer Verbraucher bremst die Suchen, statt dass sich heruntergeladene Dokumente ansammeln."""
+    fetched = []
+    release = threading.Event()
+
+    def fetch(batch_query):
+        fetched.append(batch_query.lines[0])
+        return Fetched(pdf_path=Path("/tmp/%d.pdf" % batch_query.lines[0]))
+
+    def extract(pdf_path):
+        release.wait(timeout=5)
+        return fake_extract(pdf_path)
+
+    async def run():
+        task = asyncio.ensure_future(run_pipeline(
+            queries(*("Firma %d" % i for i in range(50))), fetch, lambda output: None, events.append,
+            extract=extract, extract_workers=1, extract_executor=extract_executor, queue_size=2
+        ))
+        await asyncio.sleep(0.3)
+        in_flight = len(fetched)
+        release.set()
+        summary = await task
+        return in_flight, summary
+
+    in_flight, summary = asyncio.run(run())
+    # One job in the extraction, two waiting for it and one fetched job that waits for a free slot.
+    assert in_flight <= 4
+    assert summary.done == summary.found == 50
+
+def test_several_fetch_workers(extract_executor, events):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetch(batch_query):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        return Fetched()
+
+    summary = run_batch_pipeline(
+        queries("A", "B", "C", "D"), fetch, lambda output: None, events.append,
+        fetch_workers=2, extract_executor=extract_executor
+    )
+    assert max(peak) == 2
+    assert summary.not_found == 4
+
+def test_documents_are_extracted_in_worker_processes(tmp_path, events):
+    """Ohne eigenen Executor wird in einem Prozess-Pool extrahiert."""
+    from benchmarks import synthetic
+    ad = synthetic.generate_ad_text(managers=2, seed=1)
+    pdf_path = synthetic.write_ad_pdf(tmp_path / "AD.pdf", ad.text)
+
+    emitted = []
+    run_batch_pipeline(queries("Testfirma"), lambda q: Fetched(pdf_path=pdf_path), emitted.append, events.append, extract_workers=1)
+    assert emitted[0]["result"] == {"managers": ad.managers, "name": ad.name, "address": ad.address}
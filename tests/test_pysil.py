@@ -0,0 +1,366 @@
+import json
+import threading
+import pytest
+from pathlib import Path
+from hr import pysil
+from hr.lookupcache import LookupCache
+from hr.store import StoredDocument
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+@pytest.fixture
+def cache(tmp_path):
+    return LookupCache(db_path=tmp_path / "lookups.sqlite3")
+
+@pytest.fixture
+def stored():
+    return StoredDocument("ulm|HRB 1", "AD", "0" * 64, 8, "AD.pdf", 0.0, Path("/tmp/AD.pdf"))
+
+@pytest.fixture
+def result():
+    return {"managers": ["Mustermann, Max"], "name": "Testfirma GmbH", "address": "Musterstraße 1"}
+
+# -------------------------------- #
+# -- Tests for the lookup cache -- #
+# -------------------------------- #
+
+def test_cache_hit_skips_selenium(mocker, stored, cache, result):
+    """Ein Cache-Treffer startet weder einen Browser noch verbraucht er das Kontingent."""
+    search = mocker.patch("hr.pysil.search_and_store", return_value=stored)
+    mocker.patch("hr.pysil.build_lookup_result", return_value=result)
+
+    first = pysil.lookup_company("Testfirma", "all", False, False, "Musterstadt", None, None, cache=cache)
+    second = pysil.lookup_company("testfirma", "all", False, False, "musterstadt", None, None, cache=cache)
+
+    assert first == second == result
+    assert search.call_count == 1
+
+def test_force_skips_reading_the_cache(mocker, stored, cache, result):
+    """--force holt die Daten neu, speichert sie aber trotzdem im Cache."""
+    search = mocker.patch("hr.pysil.search_and_store", return_value=stored)
+    mocker.patch("hr.pysil.build_lookup_result", return_value=result)
+
+    pysil.lookup_company("Testfirma", "all", False, False, None, None, None, cache=cache)
+    pysil.lookup_company("Testfirma", "all", False, False, None, None, None, cache=cache, force=True)
+
+    assert search.call_count == 2
+    assert len(cache) == 1
+
+def test_nothing_found_is_not_cached(mocker, cache):
+    mocker.patch("hr.pysil.search_and_store", return_value=None)
+    assert pysil.lookup_company("Gibtsnicht", "all", False, False, None, None, None, cache=cache) is None
+    assert len(cache) == 0
+
+def test_recent_extraction_in_the_index_skips_selenium(mocker, tmp_path):
+    """Eine aktuelle Extraktion im Index beantwortet die Suche, --force fragt trotzdem das Portal."""
+    from hr.index import CompanyIndex
+    index = CompanyIndex(db_path=tmp_path / "index.sqlite3")
+    index.add_rows([{"court": "Berlin  District court Berlin (Charlottenburg) HRB 44343", "name": "GASAG AG", "state": "Berlin", "status": ""}])
+    index.add_extraction({"managers": ["Mustermann, Max"], "name": "GASAG AG", "address": "Berlin"}, "/tmp/AD.pdf")
+    search = mocker.patch("hr.pysil.search_and_store", return_value=None)
+
+    outcome = pysil.lookup_company_document("GASAG AG", "all", False, False, "Berlin", None, None, index=index)
+    assert outcome == ({"managers": ["Mustermann, Max"], "name": "GASAG AG", "address": "Berlin"}, "/tmp/AD.pdf", "berlin (charlottenburg)|HRB 44343")
+    search.assert_not_called()
+
+    assert pysil.lookup_company_document("GASAG AG", "all", False, False, "Berlin", None, None, index=index, force=True) is None
+    assert search.call_count == 1
+
+def test_extraction_is_indexed_under_the_downloaded_row(mocker, stored, result):
+    mocker.patch("hr.pysil.search_and_store", return_value=stored)
+    mocker.patch("hr.pysil.build_lookup_result", return_value=result)
+    index = mocker.Mock()
+    index.find_extracted.return_value = None
+
+    outcome = pysil.lookup_company_document("Testfirma", "all", False, False, "Ulm", None, None, index=index)
+    assert outcome.register_id == "ulm|HRB 1"
+    index.add_extraction.assert_called_once_with(result, "/tmp/AD.pdf", None, "ulm|HRB 1")
+
+def test_empty_extraction_is_not_cached(mocker, stored, cache):
+    """Ohne Namen und Geschäftsführer wird das Ergebnis zurückgegeben, aber beim nächsten Mal erneut gesucht."""
+    search = mocker.patch("hr.pysil.search_and_store", return_value=stored)
+    mocker.patch("hr.pysil.build_lookup_result", return_value={"managers": [], "name": "", "address": ""})
+    index = mocker.Mock()
+    index.find_extracted.return_value = None
+
+    assert pysil.lookup_company("Testfirma", "all", False, False, None, None, None, cache=cache, index=index) == {"managers": [], "name": "", "address": ""}
+    assert len(cache) == 0
+    index.add_extraction.assert_not_called()
+    pysil.lookup_company("Testfirma", "all", False, False, None, None, None, cache=cache, index=index)
+    assert search.call_count == 2
+
+def test_timings_are_printed_and_traced(mocker, capsys, tmp_path, result):
+    """Mit --timings enthält die Ausgabe die Dauer jeder Phase, zusätzlich wird eine Zeile an die Trace-Datei angehängt."""
+    def lookup(*args, **kwargs):
+        with pysil.span("page_load"):
+            return result
+    mocker.patch("hr.pysil.lookup_company", side_effect=lookup)
+    trace = tmp_path / "timings.jsonl"
+
+    pysil.fetch_and_download_from_bundes_api("Testfirma", "all", False, False, "Musterstadt", None, None, timings=True, trace_file=trace)
+
+    output = json.loads(capsys.readouterr().out)
+    assert output["name"] == "Testfirma GmbH"
+    assert list(output["timings"]) == ["page_load"]
+    line = json.loads(trace.read_text(encoding="utf-8"))
+    assert line["outcome"] == "found"
+    assert line["query"] == {"s": "Testfirma", "ci": "Musterstadt", "register": None}
+
+def test_output_without_timings(mocker, capsys, result):
+    mocker.patch("hr.pysil.lookup_company", return_value=result)
+    pysil.fetch_and_download_from_bundes_api("Testfirma", "all", False, False, None, None, None)
+    assert json.loads(capsys.readouterr().out) == result
+
+# ------------------------------------ #
+# -- Tests for the paginated results -- #
+# ------------------------------------ #
+
+class FakeButton:
+    def __init__(self, disabled):
+        self.disabled = disabled
+
+    def get_attribute(self, name):
+        return "ui-paginator-next ui-state-default" + (" ui-state-disabled" if self.disabled else "")
+
+class FakePaginatedDriver:
+    """Zeigt die Ergebnisseiten nacheinander an, ein Klick auf 'Weiter' wechselt zur nächsten."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.page = 0
+
+    def find_elements(self, by, selector):
+        if selector == pysil.RESULT_ROWS_SELECTOR:
+            return list(self.pages[self.page])
+        return [FakeButton(disabled=self.page == len(self.pages) - 1)]
+
+    def execute_script(self, script, button):
+        self.page += 1
+
+@pytest.fixture
+def paging(mocker):
+    quota = mocker.patch("hr.pysil.portal_quota")
+    mocker.patch("selenium.webdriver.support.ui.WebDriverWait")
+    mocker.patch("hr.pysil.wait_for_ajax_idle")
+    return quota.return_value
+
+def test_result_rows_are_paged_lazily(paging):
+    """Die nächste Seite wird erst geladen, wenn alle Zeilen der aktuellen verbraucht sind."""
+    driver = FakePaginatedDriver([["a", "b"], ["c"]])
+    rows = pysil.iter_result_rows(driver)
+    assert [next(rows), next(rows)] == ["a", "b"]
+    assert driver.page == 0
+    assert next(rows) == "c"
+    assert driver.page == 1
+    assert paging.acquire.call_count == 1
+    assert next(rows, None) is None
+    assert paging.acquire.call_count == 1
+
+class FakeRow:
+    def __init__(self, text):
+        self.text = text
+
+def test_register_lookup_downloads_the_matching_row(mocker, tmp_path):
+    """Bei der exakten Suche wird die Zeile nur über die Registernummer geprüft und direkt heruntergeladen."""
+    rows = [FakeRow("Berlin District court Berlin (Charlottenburg) HRB 443431"), FakeRow("Berlin District court Berlin (Charlottenburg) HRB 44343")]
+    mocker.patch("hr.pysil.iter_result_pages", return_value=iter([rows]))
+    mocker.patch("hr.pysil.read_result_rows", return_value=[{"court": row.text, "name": "GASAG AG"} for row in rows])
+    download = mocker.patch("hr.pysil.download_ad_of_row", return_value=tmp_path / "AD.pdf")
+
+    register = pysil.parse_register_number("HRB 44343, Charlottenburg")
+    assert pysil.download_register_ad(object(), register, tmp_path) == (tmp_path / "AD.pdf", "berlin (charlottenburg)|HRB 44343", None)
+    assert download.call_args.args[1] is rows[1]
+
+def test_register_lookup_checks_the_court_cell(mocker, tmp_path):
+    """Der Firmenname in der Zeile (z.B. "DB Netz AG") wird nicht für ein Suffix der Registernummer gehalten."""
+    rows = [FakeRow("Berlin\nDistrict court Berlin (Charlottenburg) HRB 44343 B\nDB Netz AG\nBerlin")]
+    mocker.patch("hr.pysil.iter_result_pages", return_value=iter([rows]))
+    mocker.patch("hr.pysil.read_result_rows", return_value=[{"court": "District court Berlin (Charlottenburg) HRB 44343 B", "name": "DB Netz AG"}])
+    mocker.patch("hr.pysil.download_ad_of_row", return_value=tmp_path / "AD.pdf")
+
+    downloaded = pysil.download_register_ad(object(), pysil.parse_register_number("HRB 44343 B Charlottenburg"), tmp_path)
+    assert downloaded is not None and downloaded.path == tmp_path / "AD.pdf"
+
+class FakeText:
+    def __init__(self, text):
+        self.text = text
+
+class FakeCandidateRow:
+    def __init__(self, name, seat):
+        self.cells = {"span.marginLeft20": FakeText(name), "td.sitzSuchErgebnisse span.verticalText": FakeText(seat)}
+
+    def find_element(self, by, selector):
+        return self.cells[selector]
+
+class FakeSourceDriver:
+    page_source = "<html><body>Die Tabelle ist nicht im Quelltext.</body></html>"
+
+def test_best_matching_row_is_downloaded(mocker, tmp_path):
+    """Es wird die am besten passende Zeile heruntergeladen, nicht die erste, die den Suchbegriff enthält."""
+    rows = [FakeCandidateRow("Testfirma Nord GmbH", "Musterstadt"), FakeCandidateRow("Testfirma GmbH", "Musterstadt")]
+    mocker.patch("hr.pysil.iter_result_pages", return_value=iter([rows]))
+    download = mocker.patch("hr.pysil.download_ad_of_row", return_value=tmp_path / "AD.pdf")
+
+    downloaded = pysil.download_matching_ad(FakeSourceDriver(), "Testfirma GmbH", "Musterstadt", tmp_path)
+    assert downloaded == (tmp_path / "AD.pdf", "?||testfirma gmbh", None)
+    assert download.call_args.args[1] is rows[1]
+
+def test_parsed_rows_are_indexed_without_a_second_parse(mocker):
+    parsed = [{"court": "Berlin  District court Berlin (Charlottenburg) HRB 44343", "name": "GASAG AG", "state": "Berlin"}]
+    parse = mocker.patch("hr.pysil.get_companies_in_searchresults", return_value=parsed)
+    index = mocker.Mock()
+
+    assert pysil.read_result_rows(FakeSourceDriver(), [FakeRow("GASAG AG")], index) == parsed
+    index.add_rows.assert_called_once_with(parsed)
+    assert parse.call_count == 1
+
+def test_no_download_without_a_good_match(mocker, tmp_path):
+    mocker.patch("hr.pysil.iter_result_pages", return_value=iter([[FakeCandidateRow("Falsche Firma AG", "Musterstadt")]]))
+    download = mocker.patch("hr.pysil.download_ad_of_row")
+
+    assert pysil.download_matching_ad(FakeSourceDriver(), "Testfirma", None, tmp_path) is None
+    download.assert_not_called()
+
+class FakePool:
+    def __init__(self):
+        self.released = []
+
+    def acquire(self, dl_path):
+        return object()
+
+    def release(self, driver, discard=False):
+        self.released.append(discard)
+
+def test_browser_failures_are_raised(mocker, tmp_path):
+    """Ein Absturz des Browsers wird nicht als "nicht gefunden" gemeldet, der Browser wird verworfen."""
+    mocker.patch("hr.pysil.fill_and_submit_search_form", return_value=True)
+    mocker.patch("hr.pysil.download_matching_ad", side_effect=RuntimeError("Browser abgestürzt"))
+    pool = FakePool()
+
+    with pytest.raises(RuntimeError, match="Browser abgestürzt"):
+        pysil.search_and_download("Testfirma", "all", False, False, "Ulm", None, None, pool=pool, store=pysil.DocumentStore(tmp_path / "store"))
+    assert pool.released == [True]
+
+def test_result_table_timeout_is_raised(mocker, tmp_path):
+    mocker.patch("hr.pysil.fill_and_submit_search_form", return_value=False)
+    pool = FakePool()
+
+    with pytest.raises(TimeoutError):
+        pysil.fetch_document("Testfirma", "all", False, False, "Ulm", None, None, tmp_path, pool=pool)
+    assert pool.released == [True]
+
+def test_no_match_keeps_the_browser(mocker, tmp_path):
+    mocker.patch("hr.pysil.fill_and_submit_search_form", return_value=True)
+    mocker.patch("hr.pysil.download_matching_ad", return_value=None)
+    pool = FakePool()
+
+    assert pysil.fetch_document("Testfirma", "all", False, False, "Ulm", None, None, tmp_path, pool=pool) is None
+    assert pool.released == [False]
+
+def test_download_is_moved_into_the_store(mocker, tmp_path):
+    """Das heruntergeladene Dokument landet im Store, ein späterer Fehlschlag liefert aber kein altes Dokument."""
+    store = pysil.DocumentStore(tmp_path / "store")
+    mocker.patch("hr.pysil.create_chrome_driver")
+    mocker.patch("hr.pysil.fill_and_submit_search_form", return_value=True)
+
+    def download(driver, s, ci, dl_path, index, in_memory=False):
+        (dl_path / "AD.pdf").write_bytes(b"%PDF-1.4 Testfirma")
+        return pysil.DownloadedDocument(dl_path / "AD.pdf", "ulm|HRB 1")
+    mocker.patch("hr.pysil.download_matching_ad", side_effect=download)
+
+    pdf_path = pysil.search_and_download("Testfirma", "all", False, False, "Ulm", None, None, store=store)
+    assert pdf_path == store.latest("ulm|HRB 1").path
+    assert pdf_path.read_bytes() == b"%PDF-1.4 Testfirma"
+    # The job folder is gone again.
+    assert not any(store.tmp_root.iterdir())
+
+    # Nothing downloaded this time: the stored document of the same query is not served as if it was fresh.
+    pysil.download_matching_ad.side_effect = None
+    pysil.download_matching_ad.return_value = None
+    assert pysil.search_and_download(" testfirma", "all", False, False, "ulm", None, None, store=store) is None
+    assert store.latest_for_query(pysil.query_key(pysil.normalize_query("Testfirma", "all", False, False, "Ulm", None, None))).path == pdf_path
+
+def test_concurrent_jobs_use_private_download_dirs(mocker, tmp_path):
+    """Zwei gleichzeitige Suchen nach derselben Firma laden in getrennte Ordner herunter."""
+    store = pysil.DocumentStore(tmp_path / "store")
+    mocker.patch("hr.pysil.fill_and_submit_search_form", return_value=True)
+    mocker.patch("hr.pysil.create_chrome_driver")
+    both_started = threading.Barrier(2, timeout=5)
+    dl_paths = []
+
+    def download(driver, s, ci, dl_path, index, in_memory=False):
+        dl_paths.append(dl_path)
+        (dl_path / "AD.pdf").write_bytes(b"%PDF-1.4 " + str(dl_path).encode())
+        both_started.wait()
+        return pysil.DownloadedDocument(dl_path / "AD.pdf", "ulm|HRB 1")
+    mocker.patch("hr.pysil.download_matching_ad", side_effect=download)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pysil.search_and_download("Testfirma", "all", False, False, "Ulm", None, None, store=store))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(dl_paths)) == 2
+    assert len(set(results)) == 2 and all(path.is_file() for path in results)
+    assert len(store.history("ulm|HRB 1")) == 2
+    assert not any(store.tmp_root.iterdir())
+
+# ------------------------------------- #
+# -- Tests for the in-memory capture -- #
+# ------------------------------------- #
+
+def test_captured_document_is_extracted_from_memory(mocker, tmp_path, cache, result):
+    """Im Speicher-Modus wird das Dokument direkt aus dem Puffer ausgewertet und im Hintergrund gespeichert."""
+    store = pysil.DocumentStore(tmp_path / "store")
+    mocker.patch("hr.pysil.DocumentStore", return_value=store)
+    fetch = mocker.patch("hr.pysil.fetch_document", return_value=pysil.DownloadedDocument(None, "ulm|HRB 1", b"%PDF-1.4 Testfirma"))
+    extract = mocker.patch("hr.pysil.build_lookup_result", return_value=result)
+    put = mocker.spy(store, "put_bytes_async")
+
+    assert pysil.lookup_company("Testfirma", "all", False, False, "Ulm", None, None, cache=cache, in_memory=True) == result
+    assert fetch.call_args.kwargs["in_memory"] is True
+    assert extract.call_args.args[0] == b"%PDF-1.4 Testfirma"
+    stored = put.spy_return.result(timeout=5)
+    assert cache.get(pysil.normalize_query("Testfirma", "all", False, False, "Ulm", None, None)).pdf_path == str(stored.path)
+    assert stored.path.read_bytes() == b"%PDF-1.4 Testfirma"
+    # Nothing was downloaded into a job folder.
+    assert not any(store.tmp_root.iterdir())
+
+def test_failed_background_write_is_not_cached(mocker, tmp_path, cache, result, capsys):
+    """Schlägt das Speichern im Hintergrund fehl, merken sich Cache und Index keinen Pfad zu einer fehlenden Datei."""
+    store = pysil.DocumentStore(tmp_path / "store")
+    mocker.patch("hr.pysil.DocumentStore", return_value=store)
+    mocker.patch("hr.pysil.fetch_document", return_value=pysil.DownloadedDocument(None, "ulm|HRB 1", b"%PDF-1.4 Testfirma"))
+    mocker.patch("hr.pysil.build_lookup_result", return_value=result)
+    mocker.patch.object(store, "_write_blob_bytes", side_effect=OSError("Kein Speicherplatz"))
+    index = mocker.Mock()
+    index.find_extracted.return_value = None
+
+    outcome = pysil.lookup_company_document("Testfirma", "all", False, False, "Ulm", None, None, cache=cache, index=index, in_memory=True)
+    assert outcome.result == result and outcome.pdf_path is None
+    assert cache.get(pysil.normalize_query("Testfirma", "all", False, False, "Ulm", None, None)).pdf_path is None
+    assert index.add_extraction.call_args.args[1] is None
+    assert "Kein Speicherplatz" in capsys.readouterr().err
+
+def test_captured_document_without_persisting(mocker, tmp_path):
+    store = pysil.DocumentStore(tmp_path / "store")
+    mocker.patch("hr.pysil.fetch_document", return_value=pysil.DownloadedDocument(None, "ulm|HRB 1", b"%PDF-1.4 Testfirma"))
+
+    captured = pysil.search_and_capture("Testfirma", "all", False, False, "Ulm", None, None, store=store, persist=False)
+    assert captured == (b"%PDF-1.4 Testfirma", None, None, "ulm|HRB 1")
+    assert store.history("ulm|HRB 1") == []
+
+def test_capture_does_not_fall_back_to_the_stored_document(mocker, tmp_path):
+    """Wird nichts erfasst, gibt es kein Ergebnis, auch wenn ein früherer Lauf ein Dokument gespeichert hat."""
+    store = pysil.DocumentStore(tmp_path / "store")
+    fetch = mocker.patch("hr.pysil.fetch_document", return_value=pysil.DownloadedDocument(None, "ulm|HRB 1", b"%PDF-1.4 Testfirma"))
+    first = pysil.search_and_capture("Testfirma", "all", False, False, "Ulm", None, None, store=store)
+    first.persisted.result(timeout=5)
+
+    fetch.return_value = None
+    assert pysil.search_and_capture(" testfirma", "all", False, False, "ulm", None, None, store=store) is None
+    assert pysil.search_and_capture("Andere Firma", "all", False, False, "Ulm", None, None, store=store) is None
@@ -1,5 +1,6 @@
 # Adjusted to utilize the direct injection that was added to the functions!
 
+import fitz
 import pytest
 import unittest
 from hr import pyutil
@@ -99,6 +100,96 @@ def test_extract_management_data2(sample_pdf_text2):
     result = pyutil.extract_management_data(full_text=sample_pdf_text2)
     assert result == ["Mustermann, Max"]
 
+# --- Tests for the section index ---
+
+def test_section_index_records_offsets(sample_pdf_text):
+    """Testet, ob die nummerierten Abschnitte, Unterabschnitte und Anschriften an den richtigen Stellen erkannt werden."""
+    index = pyutil.SectionIndex(sample_pdf_text)
+    assert [sample_pdf_text[o:o + 5] for o in index.subsections("a")] == ["a) Fi", "a) Re"]
+    assert [sample_pdf_text[o:o + 5] for o in index.subsections("b")] == ["b) Si", "b) Vo"]
+    assert [sample_pdf_text[o:o + 19] for o in index.labels()] == ["Geschäftsanschrift:"]
+    assert [sample_pdf_text[o:o + 2] for o in index.sections] == ["1.", "2.", "3.", "4.", "5.", "6."]
+    assert index.complete
+
+def test_section_index_stops_after_last_needed_anchor(sample_pdf_text):
+    """Testet, ob der Text nur so weit durchlaufen wird, wie es die Extraktion erfordert."""
+    index = pyutil.SectionIndex(sample_pdf_text)
+    assert pyutil.extract_company_name(sample_pdf_text, index) == "Testfirma GmbH"
+    assert pyutil.extract_management_data(sample_pdf_text, index) == ["Mustermann, Max", "Musterfrau, Erika"]
+    assert not index.complete
+    assert sample_pdf_text[index.sections[-1]:].startswith("5. Prokura")
+
+def test_extract_management_data_without_following_section():
+    """Testet, ob ein Abschnitt ohne nachfolgenden nummerierten Abschnitt auch bei langen Texten schnell verworfen wird."""
+    text = "4. b) Geschäftsführer:\n" + "Geschäftsführer: Mustermann, Max, Musterhausen, *01.03.1988\n" * 20000
+    assert pyutil.extract_management_data(text) == []
+
+def test_extract_company_data_from_text_with_shared_index(sample_pdf_text):
+    """Testet die Extraktion aller Felder über einen gemeinsamen Index."""
+    result = pyutil.extract_company_data_from_pdf("dummy.pdf", _test_text=sample_pdf_text)
+    assert result == pyutil.CompanyPdfData(["Mustermann, Max", "Musterfrau, Erika"], "Testfirma GmbH", "Musterstraße 1, 12345 Musterstadt")
+
+# --- Tests for the page streaming ---
+
+def _counting_pages(pages, consumed):
+    for page in pages:
+        consumed.append(page)
+        yield page
+
+def test_extract_company_data_from_pages_stops_early(sample_pdf_text):
+    """Testet, ob nach dem Fund aller Daten keine weiteren Seiten mehr gelesen werden."""
+    first, second = sample_pdf_text.split("5. Prokura:")
+    pages = [first, "5. Prokura:" + second, "Seite 3\n", "Seite 4\n"]
+    consumed = []
+    result = pyutil.extract_company_data_from_pages(_counting_pages(pages, consumed))
+    assert result == pyutil.extract_company_data_from_pdf("dummy.pdf", _test_text=sample_pdf_text)
+    assert result.pages_read == 2
+    assert len(consumed) == 2
+
+def test_extract_company_data_from_pages_without_early_exit(sample_pdf_text):
+    """Testet, ob ohne early_exit alle Seiten gelesen werden und das Ergebnis gleich bleibt."""
+    first, second = sample_pdf_text.split("5. Prokura:")
+    pages = [first, "5. Prokura:" + second, "Seite 3\n"]
+    result = pyutil.extract_company_data_from_pages(pages, early_exit=False)
+    assert result.name == "Testfirma GmbH"
+    assert result.ceos == ["Mustermann, Max", "Musterfrau, Erika"]
+    assert result.pages_read == 3
+
+def test_extract_company_data_from_pages_field_across_pages():
+    """Testet, ob ein Wert, der erst auf der nächsten Seite steht, nicht vorzeitig übernommen wird."""
+    pages = ["1. a) Firma:\n", "\n", "Testfirma GmbH\n2. Geschäftsanschrift:\n", "Musterstraße 1, 12345 Musterstadt\n3. Sonstiges\n"]
+    result = pyutil.extract_company_data_from_pages(pages)
+    assert result.name == "Testfirma GmbH"
+    assert result.address == "Musterstraße 1, 12345 Musterstadt"
+    assert result.ceos == []
+    assert result.pages_read == 4
+
+def test_extract_company_data_from_pdf_streams_pages(tmp_path, sample_pdf_text):
+    """Testet das seitenweise Lesen an einer echten PDF-Datei."""
+    first, second = sample_pdf_text.split("5. Prokura:")
+    pdf_path = tmp_path / "AD.pdf"
+    with fitz.open() as doc:
+        for text in (first, "5. Prokura:" + second, "Seite 3", "Seite 4"):
+            doc.new_page().insert_text((50, 50), text, fontname="helv")
+        doc.save(str(pdf_path))
+
+    result = pyutil.extract_company_data_from_pdf(str(pdf_path))
+    assert result.name == "Testfirma GmbH"
+    assert result.address == "Musterstraße 1, 12345 Musterstadt"
+    assert result.ceos == ["Mustermann, Max", "Musterfrau, Erika"]
+    assert result.pages_read == 2
+    assert pyutil.extract_company_data_from_pdf(str(pdf_path), early_exit=False).pages_read == 4
+
+def test_extract_company_data_from_pdf_bytes(tmp_path, sample_pdf_text):
+    """Ein im Speicher vorliegendes Dokument wird ohne Umweg über eine Datei ausgewertet."""
+    with fitz.open() as doc:
+        doc.new_page().insert_text((50, 50), sample_pdf_text, fontname="helv")
+        content = doc.tobytes()
+
+    result = pyutil.extract_company_data_from_pdf(content)
+    assert result.name == "Testfirma GmbH"
+    assert result.ceos == ["Mustermann, Max", "Musterfrau, Erika"]
+
 # --- Test for main function ---
 
 def test_extract_company_data_from_pdf_integration(mocker):
@@ -0,0 +1,115 @@
+import threading
+import pytest
+from hr.quota import QuotaExceededError, QuotaScheduler
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeClock:
+    """Uhr, die nur vorläuft, wenn der Test es möchte."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "quota.sqlite3"
+
+def make_scheduler(db_path, clock, limit=3, window=60.0):
+    return QuotaScheduler(db_path=db_path, limit=limit, window=window, clock=clock, sleep=clock.sleep)
+
+# ---------------------------- #
+# -- Tests for the scheduler -- #
+# ---------------------------- #
+
+def test_slots_are_packed_densely(db_path, clock):
+    """Solange das Kontingent reicht, startet jeder Job sofort, danach genau wenn der älteste Abruf aus dem Fenster fällt."""
+    quota = make_scheduler(db_path, clock)
+    starts = [quota.reserve().start_at - clock.now for _ in range(5)]
+    assert starts == [0.0, 0.0, 0.0, 60.0, 60.0]
+
+def test_rolling_window_never_exceeds_limit(db_path, clock):
+    """Kein beliebiges Zeitfenster enthält mehr Abrufe als erlaubt."""
+    quota = make_scheduler(db_path, clock)
+    starts = []
+    for step in range(20):
+        starts.append(quota.acquire().start_at)
+        clock.now += 7 * (step % 3)
+    for start in starts:
+        assert sum(1 for other in starts if start <= other < start + 60.0) <= 3
+
+def test_quota_is_shared_between_schedulers(db_path, clock):
+    """Zwei Scheduler (z.B. in zwei Prozessen) teilen sich dasselbe Kontingent über die Datenbank."""
+    first = make_scheduler(db_path, clock)
+    second = make_scheduler(db_path, clock)
+    first.reserve()
+    first.reserve()
+    second.reserve()
+    reservation = second.reserve()
+    assert reservation.wait == 60.0
+    assert reservation.queued == 0
+    assert first.reserve().queued == 1
+
+def test_estimate_does_not_book(db_path, clock):
+    quota = make_scheduler(db_path, clock, limit=1)
+    assert quota.estimate() == clock.now
+    quota.reserve()
+    assert quota.estimate() == clock.now + 60.0
+    assert quota.estimate() == clock.now + 60.0
+
+def test_max_wait_raises_without_booking(db_path, clock):
+    """Ist der nächste freie Abruf zu weit weg, wird nichts gebucht und der Startzeitpunkt mitgeteilt."""
+    quota = make_scheduler(db_path, clock, limit=1)
+    quota.reserve()
+    with pytest.raises(QuotaExceededError) as error:
+        quota.reserve(max_wait=10)
+    assert error.value.start_at == clock.now + 60.0
+    assert quota.status()["queued"] == 0
+
+def test_acquire_sleeps_until_slot(db_path, clock):
+    quota = make_scheduler(db_path, clock, limit=1)
+    start = clock.now
+    quota.acquire()
+    quota.acquire()
+    assert clock.now == start + 60.0
+
+def test_old_slots_expire(db_path, clock):
+    quota = make_scheduler(db_path, clock)
+    for _ in range(3):
+        quota.reserve()
+    clock.now += 61
+    assert quota.status()["used"] == 0
+    assert quota.reserve().wait == 0.0
+
+def test_concurrent_reservations_are_serialized(db_path):
+    """Gleichzeitige Reservierungen aus mehreren Threads bekommen alle unterschiedliche, gültige Slots."""
+    quota = QuotaScheduler(db_path=db_path, limit=5, window=3600.0)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        # Every worker uses its own scheduler and connection, like a separate process would.
+        reservation = QuotaScheduler(db_path=db_path, limit=5, window=3600.0).reserve()
+        with lock:
+            results.append(reservation)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    immediate = [r for r in results if r.wait < 1]
+    assert len(results) == 10
+    assert len(immediate) == 5
+    assert quota.status()["queued"] == 5
@@ -0,0 +1,173 @@
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from hr import service
+from hr.index import CompanyIndex
+from hr.lookupcache import LookupCache
+from hr.pyutil import CompanyPdfData
+from hr.store import DocumentStore
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakePool:
+    """Ersetzt den Browser-Pool, damit kein Chrome gestartet werden muss."""
+
+    def __init__(self):
+        self.closed = False
+
+    def warm(self):
+        pass
+
+    def stats(self):
+        return {"size": 1}
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def pool():
+    return FakePool()
+
+@pytest.fixture
+def cache(tmp_path):
+    return LookupCache(db_path=tmp_path / "lookups.sqlite3")
+
+@pytest.fixture
+def index(tmp_path):
+    return CompanyIndex(db_path=tmp_path / "index.sqlite3")
+
+@pytest.fixture
+def store(tmp_path):
+    return DocumentStore(tmp_path / "store")
+
+@pytest.fixture
+def client(pool, cache, index, store):
+    with TestClient(service.create_app(pool=pool, warm=False, cache=cache, index=index, store=store)) as client:
+        yield client
+
+@pytest.fixture
+def stored(tmp_path, store):
+    """Ein Dokument im Dokumentenspeicher."""
+    path = tmp_path / "AD.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    return store.put(path, "ulm|HRB 1")
+
+@pytest.fixture
+def pdf_file(stored):
+    return stored.path
+
+@pytest.fixture
+def pysil():
+    """Das pysil-Modul, so wie es der Service importiert hat (ohne das "hr."-Präfix)."""
+    return sys.modules[service.lookup_company_document.__module__]
+
+@pytest.fixture
+def result():
+    return {"managers": ["Mustermann, Max"], "name": "Testfirma GmbH", "address": "Musterstraße 1"}
+
+# ----------------------------- #
+# -- Tests for the endpoints -- #
+# ----------------------------- #
+
+def test_health_reports_pool_stats(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "pool": {"size": 1}}
+
+def test_pool_is_closed_on_shutdown(pool, cache, index, store):
+    with TestClient(service.create_app(pool=pool, warm=False, cache=cache, index=index, store=store)):
+        pass
+    assert pool.closed
+
+def test_lookup_returns_ts_shape(client, mocker, pysil, stored, pdf_file, result, index):
+    """Die Antwort entspricht dem json, das pysil auf der Konsole ausgibt."""
+    search = mocker.patch.object(pysil, "search_and_store", return_value=stored)
+    mocker.patch.object(pysil, "build_lookup_result", return_value=result)
+    add_extraction = mocker.spy(index, "add_extraction")
+
+    response = client.post("/lookup", json={"schlagwoerter": "Testfirma", "city": "Musterstadt"})
+
+    assert response.status_code == 200
+    assert response.json() == {**result, "pdf_path": str(pdf_file)}
+    assert search.call_args.args[:7] == ("Testfirma", "all", False, False, "Musterstadt", None, None)
+    add_extraction.assert_called_once()
+
+def test_lookup_of_a_register_entry(client, mocker, pysil, stored, pdf_file, result):
+    """Die Registernummer wird wie bei pysil.py an die exakte Suche übergeben."""
+    search = mocker.patch.object(pysil, "search_and_store", return_value=stored)
+    mocker.patch.object(pysil, "build_lookup_result", return_value=result)
+
+    assert client.post("/lookup", json={"schlagwoerter": "", "registerNummer": "HRB 44343 Charlottenburg"}).status_code == 200
+    assert str(search.call_args.args[8]) == str(service.parse_register_number("HRB 44343, Charlottenburg"))
+    assert client.post("/lookup", json={"schlagwoerter": "", "registerNummer": "Testfirma"}).status_code == 422
+
+def test_lookup_is_answered_from_cache(client, mocker, pysil, stored, pdf_file, result):
+    """Die zweite Anfrage derselben Firma startet keine neue Suche, außer mit force=true."""
+    search = mocker.patch.object(pysil, "search_and_store", return_value=stored)
+    mocker.patch.object(pysil, "build_lookup_result", return_value=result)
+
+    first = client.post("/lookup", json={"schlagwoerter": "Testfirma"})
+    second = client.post("/lookup", json={"schlagwoerter": "  testfirma "})
+    assert first.json() == second.json()
+    assert search.call_count == 1
+
+    client.post("/lookup?force=true", json={"schlagwoerter": "Testfirma"})
+    assert search.call_count == 2
+
+def test_lookup_not_found(client, mocker, pysil):
+    mocker.patch.object(pysil, "search_and_store", return_value=None)
+    response = client.post("/lookup", json={"schlagwoerter": "Gibtsnicht"})
+    assert response.status_code == 404
+
+def test_extract_is_cached_in_process(client, mocker, pdf_file):
+    """Ein bereits extrahiertes Dokument wird nicht erneut gelesen."""
+    service._extract_cached.cache_clear()
+    extract = mocker.patch("hr.service.extract_company_data_from_pdf", return_value=CompanyPdfData([], "Testfirma GmbH", ""))
+
+    first = client.post("/extract", json={"pdf_path": str(pdf_file)})
+    second = client.post("/extract", json={"sha256": pdf_file.stem})
+
+    assert first.json() == second.json() == {"ceos": [], "name": "Testfirma GmbH", "address": "", "pages_read": 0}
+    assert extract.call_count == 1
+
+def test_extract_missing_file(client, tmp_path):
+    response = client.post("/extract", json={"pdf_path": str(tmp_path / "fehlt.pdf")})
+    assert response.status_code == 404
+
+def test_extract_only_reads_stored_documents(client, mocker, tmp_path, store, pdf_file):
+    """Pfade außerhalb des Dokumentenspeichers werden nicht gelesen, auch nicht über ".." oder Symlinks."""
+    extract = mocker.patch("hr.service.extract_company_data_from_pdf")
+    secret = tmp_path / "secret.pdf"
+    secret.write_bytes(b"%PDF-1.4 geheim")
+    (store.blob_root / "link.pdf").symlink_to(secret)
+
+    for path in (secret, store.blob_root / ".." / ".." / "secret.pdf", store.blob_root / "link.pdf", "/etc/passwd"):
+        assert client.post("/extract", json={"pdf_path": str(path)}).status_code == 404
+    assert client.post("/extract", json={"sha256": "0" * 64}).status_code == 404
+    assert client.post("/extract", json={}).status_code == 422
+    extract.assert_not_called()
+
+def test_invalid_search_option(client):
+    response = client.post("/search", json={"schlagwoerter": "Test", "schlagwortOptionen": "fuzzy"})
+    assert response.status_code == 422
+
+def test_index_is_answered_locally(client, index, mocker):
+    """Die Suche im Index braucht weder einen Browser noch das Portal."""
+    search = mocker.patch("hr.service.search_and_download")
+    index.add_rows([{
+        "court": "Berlin  District court Berlin (Charlottenburg) HRB 44343",
+        "name": "GASAG AG",
+        "state": "Berlin",
+        "status": "currently registered",
+        "documents": "ADCDHDDKUTVÖ",
+        "history": [["1.) Gasag Berliner Gaswerke Aktiengesellschaft", "1.) Berlin"]]
+    }])
+
+    response = client.get("/index", params={"q": "berliner gaswerke"})
+    assert response.status_code == 200
+    assert [company["name"] for company in response.json()] == ["GASAG AG"]
+    assert response.json()[0]["register_number"] == "44343"
+    assert client.get("/index", params={"register": "HRB 12345"}).json() == []
+    search.assert_not_called()
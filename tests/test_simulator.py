@@ -0,0 +1,166 @@
+import time
+import pytest
+import requests
+from benchmarks import synthetic
+from benchmarks.simulator import PortalSimulator, SimulatorConfig, run_http_lookups
+from hr import pysil, pyutil
+from hr.handelsregister import RegisterNumber
+from hr.httpclient import PortalClient, find_matching_row, find_register_row
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class NoQuota:
+    def acquire(self):
+        pass
+
+@pytest.fixture
+def simulate():
+    started = []
+
+    def start(**config):
+        simulator = PortalSimulator(SimulatorConfig(**config)).start()
+        started.append(simulator)
+        return simulator
+
+    yield start
+    for simulator in started:
+        simulator.stop()
+
+def client(simulator):
+    return PortalClient(base_url=simulator.url, quota=NoQuota())
+
+# ---------------------------------- #
+# -- Tests for the simulated pages -- #
+# ---------------------------------- #
+
+def test_lookup_pages_to_the_matching_row(simulate, tmp_path):
+    """Der HTTP-Client blättert bis zur passenden Zeile und lädt ein auswertbares AD-Dokument."""
+    simulator = simulate(results=250, match_position=180)
+    with client(simulator) as portal:
+        pages = []
+        for page in portal.search_pages("Testfirma GmbH", ci="Ulm"):
+            pages.append(page.first)
+            row_index = find_matching_row(page.rows, "Testfirma GmbH", "Ulm")
+            if row_index is not None:
+                document = portal.download_document(page, page.first + row_index)
+                break
+
+    assert pages == [0, 100]
+    assert document.filename.endswith("_AD.pdf")
+    pdf_path = tmp_path / document.filename
+    pdf_path.write_bytes(document.content)
+    assert pyutil.extract_company_data_from_pdf(str(pdf_path)).name == "Testfirma GmbH"
+    assert simulator.stats()["page"] == 1
+
+def test_register_lookup(simulate):
+    simulator = simulate(results=5, match_position=3)
+    register = RegisterNumber("HRB", "44343", "Charlottenburg")
+    with client(simulator) as portal:
+        result = portal.search("", register=register)
+    assert find_register_row(result.rows, register) == 3
+    assert result.rows[3]["court"].endswith("District court Berlin (Charlottenburg) HRB 44343")
+
+def test_same_query_same_rows(simulate):
+    """Die Zeilen hängen nur vom Seed und der Anfrage ab, damit Messungen reproduzierbar sind."""
+    first = simulate(results=20, seed=7)
+    second = simulate(results=20, seed=7)
+    with client(first) as a, client(second) as b:
+        assert a.search("Testfirma", ci="Ulm").rows == b.search("Testfirma", ci="Ulm").rows
+
+def test_no_matching_row(simulate):
+    simulator = simulate(results=10, match_position=None)
+    with client(simulator) as portal:
+        rows = portal.search("Testfirma GmbH", ci="Ulm").rows
+    assert len(rows) == 10
+    assert find_matching_row(rows, "Testfirma GmbH", "Ulm") is None
+
+def test_session_and_view_state_are_checked(simulate):
+    simulator = simulate()
+    assert requests.post(simulator.url + "erweitertesuche.xhtml", data={"javax.faces.ViewState": "vs1"}).status_code == 400
+    with requests.Session() as session:
+        session.get(simulator.url + "welcome.xhtml")
+        assert session.post(simulator.url + "erweitertesuche.xhtml", data={"javax.faces.ViewState": "unknown"}).status_code == 400
+    assert simulator.stats()["rejected"] == 2
+
+class FakeBrowser:
+    """Zeigt die Ergebnisseite, die ein PortalClient geladen hat, wie ein Selenium-Browser mit derselben Sitzung."""
+
+    def __init__(self, portal, result):
+        self.cookies = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path} for c in portal.session.cookies]
+        self.page_source = result.html
+        self.current_url = result.url
+
+    def get_cookies(self):
+        return self.cookies
+
+    def execute_script(self, script):
+        return "Mozilla/5.0 (X11; Linux x86_64) HeadlessChrome/120.0.0.0"
+
+class FakeResultRow:
+    def __init__(self, index):
+        self.index = index
+
+    def get_attribute(self, name):
+        return str(self.index) if name == "data-ri" else None
+
+def test_document_is_captured_in_memory(simulate, mocker):
+    """Das AD-Dokument wird mit der Sitzung des Browsers direkt in den Speicher geladen und ohne Datei ausgewertet."""
+    quota = mocker.patch("hr.pysil.portal_quota")
+    simulator = simulate(results=5, match_position=2)
+    with client(simulator) as portal:
+        result = portal.search("Testfirma GmbH", ci="Ulm")
+        content = pysil.capture_ad_of_row(FakeBrowser(portal, result), FakeResultRow(2))
+
+    assert content.startswith(b"%PDF")
+    assert pyutil.extract_company_data_from_pdf(content).name == "Testfirma GmbH"
+    assert simulator.stats()["document"] == 1
+    quota.return_value.acquire.assert_called_once()
+
+def test_capture_without_the_browser_session(simulate, mocker):
+    """Ohne die Cookies des Browsers lehnt das Portal den Abruf ab, der Fehler wird weitergereicht."""
+    mocker.patch("hr.pysil.portal_quota")
+    simulator = simulate(results=5)
+    with client(simulator) as portal:
+        result = portal.search("Testfirma GmbH")
+        browser = FakeBrowser(portal, result)
+    browser.cookies = []
+    with pytest.raises(requests.HTTPError, match="400"):
+        pysil.capture_ad_of_row(browser, FakeResultRow(0))
+
+# ------------------------------------ #
+# -- Tests for the configured faults -- #
+# ------------------------------------ #
+
+def test_latency(simulate):
+    simulator = simulate(latency=0.05)
+    start = time.perf_counter()
+    with client(simulator) as portal:
+        portal.search("Testfirma")
+    # Start page, advanced search and the search itself.
+    assert time.perf_counter() - start >= 0.15
+
+def test_errors(simulate):
+    simulator = simulate(error_rate=1.0)
+    with client(simulator) as portal:
+        with pytest.raises(requests.HTTPError):
+            portal.search("Testfirma")
+    assert simulator.stats()["error"] == 1
+
+def test_document_size(simulate, tmp_path):
+    simulator = simulate(document_size=200_000)
+    with client(simulator) as portal:
+        result = portal.search("Testfirma GmbH")
+        document = portal.download_document(result, 0)
+    assert len(document.content) >= 200_000
+    pdf_path = tmp_path / "AD.pdf"
+    pdf_path.write_bytes(document.content)
+    assert pyutil.extract_company_data_from_pdf(str(pdf_path)).name == "Testfirma GmbH"
+
+def test_load_run(simulate):
+    simulator = simulate(results=20, match_position=5)
+    numbers = run_http_lookups(simulator.url, synthetic.generate_company_names(6, seed=1), concurrency=3)
+    assert (numbers["lookups"], numbers["found"], numbers["errors"]) == (6, 6, 0)
+    assert numbers["p50_ms"] <= numbers["p95_ms"] <= numbers["max_ms"]
+    assert simulator.stats()["document"] == 6
@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from hr.lookupcache import LookupCache, normalize_query
+
+HR_DIR = Path(__file__).resolve().parent.parent / "hr"
+
+# Modules that take most of the import time. They may only be loaded once a browser or a PDF is actually needed.
+HEAVY_MODULES = {"selenium", "webdriver_manager", "fitz", "pymupdf", "nameparser", "mechanize", "requests", "bs4"}
+# Generous for slow machines, loading the heavy modules takes well above a second there.
+IMPORT_BUDGET_MS = 350
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+def run_pysil(*args, env=None):
+    """Startet pysil.py wie von der Kommandozeile und liefert die Ausgabe und die Importzeiten (-X importtime)."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "pysil.py", *args],
+        cwd=HR_DIR, env={**os.environ, **(env or {})}, capture_output=True, text=True, timeout=60
+    )
+    assert completed.returncode == 0, completed.stderr
+    imported = {}
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                imported[name.strip()] = (int(cumulative), not name[1:].startswith(" ")) # (µs, top level)
+    return completed.stdout, imported
+
+def top_level_modules(imported):
+    return {name.split(".")[0] for name in imported}
+
+def import_ms(imported):
+    # The cumulative times of the top level imports add up to the whole import time of the process.
+    return sum(us for us, top_level in imported.values() if top_level) / 1000
+
+@pytest.fixture
+def env(tmp_path):
+    return {"HR_CACHE_DB": str(tmp_path / "lookups.sqlite3"), "HR_INDEX_DB": str(tmp_path / "index.sqlite3"), "HR_TRACE_FILE": str(tmp_path / "timings.jsonl")}
+
+# ------------------------------ #
+# -- Tests for the start paths -- #
+# ------------------------------ #
+
+def test_help_skips_heavy_imports(env):
+    """--help lädt weder Selenium noch PyMuPDF."""
+    stdout, imported = run_pysil("--help", env=env)
+    assert "--schlagwoerter" in stdout
+    assert not top_level_modules(imported) & HEAVY_MODULES
+    assert import_ms(imported) < IMPORT_BUDGET_MS
+
+def test_cache_hit_skips_heavy_imports(env):
+    """Ein Cache-Treffer wird beantwortet, ohne Browser- oder PDF-Bibliotheken zu laden."""
+    result = {"managers": ["Mustermann, Max"], "name": "Testfirma GmbH", "address": "Musterstraße 1"}
+    LookupCache(db_path=Path(env["HR_CACHE_DB"])).put(
+        normalize_query("Testfirma", "all", False, False, "Musterstadt", None, None, None), result, "/tmp/AD.pdf"
+    )
+
+    stdout, imported = run_pysil("-s", "Testfirma", "-ci", "Musterstadt", env=env)
+    assert json.loads(stdout) == result
+    assert not top_level_modules(imported) & HEAVY_MODULES
+    assert import_ms(imported) < IMPORT_BUDGET_MS
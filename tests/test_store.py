@@ -0,0 +1,106 @@
+import hashlib
+import pytest
+from hr.store import DocumentStore, file_digest
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return DocumentStore(tmp_path / "store", clock=clock)
+
+def download(tmp_path, name, content):
+    path = tmp_path / "downloads" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+# ------------------------- #
+# -- Tests for the blobs -- #
+# ------------------------- #
+
+def test_blob_is_named_after_its_content(store, tmp_path):
+    source = download(tmp_path, "Testfirma-AD.pdf", b"%PDF-1.4 A")
+    document = store.put(source, "ulm|HRB 1")
+
+    sha256 = hashlib.sha256(b"%PDF-1.4 A").hexdigest()
+    assert document.sha256 == file_digest(document.path) == sha256
+    assert document.path == store.root / "blobs" / sha256[:2] / (sha256 + ".pdf")
+    assert document.filename == "Testfirma-AD.pdf"
+    assert document.size == 10
+    # Copied by default.
+    assert source.exists()
+
+def test_identical_documents_are_stored_once(store, tmp_path, clock):
+    first = store.put(download(tmp_path, "a.pdf", b"%PDF same"), "ulm|HRB 1", move=True)
+    clock.now += 60
+    second = store.put(download(tmp_path, "b.pdf", b"%PDF same"), "ulm|HRB 1", move=True)
+
+    assert first.path == second.path
+    assert len(list((store.root / "blobs").rglob("*.pdf"))) == 1
+    assert not any((tmp_path / "downloads").iterdir())
+    assert [d.fetched_at for d in store.history("ulm|HRB 1")] == [clock.now, clock.now - 60]
+
+def test_captured_document_is_stored_like_a_download(store, tmp_path, clock):
+    """Ein im Speicher erfasstes Dokument landet im selben Blob wie eine gleiche heruntergeladene Datei."""
+    stored = store.put_bytes(b"%PDF-1.4 Testfirma", "ulm|HRB 1", query_key="q1", filename="HRB_1_AD.pdf")
+    assert stored.path == store.blob_path(hashlib.sha256(b"%PDF-1.4 Testfirma").hexdigest())
+    assert stored.path.read_bytes() == b"%PDF-1.4 Testfirma"
+    assert (stored.size, stored.filename) == (18, "HRB_1_AD.pdf")
+
+    clock.now += 60
+    downloaded = store.put(download(tmp_path, "AD.pdf", b"%PDF-1.4 Testfirma"), "ulm|HRB 1")
+    assert downloaded.path == stored.path
+    assert len(store.history("ulm|HRB 1")) == 2
+
+def test_captured_document_is_stored_in_the_background(store):
+    pending = store.put_bytes_async(b"%PDF-1.4 Testfirma", "ulm|HRB 1", query_key="q1")
+    stored = pending.result(timeout=5)
+    assert stored.path.read_bytes() == b"%PDF-1.4 Testfirma"
+    assert store.latest_for_query("q1") == stored
+
+# --------------------------- #
+# -- Tests for the lookups -- #
+# --------------------------- #
+
+def test_latest_document_of_a_company(store, tmp_path, clock):
+    """Firmen mit demselben (gekürzten) Namen teilen sich keine Dokumente mehr."""
+    store.put(download(tmp_path, "old.pdf", b"%PDF old"), "ulm|HRB 1")
+    clock.now += 60
+    new = store.put(download(tmp_path, "new.pdf", b"%PDF new"), "ulm|HRB 1")
+    other = store.put(download(tmp_path, "other.pdf", b"%PDF other"), "ulm|HRB 2")
+
+    assert store.latest("ulm|HRB 1") == new
+    assert store.latest("ulm|HRB 2") == other
+    assert store.latest("ulm|HRB 1", doc_type="CD") is None
+    assert store.latest("ulm|HRB 3") is None
+
+def test_latest_respects_max_age(store, tmp_path, clock):
+    store.put(download(tmp_path, "a.pdf", b"%PDF a"), "ulm|HRB 1")
+    clock.now += 3600
+    assert store.latest("ulm|HRB 1", max_age=60) is None
+    assert store.latest("ulm|HRB 1", max_age=7200) is not None
+
+def test_latest_for_query(store, tmp_path):
+    document = store.put(download(tmp_path, "a.pdf", b"%PDF a"), "ulm|HRB 1", query_key="abc")
+    assert store.latest_for_query("abc") == document
+    assert store.latest_for_query("def") is None
+
+def test_deleted_blobs_are_skipped(store, tmp_path, clock):
+    older = store.put(download(tmp_path, "a.pdf", b"%PDF a"), "ulm|HRB 1")
+    clock.now += 60
+    newer = store.put(download(tmp_path, "b.pdf", b"%PDF b"), "ulm|HRB 1")
+    newer.path.unlink()
+    assert store.latest("ulm|HRB 1") == older
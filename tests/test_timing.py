@@ -0,0 +1,95 @@
+import json
+import pytest
+from hr.timing import append_trace, exclusive_totals, recording, span, summarize
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+# ------------------------- #
+# -- Tests for the spans -- #
+# ------------------------- #
+
+def test_span_without_recording_does_nothing():
+    with span("page_load"):
+        pass
+
+def test_spans_are_summed_up_per_name(clock):
+    with recording(clock) as timings:
+        with span("download"):
+            with span("quota_wait"):
+                clock.now += 2.0
+            clock.now += 0.5
+        with span("quota_wait"):
+            clock.now += 1.0
+
+    assert timings.totals() == {"download": 2500.0, "quota_wait": 3000.0}
+    assert timings.elapsed() == 3.5
+    assert [(s["name"], s["start_ms"], s["depth"]) for s in timings.to_trace()] == [
+        ("download", 0.0, 0), ("quota_wait", 0.0, 1), ("quota_wait", 2500.0, 0)
+    ]
+
+def test_recording_ends_with_its_block(clock):
+    with recording(clock) as timings:
+        pass
+    with span("page_load"):
+        clock.now += 1.0
+    assert timings.spans == []
+
+# ------------------------------ #
+# -- Tests for the trace file -- #
+# ------------------------------ #
+
+def test_trace_lines_are_appended(tmp_path, clock):
+    trace = tmp_path / "traces" / "timings.jsonl"
+    for seconds in (1.0, 2.0):
+        with recording(clock) as timings:
+            with span("page_load"):
+                clock.now += seconds
+        append_trace(trace, timings, query={"s": "Testfirma"}, outcome="found")
+
+    lines = [json.loads(line) for line in trace.read_text(encoding="utf-8").splitlines()]
+    assert [line["timings"] for line in lines] == [{"page_load": 1000.0}, {"page_load": 2000.0}]
+    assert lines[0]["query"] == {"s": "Testfirma"}
+    assert lines[0]["outcome"] == "found"
+    assert lines[1]["total_ms"] == 2000.0
+
+def test_summary_sorts_by_p95():
+    """Die Phasen mit dem höchsten p95 stehen oben."""
+    lines = [{"total_ms": 100.0 * i, "timings": {"page_load": 10.0 * i, "download": 80.0}} for i in range(1, 21)]
+    summary = summarize(lines)
+
+    assert [entry["phase"] for entry in summary] == ["total", "page_load", "download"]
+    page_load = summary[1]
+    assert (page_load["count"], page_load["p50_ms"], page_load["p95_ms"], page_load["max_ms"]) == (20, 100.0, 190.0, 200.0)
+    assert page_load["share"] == 0.1
+
+def test_summary_share_excludes_nested_phases(tmp_path, clock):
+    """Verschachtelte Phasen werden nicht doppelt gezählt, die Anteile ergeben zusammen höchstens 100 %."""
+    trace = tmp_path / "timings.jsonl"
+    with recording(clock) as timings:
+        with span("download"):
+            with span("quota_wait"):
+                clock.now += 2.0
+            clock.now += 0.5
+        with span("extract"):
+            clock.now += 1.5
+    append_trace(trace, timings)
+    line = json.loads(trace.read_text(encoding="utf-8"))
+
+    assert exclusive_totals(line["spans"]) == {"download": 500.0, "quota_wait": 2000.0, "extract": 1500.0}
+    shares = {entry["phase"]: entry["share"] for entry in summarize([line])}
+    assert shares == {"total": 1.0, "download": 0.125, "quota_wait": 0.5, "extract": 0.375}
+    # The percentiles still contain the nested phase.
+    assert next(entry for entry in summarize([line]) if entry["phase"] == "download")["p50_ms"] == 2500.0
@@ -0,0 +1,76 @@
+import threading
+import time
+import pytest
+from hr import waits
+
+# ------------------- #
+# -- MOCK-FIXTURES -- #
+# ------------------- #
+
+class FakeDriver:
+    """Simuliert eine Seite, die erst nach einigen Abfragen keine AJAX-Anfragen mehr offen hat."""
+
+    def __init__(self, busy_polls):
+        self.busy_polls = busy_polls
+        self.polls = 0
+
+    def execute_script(self, script):
+        self.polls += 1
+        return self.polls > self.busy_polls
+
+def write_in_chunks(path, chunks, pause):
+    """Schreibt eine Datei so wie der Browser: erst als .crdownload, danach wird sie umbenannt."""
+    partial = path.with_name(path.name + ".crdownload")
+    with open(partial, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            f.flush()
+            time.sleep(pause)
+    partial.rename(path)
+
+# ---------------------------- #
+# -- Tests for the AJAX wait -- #
+# ---------------------------- #
+
+def test_wait_for_ajax_idle_returns_once_idle():
+    """Wartet genau so lange, bis die Seite keine offenen Anfragen mehr hat."""
+    driver = FakeDriver(busy_polls=3)
+    assert waits.wait_for_ajax_idle(driver, timeout=2, poll=0.01)
+    assert driver.polls == 4
+
+def test_wait_for_ajax_idle_timeout():
+    """Gibt False zurück, wenn die Seite nicht rechtzeitig fertig wird."""
+    driver = FakeDriver(busy_polls=10**6)
+    assert not waits.wait_for_ajax_idle(driver, timeout=0.1, poll=0.01)
+
+# -------------------------------- #
+# -- Tests for the download wait -- #
+# -------------------------------- #
+
+def test_wait_for_download_waits_for_finalized_file(tmp_path):
+    """Die Datei wird erst zurückgegeben, wenn der Browser sie fertig geschrieben hat."""
+    target = tmp_path / "AD.pdf"
+    writer = threading.Thread(target=write_in_chunks, args=(target, [b"%PDF-" , b"x" * 100, b"y" * 100], 0.1))
+    writer.start()
+    result = waits.wait_for_download(tmp_path, timeout=5, stable_for=0.1, poll=0.02)
+    writer.join()
+    assert result == target
+    assert result.stat().st_size == 205
+
+def test_wait_for_download_ignores_existing_files(tmp_path):
+    """Bereits vorhandene Dateien werden nicht mit dem neuen Download verwechselt."""
+    (tmp_path / "alt.pdf").write_bytes(b"old")
+    existing = waits.snapshot_dir(tmp_path)
+    threading.Timer(0.1, lambda: (tmp_path / "neu.pdf").write_bytes(b"new")).start()
+    result = waits.wait_for_download(tmp_path, existing, timeout=5, stable_for=0.1, poll=0.02)
+    assert result.name == "neu.pdf"
+
+def test_wait_for_download_timeout(tmp_path):
+    """Ein nicht abgeschlossener Download führt zu einem TimeoutError statt stillschweigend weiterzulaufen."""
+    (tmp_path / "AD.pdf.crdownload").write_bytes(b"partial")
+    with pytest.raises(TimeoutError):
+        waits.wait_for_download(tmp_path, timeout=0.2, poll=0.02)
+
+def test_is_partial_download(tmp_path):
+    assert waits.is_partial_download(tmp_path / "AD.pdf.crdownload")
+    assert not waits.is_partial_download(tmp_path / "AD.pdf")